@@ -0,0 +1,449 @@
+"""
+IP Intelligence - Local GeoIP with an Optional HTTP Fallback
+================================================================
+- lookup(ip) returns location, ISP/ASN and the security flags (VPN, proxy,
+  Tor, datacenter, threat level) in one dict, from one lookup per backend
+- Backends are tried in GEOIP_BACKENDS order until one knows the address:
+    * MaxMindBackend reads MaxMind-format (.mmdb) databases opened memory-
+      mapped: GEOIP_CITY_DATABASE (GeoLite2/GeoIP2 City), plus optional
+      GEOIP_ASN_DATABASE and GEOIP_ANONYMOUS_DATABASE (Anonymous IP) for
+      ISP and VPN/hosting/Tor flags. Needs the `maxminddb` package
+    * IpApiBackend is the ip-api.com JSON API (45 req/min, blocking), only
+      enabled while GEOIP_HTTP_FALLBACK is on
+- Private and loopback addresses are answered without any backend
+- Answers are cached in a per-process LRU and then the shared cache (Redis
+  in production) for GEOIP_CACHE_TTL, keyed by the address's /24 (IPv4) or
+  /48 (IPv6) network while GEOIP_CACHE_BY_PREFIX is on: offices and mobile
+  carriers share a network, and location/ISP do too. VPN/proxy/Tor are
+  per-address, so they are re-read for the exact address on every prefix
+  hit from a backend with address_flags() (a local Anonymous-IP database:
+  microseconds, no I/O). Without one (e.g. only the ip-api fallback) every
+  address is cached under its own key
+- Addresses no backend could answer are cached as misses for
+  GEOIP_CACHE_NEGATIVE_TTL, so a dead fallback isn't retried per request
+- Hit counts are kept per process and added to shared counters every
+  STATS_FLUSH_EVERY lookups; cache_stats() reports the hit rate
+- A backend is any class with from_settings() (None when not configured)
+  and lookup(ip) -> Optional[dict]; address_flags(ip) is optional (and off
+  while a has_address_flags attribute is false)
+"""
+
+import ipaddress
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+import requests
+
+try:
+    import maxminddb
+    HAS_MAXMINDDB = True
+except ImportError:
+    HAS_MAXMINDDB = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKENDS = [
+    'accounts.geoip.MaxMindBackend',
+    'accounts.geoip.IpApiBackend',
+]
+IP_API_URL = 'http://ip-api.com/json/{ip}'
+IP_API_FIELDS = 'status,message,country,countryCode,region,regionName,city,zip,lat,lon,timezone,isp,org,as,proxy,hosting'
+IP_API_TIMEOUT = 3
+SECURITY_FIELDS = ('is_vpn', 'is_proxy', 'is_tor', 'is_datacenter')
+
+KEY_PREFIX = 'ipintel'
+DEFAULT_CACHE_TTL = 86400
+DEFAULT_NEGATIVE_TTL = 300
+LOCAL_TTL = 300             # seconds a process trusts its own copy
+MAX_LOCAL = 20000           # networks (or addresses) a process keeps
+STATS_FLUSH_EVERY = 100     # lookups between pushes to the shared hit counters
+STATS_TTL = 30 * 86400
+MISS = {}                   # cached "no backend knew this address"
+
+
+def empty() -> Dict[str, Any]:
+    """A lookup result with nothing known."""
+    return {
+        'country': '',
+        'country_code': '',
+        'region': '',
+        'city': '',
+        'postal_code': '',
+        'latitude': None,
+        'longitude': None,
+        'timezone': '',
+        'isp': '',
+        'organization': '',
+        'asn': '',
+        'is_vpn': False,
+        'is_proxy': False,
+        'is_tor': False,
+        'is_datacenter': False,
+        'threat_level': 'none',
+    }
+
+
+LOCAL = {
+    **empty(),
+    'country': 'Local',
+    'country_code': 'LOCAL',
+    'city': 'Local Network',
+    'isp': 'Local Network',
+}
+
+
+def threat_level(info: Dict[str, Any]) -> str:
+    if info['is_tor']:
+        return 'high'
+    if info['is_vpn']:
+        return 'medium'
+    if info['is_proxy']:
+        return 'low'
+    return 'none'
+
+
+def _finish(info: Dict[str, Any]) -> Dict[str, Any]:
+    info['threat_level'] = threat_level(info)
+    return info
+
+
+# ----------------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------------
+
+def _name(record: Optional[Dict], key: str) -> str:
+    return ((record or {}).get(key) or {}).get('names', {}).get('en', '')
+
+
+def from_maxmind(city: Optional[Dict], asn: Optional[Dict] = None, anonymous: Optional[Dict] = None) -> Dict[str, Any]:
+    """Map MaxMind City / ASN / Anonymous-IP records onto a lookup result."""
+    city, asn, anonymous = city or {}, asn or {}, anonymous or {}
+    location = city.get('location') or {}
+    subdivisions = city.get('subdivisions') or [{}]
+    traits = city.get('traits') or {}
+
+    info = empty()
+    info.update({
+        'country': _name(city, 'country'),
+        'country_code': (city.get('country') or {}).get('iso_code', ''),
+        'region': subdivisions[0].get('names', {}).get('en', ''),
+        'city': _name(city, 'city'),
+        'postal_code': (city.get('postal') or {}).get('code', ''),
+        'latitude': location.get('latitude'),
+        'longitude': location.get('longitude'),
+        'timezone': location.get('time_zone', ''),
+        'isp': traits.get('isp') or asn.get('autonomous_system_organization', ''),
+        'organization': traits.get('organization') or asn.get('autonomous_system_organization', ''),
+        'asn': f"AS{asn['autonomous_system_number']} {asn.get('autonomous_system_organization', '')}".strip()
+        if asn.get('autonomous_system_number') else '',
+        'is_vpn': bool(anonymous.get('is_anonymous_vpn')),
+        'is_proxy': bool(anonymous.get('is_public_proxy') or anonymous.get('is_residential_proxy')),
+        'is_tor': bool(anonymous.get('is_tor_exit_node')),
+        'is_datacenter': bool(anonymous.get('is_hosting_provider')),
+    })
+    # Same heuristic as the HTTP backend: datacenter addresses are often VPNs
+    info['is_vpn'] = info['is_vpn'] or info['is_datacenter']
+    return _finish(info)
+
+
+class MaxMindBackend:
+    """Local .mmdb databases, opened memory-mapped once per process."""
+
+    def __init__(self, city_path: str, asn_path: str = '', anonymous_path: str = ''):
+        mode = maxminddb.MODE_MMAP
+        self.city = maxminddb.open_database(city_path, mode) if city_path else None
+        self.asn = maxminddb.open_database(asn_path, mode) if asn_path else None
+        self.anonymous = maxminddb.open_database(anonymous_path, mode) if anonymous_path else None
+
+    @classmethod
+    def from_settings(cls) -> Optional['MaxMindBackend']:
+        from django.conf import settings
+
+        paths = [getattr(settings, name, '') for name in
+                 ('GEOIP_CITY_DATABASE', 'GEOIP_ASN_DATABASE', 'GEOIP_ANONYMOUS_DATABASE')]
+        if not any(paths):
+            return None
+        if not HAS_MAXMINDDB:
+            logger.warning("[GeoIP] GEOIP_*_DATABASE is set but the maxminddb package isn't installed")
+            return None
+        return cls(*paths)
+
+    def lookup(self, ip: str) -> Optional[Dict[str, Any]]:
+        city = self.city.get(ip) if self.city else None
+        asn = self.asn.get(ip) if self.asn else None
+        anonymous = self.anonymous.get(ip) if self.anonymous else None
+        if city is None and asn is None and anonymous is None:
+            return None
+        return from_maxmind(city, asn, anonymous)
+
+    @property
+    def has_address_flags(self) -> bool:
+        return self.anonymous is not None
+
+    def address_flags(self, ip: str) -> Optional[Dict[str, bool]]:
+        """Per-address VPN/proxy/Tor/hosting flags, if an Anonymous-IP database is open."""
+        if self.anonymous is None:
+            return None
+        info = from_maxmind(None, None, self.anonymous.get(ip))
+        return {key: info[key] for key in SECURITY_FIELDS}
+
+    def close(self):
+        for reader in (self.city, self.asn, self.anonymous):
+            if reader is not None:
+                reader.close()
+
+
+class IpApiBackend:
+    """ip-api.com: one blocking request answers both geo and proxy/hosting."""
+
+    def __init__(self, timeout: float = IP_API_TIMEOUT):
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls) -> Optional['IpApiBackend']:
+        from django.conf import settings
+
+        if not getattr(settings, 'GEOIP_HTTP_FALLBACK', True):
+            return None
+        return cls(getattr(settings, 'GEOIP_HTTP_TIMEOUT', IP_API_TIMEOUT))
+
+    def lookup(self, ip: str) -> Optional[Dict[str, Any]]:
+        response = requests.get(IP_API_URL.format(ip=ip), params={'fields': IP_API_FIELDS}, timeout=self.timeout)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        if data.get('status') != 'success':
+            return None
+
+        info = empty()
+        info.update({
+            'country': data.get('country', ''),
+            'country_code': data.get('countryCode', ''),
+            'region': data.get('regionName', ''),
+            'city': data.get('city', ''),
+            'postal_code': data.get('zip', ''),
+            'latitude': data.get('lat'),
+            'longitude': data.get('lon'),
+            'timezone': data.get('timezone', ''),
+            'isp': data.get('isp', ''),
+            'organization': data.get('org', ''),
+            'asn': data.get('as', ''),
+            'is_proxy': bool(data.get('proxy')),
+            'is_datacenter': bool(data.get('hosting')),
+            # Heuristic: datacenter IPs are often VPNs
+            'is_vpn': bool(data.get('hosting')),
+        })
+        return _finish(info)
+
+
+# ----------------------------------------------------------------------------
+# Lookup
+# ----------------------------------------------------------------------------
+
+_lock = threading.Lock()
+_backends: Optional[List] = None
+
+
+def backends() -> List:
+    """The configured backends, built once per process."""
+    global _backends
+    if _backends is None:
+        from django.conf import settings
+        from django.utils.module_loading import import_string
+
+        with _lock:
+            if _backends is None:
+                built = []
+                for path in getattr(settings, 'GEOIP_BACKENDS', DEFAULT_BACKENDS):
+                    try:
+                        backend = import_string(path).from_settings()
+                    except Exception as e:
+                        logger.error(f"[GeoIP] Could not load backend {path}: {e}")
+                        continue
+                    if backend is not None:
+                        built.append(backend)
+                _backends = built
+    return _backends
+
+
+def reset():
+    """Close and forget the process's backends and cached answers (rebuilt on demand)."""
+    global _backends
+    with _lock:
+        for backend in _backends or []:
+            if hasattr(backend, 'close'):
+                backend.close()
+        _backends = None
+        _local.clear()
+        _stats.clear()
+
+
+# ----------------------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------------------
+
+_local: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (expires_at, info)
+_stats: Counter = Counter()
+
+
+def cache_key(address) -> str:
+    """
+    Shared-cache key: the /24 or /48 network, or the address itself. Networks
+    are only shared when a backend can supply per-address security flags.
+    """
+    from django.conf import settings
+
+    if getattr(settings, 'GEOIP_CACHE_BY_PREFIX', True) and _flag_backends():
+        prefix = 24 if address.version == 4 else 48
+        return f'{KEY_PREFIX}:{ipaddress.ip_network(f"{address}/{prefix}", strict=False)}'
+    return f'{KEY_PREFIX}:{address}'
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+        due = sum(_stats.values()) >= STATS_FLUSH_EVERY
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Add this process's hit counts to the shared counters."""
+    from automations.services.cache_counters import incr
+
+    with _lock:
+        counts = dict(_stats)
+        _stats.clear()
+    try:
+        for name, count in counts.items():
+            incr(f'{KEY_PREFIX}:stats:{name}', STATS_TTL, count)
+    except Exception as e:
+        logger.warning(f"[GeoIP] Could not record cache stats: {e}")
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Shared hit/miss counts and the hit rate across all processes."""
+    from django.core.cache import cache
+
+    names = ('local_hits', 'shared_hits', 'misses')
+    values = cache.get_many([f'{KEY_PREFIX}:stats:{name}' for name in names])
+    counts = {name: int(values.get(f'{KEY_PREFIX}:stats:{name}') or 0) for name in names}
+    total = sum(counts.values())
+    counts['lookups'] = total
+    counts['hit_rate'] = round((counts['local_hits'] + counts['shared_hits']) / total * 100, 1) if total else 0.0
+    return counts
+
+
+def _local_get(key: str) -> Optional[Dict]:
+    with _lock:
+        entry = _local.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return entry[1]
+
+
+def _local_set(key: str, info: Dict, ttl: float):
+    with _lock:
+        _local[key] = (time.monotonic() + min(ttl, LOCAL_TTL), info)
+        _local.move_to_end(key)
+        while len(_local) > MAX_LOCAL:
+            _local.popitem(last=False)
+
+
+def _cached(key: str) -> Optional[Dict]:
+    """(Process LRU, then shared cache) answer for a key; MISS for a cached failure."""
+    from django.conf import settings
+    from django.core.cache import cache
+
+    info = _local_get(key)
+    if info is not None:
+        _count('local_hits')
+        return info
+    try:
+        info = cache.get(key)
+    except Exception as e:
+        logger.warning(f"[GeoIP] Shared cache read failed: {e}")
+        info = None
+    if info is not None:
+        _count('shared_hits')
+        ttl = getattr(settings, 'GEOIP_CACHE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL) if info == MISS \
+            else getattr(settings, 'GEOIP_CACHE_TTL', DEFAULT_CACHE_TTL)
+        _local_set(key, info, ttl)
+    return info
+
+
+def _store(key: str, info: Dict):
+    from django.conf import settings
+    from django.core.cache import cache
+
+    ttl = getattr(settings, 'GEOIP_CACHE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL) if info == MISS \
+        else getattr(settings, 'GEOIP_CACHE_TTL', DEFAULT_CACHE_TTL)
+    _local_set(key, info, ttl)
+    try:
+        cache.set(key, info, ttl)
+    except Exception as e:
+        logger.warning(f"[GeoIP] Shared cache write failed: {e}")
+
+
+def _flag_backends() -> List[Any]:
+    """Backends that can answer security flags for an exact address."""
+    return [
+        backend for backend in backends()
+        if hasattr(backend, 'address_flags') and getattr(backend, 'has_address_flags', True)
+    ]
+
+
+def _with_address_flags(ip: str, info: Dict[str, Any]) -> Dict[str, Any]:
+    """A network's cached answer with the security flags of this exact address."""
+    for backend in _flag_backends():
+        try:
+            flags = backend.address_flags(ip)
+        except Exception as e:
+            logger.warning(f"⚠️ [GeoIP] {type(backend).__name__} flag lookup failed for {ip}: {e}")
+            continue
+        if flags is not None:
+            return _finish({**info, **flags})
+    return info
+
+
+# ----------------------------------------------------------------------------
+# Lookup
+# ----------------------------------------------------------------------------
+
+def _lookup(ip: str) -> Optional[Dict[str, Any]]:
+    for backend in backends():
+        try:
+            info = backend.lookup(ip)
+        except Exception as e:
+            logger.warning(f"⚠️ [GeoIP] {type(backend).__name__} lookup failed for {ip}: {e}")
+            continue
+        if info is not None:
+            return info
+    return None
+
+
+def lookup(ip: str) -> Dict[str, Any]:
+    """Location, network and security flags for an IP address (cached)."""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return empty()
+    if address.is_private or address.is_loopback:
+        return dict(LOCAL)
+
+    key = cache_key(address)
+    info = _cached(key)
+    if info is None:
+        _count('misses')
+        info = _lookup(ip)
+        _store(key, info if info is not None else MISS)
+    elif info != MISS and key != f'{KEY_PREFIX}:{address}':
+        info = _with_address_flags(ip, info)
+    return dict(info) if info else empty()
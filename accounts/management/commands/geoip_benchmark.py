@@ -0,0 +1,73 @@
+"""
+Management command: geoip_benchmark
+
+Usage:
+    python manage.py geoip_benchmark                             # GEOIP_*_DATABASE settings
+    python manage.py geoip_benchmark --city GeoLite2-City.mmdb --asn GeoLite2-ASN.mmdb
+    python manage.py geoip_benchmark --count 500000 --seed 7
+
+Times accounts.geoip lookups against the local .mmdb databases only (the
+ip-api.com fallback is never called) over random public IPv4 addresses and
+reports lookups/sec, microseconds per lookup and how many addresses the
+databases knew.
+"""
+
+import ipaddress
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import geoip
+
+
+class Command(BaseCommand):
+    help = 'Benchmark local GeoIP (.mmdb) lookups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', default='', help='City database (default: GEOIP_CITY_DATABASE).')
+        parser.add_argument('--asn', default='', help='ASN database (default: GEOIP_ASN_DATABASE).')
+        parser.add_argument('--anonymous', default='', help='Anonymous IP database (default: GEOIP_ANONYMOUS_DATABASE).')
+        parser.add_argument('--count', type=int, default=200000, help='Lookups to time (default: 200000).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the addresses.')
+
+    def handle(self, *args, **options):
+        if not geoip.HAS_MAXMINDDB:
+            raise CommandError('The maxminddb package is not installed (pip install maxminddb)')
+        paths = (
+            options['city'] or settings.GEOIP_CITY_DATABASE,
+            options['asn'] or settings.GEOIP_ASN_DATABASE,
+            options['anonymous'] or settings.GEOIP_ANONYMOUS_DATABASE,
+        )
+        if not any(paths):
+            raise CommandError('No database: pass --city/--asn/--anonymous or set GEOIP_*_DATABASE')
+        if options['count'] < 1:
+            raise CommandError('--count must be positive')
+
+        rng = random.Random(options['seed'])
+        addresses = []
+        while len(addresses) < options['count']:
+            address = ipaddress.IPv4Address(rng.getrandbits(32))
+            if address.is_global:
+                addresses.append(str(address))
+
+        opened = time.perf_counter()
+        backend = geoip.MaxMindBackend(*paths)
+        opened = time.perf_counter() - opened
+        try:
+            backend.lookup(addresses[0])  # fault in the first pages
+            started = time.perf_counter()
+            known = sum(1 for address in addresses if backend.lookup(address) is not None)
+            seconds = time.perf_counter() - started
+        finally:
+            backend.close()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{len(addresses)} lookups ({', '.join(p for p in paths if p)})"
+        ))
+        self.stdout.write(f'  opened in {opened * 1000:.1f} ms (memory-mapped)')
+        self.stdout.write(self.style.SUCCESS(
+            f'  {len(addresses) / seconds:,.0f} lookups/s, {seconds / len(addresses) * 1e6:.1f} µs per lookup'
+        ))
+        self.stdout.write(f'  {known / len(addresses):.1%} of addresses found')
@@ -0,0 +1,35 @@
+"""
+Management command: geoip_cache_stats
+
+Usage:
+    python manage.py geoip_cache_stats
+    python manage.py geoip_cache_stats --reset
+
+Shows the IP-intelligence cache hit rate across all processes (process LRU
+hits, shared-cache hits and misses that went to a GeoIP backend). Processes
+push their counts every accounts.geoip.STATS_FLUSH_EVERY lookups.
+"""
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from accounts import geoip
+
+
+class Command(BaseCommand):
+    help = 'Show the IP-intelligence (GeoIP) cache hit rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the shared counters afterwards.')
+
+    def handle(self, *args, **options):
+        stats = geoip.cache_stats()
+        self.stdout.write(self.style.MIGRATE_HEADING(f"IP intelligence cache ({stats['lookups']} lookups)"))
+        self.stdout.write(f"  process LRU hits  {stats['local_hits']:>10}")
+        self.stdout.write(f"  shared cache hits {stats['shared_hits']:>10}")
+        self.stdout.write(f"  misses            {stats['misses']:>10}")
+        self.stdout.write(self.style.SUCCESS(f"  hit rate          {stats['hit_rate']:>9}%"))
+
+        if options['reset']:
+            cache.delete_many([f'{geoip.KEY_PREFIX}:stats:{name}' for name in ('local_hits', 'shared_hits', 'misses')])
+            self.stdout.write('  counters reset')
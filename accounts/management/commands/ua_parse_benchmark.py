@@ -0,0 +1,101 @@
+"""
+Management command: ua_parse_benchmark
+
+Usage:
+    python manage.py ua_parse_benchmark
+    python manage.py ua_parse_benchmark --requests 50000 --agents 200
+    python manage.py ua_parse_benchmark --shared          # include the shared-cache tier
+
+Replays a request stream over a pool of distinct user agents (a few popular
+ones take most of the traffic, like real browser share) and compares the
+CPU time per request of parsing every time against the memoized
+SessionTracker.parse_user_agent, reporting the microseconds saved.
+
+"Parse every request" still benefits from ua-parser's own small cache
+(MAX_CACHE_SIZE agents); the cold line is a parse with that cache empty,
+i.e. what each miss costs once more agents are in play than it holds.
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.session_tracker import SessionTracker
+
+BROWSERS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{m} Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_{m} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.{m} Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 14; SM-S91{m}B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0',
+    'Mozilla/5.0 (Linux; Android 13; Pixel {m}) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Mobile Safari/537.36 Instagram 3{v}.0.0.0',
+    'Mozilla/5.0 (iPad; CPU OS 16_{m} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.{m} Mobile/15E148 Safari/604.1',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark memoized user-agent parsing against parsing on every request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Requests to replay (default: 20000).')
+        parser.add_argument('--agents', type=int, default=100, help='Distinct user agents (default: 100).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request stream.')
+        parser.add_argument('--shared', action='store_true', help='Also go through the shared cache on LRU misses.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['agents'] < 1:
+            raise CommandError('--requests and --agents must be positive')
+
+        rng = random.Random(options['seed'])
+        agents = [
+            BROWSERS[i % len(BROWSERS)].format(v=100 + i // len(BROWSERS), m=i % 10)
+            for i in range(options['agents'])
+        ]
+        # Zipf-like traffic: agent i gets weight 1 / (i + 1)
+        stream = rng.choices(agents, weights=[1 / (i + 1) for i in range(len(agents))], k=options['requests'])
+        hashes = {agent: SessionTracker.hash_user_agent(agent) for agent in agents}
+
+        started = time.process_time()
+        for agent in stream:
+            SessionTracker._parse_user_agent(agent)
+        uncached = time.process_time() - started
+
+        cold = self._cold_parse(agents)
+
+        SessionTracker.clear_user_agent_cache()
+        started = time.process_time()
+        for agent in stream:
+            SessionTracker.parse_user_agent(agent, hashes[agent], shared=options['shared'])
+        cached = time.process_time() - started
+
+        n = len(stream)
+        per_uncached, per_cached = uncached / n * 1e6, cached / n * 1e6
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{n} requests over {len(set(stream))} distinct user agents"
+            f"{' (shared cache tier on)' if options['shared'] else ''}"
+        ))
+        if cold is not None:
+            self.stdout.write(f'  cold parse           {cold:9.1f} µs CPU/agent (ua-parser cache empty)')
+        self.stdout.write(f'  parse every request  {per_uncached:9.1f} µs CPU/request')
+        self.stdout.write(f'  memoized             {per_cached:9.1f} µs CPU/request')
+        self.stdout.write(self.style.SUCCESS(
+            f'  saved                {per_uncached - per_cached:9.1f} µs CPU/request '
+            f'({(1 - cached / uncached) * 100 if uncached else 0:.1f}%, {uncached / cached if cached else 0:.0f}x)'
+        ))
+
+    @staticmethod
+    def _cold_parse(agents):
+        """µs of CPU per parse with ua-parser's internal cache cleared, if it has one."""
+        try:
+            from ua_parser import user_agent_parser
+            parse_cache = user_agent_parser._PARSE_CACHE
+        except (ImportError, AttributeError):
+            return None
+        total = 0.0
+        for agent in agents:
+            parse_cache.clear()
+            started = time.process_time()
+            SessionTracker._parse_user_agent(agent)
+            total += time.process_time() - started
+        return total / len(agents) * 1e6
@@ -5,7 +5,7 @@ Automatically tracks user sessions and page visits for all requests
 
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth.models import AnonymousUser
-from .session_tracker import SessionTracker
+from . import tracking
 
 
 class SessionTrackingMiddleware(MiddlewareMixin):
@@ -33,38 +33,21 @@ class SessionTrackingMiddleware(MiddlewareMixin):
 
     def process_request(self, request):
         """
-        Track session and page visit for each request
+        Queue a tracking event for each request; sessions and page visits
+        are written in the background (see accounts.tracking)
         """
         # Skip excluded paths
         for excluded_path in self.EXCLUDE_PATHS:
             if request.path.startswith(excluded_path):
                 return None
 
-        # Get or create session for authenticated users
         if request.user and not isinstance(request.user, AnonymousUser):
             try:
-                # Create or update session
-                session = SessionTracker.create_or_update_session(
-                    request=request,
-                    user=request.user
-                )
-
-                # Attach session to request for use in views
-                request.user_session = session
-
                 # Track page visit for non-API requests
-                should_track_page = True
-                for excluded_path in self.EXCLUDE_PAGE_TRACKING:
-                    if request.path.startswith(excluded_path):
-                        should_track_page = False
-                        break
-
-                if should_track_page and request.method == 'GET':
-                    SessionTracker.track_page_visit(
-                        session=session,
-                        request=request,
-                        page_title=''  # Can be set from frontend via header
-                    )
+                should_track_page = request.method == 'GET' and not any(
+                    request.path.startswith(excluded_path) for excluded_path in self.EXCLUDE_PAGE_TRACKING
+                )
+                tracking.emit(tracking.event_from_request(request, is_visit=should_track_page))
 
             except Exception as e:
                 # Don't let tracking errors break the application
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_alter_user_managers_user_deleted_at_user_is_deleted'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pagevisit',
+            name='visited_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -600,7 +600,7 @@ class PageVisit(models.Model):
     metadata = models.JSONField(default=dict, blank=True)
 
     # Timestamps
-    visited_at = models.DateTimeField(auto_now_add=True)
+    visited_at = models.DateTimeField(default=timezone.now)
     exited_at = models.DateTimeField(null=True, blank=True)
 
 
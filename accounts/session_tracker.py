@@ -9,19 +9,33 @@ Automatically captures and stores user browsing information including:
 
 import hashlib
 import secrets
-import requests
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from django.contrib.auth import get_user_model
 User = get_user_model()
+from django.conf import settings
+from django.core.cache import cache
 from django.http import HttpRequest
 from django.utils import timezone
 from django.db import models
+from django.db.models import F
 from user_agents import parse as parse_user_agent
 import ipaddress
 
+from . import geoip
 from .models import UserSession, PageVisit, UserEvent
 
+SECURITY_FLAGS = ('is_vpn', 'is_proxy', 'is_tor', 'is_datacenter', 'threat_level')
+
+# Parsed user agents by user_agent_hash (see SessionTracker.parse_user_agent)
+UA_CACHE_PREFIX = 'ua'
+UA_CACHE_SIZE = 4096        # agents a process keeps
+UA_CACHE_TTL = 7 * 86400
+_ua_lock = threading.Lock()
+_ua_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
 
 class SessionTracker:
     """
@@ -70,85 +84,64 @@ class SessionTracker:
     @staticmethod
     def get_geolocation(ip: str) -> Dict[str, Any]:
         """
-        Get geolocation data from IP address using ip-api.com (free, no API key)
-
-        For production, consider:
-        - MaxMind GeoIP2 (more accurate, local database)
-        - IPinfo.io (paid, reliable)
-        - ipstack.com (paid, comprehensive)
+        Get geolocation data from IP address (see accounts.geoip for the
+        local MaxMind database and the ip-api.com fallback)
 
         Args:
             ip: IP address to lookup
 
         Returns:
-            Dictionary with location data
+            Dictionary with location data (and the security flags)
         """
-        try:
-            # Skip private/local IPs
-            ip_obj = ipaddress.ip_address(ip)
-            if ip_obj.is_private or ip_obj.is_loopback:
-                return {
-                    'country': 'Local',
-                    'country_code': 'LOCAL',
-                    'region': '',
-                    'city': 'Local Network',
-                    'postal_code': '',
-                    'latitude': None,
-                    'longitude': None,
-                    'timezone': '',
-                    'isp': 'Local Network',
-                    'organization': '',
-                    'asn': '',
-                }
-
-            # Call ip-api.com (free, 45 requests/minute limit)
-            response = requests.get(
-                f'http://ip-api.com/json/{ip}',
-                params={
-                    'fields': 'status,message,country,countryCode,region,regionName,city,zip,lat,lon,timezone,isp,org,as,proxy,hosting'
-                },
-                timeout=3
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-
-                if data.get('status') == 'success':
-                    return {
-                        'country': data.get('country', ''),
-                        'country_code': data.get('countryCode', ''),
-                        'region': data.get('regionName', ''),
-                        'city': data.get('city', ''),
-                        'postal_code': data.get('zip', ''),
-                        'latitude': data.get('lat'),
-                        'longitude': data.get('lon'),
-                        'timezone': data.get('timezone', ''),
-                        'isp': data.get('isp', ''),
-                        'organization': data.get('org', ''),
-                        'asn': data.get('as', ''),
-                        'is_proxy': data.get('proxy', False),
-                        'is_datacenter': data.get('hosting', False),
-                    }
-        except Exception as e:
-            print(f"⚠️ Geolocation lookup failed for {ip}: {e}")
-
-        # Return empty data on failure
-        return {
-            'country': '',
-            'country_code': '',
-            'region': '',
-            'city': '',
-            'postal_code': '',
-            'latitude': None,
-            'longitude': None,
-            'timezone': '',
-            'isp': '',
-            'organization': '',
-            'asn': '',
-        }
+        return geoip.lookup(ip)
 
     @staticmethod
-    def parse_user_agent(user_agent_string: str) -> Dict[str, Any]:
+    def parse_user_agent(user_agent_string: str, ua_hash: str = '', shared: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Device, browser, and OS information for a user agent string,
+        memoized by user_agent_hash: a per-process LRU, then the shared
+        cache (Redis) unless USER_AGENT_SHARED_CACHE is off. The regex-heavy
+        parser only runs for agents neither has seen
+
+        Args:
+            user_agent_string: Raw User-Agent header
+            ua_hash: hash_user_agent() of it, if the caller already has it
+            shared: Override USER_AGENT_SHARED_CACHE
+        """
+        ua_hash = ua_hash or SessionTracker.hash_user_agent(user_agent_string)
+        with _ua_lock:
+            ua_data = _ua_cache.get(ua_hash)
+            if ua_data is not None:
+                _ua_cache.move_to_end(ua_hash)
+        if ua_data is None:
+            if shared is None:
+                shared = getattr(settings, 'USER_AGENT_SHARED_CACHE', True)
+            key = f'{UA_CACHE_PREFIX}:{ua_hash}'
+            try:
+                ua_data = cache.get(key) if shared else None
+            except Exception:
+                ua_data = None
+            if ua_data is None:
+                ua_data = SessionTracker._parse_user_agent(user_agent_string)
+                if shared:
+                    try:
+                        cache.set(key, ua_data, UA_CACHE_TTL)
+                    except Exception:
+                        pass
+            with _ua_lock:
+                _ua_cache[ua_hash] = ua_data
+                while len(_ua_cache) > UA_CACHE_SIZE:
+                    _ua_cache.popitem(last=False)
+        return dict(ua_data)
+
+    @staticmethod
+    def clear_user_agent_cache():
+        """Forget this process's parsed user agents — useful in tests and benchmarks."""
+        with _ua_lock:
+            _ua_cache.clear()
+
+    @staticmethod
+    def _parse_user_agent(user_agent_string: str) -> Dict[str, Any]:
         """
         Parse user agent string to extract device, browser, and OS information
 
@@ -195,50 +188,10 @@ class SessionTracker:
         """
         Detect if IP is from VPN, Tor, or proxy
 
-        For basic detection, we can use:
-        - ip-api.com proxy field
-        - Known Tor exit node lists
-        - VPN/proxy detection services (paid)
-
         Returns flags for security analysis
         """
-        security_flags = {
-            'is_vpn': False,
-            'is_proxy': False,
-            'is_tor': False,
-            'is_datacenter': False,
-            'threat_level': 'none',
-        }
-
-        try:
-            # ip-api includes proxy and hosting detection
-            response = requests.get(
-                f'http://ip-api.com/json/{ip}',
-                params={'fields': 'proxy,hosting'},
-                timeout=2
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                security_flags['is_proxy'] = data.get('proxy', False)
-                security_flags['is_datacenter'] = data.get('hosting', False)
-
-                # Heuristic: datacenter IPs are often VPNs
-                if data.get('hosting'):
-                    security_flags['is_vpn'] = True
-
-                # Set threat level based on flags
-                if security_flags['is_tor']:
-                    security_flags['threat_level'] = 'high'
-                elif security_flags['is_vpn']:
-                    security_flags['threat_level'] = 'medium'
-                elif security_flags['is_proxy']:
-                    security_flags['threat_level'] = 'low'
-
-        except Exception as e:
-            print(f"⚠️ Security check failed for {ip}: {e}")
-
-        return security_flags
+        info = geoip.lookup(ip)
+        return {key: info[key] for key in SECURITY_FLAGS}
 
     @staticmethod
     def extract_utm_params(request: HttpRequest) -> Dict[str, str]:
@@ -278,118 +231,137 @@ class SessionTracker:
         Returns:
             UserSession instance
         """
-        # Extract basic data
-        ip_address, proxy_ip = SessionTracker.get_client_ip(request)
-        user_agent_string = request.META.get('HTTP_USER_AGENT', 'Unknown User Agent')
-        # Ensure ip_address is not empty to avoid DB errors
-        if not ip_address:
-            ip_address = '0.0.0.0'
-        referrer = request.META.get('HTTP_REFERER', '')
-
-        # Get detailed information
-        ip_version = SessionTracker.get_ip_version(ip_address)
-        geo_data = SessionTracker.get_geolocation(ip_address)
-        ua_data = SessionTracker.parse_user_agent(user_agent_string)
-        security_flags = SessionTracker.detect_vpn_tor(ip_address)
-        utm_params = SessionTracker.extract_utm_params(request)
+        context = SessionTracker.request_context(request)
+        ua_hash = SessionTracker.hash_user_agent(context['user_agent'])
 
         # ── Device fingerprint = IP + user-agent hash ───────────────────────────
         # This is how all big SaaS apps work: one active session per device.
         # We match on (user, ip_address, user_agent_hash, is_active) and simply
         # UPDATE last_activity on every visit instead of creating a new row.
-        ua_hash = SessionTracker.hash_user_agent(user_agent_string)
-
         session = None
         if user:
             session = UserSession.objects.filter(
                 user=user,
-                ip_address=ip_address,
+                ip_address=context['ip_address'],
                 user_agent_hash=ua_hash,
                 is_active=True,
             ).first()
 
         # Create new session only if no matching device session exists
         if not session:
-            session_token = SessionTracker.generate_session_token()
+            session = SessionTracker.create_session(user, context, login_method=login_method)
+        else:
+            # Same device visited again — just refresh the timestamp
+            session.page_views += 1
+            session.save(update_fields=['page_views', 'last_activity'])
 
-            session = UserSession.objects.create(
-                user=user,
-                session_key=getattr(request, 'session', {}).get('session_key', '') if hasattr(request, 'session') else '',
-                session_token=session_token,
-
-                # IP and Network
-                ip_address=ip_address,
-                ip_version=ip_version,
-                proxy_ip=proxy_ip or None,
-
-                # Geolocation
-                country=geo_data.get('country', ''),
-                country_code=geo_data.get('country_code', ''),
-                region=geo_data.get('region', ''),
-                city=geo_data.get('city', ''),
-                postal_code=geo_data.get('postal_code', ''),
-                latitude=geo_data.get('latitude'),
-                longitude=geo_data.get('longitude'),
-                timezone=geo_data.get('timezone', ''),
-
-                # ISP
-                isp=geo_data.get('isp', ''),
-                organization=geo_data.get('organization', ''),
-                asn=geo_data.get('asn', ''),
-
-                # Browser
-                browser_name=ua_data['browser_name'],
-                browser_version=ua_data['browser_version'],
-                browser_language=request.META.get('HTTP_ACCEPT_LANGUAGE', '')[:20],
-
-                # OS
-                os_name=ua_data['os_name'],
-                os_version=ua_data['os_version'],
-
-                # Device
-                device_type=ua_data['device_type'],
-                device_brand=ua_data['device_brand'],
-                device_model=ua_data['device_model'],
-                is_mobile=ua_data['is_mobile'],
-                is_tablet=ua_data['is_tablet'],
-                is_touch_capable=ua_data['is_touch_capable'],
-                is_pc=ua_data['is_pc'],
-                is_bot=ua_data['is_bot'],
-
-                # User Agent
-                user_agent=user_agent_string,
-                user_agent_hash=ua_hash,
+            print(f"🔄 Session refreshed: {user.username} [{session.browser_name} / {session.os_name}]")
 
-                # Referrer
-                referrer_url=referrer,
-                referrer_domain=SessionTracker._extract_domain(referrer),
-                landing_page=request.path,
+        return session
 
-                # UTM params
-                **utm_params,
+    @staticmethod
+    def request_context(request: HttpRequest) -> Dict[str, Any]:
+        """
+        The plain values a session is built from, so it can also be created
+        outside the request (see accounts.tracking)
+        """
+        ip_address, proxy_ip = SessionTracker.get_client_ip(request)
+        return {
+            # Ensure ip_address is not empty to avoid DB errors
+            'ip_address': ip_address or '0.0.0.0',
+            'proxy_ip': proxy_ip,
+            'user_agent': request.META.get('HTTP_USER_AGENT', 'Unknown User Agent'),
+            'referrer': request.META.get('HTTP_REFERER', ''),
+            'accept_language': request.META.get('HTTP_ACCEPT_LANGUAGE', '')[:20],
+            'landing_page': request.path,
+            'session_key': getattr(request, 'session', {}).get('session_key', '') if hasattr(request, 'session') else '',
+            'utm': SessionTracker.extract_utm_params(request),
+        }
 
-                # Security
-                is_vpn=security_flags['is_vpn'],
-                is_proxy=security_flags['is_proxy'],
-                is_tor=security_flags['is_tor'],
-                is_datacenter=security_flags['is_datacenter'],
-                threat_level=security_flags['threat_level'],
+    @staticmethod
+    def create_session(user: Optional[User], context: Dict[str, Any], login_method: str = '') -> UserSession:
+        """
+        Create a device session from request_context() values: parses the
+        user agent and looks the IP up (location and security flags)
+        """
+        ip_address = context['ip_address']
+        user_agent_string = context['user_agent']
+        ua_hash = SessionTracker.hash_user_agent(user_agent_string)
+        referrer = context['referrer']
+        ua_data = SessionTracker.parse_user_agent(user_agent_string, ua_hash)
+        # One lookup answers both location and the security flags
+        ip_info = geoip.lookup(ip_address)
 
-                # Session info
-                login_method=login_method,
-                is_active=True,
-            )
+        session = UserSession.objects.create(
+            user=user,
+            session_key=context['session_key'],
+            session_token=SessionTracker.generate_session_token(),
+
+            # IP and Network
+            ip_address=ip_address,
+            ip_version=SessionTracker.get_ip_version(ip_address),
+            proxy_ip=context['proxy_ip'] or None,
+
+            # Geolocation
+            country=ip_info.get('country', ''),
+            country_code=ip_info.get('country_code', ''),
+            region=ip_info.get('region', ''),
+            city=ip_info.get('city', ''),
+            postal_code=ip_info.get('postal_code', ''),
+            latitude=ip_info.get('latitude'),
+            longitude=ip_info.get('longitude'),
+            timezone=ip_info.get('timezone', ''),
+
+            # ISP
+            isp=ip_info.get('isp', ''),
+            organization=ip_info.get('organization', ''),
+            asn=ip_info.get('asn', ''),
 
-            print(f"✅ New session for {user.username if user else 'Anonymous'} from {ip_address} [{ua_data['browser_name']} / {ua_data['os_name']}]")
-        else:
-            # Same device visited again — just refresh the timestamp
-            session.page_views += 1
-            session.save(update_fields=['page_views', 'last_activity'])
+            # Browser
+            browser_name=ua_data['browser_name'],
+            browser_version=ua_data['browser_version'],
+            browser_language=context['accept_language'],
 
-            print(f"🔄 Session refreshed: {user.username} [{ua_data['browser_name']} / {ua_data['os_name']}]")
+            # OS
+            os_name=ua_data['os_name'],
+            os_version=ua_data['os_version'],
 
-        return session
+            # Device
+            device_type=ua_data['device_type'],
+            device_brand=ua_data['device_brand'],
+            device_model=ua_data['device_model'],
+            is_mobile=ua_data['is_mobile'],
+            is_tablet=ua_data['is_tablet'],
+            is_touch_capable=ua_data['is_touch_capable'],
+            is_pc=ua_data['is_pc'],
+            is_bot=ua_data['is_bot'],
+
+            # User Agent
+            user_agent=user_agent_string,
+            user_agent_hash=ua_hash,
+
+            # Referrer
+            referrer_url=referrer,
+            referrer_domain=SessionTracker._extract_domain(referrer),
+            landing_page=context['landing_page'],
+
+            # UTM params
+            **context['utm'],
+
+            # Security
+            is_vpn=ip_info['is_vpn'],
+            is_proxy=ip_info['is_proxy'],
+            is_tor=ip_info['is_tor'],
+            is_datacenter=ip_info['is_datacenter'],
+            threat_level=ip_info['threat_level'],
+
+            # Session info
+            login_method=login_method,
+            is_active=True,
+        )
 
+        print(f"✅ New session for {user.username if user else 'Anonymous'} from {ip_address} [{ua_data['browser_name']} / {ua_data['os_name']}]")
+        return session
 
     @staticmethod
     def _extract_domain(url: str) -> str:
@@ -435,8 +407,7 @@ class SessionTracker:
         )
 
         # Update session page view count
-        session.page_views += 1
-        session.save()
+        UserSession.objects.filter(pk=session.pk).update(page_views=F('page_views') + 1, last_activity=timezone.now())
 
         return visit
 
@@ -0,0 +1,18 @@
+"""
+Accounts Celery Tasks
+Background jobs for session and page-visit tracking
+"""
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def record_page_events(events):
+    """Write a batch of buffered page/session events (see accounts.tracking)."""
+    from accounts import tracking
+
+    result = tracking.ingest(events)
+    logger.debug(f"[SessionTracking] Ingested {result}")
+    return result
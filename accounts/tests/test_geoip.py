@@ -0,0 +1,153 @@
+import ipaddress
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from accounts import geoip
+from accounts.models import UserSession
+from accounts.session_tracker import SessionTracker
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+IP_API_RESPONSE = {
+    'status': 'success', 'country': 'Germany', 'countryCode': 'DE', 'regionName': 'Hesse', 'city': 'Frankfurt',
+    'zip': '60313', 'lat': 50.11, 'lon': 8.68, 'timezone': 'Europe/Berlin', 'isp': 'Hetzner', 'org': 'Hetzner',
+    'as': 'AS24940 Hetzner Online GmbH', 'proxy': False, 'hosting': True,
+}
+
+
+class BrokenBackend:
+    @classmethod
+    def from_settings(cls):
+        return cls()
+
+    def lookup(self, ip):
+        raise OSError('database file went away')
+
+
+class OfflineBackend:
+    @classmethod
+    def from_settings(cls):
+        return None
+
+
+class NetworkBackend:
+    """Knows 88.198.1.0/24 and 2a01:4f8:1::/48; 88.198.1.66 is a Tor exit."""
+    calls = []
+
+    @classmethod
+    def from_settings(cls):
+        return cls()
+
+    def lookup(self, ip):
+        self.calls.append(ip)
+        if not ip.startswith(('88.198.1.', '2a01:4f8:1:')):
+            return None
+        return geoip.from_maxmind({'country': {'iso_code': 'DE', 'names': {'en': 'Germany'}}})
+
+    def address_flags(self, ip):
+        return {'is_vpn': False, 'is_proxy': False, 'is_tor': ip == '88.198.1.66', 'is_datacenter': False}
+
+
+def _ip_api(*args, **kwargs):
+    return mock.Mock(status_code=200, json=mock.Mock(return_value=IP_API_RESPONSE))
+
+
+@override_settings(CACHES=TEST_CACHES, GEOIP_CITY_DATABASE='', GEOIP_ASN_DATABASE='', GEOIP_ANONYMOUS_DATABASE='',
+                   GEOIP_HTTP_FALLBACK=True)
+class GeoIPTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        geoip.reset()
+        self.addCleanup(geoip.reset)
+
+    def test_maxmind_records_map_to_geo_and_security_flags(self):
+        info = geoip.from_maxmind(
+            {
+                'country': {'iso_code': 'DE', 'names': {'en': 'Germany'}},
+                'subdivisions': [{'names': {'en': 'Hesse'}}],
+                'city': {'names': {'en': 'Frankfurt'}},
+                'postal': {'code': '60313'},
+                'location': {'latitude': 50.11, 'longitude': 8.68, 'time_zone': 'Europe/Berlin'},
+            },
+            {'autonomous_system_number': 24940, 'autonomous_system_organization': 'Hetzner Online GmbH'},
+            {'is_tor_exit_node': True, 'is_hosting_provider': True},
+        )
+        self.assertEqual((info['country_code'], info['region'], info['city']), ('DE', 'Hesse', 'Frankfurt'))
+        self.assertEqual((info['asn'], info['isp']), ('AS24940 Hetzner Online GmbH', 'Hetzner Online GmbH'))
+        self.assertEqual((info['is_tor'], info['is_datacenter'], info['is_vpn']), (True, True, True))
+        self.assertEqual(info['threat_level'], 'high')
+
+        # A City database alone gives location and no flags
+        bare = geoip.from_maxmind({'country': {'iso_code': 'FR', 'names': {'en': 'France'}}})
+        self.assertEqual((bare['country'], bare['asn'], bare['threat_level']), ('France', '', 'none'))
+
+    @override_settings(GEOIP_BACKENDS=['accounts.tests.test_geoip.OfflineBackend',
+                                       'accounts.tests.test_geoip.BrokenBackend',
+                                       'accounts.geoip.IpApiBackend'])
+    def test_backends_fall_through_and_private_ips_skip_them(self):
+        with mock.patch('accounts.geoip.requests.get', side_effect=_ip_api) as get:
+            self.assertEqual(geoip.lookup('10.1.2.3')['country_code'], 'LOCAL')
+            self.assertEqual(geoip.lookup('not an ip')['country_code'], '')
+            info = geoip.lookup('88.198.1.1')
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(len(geoip.backends()), 2)
+        self.assertEqual((info['city'], info['is_datacenter'], info['threat_level']), ('Frankfurt', True, 'medium'))
+
+        geoip.reset()
+        cache.clear()
+        with override_settings(GEOIP_HTTP_FALLBACK=False), mock.patch('accounts.geoip.requests.get') as get:
+            self.assertEqual(geoip.lookup('88.198.1.1'), geoip.empty())
+        get.assert_not_called()
+
+    @override_settings(GEOIP_BACKENDS=['accounts.tests.test_geoip.NetworkBackend'])
+    def test_answers_are_cached_per_network_with_per_address_flags(self):
+        NetworkBackend.calls = []
+        self.assertEqual(geoip.lookup('88.198.1.1')['country_code'], 'DE')
+        self.assertEqual(geoip.lookup('88.198.1.2')['threat_level'], 'none')
+        tor = geoip.lookup('88.198.1.66')
+        self.assertEqual((tor['country_code'], tor['is_tor'], tor['threat_level']), ('DE', True, 'high'))
+        geoip.lookup('2a01:4f8:1:2::1')
+        geoip.lookup('2a01:4f8:1:ff::1')
+        # Unknown addresses are cached as misses too
+        self.assertEqual(geoip.lookup('5.5.5.5'), geoip.empty())
+        self.assertEqual(geoip.lookup('5.5.5.5'), geoip.empty())
+        self.assertEqual(NetworkBackend.calls, ['88.198.1.1', '2a01:4f8:1:2::1', '5.5.5.5'])
+
+        # Another process: its LRU is empty but the shared cache answers
+        geoip.flush_stats()
+        geoip._local.clear()
+        self.assertEqual(geoip.lookup('88.198.1.200')['country_code'], 'DE')
+        self.assertEqual(len(NetworkBackend.calls), 3)
+
+        geoip.flush_stats()
+        stats = geoip.cache_stats()
+        self.assertEqual((stats['local_hits'], stats['shared_hits'], stats['misses']), (4, 1, 3))
+        self.assertEqual(stats['hit_rate'], 62.5)
+
+    @override_settings(GEOIP_BACKENDS=['accounts.geoip.IpApiBackend'])
+    def test_without_address_flags_answers_are_cached_per_address(self):
+        def ip_api(url, **kwargs):
+            # Only .66 is a proxy; nothing else in the /24 is
+            response = {**IP_API_RESPONSE, 'proxy': url.endswith('.66')}
+            return mock.Mock(status_code=200, json=mock.Mock(return_value=response))
+
+        with mock.patch('accounts.geoip.requests.get', side_effect=ip_api) as get:
+            self.assertFalse(geoip.lookup('88.198.1.1')['is_proxy'])
+            self.assertTrue(geoip.lookup('88.198.1.66')['is_proxy'])
+            self.assertFalse(geoip.lookup('88.198.1.1')['is_proxy'])
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(geoip.cache_key(ipaddress.ip_address('88.198.1.1')), 'ipintel:88.198.1.1')
+
+    def test_session_lookup_happens_once_per_new_device(self):
+        user = self.create_user()
+        request = RequestFactory().get('/dashboard', REMOTE_ADDR='88.198.1.1', HTTP_USER_AGENT='Mozilla/5.0')
+
+        with mock.patch('accounts.geoip.requests.get', side_effect=_ip_api) as get:
+            session = SessionTracker.create_or_update_session(request, user)
+            SessionTracker.create_or_update_session(request, user)
+        # Geo and security flags come from the same single request; a known device needs none
+        self.assertEqual(get.call_count, 1)
+        session = UserSession.objects.get(pk=session.pk)
+        self.assertEqual((session.city, session.asn), ('Frankfurt', 'AS24940 Hetzner Online GmbH'))
+        self.assertEqual((session.is_datacenter, session.is_vpn, session.threat_level), (True, True, 'medium'))
@@ -0,0 +1,108 @@
+from collections import deque
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from accounts import geoip, tracking
+from accounts.middleware import SessionTrackingMiddleware
+from accounts.models import PageVisit, UserSession
+from accounts.session_tracker import SessionTracker
+from accounts.tasks import record_page_events
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+CHROME = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+
+def _run_now(args, **kwargs):
+    record_page_events(*args)
+
+
+@override_settings(CACHES=TEST_CACHES, GEOIP_BACKENDS=[])
+class SessionTrackingTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        geoip.reset()
+        tracking.reset()
+        self.addCleanup(geoip.reset)
+        self.addCleanup(tracking.reset)
+        SessionTracker.clear_user_agent_cache()
+        # No background thread in tests: flush() is called explicitly
+        patcher = mock.patch.object(tracking, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = self.create_user()
+        self.middleware = SessionTrackingMiddleware(lambda request: None)
+        self.factory = RequestFactory()
+
+    def _request(self, method, path):
+        request = getattr(self.factory, method)(path, REMOTE_ADDR='88.198.1.1', HTTP_USER_AGENT=CHROME)
+        request.user = self.user
+        with self.assertNumQueries(0):
+            self.middleware.process_request(request)
+
+    def test_requests_only_queue_events_and_batches_write_once_per_session(self):
+        for method, path in (('get', '/dashboard'), ('get', '/automations'), ('post', '/api/automations/'),
+                             ('get', '/api/tokens/'), ('get', '/admin/')):
+            self._request(method, path)
+        self.assertEqual(len(tracking._buffer), 4)  # /admin/ is excluded
+        self.assertFalse(UserSession.objects.exists())
+
+        with mock.patch.object(record_page_events, 'apply_async', side_effect=_run_now):
+            self.assertEqual(tracking.flush(), 4)
+
+        session = UserSession.objects.get()
+        self.assertEqual((session.browser_name, session.landing_page), ('Chrome', '/dashboard'))
+        # Only GET pages outside EXCLUDE_PAGE_TRACKING are visits, each counted once
+        self.assertEqual(sorted(PageVisit.objects.values_list('path', flat=True)), ['/automations', '/dashboard'])
+        self.assertEqual(session.page_views, 2)
+
+        # A batch for a known device: find sessions, insert visits, update the session
+        self._request('get', '/contacts')
+        self._request('get', '/settings')
+        events = list(tracking._buffer)
+        tracking.reset()
+        with self.assertNumQueries(3):
+            result = tracking.ingest(events)
+        self.assertEqual(result, {'events': 2, 'visits': 2, 'sessions_created': 0})
+        session.refresh_from_db()
+        self.assertEqual(session.page_views, 4)
+        self.assertEqual(session.last_activity.timestamp(), round(events[-1][1], 6))
+        self.assertEqual(PageVisit.objects.get(path='/contacts').visited_at.timestamp(), round(events[0][1], 6))
+
+        # A batch that arrives late keeps its visit time and never moves last_activity back
+        late = list(events[0])
+        late[1] -= 3600
+        late[8] = '/billing'
+        tracking.ingest([late])
+        session.refresh_from_db()
+        self.assertEqual(session.last_activity.timestamp(), round(events[-1][1], 6))
+        self.assertEqual(PageVisit.objects.get(path='/billing').visited_at.timestamp(), round(late[1], 6))
+
+    def test_ring_buffer_keeps_the_newest_events(self):
+        with mock.patch.object(tracking, '_buffer', deque(maxlen=3)):
+            for i in range(5):
+                self._request('get', f'/page/{i}')
+            self.assertEqual([event[8] for event in tracking._buffer], ['/page/2', '/page/3', '/page/4'])
+            with mock.patch.object(record_page_events, 'apply_async') as apply_async:
+                self.assertEqual(tracking.flush(), 3)
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs['queue'], 'system')
+
+    def test_user_agents_are_parsed_once_and_not_on_refresh(self):
+        request = self.factory.get('/dashboard', REMOTE_ADDR='88.198.1.1', HTTP_USER_AGENT=CHROME)
+        with mock.patch.object(SessionTracker, '_parse_user_agent', wraps=SessionTracker._parse_user_agent) as parse:
+            SessionTracker.create_or_update_session(request, self.user)
+            SessionTracker.create_or_update_session(request, self.user)  # refresh: no parsing at all
+            self.assertEqual(parse.call_count, 1)
+
+            # Another process: its LRU is empty, the shared cache still has the agent
+            SessionTracker.clear_user_agent_cache()
+            ua = SessionTracker.parse_user_agent(CHROME)
+            self.assertEqual(parse.call_count, 1)
+            SessionTracker.clear_user_agent_cache()
+            self.assertEqual(SessionTracker.parse_user_agent(CHROME, shared=False), ua)
+            self.assertEqual(parse.call_count, 2)
+        self.assertEqual((ua['browser_name'], ua['device_type']), ('Chrome', 'desktop'))
+        self.assertEqual(UserSession.objects.get().page_views, 1)
@@ -0,0 +1,233 @@
+"""
+Session Tracking Pipeline - Page Views Off the Request Path
+================================================================
+- SessionTrackingMiddleware only calls emit(): a few request values go into
+  a compact tuple in this process's ring buffer (a bounded deque — when it
+  is full the oldest events are dropped and counted)
+- A daemon flusher thread per process drains the buffer every
+  FLUSH_INTERVAL seconds, or as soon as FLUSH_SIZE events are waiting, and
+  hands batches to the record_page_events Celery task (system queue)
+- ingest() runs in the worker: one query finds the device sessions of the
+  whole batch, missing ones are created there (user-agent parsing and the
+  GeoIP lookup included), then every PageVisit is written with one
+  bulk_create (stamped with the request time, not the ingest time) and each
+  session gets one page_views/last_activity UPDATE
+- A page view counts once: page_views grows by the PageVisits written
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 200
+FLUSH_INTERVAL = 2.0   # seconds
+MAX_BUFFER = 10000     # events kept per process; the oldest are dropped beyond this
+BATCH_SIZE = 500       # events per record_page_events task
+
+# Positions in an event tuple (tuples are lists once they went through Celery's JSON)
+EVENT_FIELDS = (
+    'user_id', 'ts', 'ip_address', 'proxy_ip', 'user_agent', 'accept_language', 'session_key',
+    'url', 'path', 'query_string', 'method', 'referrer', 'is_internal_referrer', 'is_visit', 'utm',
+)
+
+_lock = threading.Lock()
+_buffer: deque = deque(maxlen=MAX_BUFFER)
+_dropped = 0
+_wake = threading.Event()
+_flusher: Optional[threading.Thread] = None
+_flusher_pid: Optional[int] = None
+
+
+def event_from_request(request, is_visit: bool) -> Tuple:
+    """The event tuple for an authenticated request (no DB, no parsing)."""
+    from .session_tracker import SessionTracker
+
+    context = SessionTracker.request_context(request)
+    try:
+        url = request.build_absolute_uri()
+        is_internal = SessionTracker._extract_domain(context['referrer']) == request.get_host()
+    except Exception:
+        # DisallowedHost: keep the event, just without the host
+        url, is_internal = request.get_full_path(), False
+    return (
+        str(request.user.pk), time.time(), context['ip_address'], context['proxy_ip'], context['user_agent'],
+        context['accept_language'], context['session_key'], url[:500], request.path[:500],
+        request.META.get('QUERY_STRING', ''), request.method, context['referrer'][:500], is_internal, is_visit,
+        context['utm'],
+    )
+
+
+def emit(event: Tuple):
+    """Queue an event for the background flusher (never blocks on I/O)."""
+    global _dropped
+    with _lock:
+        if len(_buffer) == _buffer.maxlen:
+            _dropped += 1
+        _buffer.append(event)
+        due = len(_buffer) >= FLUSH_SIZE
+    _ensure_flusher()
+    if due:
+        _wake.set()
+
+
+def _ensure_flusher():
+    """Start this process's flusher thread (again after a fork)."""
+    global _flusher, _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        _flusher = threading.Thread(target=_run, name='session-tracking-flusher', daemon=True)
+        _flusher_pid = pid
+    _flusher.start()
+
+
+def _run():
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"[SessionTracking] Flush failed: {e}")
+
+
+def _drain() -> List[Tuple]:
+    global _dropped
+    with _lock:
+        events = list(_buffer)
+        _buffer.clear()
+        dropped, _dropped = _dropped, 0
+    if dropped:
+        logger.warning(f"⚠️ [SessionTracking] Buffer full: dropped {dropped} event(s)")
+    return events
+
+
+def flush() -> int:
+    """Hand buffered events to Celery. Returns the number handed over."""
+    from .tasks import record_page_events
+
+    events = _drain()
+    sent = 0
+    for start in range(0, len(events), BATCH_SIZE):
+        batch = events[start:start + BATCH_SIZE]
+        try:
+            record_page_events.apply_async(args=[batch], queue='system')
+            sent += len(batch)
+        except Exception as e:
+            logger.warning(f"[SessionTracking] Dropped {len(batch)} event(s): {e}")
+    return sent
+
+
+atexit.register(flush)
+
+
+# ----------------------------------------------------------------------------
+# Worker side
+# ----------------------------------------------------------------------------
+
+def _device(row: Dict) -> Tuple[str, str, str]:
+    return row['user_id'], row['ip_address'], row['ua_hash']
+
+
+def ingest(events: List) -> Dict[str, int]:
+    """
+    Write a batch of events: sessions resolved with one query (created if
+    missing), PageVisits bulk-inserted, one UPDATE per session.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db.models import F
+    from django.db.models.functions import Greatest
+
+    from .models import PageVisit, UserSession
+    from .session_tracker import SessionTracker
+
+    rows = [dict(zip(EVENT_FIELDS, event)) for event in events]
+    for row in rows:
+        row['ua_hash'] = SessionTracker.hash_user_agent(row['user_agent'])
+        row['at'] = datetime.fromtimestamp(row['ts'], tz=dt_timezone.utc)
+    if not rows:
+        return {'events': 0, 'visits': 0, 'sessions_created': 0}
+
+    sessions = {}
+    candidates = (
+        UserSession.objects
+        .filter(
+            is_active=True,
+            user_id__in={row['user_id'] for row in rows},
+            ip_address__in={row['ip_address'] for row in rows},
+            user_agent_hash__in={row['ua_hash'] for row in rows},
+        )
+        .order_by('-created_at')
+        .values_list('id', 'user_id', 'ip_address', 'user_agent_hash')
+    )
+    for session_id, user_id, ip_address, ua_hash in candidates:
+        sessions.setdefault((str(user_id), ip_address, ua_hash), session_id)
+
+    missing = {}
+    for row in rows:
+        if _device(row) not in sessions:
+            missing.setdefault(_device(row), row)
+    users = {str(pk): user for pk, user in get_user_model().objects.in_bulk({key[0] for key in missing}).items()}
+    created = 0
+    for key, row in missing.items():
+        user = users.get(row['user_id'])
+        if user is None:
+            continue
+        context = {
+            'ip_address': row['ip_address'],
+            'proxy_ip': row['proxy_ip'],
+            'user_agent': row['user_agent'],
+            'referrer': row['referrer'],
+            'accept_language': row['accept_language'],
+            'landing_page': row['path'],
+            'session_key': row['session_key'],
+            'utm': row['utm'],
+        }
+        sessions[key] = SessionTracker.create_session(user, context).id
+        created += 1
+
+    visits, activity = [], {}
+    for row in rows:
+        session_id = sessions.get(_device(row))
+        if session_id is None:
+            continue
+        views, last = activity.get(session_id, (0, row['at']))
+        activity[session_id] = (views + row['is_visit'], max(last, row['at']))
+        if row['is_visit']:
+            visits.append(PageVisit(
+                session_id=session_id,
+                user_id=row['user_id'],
+                url=row['url'],
+                path=row['path'],
+                query_string=row['query_string'],
+                http_method=row['method'],
+                referrer=row['referrer'],
+                is_internal_referrer=row['is_internal_referrer'],
+                visited_at=row['at'],
+            ))
+
+    PageVisit.objects.bulk_create(visits, batch_size=BATCH_SIZE)
+    for session_id, (views, last) in activity.items():
+        # Batches can arrive out of order: last_activity never moves back
+        UserSession.objects.filter(pk=session_id).update(
+            page_views=F('page_views') + views, last_activity=Greatest(F('last_activity'), last),
+        )
+    return {'events': len(rows), 'visits': len(visits), 'sessions_created': created}
+
+
+def reset():
+    """Forget buffered events — useful in tests."""
+    global _dropped
+    with _lock:
+        _buffer.clear()
+        _dropped = 0
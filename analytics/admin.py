@@ -1,5 +1,5 @@
 from django.contrib import admin
-from.models import DailyStats, AutomationPerformance, WebhookLog, SystemEvent, ContactEngagement, AIProviderMetrics
+from.models import DailyStats, AutomationPerformance, WebhookLog, SystemEvent, ContactEngagement, AIProviderMetrics, AICallTelemetry, HourlyTriggerRollup
 # Register your models here.
 
 
@@ -9,4 +9,6 @@ admin.site.register(AutomationPerformance)
 admin.site.register(WebhookLog)
 admin.site.register(SystemEvent)
 admin.site.register(ContactEngagement)
-admin.site.register(AIProviderMetrics)
\ No newline at end of file
+admin.site.register(AIProviderMetrics)
+admin.site.register(AICallTelemetry)
+admin.site.register(HourlyTriggerRollup)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiprovidermetrics',
+            name='cache_hits',
+            field=models.IntegerField(default=0, help_text='Enhancements served from the AI message cache'),
+        ),
+        migrations.AddField(
+            model_name='aiprovidermetrics',
+            name='estimated_cost_saved',
+            field=models.DecimalField(decimal_places=4, default=0.0, help_text='Estimated AI spend avoided by cache hits (USD)', max_digits=10),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_aiprovidermetrics_cache_hits_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AICallTelemetry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField(blank=True, null=True)),
+                ('automation_id', models.UUIDField(blank=True, null=True)),
+                ('provider', models.CharField(max_length=20)),
+                ('model', models.CharField(max_length=100)),
+                ('key_slot', models.CharField(blank=True, help_text='Hash prefix of the API key used', max_length=12)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('success', models.BooleanField(default=True)),
+                ('cache_hit', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'ai_call_telemetry',
+                'indexes': [models.Index(fields=['created_at'], name='ai_call_tel_created_a2a844_idx'), models.Index(fields=['user_id', 'created_at'], name='ai_call_tel_user_id_af9b2f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_aicalltelemetry'),
+        ('automations', '0005_automationtrigger_created_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyTriggerRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('hour', models.DateTimeField(help_text='Start of the hour (UTC)')),
+                ('triggers', models.IntegerField(default=0)),
+                ('sent', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('skipped', models.IntegerField(default=0)),
+                ('ai_enhanced', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('automation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_rollups', to='automations.automation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_trigger_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'hourly_trigger_rollups',
+                'ordering': ['-hour'],
+                'indexes': [models.Index(fields=['user', 'hour'], name='hourly_trig_user_id_ef4a71_idx'), models.Index(fields=['hour'], name='hourly_trig_hour_a272a2_idx')],
+                'unique_together': {('automation', 'hour')},
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_hourlytriggerrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='automationperformance',
+            name='commenters_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='automationperformance',
+            name='recipients_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='automationperformance',
+            name='unique_commenters',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='automationperformance',
+            name='unique_recipients',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailystats',
+            name='commenters_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='dailystats',
+            name='recipients_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='dailystats',
+            name='unique_commenters',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailystats',
+            name='unique_recipients',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='hourlytriggerrollup',
+            name='commenters_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='hourlytriggerrollup',
+            name='recipients_sketch',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
@@ -27,6 +27,12 @@ class DailyStats(models.Model):
     total_dms_sent = models.IntegerField(default=0)
     ai_enhanced_dms = models.IntegerField(default=0)
     
+    # Unique people (HyperLogLog estimates; sketches merge across days)
+    unique_commenters = models.IntegerField(default=0)
+    unique_recipients = models.IntegerField(default=0)
+    commenters_sketch = models.BinaryField(default=b'', blank=True)
+    recipients_sketch = models.BinaryField(default=b'', blank=True)
+    
     # Performance stats
     avg_response_time = models.FloatField(default=0.0, help_text="Average time to send DM (seconds)")
     success_rate = models.FloatField(default=0.0, help_text="Percentage of successful DMs")
@@ -72,6 +78,12 @@ class AutomationPerformance(models.Model):
     ai_enhanced_count = models.IntegerField(default=0)
     ai_enhancement_rate = models.FloatField(default=0.0)
     
+    # Unique people (HyperLogLog estimates; sketches merge across days and automations)
+    unique_commenters = models.IntegerField(default=0)
+    unique_recipients = models.IntegerField(default=0)
+    commenters_sketch = models.BinaryField(default=b'', blank=True)
+    recipients_sketch = models.BinaryField(default=b'', blank=True)
+    
     # Engagement (if available)
     click_count = models.IntegerField(default=0, help_text="Clicks on DM buttons")
     click_rate = models.FloatField(default=0.0)
@@ -114,6 +126,10 @@ class AIProviderMetrics(models.Model):
     # Cost tracking
     estimated_cost = models.DecimalField(max_digits=10, decimal_places=4, default=0.0, help_text="Estimated cost in USD")
     
+    # AI message cache
+    cache_hits = models.IntegerField(default=0, help_text="Enhancements served from the AI message cache")
+    estimated_cost_saved = models.DecimalField(max_digits=10, decimal_places=4, default=0.0, help_text="Estimated AI spend avoided by cache hits (USD)")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -129,6 +145,89 @@ class AIProviderMetrics(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.model_used} - {self.date}"
+    
+    @property
+    def cache_hit_rate(self):
+        """Percentage of enhancements served from cache"""
+        total = self.total_requests + self.cache_hits
+        if total == 0:
+            return 0
+        return (self.cache_hits / total) * 100
+
+
+class AICallTelemetry(models.Model):
+    """
+    One AI provider call (or cache hit) as emitted by the AI services.
+    High volume, append-only: BigAutoField PK, no FK constraints, and
+    AIProviderMetrics is rolled up from it with SQL aggregation.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user_id = models.UUIDField(null=True, blank=True)
+    automation_id = models.UUIDField(null=True, blank=True)
+
+    provider = models.CharField(max_length=20)
+    model = models.CharField(max_length=100)
+    key_slot = models.CharField(max_length=12, blank=True, help_text="Hash prefix of the API key used")
+
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    success = models.BooleanField(default=True)
+    cache_hit = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'ai_call_telemetry'
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['user_id', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.model} {self.latency_ms}ms"
+
+
+class HourlyTriggerRollup(models.Model):
+    """
+    Trigger counts per automation per hour (by trigger created_at).
+    Kept current by deltas emitted on every trigger state transition and
+    flushed every minute; DailyStats and AutomationPerformance are derived
+    from these rows, and the nightly jobs reconcile them against the triggers.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='hourly_trigger_rollups')
+    automation = models.ForeignKey(
+        'automations.Automation',
+        on_delete=models.CASCADE,
+        related_name='hourly_rollups'
+    )
+    hour = models.DateTimeField(help_text="Start of the hour (UTC)")
+    
+    triggers = models.IntegerField(default=0)
+    sent = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    skipped = models.IntegerField(default=0)
+    ai_enhanced = models.IntegerField(default=0)
+    
+    # HyperLogLog sketches of the commenters / DM recipients (see services/hll.py)
+    commenters_sketch = models.BinaryField(default=b'', blank=True)
+    recipients_sketch = models.BinaryField(default=b'', blank=True)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'hourly_trigger_rollups'
+        unique_together = ['automation', 'hour']
+        ordering = ['-hour']
+        indexes = [
+            models.Index(fields=['user', 'hour']),
+            models.Index(fields=['hour']),
+        ]
+    
+    def __str__(self):
+        return f"{self.automation_id} - {self.hour:%Y-%m-%d %H:00}"
 
 
 class ContactEngagement(models.Model):
@@ -21,7 +21,7 @@ class DailyStatsSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'date', 'total_automations', 'active_automations',
             'total_triggers', 'successful_triggers', 'failed_triggers', 'skipped_triggers',
-            'total_dms_sent', 'ai_enhanced_dms', 'avg_response_time',
+            'total_dms_sent', 'ai_enhanced_dms', 'unique_commenters', 'unique_recipients', 'avg_response_time',
             'success_rate', 'ai_enhancement_rate', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -38,6 +38,7 @@ class AutomationPerformanceSerializer(serializers.ModelSerializer):
             'triggers_count', 'successful_count', 'failed_count', 'skipped_count',
             'avg_response_time', 'success_rate',
             'ai_enhanced_count', 'ai_enhancement_rate',
+            'unique_commenters', 'unique_recipients',
             'click_count', 'click_rate',
             'created_at', 'updated_at'
         ]
@@ -46,6 +47,7 @@ class AutomationPerformanceSerializer(serializers.ModelSerializer):
 
 class AIProviderMetricsSerializer(serializers.ModelSerializer):
     """Serializer for AI provider metrics"""
+    cache_hit_rate = serializers.FloatField(read_only=True)
     
     class Meta:
         model = AIProviderMetrics
@@ -53,6 +55,7 @@ class AIProviderMetricsSerializer(serializers.ModelSerializer):
             'id', 'date', 'provider', 'model_used',
             'total_requests', 'successful_requests', 'failed_requests',
             'avg_response_time', 'total_tokens_used', 'estimated_cost',
+            'cache_hits', 'cache_hit_rate', 'estimated_cost_saved',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -152,6 +155,8 @@ class AIUsageSerializer(serializers.Serializer):
     failed_requests = serializers.IntegerField()
     models_breakdown = serializers.ListField()
     total_cost = serializers.DecimalField(max_digits=10, decimal_places=4)
+    total_cache_hits = serializers.IntegerField()
+    total_cost_saved = serializers.DecimalField(max_digits=10, decimal_places=4)
     avg_response_time = serializers.FloatField()
 
 
@@ -0,0 +1,68 @@
+"""
+Dashboard Cache - Per-User Versioned Response Cache
+================================================================
+- Dashboard responses are cached per (user, endpoint, params) for
+  DASHBOARD_CACHE_TTL seconds
+- Every key embeds the user's dashboard version; any trigger activity for
+  the user bumps it (see analytics.signals), so cached responses are
+  invalidated immediately without tracking individual keys
+"""
+
+import logging
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from automations.services import cache_counters
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'dashboard'
+DEFAULT_TTL = 60
+VERSION_TTL = 86400 * 7
+OWNER_TTL = 86400
+
+
+def owner_id(automation_id):
+    """User id owning an automation (cached — ownership never changes)."""
+    from automations.models import Automation
+
+    key = f'{KEY_PREFIX}:owner:{automation_id}'
+    user_id = cache.get(key)
+    if user_id is None:
+        user_id = (
+            Automation.objects.filter(id=automation_id)
+            .values_list('instagram_account__user_id', flat=True)
+            .first()
+        )
+        if user_id is not None:
+            cache.set(key, user_id, OWNER_TTL)
+    return user_id
+
+
+def _version_key(user_id) -> str:
+    return f'{KEY_PREFIX}:v:{user_id}'
+
+
+def bump(user_id):
+    """Invalidate every cached dashboard response of a user."""
+    if user_id is None:
+        return
+    try:
+        cache_counters.incr(_version_key(user_id), VERSION_TTL)
+    except Exception as e:
+        logger.warning(f"[DashboardCache] Could not bump version for {user_id}: {e}")
+
+
+def get_or_build(user_id, name: str, build: Callable[[], Dict], *params, ttl: Optional[int] = None) -> Dict:
+    """Cached `build()` result for this user/endpoint/params at the current version."""
+    ttl = ttl if ttl is not None else getattr(settings, 'DASHBOARD_CACHE_TTL', DEFAULT_TTL)
+    version = cache.get(_version_key(user_id)) or 0
+    key = ':'.join(str(part) for part in (KEY_PREFIX, name, user_id, version, *params))
+
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, ttl)
+    return data
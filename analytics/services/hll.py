@@ -0,0 +1,130 @@
+"""
+HyperLogLog - Mergeable Distinct-Count Sketches
+================================================================
+- 2^12 one-byte registers (~1.6% standard error) fed by a 64-bit blake2b
+  hash, so the same Instagram user always lands in the same register on
+  every worker and every day
+- Sketches merge by register-wise max: the union of any number of days,
+  automations or accounts is estimated without touching raw triggers, and
+  overlap comes from |A ∩ B| = |A| + |B| - |A ∪ B|
+- to_bytes() stores a sparse (index, rank) list while a sketch is small and
+  the dense register array once that is shorter, so the hourly rollup rows
+  of quiet automations stay a few bytes
+"""
+
+import hashlib
+import math
+import struct
+from typing import Iterable, Optional
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_RANK_BITS = 64 - PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(_RANK_BITS + 2)]
+
+SPARSE = b'\x01'
+DENSE = b'\x02'
+_PAIR = struct.Struct('>HB')
+
+
+def _hash(value) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """
+    Usage:
+        sketch = HyperLogLog()
+        sketch.add(instagram_user_id)
+        row.commenters_sketch = sketch.to_bytes()
+        week = HyperLogLog.union(HyperLogLog.from_bytes(b) for b in daily_blobs)
+        week.count()
+    """
+
+    __slots__ = ('registers',)
+
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers = bytearray(registers) if registers is not None else bytearray(REGISTERS)
+
+    def add(self, value):
+        x = _hash(value)
+        index = x >> _RANK_BITS
+        rank = _RANK_BITS - (x & ((1 << _RANK_BITS) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable):
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Fold another sketch into this one (in place)."""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def absorb(self, data: Optional[bytes]) -> "HyperLogLog":
+        """merge() straight from serialized bytes; sparse input never builds a full sketch."""
+        data = bytes(data or b'')
+        if not data:
+            return self
+        kind, body = data[:1], data[1:]
+        if kind == SPARSE:
+            registers = self.registers
+            for index, rank in _PAIR.iter_unpack(body):
+                if rank > registers[index]:
+                    registers[index] = rank
+        elif kind == DENSE and len(body) == REGISTERS:
+            self.registers = bytearray(map(max, self.registers, body))
+        else:
+            raise ValueError('Not a serialized HyperLogLog sketch')
+        return self
+
+    @classmethod
+    def union(cls, sketches: Iterable["HyperLogLog"]) -> "HyperLogLog":
+        result = cls()
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "HyperLogLog":
+        return cls().absorb(data)
+
+    def to_bytes(self) -> bytes:
+        """Compact serialization; an empty sketch is b''."""
+        pairs = [(index, rank) for index, rank in enumerate(self.registers) if rank]
+        if not pairs:
+            return b''
+        if len(pairs) * _PAIR.size < REGISTERS:
+            return SPARSE + b''.join(_PAIR.pack(index, rank) for index, rank in pairs)
+        return DENSE + bytes(self.registers)
+
+    def count(self) -> int:
+        """Estimated number of distinct values added."""
+        zeros = self.registers.count(0)
+        if zeros == REGISTERS:
+            return 0
+        estimate = _ALPHA * REGISTERS * REGISTERS / sum(_INVERSE_POWERS[rank] for rank in self.registers)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Small-range correction (linear counting)
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return int(round(estimate))
+
+    def __bool__(self):
+        return any(self.registers)
+
+
+def merge_bytes(*blobs: Optional[bytes]) -> bytes:
+    """Union of serialized sketches, serialized."""
+    sketch = HyperLogLog()
+    for blob in blobs:
+        sketch.absorb(blob)
+    return sketch.to_bytes()
+
+
+def overlap(a: HyperLogLog, b: HyperLogLog) -> int:
+    """Estimated size of the intersection of two sketches."""
+    union = HyperLogLog(a.registers).merge(b)
+    return max(0, a.count() + b.count() - union.count())
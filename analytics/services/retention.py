@@ -0,0 +1,148 @@
+"""
+Retention - Chunked, Throttled Deletes for Analytics and Log Tables
+================================================================
+- POLICIES lists every table that expires rows: the date/timestamp column
+  that ages them and how many days they are kept (RETENTION_DAYS in settings
+  overrides a table's default)
+- Expired rows are deleted in primary-key order, RETENTION_BATCH_SIZE at a
+  time, with one bare DELETE ... WHERE pk IN (...) per batch (no object
+  loading, no cascade collection, no signals) and a RETENTION_BATCH_SLEEP
+  pause between batches so replicas and the WAL keep up
+- The last deleted PK is checkpointed in the shared Django cache; a run that
+  hits its time budget (or dies) resumes from there on the next run
+- Every table's run is logged and returned with rows deleted and rows/sec
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.db import router
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'retention'
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_BATCH_SLEEP = 0.1    # seconds between batches
+DEFAULT_MAX_SECONDS = 600    # per table per run; the rest resumes from the checkpoint
+CHECKPOINT_TTL = 7 * 86400
+
+# name -> (model label, column that ages the row, default days kept)
+POLICIES = {
+    'daily_stats': ('analytics.DailyStats', 'date', 365),
+    'performance': ('analytics.AutomationPerformance', 'date', 365),
+    'ai_metrics': ('analytics.AIProviderMetrics', 'date', 365),
+    'engagement': ('analytics.ContactEngagement', 'date', 365),
+    'ai_telemetry': ('analytics.AICallTelemetry', 'created_at', 90),
+    'webhooks': ('analytics.WebhookLog', 'created_at', 90),
+    'system_events': ('analytics.SystemEvent', 'created_at', 180),
+    'page_visits': ('accounts.PageVisit', 'visited_at', 180),
+    'user_events': ('accounts.UserEvent', 'created_at', 365),
+    'email_logs': ('payments.EmailLog', 'created_at', 90),
+}
+
+
+def retention_days(name: str) -> int:
+    from django.conf import settings
+
+    overrides = getattr(settings, 'RETENTION_DAYS', {}) or {}
+    return int(overrides.get(name, POLICIES[name][2]))
+
+
+def cutoff_for(name: str, now: Optional[datetime] = None):
+    """Rows whose aging column is before this value are expired."""
+    from django.apps import apps
+    from django.db import models
+
+    label, field, _ = POLICIES[name]
+    moment = (now or timezone.now()) - timedelta(days=retention_days(name))
+    column = apps.get_model(label)._meta.get_field(field)
+    if isinstance(column, models.DateField) and not isinstance(column, models.DateTimeField):
+        return timezone.localtime(moment).date()
+    return moment
+
+
+def _checkpoint_key(name: str) -> str:
+    return f'{KEY_PREFIX}:checkpoint:{name}'
+
+
+def delete_batch(model, pks) -> int:
+    """One DELETE for a batch of PKs, skipping the ORM's collector when it's safe."""
+    queryset = model._base_manager.filter(pk__in=pks)
+    if model._meta.related_objects:
+        # Something references this table — let Django handle the cascade
+        return queryset.delete()[0]
+    return queryset._raw_delete(using=router.db_for_write(model))
+
+
+def purge(
+    name: str,
+    batch_size: Optional[int] = None,
+    sleep: Optional[float] = None,
+    max_seconds: Optional[float] = None,
+    now: Optional[datetime] = None,
+) -> Dict:
+    """
+    Delete one table's expired rows in PK-ordered batches.
+    Returns {'deleted', 'seconds', 'rows_per_sec', 'complete'}; complete is
+    False when the time budget ran out and the next run will resume.
+    """
+    from django.apps import apps
+    from django.conf import settings
+
+    label, field, _ = POLICIES[name]
+    model = apps.get_model(label)
+    batch_size = batch_size or getattr(settings, 'RETENTION_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    sleep = getattr(settings, 'RETENTION_BATCH_SLEEP', DEFAULT_BATCH_SLEEP) if sleep is None else sleep
+    max_seconds = max_seconds or getattr(settings, 'RETENTION_MAX_SECONDS', DEFAULT_MAX_SECONDS)
+
+    expired = model._base_manager.filter(**{f'{field}__lt': cutoff_for(name, now)}).order_by('pk')
+    checkpoint = cache.get(_checkpoint_key(name))
+    if checkpoint is not None:
+        logger.info(f"[Retention] Resuming {label} after pk {checkpoint}")
+
+    started = time.monotonic()
+    deleted, complete = 0, False
+    while True:
+        batch_query = expired.filter(pk__gt=checkpoint) if checkpoint is not None else expired
+        pks = list(batch_query.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            complete = True
+            break
+        deleted += delete_batch(model, pks)
+        checkpoint = pks[-1]
+        cache.set(_checkpoint_key(name), checkpoint, CHECKPOINT_TTL)
+
+        if len(pks) < batch_size:
+            complete = True
+            break
+        if time.monotonic() - started >= max_seconds:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    if complete:
+        # Next run starts a fresh pass from the lowest PK
+        cache.delete(_checkpoint_key(name))
+
+    seconds = time.monotonic() - started
+    rate = deleted / seconds if seconds > 0 else float(deleted)
+    status = '✓' if complete else '⏸ (budget reached, will resume)'
+    logger.info(f"[Retention] {status} {label}: deleted {deleted} rows in {seconds:.1f}s ({rate:.0f} rows/sec)")
+    return {'deleted': deleted, 'seconds': round(seconds, 3), 'rows_per_sec': round(rate, 1), 'complete': complete}
+
+
+def purge_all(names=None, **options) -> Dict[str, Dict]:
+    """Run purge() for each named policy (all of them by default)."""
+    results = {}
+    for name in names or POLICIES:
+        try:
+            results[name] = purge(name, **options)
+        except Exception as e:
+            # One broken table shouldn't stop the others
+            logger.error(f"[Retention] ❌ {POLICIES[name][0]} failed: {e}")
+            results[name] = {'deleted': 0, 'seconds': 0, 'rows_per_sec': 0, 'complete': False, 'error': str(e)}
+    return results
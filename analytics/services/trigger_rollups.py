@@ -0,0 +1,373 @@
+"""
+Trigger Rollups - Incremental Hourly Trigger Counts
+================================================================
+- Every AutomationTrigger state transition (created, sent, failed, skipped,
+  AI-enhanced) emits a delta into per-minute counters in the shared Django
+  cache (Redis in production), keyed by (automation, hour of created_at)
+- Each minute the flush task applies the deltas of finished minutes to
+  HourlyTriggerRollup in a fixed number of queries, so dashboards read
+  today's numbers from O(hours) rows instead of counting raw triggers
+- The commenter (on create) and DM recipient (on send) ride along with the
+  deltas and are folded into per-hour HyperLogLog sketches on the same rows,
+  so unique people merge up to days, automations and accounts
+- Deltas are best-effort: a lost delta is corrected by reconcile(), which
+  the nightly aggregation runs before deriving the daily tables
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from automations.services import cache_counters
+
+from .hll import HyperLogLog, merge_bytes
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'rollup'
+FIELDS = ('triggers', 'sent', 'failed', 'skipped', 'ai_enhanced')
+COUNTED_STATUSES = ('sent', 'failed', 'skipped')
+# sketch -> (model field, counter whose increase adds the person to it)
+SKETCHES = {
+    'commenters': ('commenters_sketch', 'triggers'),
+    'recipients': ('recipients_sketch', 'sent'),
+}
+SKETCH_FIELDS = tuple(field for field, _ in SKETCHES.values())
+COUNTER_TTL = 7200         # a stalled flusher can catch up for ~2 hours
+MAX_CATCHUP_MINUTES = 90   # oldest minute a flush still looks at
+
+# (automation_id, hour start) -> {field: delta}
+Deltas = Dict[Tuple[str, datetime], Dict[str, int]]
+# (automation_id, hour start) -> {sketch name: HyperLogLog}
+People = Dict[Tuple[str, datetime], Dict[str, HyperLogLog]]
+
+
+def state_of(trigger) -> Optional[Dict]:
+    """The parts of a trigger the rollups count, or None if they weren't loaded."""
+    if {'status', 'was_ai_enhanced'} & trigger.get_deferred_fields():
+        return None
+    return {'status': trigger.status, 'ai_enhanced': bool(trigger.was_ai_enhanced)}
+
+
+def transition_delta(before: Optional[Dict], after: Dict, created: bool = False) -> Dict[str, int]:
+    """Counter changes for a trigger moving from `before` to `after`."""
+    delta = dict.fromkeys(FIELDS, 0)
+    if created:
+        delta['triggers'] = 1
+        before = {'status': None, 'ai_enhanced': False}
+
+    if before['status'] != after['status']:
+        if before['status'] in COUNTED_STATUSES:
+            delta[before['status']] -= 1
+        if after['status'] in COUNTED_STATUSES:
+            delta[after['status']] += 1
+    if before['ai_enhanced'] != after['ai_enhanced']:
+        delta['ai_enhanced'] = 1 if after['ai_enhanced'] else -1
+
+    return {field: value for field, value in delta.items() if value}
+
+
+def _hour_of(moment: datetime) -> int:
+    return int(moment.timestamp() // 3600)
+
+
+def _minute(now: Optional[float] = None) -> int:
+    return int((now or time.time()) // 60)
+
+
+def _hour_start(moment: datetime) -> datetime:
+    return datetime.fromtimestamp(_hour_of(moment) * 3600, tz=dt_timezone.utc)
+
+
+def sketches_for(delta: Dict[str, int]) -> Tuple[str, ...]:
+    """The sketches a trigger's person joins with this delta."""
+    return tuple(name for name, (_, counter) in SKETCHES.items() if delta.get(counter, 0) > 0)
+
+
+def record(automation_id, created_at: datetime, delta: Dict[str, int],
+           person: Optional[str] = None, now: Optional[float] = None):
+    """Add a trigger's counter changes (and its person, for the sketches) to the current minute."""
+    if not delta:
+        return
+    minute = _minute(now)
+    bucket = f'{automation_id}:{_hour_of(created_at)}'
+    try:
+        sketches = sketches_for(delta) if person else ()
+        if sketches:
+            slot = cache_counters.incr(f'{KEY_PREFIX}:people:{minute}:n', COUNTER_TTL)
+            cache.set(f'{KEY_PREFIX}:people:{minute}:{slot}', (bucket, str(person), sketches), COUNTER_TTL)
+        # First touch of this bucket in this minute: register it for the flusher
+        if cache.add(f'{KEY_PREFIX}:seen:{minute}:{bucket}', 1, COUNTER_TTL):
+            slot = cache_counters.incr(f'{KEY_PREFIX}:dirty:{minute}:n', COUNTER_TTL)
+            cache.set(f'{KEY_PREFIX}:dirty:{minute}:{slot}', bucket, COUNTER_TTL)
+        for field, value in delta.items():
+            cache_counters.incr(f'{KEY_PREFIX}:{minute}:{bucket}:{field}', COUNTER_TTL, delta=value)
+    except Exception as e:
+        # Rollups must never fail a trigger; the nightly reconcile fixes the gap
+        logger.warning(f"[TriggerRollups] Could not record delta for {automation_id}: {e}")
+
+
+def _bucket_key(bucket: str) -> Tuple[str, datetime]:
+    automation_id, hour = bucket.rsplit(':', 1)
+    return automation_id, datetime.fromtimestamp(int(hour) * 3600, tz=dt_timezone.utc)
+
+
+def _read_people(minute: int) -> Tuple[People, list]:
+    """Sketches of the people recorded during `minute` plus the cache keys used."""
+    n_key = f'{KEY_PREFIX}:people:{minute}:n'
+    count = int(cache.get(n_key) or 0)
+    if not count:
+        return {}, []
+
+    slot_keys = [f'{KEY_PREFIX}:people:{minute}:{slot}' for slot in range(1, count + 1)]
+    people: People = {}
+    for bucket, person, sketches in cache.get_many(slot_keys).values():
+        for name in sketches:
+            people.setdefault(_bucket_key(bucket), {}).setdefault(name, HyperLogLog()).add(person)
+    return people, [n_key, *slot_keys]
+
+
+def _read_minute(minute: int) -> Tuple[Deltas, People, list]:
+    """Deltas and people recorded during `minute` plus every cache key they used."""
+    people, used = _read_people(minute)
+    n_key = f'{KEY_PREFIX}:dirty:{minute}:n'
+    count = int(cache.get(n_key) or 0)
+    if not count:
+        return {}, people, used
+
+    slot_keys = [f'{KEY_PREFIX}:dirty:{minute}:{slot}' for slot in range(1, count + 1)]
+    buckets = set(cache.get_many(slot_keys).values())
+    counter_keys = {
+        (bucket, field): f'{KEY_PREFIX}:{minute}:{bucket}:{field}'
+        for bucket in buckets for field in FIELDS
+    }
+    values = cache.get_many(list(counter_keys.values()))
+
+    deltas: Deltas = {}
+    for (bucket, field), key in counter_keys.items():
+        value = int(values.get(key) or 0)
+        if value:
+            deltas.setdefault(_bucket_key(bucket), {})[field] = value
+
+    used += [n_key, *slot_keys, *counter_keys.values()]
+    used += [f'{KEY_PREFIX}:seen:{minute}:{bucket}' for bucket in buckets]
+    return deltas, people, used
+
+
+def _merged(row, sketches: Dict[str, HyperLogLog]) -> Dict[str, bytes]:
+    """The row's sketch fields with `sketches` folded in."""
+    merged = {}
+    for name, (field, _) in SKETCHES.items():
+        if name in sketches:
+            merged[field] = HyperLogLog.from_bytes(getattr(row, field)).merge(sketches[name]).to_bytes()
+    return merged
+
+
+def apply_deltas(deltas: Deltas, people: Optional[People] = None) -> int:
+    """Add deltas and people to HourlyTriggerRollup (a handful of queries regardless of size)."""
+    from analytics.models import HourlyTriggerRollup
+    from automations.models import Automation
+
+    people = people or {}
+    if not deltas and not people:
+        return 0
+
+    automation_ids = {automation_id for automation_id, _ in [*deltas, *people]}
+    # Also drops deltas for automations deleted since
+    owners = dict(
+        Automation.objects.filter(id__in=automation_ids)
+        .values_list('id', 'instagram_account__user_id')
+    )
+    owners = {str(k): v for k, v in owners.items()}
+
+    keys = [key for key in {*deltas, *people} if key[0] in owners]
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Locked so a concurrent flush can't lose a sketch merge (counters use F() anyway)
+        existing = {
+            (str(row.automation_id), row.hour): row
+            for row in HourlyTriggerRollup.objects.select_for_update().filter(
+                automation_id__in=list(owners), hour__in={hour for _, hour in keys}
+            )
+        }
+
+        to_update, to_create = [], []
+        for key in keys:
+            automation_id, hour = key
+            delta, sketches = deltas.get(key, {}), people.get(key, {})
+            row = existing.get(key)
+            if row is not None:
+                # Every counted field is written as F() + delta so concurrent writes aren't overwritten
+                for field in FIELDS:
+                    setattr(row, field, F(field) + delta.get(field, 0))
+                for field, value in _merged(row, sketches).items():
+                    setattr(row, field, value)
+                row.updated_at = now
+                to_update.append(row)
+            else:
+                row = HourlyTriggerRollup(
+                    user_id=owners[automation_id], automation_id=automation_id, hour=hour, **delta
+                )
+                for field, value in _merged(row, sketches).items():
+                    setattr(row, field, value)
+                to_create.append(row)
+
+        if to_update:
+            HourlyTriggerRollup.objects.bulk_update(to_update, [*FIELDS, *SKETCH_FIELDS, 'updated_at'])
+        if to_create:
+            try:
+                with transaction.atomic():
+                    HourlyTriggerRollup.objects.bulk_create(to_create)
+            except IntegrityError:
+                # Row appeared concurrently (e.g. a reconcile) — add to it one by one
+                for row in to_create:
+                    current = HourlyTriggerRollup.objects.select_for_update().filter(
+                        automation_id=row.automation_id, hour=row.hour
+                    ).first()
+                    if current is None:
+                        row.save()
+                        continue
+                    for field in FIELDS:
+                        setattr(current, field, F(field) + getattr(row, field))
+                    for field in SKETCH_FIELDS:
+                        setattr(current, field, merge_bytes(getattr(current, field), getattr(row, field)))
+                    current.updated_at = now
+                    current.save(update_fields=[*FIELDS, *SKETCH_FIELDS, 'updated_at'])
+    return len(to_update) + len(to_create)
+
+
+def flush(now: Optional[float] = None) -> int:
+    """
+    Apply the deltas of every finished minute that hasn't been flushed yet.
+    The minute that just ended is left alone so in-flight writes can land.
+    Returns the number of rollup rows touched.
+    """
+    current = _minute(now)
+    minutes = list(range(current - MAX_CATCHUP_MINUTES, current - 1))
+    done = cache.get_many([f'{KEY_PREFIX}:flushed:{m}' for m in minutes])
+
+    touched = 0
+    for minute in minutes:
+        marker = f'{KEY_PREFIX}:flushed:{minute}'
+        # add() doubles as a lock so concurrent flushers never apply a minute twice
+        if marker in done or not cache.add(marker, 1, COUNTER_TTL):
+            continue
+        deltas, people, used = _read_minute(minute)
+        if not deltas and not people:
+            continue
+        try:
+            touched += apply_deltas(deltas, people)
+        except Exception as e:
+            logger.error(f"[TriggerRollups] Dropped deltas for minute {minute}: {e}")
+            continue
+        cache.delete_many(used)
+    return touched
+
+
+def _sketch_triggers(start: datetime, end: datetime) -> Dict[Tuple[str, datetime], Dict[str, HyperLogLog]]:
+    """Per (automation, hour) sketch fields built from the raw triggers in [start, end)."""
+    from automations.models import AutomationTrigger
+
+    sketches: Dict[Tuple[str, datetime], Dict[str, HyperLogLog]] = {}
+    rows = (
+        AutomationTrigger.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .values_list('automation_id', 'created_at', 'instagram_user_id', 'status')
+        .order_by()
+    )
+    for automation_id, created_at, person, status in rows.iterator(chunk_size=2000):
+        row = sketches.setdefault(
+            (str(automation_id), _hour_start(created_at)),
+            {field: HyperLogLog() for field in SKETCH_FIELDS},
+        )
+        row['commenters_sketch'].add(person)
+        if status == 'sent':
+            row['recipients_sketch'].add(person)
+    return sketches
+
+
+def reconcile(start: datetime, end: datetime) -> int:
+    """
+    Rebuild the hourly rows in [start, end) from automation_triggers with one
+    grouped query, one streamed pass for the sketches and a bulk upsert; rows
+    with no triggers left are removed.
+    Months already moved to the trigger archive are skipped.
+    """
+    from django.db.models import Count, Q
+    from django.db.models.functions import TruncHour
+    from analytics.models import HourlyTriggerRollup
+    from automations.models import AutomationTrigger
+    from automations.services import trigger_archive
+
+    # Archived months are no longer in automation_triggers — keep their rollups
+    boundary = trigger_archive.hot_since()
+    if boundary is not None:
+        start = max(start, boundary)
+        if start >= end:
+            return 0
+
+    rows = (
+        AutomationTrigger.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .annotate(hour=TruncHour('created_at'))
+        .values('automation_id', 'automation__instagram_account__user_id', 'hour')
+        .annotate(
+            triggers=Count('id'),
+            sent=Count('id', filter=Q(status='sent')),
+            failed=Count('id', filter=Q(status='failed')),
+            skipped=Count('id', filter=Q(status='skipped')),
+            ai_enhanced=Count('id', filter=Q(was_ai_enhanced=True)),
+        )
+        .order_by()
+    )
+    sketches = _sketch_triggers(start, end)
+    rollups = [
+        HourlyTriggerRollup(
+            user_id=row['automation__instagram_account__user_id'],
+            automation_id=row['automation_id'],
+            hour=row['hour'],
+            **{field: row[field] for field in FIELDS},
+            **{
+                field: sketch.to_bytes()
+                for field, sketch in sketches.get((str(row['automation_id']), row['hour']), {}).items()
+            },
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        HourlyTriggerRollup.objects.bulk_create(
+            rollups,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['automation', 'hour'],
+            update_fields=[*FIELDS, *SKETCH_FIELDS, 'updated_at'],
+        )
+        keep = {(r.automation_id, r.hour) for r in rollups}
+        stale = [
+            pk for pk, automation_id, hour in
+            HourlyTriggerRollup.objects.filter(hour__gte=start, hour__lt=end)
+            .values_list('id', 'automation_id', 'hour')
+            if (automation_id, hour) not in keep
+        ]
+        HourlyTriggerRollup.objects.filter(id__in=stale).delete()
+    return len(rollups)
+
+
+def today_totals(user_id) -> Dict[str, int]:
+    """A user's trigger counts since midnight, summed from the hourly rows."""
+    from django.db.models import Sum
+    from analytics.models import HourlyTriggerRollup
+
+    midnight = timezone.make_aware(datetime.combine(timezone.now().date(), datetime.min.time()))
+    totals = HourlyTriggerRollup.objects.filter(
+        user_id=user_id, hour__gte=midnight, hour__lt=midnight + timedelta(days=1)
+    ).aggregate(**{field: Sum(field) for field in FIELDS})
+    return {field: totals[field] or 0 for field in FIELDS}
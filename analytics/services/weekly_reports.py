@@ -0,0 +1,239 @@
+"""
+Weekly Reports - Batched Metrics and Pooled Delivery
+================================================================
+- send_weekly_reports only picks the recipients and shards them into
+  chunks of WEEKLY_REPORT_CHUNK_SIZE users, one send_weekly_report_chunk
+  task each, so the run spreads across workers
+- A chunk's metrics come from two grouped queries over the hourly trigger
+  rollups (per-user totals for this and last week, per-automation weekly
+  counts), never per-user COUNTs over automation_triggers
+- Every email in a chunk goes through one SMTP connection, and the chunk's
+  EmailLog rows are written with a single bulk INSERT
+- Each chunk logs its throughput in emails/min; the chunk that finishes a
+  run logs the run's overall rate from counters kept in the cache
+"""
+
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from automations.services.cache_counters import incr
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 200
+TOP_AUTOMATIONS = 5
+RUN_TTL = 2 * 86400
+TEMPLATE = 'emails/weekly_report.html'
+
+
+def _midnight(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _change(current, previous) -> float:
+    return (current - previous) / previous * 100 if previous > 0 else 0
+
+
+def _rate(part, total) -> float:
+    return part / total * 100 if total > 0 else 0
+
+
+def recipients() -> List[str]:
+    """Ids of active users who haven't turned weekly reports off."""
+    from accounts.models import User
+
+    rows = User.objects.filter(is_active=True).exclude(email='').values_list('id', 'email_preferences')
+    return [
+        str(user_id) for user_id, preferences in rows.iterator(chunk_size=2000)
+        if (preferences or {}).get('weekly_reports', True)
+    ]
+
+
+def chunked(ids: List[str], size: int) -> List[List[str]]:
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+def weekly_metrics(user_ids: Iterable, end_date: date) -> Dict[str, Dict]:
+    """
+    {user_id: metrics} for the week [end_date - 7, end_date] and the week
+    before it, from the hourly rollups. Users without triggers are absent.
+    """
+    from django.db.models import Q, Sum
+
+    from analytics.models import HourlyTriggerRollup
+
+    user_ids = list(user_ids)
+    start_date = end_date - timedelta(days=7)
+    this_week, last_week, end = _midnight(start_date), _midnight(start_date - timedelta(days=7)), _midnight(end_date + timedelta(days=1))
+    this, last = Q(hour__gte=this_week), Q(hour__lt=this_week)
+
+    metrics = {}
+    totals = (
+        HourlyTriggerRollup.objects
+        .filter(user_id__in=user_ids, hour__gte=last_week, hour__lt=end)
+        .values('user_id')
+        .annotate(
+            week_triggers=Sum('triggers', filter=this),
+            week_sent=Sum('sent', filter=this),
+            week_ai_enhanced=Sum('ai_enhanced', filter=this),
+            last_triggers=Sum('triggers', filter=last),
+            last_sent=Sum('sent', filter=last),
+        )
+        .order_by()
+    )
+    for row in totals:
+        user_id = str(row.pop('user_id'))
+        metrics[user_id] = {key: value or 0 for key, value in row.items()}
+        metrics[user_id]['top_automations'] = []
+
+    automations = (
+        HourlyTriggerRollup.objects
+        .filter(user_id__in=user_ids, hour__gte=this_week, hour__lt=end)
+        .values('user_id', 'automation_id', 'automation__name')
+        .annotate(weekly_triggers=Sum('triggers'), weekly_dms=Sum('sent'))
+        .order_by()
+    )
+    for row in automations:
+        user_metrics = metrics.get(str(row['user_id']))
+        if user_metrics is not None:
+            user_metrics['top_automations'].append({
+                'name': row['automation__name'],
+                'weekly_triggers': row['weekly_triggers'] or 0,
+                'weekly_dms': row['weekly_dms'] or 0,
+            })
+    for user_metrics in metrics.values():
+        user_metrics['top_automations'].sort(key=lambda a: (-a['weekly_dms'], -a['weekly_triggers'], a['name']))
+        del user_metrics['top_automations'][TOP_AUTOMATIONS:]
+    return metrics
+
+
+def report_context(user, metrics: Optional[Dict], end_date: date) -> Dict:
+    """Template context for one user's report."""
+    from django.conf import settings
+
+    m = metrics or {'week_triggers': 0, 'week_sent': 0, 'week_ai_enhanced': 0, 'last_triggers': 0, 'last_sent': 0,
+                    'top_automations': []}
+    success_rate = _rate(m['week_sent'], m['week_triggers'])
+    dms_change = _change(m['week_sent'], m['last_sent'])
+    triggers_change = _change(m['week_triggers'], m['last_triggers'])
+    success_change = success_rate - _rate(m['last_sent'], m['last_triggers'])
+    return {
+        'user': user,
+        'start_date': end_date - timedelta(days=7),
+        'end_date': end_date,
+        'total_triggers': m['week_triggers'],
+        'total_dms_sent': m['week_sent'],
+        'success_rate': round(success_rate, 1),
+        'ai_enhanced_count': m['week_ai_enhanced'],
+        'ai_enhancement_rate': round(_rate(m['week_ai_enhanced'], m['week_triggers']), 1),
+        'dms_change': round(dms_change, 1),
+        'triggers_change': round(triggers_change, 1),
+        'success_change': round(success_change, 1),
+        'dms_change_class': 'positive' if dms_change >= 0 else 'negative',
+        'triggers_change_class': 'positive' if triggers_change >= 0 else 'negative',
+        'success_change_class': 'positive' if success_change >= 0 else 'negative',
+        'top_automations': m['top_automations'],
+        'dashboard_url': f"{settings.FRONTEND_URL}/dashboard",
+        'unsubscribe_url': f"{settings.FRONTEND_URL}/settings/notifications",
+        'settings_url': f"{settings.FRONTEND_URL}/settings/notifications",
+    }
+
+
+def build_message(template, to_email: str, context: Dict):
+    from django.conf import settings
+    from django.core.mail import EmailMultiAlternatives
+    from django.utils.html import strip_tags
+
+    html_content = template.render(context)
+    message = EmailMultiAlternatives(
+        subject=f"📊 Your Weekly Report - {context['start_date'].strftime('%b %d')}",
+        body=strip_tags(html_content),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[to_email],
+    )
+    message.attach_alternative(html_content, "text/html")
+    return message
+
+
+def _run_key(end_date: date, name: str) -> str:
+    return f'weekly_reports:{end_date.isoformat()}:{name}'
+
+
+def start_run(end_date: date, chunks: int):
+    cache.set(_run_key(end_date, 'started'), time.time(), RUN_TTL)
+    cache.set(_run_key(end_date, 'chunks'), chunks, RUN_TTL)
+    for name in ('done', 'sent', 'failed'):
+        cache.set(_run_key(end_date, name), 0, RUN_TTL)
+
+
+def _finish_chunk(end_date: date, sent: int, failed: int):
+    """Add a chunk's counts to the run; the last chunk logs the overall rate."""
+    total_sent = incr(_run_key(end_date, 'sent'), RUN_TTL, sent)
+    total_failed = incr(_run_key(end_date, 'failed'), RUN_TTL, failed)
+    done = incr(_run_key(end_date, 'done'), RUN_TTL)
+    started, chunks = cache.get(_run_key(end_date, 'started')), cache.get(_run_key(end_date, 'chunks'))
+    if started is None or done != chunks:
+        return
+    minutes = max(time.time() - started, 1e-6) / 60
+    logger.info(
+        f'📧 [WeeklyReports] Run for {end_date}: {total_sent} sent, {total_failed} failed '
+        f'in {minutes:.1f} min ({total_sent / minutes:.0f} emails/min)'
+    )
+
+
+def send_chunk(user_ids: Iterable, end_date: date) -> Dict:
+    """
+    Compute, render and send the reports for a chunk of users over one SMTP
+    connection. Returns {'sent', 'failed', 'seconds', 'emails_per_min'}.
+    """
+    from django.core.mail import get_connection
+    from django.template.loader import get_template
+
+    from accounts.models import User
+    from payments.models import EmailLog
+
+    started = time.monotonic()
+    users = list(User.objects.filter(pk__in=list(user_ids), is_active=True).exclude(email=''))
+    metrics = weekly_metrics([user.pk for user in users], end_date)
+    template = get_template(TEMPLATE)
+
+    logs = []
+    connection = get_connection()
+    with connection:
+        for user in users:
+            message = None
+            try:
+                message = build_message(template, user.email, report_context(user, metrics.get(str(user.pk)), end_date))
+                connection.send_messages([message])
+                status, error = 'sent', ''
+            except Exception as e:
+                logger.error(f"✗ Failed to send report to {user.email}: {str(e)}")
+                status, error = 'failed', str(e)
+                # A broken connection is reopened by the next send_messages()
+                connection.close()
+            logs.append(EmailLog(
+                user=user,
+                email_type='weekly_report',
+                recipient=user.email,
+                subject=message.subject if message else '',
+                status=status,
+                error_message=error,
+                metadata={'week_ending': end_date.isoformat()},
+            ))
+    EmailLog.objects.bulk_create(logs, batch_size=500)
+
+    sent = sum(1 for log in logs if log.status == 'sent')
+    failed = len(logs) - sent
+    seconds = time.monotonic() - started
+    per_minute = sent / max(seconds, 1e-6) * 60
+    logger.info(
+        f'📧 [WeeklyReports] Chunk of {len(users)}: {sent} sent, {failed} failed '
+        f'in {seconds:.1f}s ({per_minute:.0f} emails/min)'
+    )
+    _finish_chunk(end_date, sent, failed)
+    return {'sent': sent, 'failed': failed, 'seconds': round(seconds, 2), 'emails_per_min': round(per_minute, 1)}
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from automations.models import AutomationTrigger
+
+from .services import dashboard_cache, trigger_rollups
+
+
+@receiver(post_init, sender=AutomationTrigger)
+def remember_trigger_state(sender, instance, **kwargs):
+    """Snapshot the counted fields so post_save can tell what changed."""
+    instance._rollup_state = trigger_rollups.state_of(instance)
+
+
+@receiver(post_save, sender=AutomationTrigger)
+def emit_trigger_rollup_delta(sender, instance, created, **kwargs):
+    """Turn a trigger state transition into hourly rollup deltas."""
+    if not getattr(settings, 'TRIGGER_ROLLUPS_ENABLED', True):
+        return
+    before = getattr(instance, '_rollup_state', None)
+    after = trigger_rollups.state_of(instance)
+    if after is None or (before is None and not created):
+        return
+    instance._rollup_state = after
+
+    delta = trigger_rollups.transition_delta(before, after, created=created)
+    if delta:
+        automation_id, created_at, person = instance.automation_id, instance.created_at, instance.instagram_user_id
+        transaction.on_commit(lambda: trigger_rollups.record(automation_id, created_at, delta, person=person))
+
+
+@receiver(post_save, sender=AutomationTrigger)
+def invalidate_dashboard_cache(sender, instance, **kwargs):
+    """Any trigger activity makes the owner's cached dashboard responses stale."""
+    automation_id = instance.automation_id
+    transaction.on_commit(lambda: dashboard_cache.bump(dashboard_cache.owner_id(automation_id)))
@@ -3,9 +3,6 @@ Analytics Celery Tasks
 Background jobs for aggregating and processing analytics data
 """
 from celery import shared_task
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.conf import settings
 from datetime import timedelta
 from django.utils import timezone
@@ -13,256 +10,480 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Rows per INSERT ... ON CONFLICT statement, and rows fetched per DB round trip
+UPSERT_BATCH_SIZE = 1000
+# HyperLogLog unique-people columns shared by DailyStats and AutomationPerformance
+UNIQUE_FIELDS = ['unique_commenters', 'unique_recipients', 'commenters_sketch', 'recipients_sketch']
+
+def _parse_day(value, default):
+    """date from 'YYYY-MM-DD' (or a date), falling back to `default`."""
+    from datetime import date, datetime
+    
+    if value is None:
+        return default
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _day_bounds(first_day, last_day):
+    """Half-open aware datetime range [first_day 00:00, last_day + 1 00:00)."""
+    from datetime import datetime
+    
+    start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), datetime.min.time()))
+    return start, end
+
+
+def _days(start_date, end_date):
+    """Inclusive list of days to aggregate; defaults to yesterday."""
+    yesterday = timezone.now().date() - timedelta(days=1)
+    first_day = _parse_day(start_date, yesterday)
+    last_day = _parse_day(end_date, first_day)
+    return [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+
+
+def _bulk_upsert(model, objects, unique_fields, update_fields, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Upsert an iterable of unsaved instances in fixed-size batches so only one
+    batch is held in memory. Returns the number of rows written.
+    """
+    written = 0
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch, update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields)
+            written += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch, update_conflicts=True, unique_fields=unique_fields, update_fields=update_fields)
+        written += len(batch)
+    return written
+
+
+def _hourly_totals(start, end, *group_by, **group_expressions):
+    """HourlyTriggerRollup summed over [start, end) per the given grouping."""
+    from django.db.models import Sum
+    from .models import HourlyTriggerRollup
+    
+    return (
+        HourlyTriggerRollup.objects
+        .filter(hour__gte=start, hour__lt=end)
+        .annotate(**group_expressions)
+        .values(*group_by, *group_expressions)
+        .annotate(
+            total=Sum('triggers'),
+            sent=Sum('sent'),
+            failed=Sum('failed'),
+            skipped=Sum('skipped'),
+            ai_enhanced=Sum('ai_enhanced'),
+        )
+        .filter(total__gt=0)
+        .order_by()
+    )
+
+
+def _hourly_sketches(start, end, key):
+    """
+    Commenter/recipient sketches of the HourlyTriggerRollup rows in [start, end),
+    merged per key(row) where row has user_id, automation_id and hour.
+    Returns {key: {sketch field: HyperLogLog}}.
+    """
+    from .models import HourlyTriggerRollup
+    from .services import uniques
+    from .services.trigger_rollups import SKETCH_FIELDS
+    
+    rows = (
+        HourlyTriggerRollup.objects
+        .filter(hour__gte=start, hour__lt=end)
+        .values('user_id', 'automation_id', 'hour', *SKETCH_FIELDS)
+        .order_by()
+    )
+    return uniques.fold({}, rows.iterator(chunk_size=UPSERT_BATCH_SIZE), key)
+
+
+def _unique_fields(sketches):
+    """Unique-people column values for a {sketch field: HyperLogLog} dict (or None)."""
+    from .services import uniques
+    
+    sketches = sketches or uniques.empty()
+    return {**uniques.counts(sketches), **{field: sketch.to_bytes() for field, sketch in sketches.items()}}
+
+
 @shared_task
-def aggregate_daily_stats():
+def aggregate_daily_stats(start_date=None, end_date=None, reconcile=True):
     """
     Aggregate daily statistics for all users
-    Runs once per day at midnight
+    Runs once per day at midnight (for yesterday); pass start_date/end_date
+    ('YYYY-MM-DD', inclusive) to backfill a range of days
+    
+    Derived from HourlyTriggerRollup: the hourly rows are first reconciled
+    against automation_triggers (one grouped query), then summed per user and
+    day and written with one bulk upsert — independent of the number of users.
+    aggregate_nightly_rollups has already reconciled and passes reconcile=False.
+    
+    total_automations/active_automations are a snapshot of the automations as
+    they are now: there is no history to rebuild them from. A backfill leaves
+    them untouched on existing rows before yesterday; rows it creates for those
+    days get today's counts.
     """
-    from accounts.models import User
-    from automations.models import Automation, AutomationTrigger
+    from django.db.models import Count, Q
+    from django.db.models.functions import TruncDate
+    from automations.models import Automation
     from .models import DailyStats
-    
-    yesterday = timezone.now().date() - timedelta(days=1)
-    
-    logger.info(f"Aggregating daily stats for {yesterday}")
-    
-    users = User.objects.all()
-    stats_created = 0
-    
-    for user in users:
-        # Get user's automations
-        automations = Automation.objects.filter(
-            instagram_account__user=user
-        )
-        
-        # Get yesterday's triggers
-        triggers = AutomationTrigger.objects.filter(
-            automation__instagram_account__user=user,
-            created_at__date=yesterday
+    from .services import trigger_rollups
+    
+    days = _days(start_date, end_date)
+    first_day, last_day = days[0], days[-1]
+    start, end = _day_bounds(first_day, last_day)
+    
+    logger.info(f"Aggregating daily stats for {first_day} → {last_day}")
+    
+    if reconcile:
+        trigger_rollups.reconcile(start, end)
+    trigger_rows = _hourly_totals(start, end, 'user_id', day=TruncDate('hour'))
+    triggers = {(row['user_id'], row['day']): row for row in trigger_rows}
+    sketches = _hourly_sketches(start, end, lambda row: (row['user_id'], timezone.localtime(row['hour']).date()))
+    
+    # Automation counts are a current snapshot (see docstring)
+    automation_counts = {
+        row['instagram_account__user_id']: row
+        for row in (
+            Automation.objects
+            .values('instagram_account__user_id')
+            .annotate(total=Count('id'), active=Count('id', filter=Q(is_active=True)))
         )
-        
-        # Calculate stats
-        total_triggers = triggers.count()
-        successful_triggers = triggers.filter(status='sent').count()
-        failed_triggers = triggers.filter(status='failed').count()
-        skipped_triggers = triggers.filter(status='skipped').count()
-        ai_enhanced = triggers.filter(was_ai_enhanced=True).count()
-        
-        success_rate = (successful_triggers / total_triggers * 100) if total_triggers > 0 else 0
-        ai_rate = (ai_enhanced / total_triggers * 100) if total_triggers > 0 else 0
-        
-        # Create or update daily stats
-        daily_stat, created = DailyStats.objects.update_or_create(
-            user=user,
-            date=yesterday,
-            defaults={
-                'total_automations': automations.count(),
-                'active_automations': automations.filter(is_active=True).count(),
-                'total_triggers': total_triggers,
-                'successful_triggers': successful_triggers,
-                'failed_triggers': failed_triggers,
-                'skipped_triggers': skipped_triggers,
-                'total_dms_sent': successful_triggers,
-                'ai_enhanced_dms': ai_enhanced,
-                'success_rate': success_rate,
-                'ai_enhancement_rate': ai_rate,
-            }
-        )
-        
-        if created:
-            stats_created += 1
+    }
     
-    logger.info(f"✅ Created {stats_created} daily stats for {yesterday}")
-    return f"Processed {users.count()} users, created {stats_created} stats"
+    # Users with neither automations nor triggers get no row
+    keys = set(triggers) | {(user_id, day) for user_id in automation_counts for day in days}
+    
+    stats = []
+    empty = {'total': 0, 'sent': 0, 'failed': 0, 'skipped': 0, 'ai_enhanced': 0}
+    for user_id, day in keys:
+        row = triggers.get((user_id, day), empty)
+        automations = automation_counts.get(user_id, {'total': 0, 'active': 0})
+        total = row['total']
+        
+        stats.append(DailyStats(
+            user_id=user_id,
+            date=day,
+            total_automations=automations['total'],
+            active_automations=automations['active'],
+            total_triggers=total,
+            successful_triggers=row['sent'],
+            failed_triggers=row['failed'],
+            skipped_triggers=row['skipped'],
+            total_dms_sent=row['sent'],
+            ai_enhanced_dms=row['ai_enhanced'],
+            success_rate=(row['sent'] / total * 100) if total > 0 else 0,
+            ai_enhancement_rate=(row['ai_enhanced'] / total * 100) if total > 0 else 0,
+            **_unique_fields(sketches.get((user_id, day))),
+        ))
+    
+    update_fields = [
+        'total_triggers', 'successful_triggers', 'failed_triggers', 'skipped_triggers',
+        'total_dms_sent', 'ai_enhanced_dms', 'success_rate',
+        'ai_enhancement_rate', *UNIQUE_FIELDS, 'updated_at',
+    ]
+    # Only the nightly day takes the snapshot; backfilled rows keep the counts they were written with
+    snapshot_since = timezone.now().date() - timedelta(days=1)
+    for rows, fields in (
+        ([stat for stat in stats if stat.date >= snapshot_since], ['total_automations', 'active_automations', *update_fields]),
+        ([stat for stat in stats if stat.date < snapshot_since], update_fields),
+    ):
+        if rows:
+            DailyStats.objects.bulk_create(
+                rows,
+                batch_size=UPSERT_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['user', 'date'],
+                update_fields=fields,
+            )
+    
+    logger.info(f"✅ Wrote {len(stats)} daily stats for {first_day} → {last_day}")
+    return f"Wrote {len(stats)} daily stats for {len(days)} day(s)"
 
 
 @shared_task
-def aggregate_automation_performance():
+def aggregate_automation_performance(start_date=None, end_date=None, reconcile=True):
     """
     Aggregate performance metrics for each automation
-    Runs daily
+    Runs daily (for yesterday); pass start_date/end_date ('YYYY-MM-DD',
+    inclusive) to backfill. Each day's hourly rollups are reconciled (unless
+    reconcile=False, as from aggregate_nightly_rollups), summed per automation
+    and streamed into batched upserts. click_count is left to the short-link
+    click buffer; click_rate is recomputed from it once the day's sends are in.
     """
-    from automations.models import Automation, AutomationTrigger
-    from .models import AutomationPerformance
+    from django.db.models import F, FloatField, Value
+    from django.db.models.functions import Cast, Coalesce, NullIf
     
-    yesterday = timezone.now().date() - timedelta(days=1)
-    
-    logger.info(f"Aggregating automation performance for {yesterday}")
-    
-    automations = Automation.objects.all()
-    performance_created = 0
-    
-    for automation in automations:
-        # Get yesterday's triggers for this automation
-        triggers = AutomationTrigger.objects.filter(
-            automation=automation,
-            created_at__date=yesterday
+    from .models import AutomationPerformance
+    from .services import trigger_rollups
+    
+    days = _days(start_date, end_date)
+    written = 0
+    
+    for day in days:
+        logger.info(f"Aggregating automation performance for {day}")
+        start, end = _day_bounds(day, day)
+        
+        if reconcile:
+            trigger_rollups.reconcile(start, end)
+        rows = _hourly_totals(start, end, 'automation_id')
+        sketches = _hourly_sketches(start, end, lambda row: row['automation_id'])
+        
+        performance = (
+            AutomationPerformance(
+                automation_id=row['automation_id'],
+                date=day,
+                triggers_count=row['total'],
+                successful_count=row['sent'],
+                failed_count=row['failed'],
+                skipped_count=row['skipped'],
+                success_rate=row['sent'] / row['total'] * 100,
+                ai_enhanced_count=row['ai_enhanced'],
+                ai_enhancement_rate=row['ai_enhanced'] / row['total'] * 100,
+                **_unique_fields(sketches.get(row['automation_id'])),
+            )
+            for row in rows.iterator(chunk_size=UPSERT_BATCH_SIZE)
         )
-        
-        triggers_count = triggers.count()
-        if triggers_count == 0:
-            continue
-        
-        successful = triggers.filter(status='sent').count()
-        failed = triggers.filter(status='failed').count()
-        skipped = triggers.filter(status='skipped').count()
-        ai_enhanced = triggers.filter(was_ai_enhanced=True).count()
-        
-        success_rate = (successful / triggers_count * 100) if triggers_count > 0 else 0
-        ai_rate = (ai_enhanced / triggers_count * 100) if triggers_count > 0 else 0
-        
-        # Create or update performance record
-        performance, created = AutomationPerformance.objects.update_or_create(
-            automation=automation,
-            date=yesterday,
-            defaults={
-                'triggers_count': triggers_count,
-                'successful_count': successful,
-                'failed_count': failed,
-                'skipped_count': skipped,
-                'success_rate': success_rate,
-                'ai_enhanced_count': ai_enhanced,
-                'ai_enhancement_rate': ai_rate,
-            }
+        written += _bulk_upsert(
+            AutomationPerformance, performance,
+            unique_fields=['automation', 'date'],
+            update_fields=[
+                'triggers_count', 'successful_count', 'failed_count', 'skipped_count',
+                'success_rate', 'ai_enhanced_count', 'ai_enhancement_rate', *UNIQUE_FIELDS, 'updated_at',
+            ],
+        )
+        AutomationPerformance.objects.filter(date=day).update(
+            click_rate=Coalesce(
+                Cast(F('click_count'), FloatField()) * 100.0 / NullIf(F('successful_count'), 0),
+                Value(0.0),
+            )
         )
-        
-        if created:
-            performance_created += 1
     
-    logger.info(f"✅ Created {performance_created} performance records for {yesterday}")
-    return f"Processed {automations.count()} automations, created {performance_created} records"
+    logger.info(f"✅ Wrote {written} performance records for {days[0]} → {days[-1]}")
+    return f"Wrote {written} performance records for {len(days)} day(s)"
 
 
 @shared_task
-def aggregate_ai_metrics():
+def aggregate_nightly_rollups(start_date=None, end_date=None):
     """
-    Aggregate AI provider metrics
-    Runs daily
+    Nightly rollup step
+    Runs once per day after midnight (for yesterday); pass start_date/end_date
+    ('YYYY-MM-DD', inclusive) to backfill. Each day's hourly rollups are
+    reconciled against automation_triggers once, then daily stats and
+    automation performance are derived from them with reconcile=False.
     """
-    from accounts.models import User
-    from automations.models import AutomationTrigger
-    from .models import AIProviderMetrics
-    
-    yesterday = timezone.now().date() - timedelta(days=1)
+    from .services import trigger_rollups
     
-    logger.info(f"Aggregating AI metrics for {yesterday}")
+    days = _days(start_date, end_date)
+    for day in days:
+        trigger_rollups.reconcile(*_day_bounds(day, day))
     
-    users = User.objects.all()
-    metrics_created = 0
+    first_day, last_day = days[0].isoformat(), days[-1].isoformat()
+    aggregate_daily_stats(first_day, last_day, reconcile=False)
+    aggregate_automation_performance(first_day, last_day, reconcile=False)
+    return f"Aggregated rollups for {len(days)} day(s)"
+
+
+@shared_task
+def flush_trigger_rollups():
+    """
+    Apply buffered trigger deltas to HourlyTriggerRollup
+    Runs every minute
+    """
+    from .services import trigger_rollups
     
-    for user in users:
-        # Get AI-enhanced triggers from yesterday
-        triggers = AutomationTrigger.objects.filter(
-            automation__instagram_account__user=user,
-            created_at__date=yesterday,
-            was_ai_enhanced=True
+    touched = trigger_rollups.flush()
+    if touched:
+        logger.info(f"✅ Flushed trigger deltas into {touched} hourly rollup(s)")
+    return touched
+
+
+@shared_task
+def aggregate_ai_metrics(date=None):
+    """
+    Roll AIProviderMetrics up from AICallTelemetry with one grouped query
+    Runs daily (for yesterday); pass date='YYYY-MM-DD' to rebuild a day
+    """
+    from django.db.models import Avg, Count, Q, Sum
+    from .models import AICallTelemetry, AIProviderMetrics
+    
+    day = _parse_day(date, timezone.now().date() - timedelta(days=1))
+    start, end = _day_bounds(day, day)
+    
+    logger.info(f"Aggregating AI metrics for {day}")
+    
+    provider_calls = Q(cache_hit=False)
+    rows = (
+        AICallTelemetry.objects
+        .filter(created_at__gte=start, created_at__lt=end, user_id__isnull=False)
+        .values('user_id', 'model')
+        .annotate(
+            total=Count('id', filter=provider_calls),
+            successful=Count('id', filter=provider_calls & Q(success=True)),
+            failed=Count('id', filter=provider_calls & Q(success=False)),
+            cache_hits=Count('id', filter=Q(cache_hit=True)),
+            prompt_tokens=Sum('prompt_tokens', filter=provider_calls),
+            completion_tokens=Sum('completion_tokens', filter=provider_calls),
+            avg_latency_ms=Avg('latency_ms', filter=provider_calls),
         )
-        
-        if triggers.count() == 0:
-            continue
-        
-        # Group by AI model used (stored in ai_modifications field)
-        model_stats = {}
-        
-        for trigger in triggers:
-            if trigger.ai_modifications:
-                # Parse model info from ai_modifications
-                # Format: "Claude 3.5 Sonnet via OpenRouter"
-                model = trigger.ai_modifications.split(' via ')[0] if ' via ' in trigger.ai_modifications else 'Unknown'
-                
-                if model not in model_stats:
-                    model_stats[model] = {
-                        'total': 0,
-                        'successful': 0,
-                        'failed': 0
-                    }
-                
-                model_stats[model]['total'] += 1
-                if trigger.status == 'sent':
-                    model_stats[model]['successful'] += 1
-                else:
-                    model_stats[model]['failed'] += 1
-        
-        # Create metrics for each model
-        for model, stats in model_stats.items():
-            # Estimate cost based on model
-            cost_per_request = 0.001  # Default $0.001 per request
-            if 'Claude 3.5 Sonnet' in model:
-                cost_per_request = 0.003
-            elif 'Claude 3 Haiku' in model:
-                cost_per_request = 0.00025
-            elif 'GPT-4' in model:
-                cost_per_request = 0.01
-            elif 'GPT-3.5' in model:
-                cost_per_request = 0.0005
-            
-            estimated_cost = stats['total'] * cost_per_request
-            
-            metric, created = AIProviderMetrics.objects.update_or_create(
-                user=user,
-                date=yesterday,
-                model_used=model,
-                defaults={
-                    'provider': 'openrouter',
-                    'total_requests': stats['total'],
-                    'successful_requests': stats['successful'],
-                    'failed_requests': stats['failed'],
-                    'estimated_cost': estimated_cost,
-                }
-            )
-            
-            if created:
-                metrics_created += 1
+    )
+    
+    metrics = []
+    for row in rows:
+        model = row['model']
+        rate = _cost_per_1k_tokens(model)
+        tokens = (row['prompt_tokens'] or 0) + (row['completion_tokens'] or 0)
+        # Cache hits avoided a call of that day's average size (or ~1k tokens)
+        avg_tokens = tokens / row['total'] if row['total'] else 1000
+        
+        metrics.append(AIProviderMetrics(
+            user_id=row['user_id'],
+            date=day,
+            model_used=model,
+            provider='gemini' if model.startswith('gemini') else 'openrouter',
+            total_requests=row['total'],
+            successful_requests=row['successful'],
+            failed_requests=row['failed'],
+            avg_response_time=(row['avg_latency_ms'] or 0) / 1000,
+            total_tokens_used=tokens,
+            estimated_cost=round(tokens / 1000 * rate, 4),
+            cache_hits=row['cache_hits'],
+            estimated_cost_saved=round(row['cache_hits'] * avg_tokens / 1000 * rate, 4),
+        ))
+    
+    AIProviderMetrics.objects.bulk_create(
+        metrics,
+        update_conflicts=True,
+        unique_fields=['user', 'date', 'model_used'],
+        update_fields=[
+            'provider', 'total_requests', 'successful_requests', 'failed_requests',
+            'avg_response_time', 'total_tokens_used', 'estimated_cost',
+            'cache_hits', 'estimated_cost_saved', 'updated_at',
+        ],
+    )
     
-    logger.info(f"✅ Created {metrics_created} AI metrics for {yesterday}")
-    return f"Processed {users.count()} users, created {metrics_created} metrics"
+    logger.info(f"✅ Wrote {len(metrics)} AI metrics for {day}")
+    return f"Wrote {len(metrics)} metrics for {day}"
+
+
+def _cost_per_1k_tokens(model):
+    """USD per 1k tokens for a model id, based on settings.OPENROUTER_MODELS."""
+    for model_info in getattr(settings, 'OPENROUTER_MODELS', []):
+        if model in (model_info['id'], model_info['name']):
+            return model_info['cost_per_1k_tokens']
+    if model.startswith('gemini'):
+        return 0.0  # Gemini Flash free tier
+    return 0.001  # Default $0.001 per 1k tokens
 
 
 @shared_task
-def aggregate_contact_engagement():
+def aggregate_contact_engagement(start_date=None, end_date=None):
     """
     Aggregate contact engagement metrics
-    Runs daily
+    Runs daily (for yesterday); pass start_date/end_date ('YYYY-MM-DD',
+    inclusive) to backfill. Triggers are grouped by (account,
+    instagram_user_id), so a user who interacts with several accounts is
+    counted once per account's contact. Days the trigger archive has taken
+    are grouped from the archive files instead.
     """
-    from automations.models import Contact, AutomationTrigger
+    from django.db.models import Count, OuterRef, Q, Subquery
+    from automations.models import AutomationTrigger, Contact
+    from automations.services import trigger_archive
     from .models import ContactEngagement
     
-    yesterday = timezone.now().date() - timedelta(days=1)
-    
-    logger.info(f"Aggregating contact engagement for {yesterday}")
-    
-    contacts = Contact.objects.all()
-    engagement_created = 0
-    
-    for contact in contacts:
-        # Get triggers for this contact from yesterday
-        triggers = AutomationTrigger.objects.filter(
-            instagram_user_id=contact.instagram_user_id,
-            created_at__date=yesterday
-        )
-        
-        dms_count = triggers.filter(status='sent').count()
-        if dms_count == 0:
-            continue
-        
-        ai_enhanced = triggers.filter(was_ai_enhanced=True).count()
+    days = _days(start_date, end_date)
+    hot_since = trigger_archive.hot_since()
+    written = 0
+    
+    contact = Contact.objects.filter(
+        instagram_account_id=OuterRef('automation__instagram_account_id'),
+        instagram_user_id=OuterRef('instagram_user_id'),
+    ).values('id')[:1]
+    
+    for day in days:
+        logger.info(f"Aggregating contact engagement for {day}")
+        start, end = _day_bounds(day, day)
+        
+        if hot_since is not None and end <= hot_since:
+            rows = _archived_engagement(start, end)
+        else:
+            rows = (
+                AutomationTrigger.objects
+                .filter(created_at__gte=start, created_at__lt=end)
+                .values('automation__instagram_account_id', 'instagram_user_id')
+                .annotate(
+                    dms=Count('id', filter=Q(status='sent')),
+                    ai_enhanced=Count('id', filter=Q(was_ai_enhanced=True)),
+                    contact_id=Subquery(contact),
+                )
+                .filter(dms__gt=0, contact_id__isnull=False)
+                .order_by()
+                .iterator(chunk_size=UPSERT_BATCH_SIZE)
+            )
         
-        # Create engagement record
-        engagement, created = ContactEngagement.objects.update_or_create(
-            contact=contact,
-            date=yesterday,
-            defaults={
-                'dms_received': dms_count,
-                'ai_enhanced_dms': ai_enhanced,
-            }
+        engagement = (
+            ContactEngagement(
+                contact_id=row['contact_id'],
+                date=day,
+                dms_received=row['dms'],
+                ai_enhanced_dms=row['ai_enhanced'],
+            )
+            for row in rows
+        )
+        written += _bulk_upsert(
+            ContactEngagement, engagement,
+            unique_fields=['contact', 'date'],
+            update_fields=['dms_received', 'ai_enhanced_dms', 'updated_at'],
         )
-        
-        if created:
-            engagement_created += 1
     
-    logger.info(f"✅ Created {engagement_created} engagement records for {yesterday}")
-    return f"Processed {contacts.count()} contacts, created {engagement_created} records"
+    logger.info(f"✅ Wrote {written} engagement records for {days[0]} → {days[-1]}")
+    return f"Wrote {written} engagement records for {len(days)} day(s)"
+
+
+def _archived_engagement(start, end):
+    """aggregate_contact_engagement's grouped rows for an archived day, read from the archive."""
+    from collections import defaultdict
+    from automations.models import Automation, Contact
+    from automations.services import trigger_archive
+    
+    grouped = defaultdict(lambda: {'dms': 0, 'ai_enhanced': 0})
+    for row in trigger_archive.iter_archived(start, end):
+        counts = grouped[(row['automation_id'], row['instagram_user_id'])]
+        counts['dms'] += row['status'] == 'sent'
+        counts['ai_enhanced'] += bool(row['was_ai_enhanced'])
+    if not grouped:
+        return []
+    
+    accounts = {
+        str(pk): account_id
+        for pk, account_id in Automation.all_objects.filter(
+            id__in={automation_id for automation_id, _ in grouped}
+        ).values_list('id', 'instagram_account_id')
+    }
+    per_contact = defaultdict(lambda: {'dms': 0, 'ai_enhanced': 0})
+    for (automation_id, person), counts in grouped.items():
+        if automation_id in accounts:
+            key = (accounts[automation_id], person)
+            per_contact[key]['dms'] += counts['dms']
+            per_contact[key]['ai_enhanced'] += counts['ai_enhanced']
+    
+    contacts = {
+        (account_id, person): pk
+        for pk, account_id, person in Contact.objects.filter(
+            instagram_account_id__in={account_id for account_id, _ in per_contact},
+            instagram_user_id__in={person for _, person in per_contact},
+        ).values_list('id', 'instagram_account_id', 'instagram_user_id')
+    }
+    return [
+        {'contact_id': contacts[key], **counts}
+        for key, counts in per_contact.items()
+        if counts['dms'] > 0 and key in contacts
+    ]
 
 
 @shared_task
@@ -306,32 +527,22 @@ def log_system_event(user_id, event_type, description='', metadata=None, severit
 @shared_task
 def cleanup_old_analytics():
     """
-    Clean up old analytics data (older than 1 year)
-    Runs weekly
+    Delete expired analytics, tracking and log rows (see services/retention.py
+    for the tables and how long each is kept)
+    Runs weekly; deletes in throttled PK batches and resumes where a previous
+    run stopped
     """
-    from .models import DailyStats, AutomationPerformance, AIProviderMetrics, ContactEngagement, WebhookLog
-    
-    cutoff_date = timezone.now().date() - timedelta(days=365)
-    
-    logger.info(f"Cleaning up analytics data older than {cutoff_date}")
-    
-    # Delete old records
-    daily_stats_deleted = DailyStats.objects.filter(date__lt=cutoff_date).delete()[0]
-    performance_deleted = AutomationPerformance.objects.filter(date__lt=cutoff_date).delete()[0]
-    ai_metrics_deleted = AIProviderMetrics.objects.filter(date__lt=cutoff_date).delete()[0]
-    engagement_deleted = ContactEngagement.objects.filter(date__lt=cutoff_date).delete()[0]
-    webhook_deleted = WebhookLog.objects.filter(created_at__lt=timezone.now() - timedelta(days=90)).delete()[0]
-    
-    total_deleted = daily_stats_deleted + performance_deleted + ai_metrics_deleted + engagement_deleted + webhook_deleted
-    
+    from .services import retention
+
+    names = [name for name in retention.POLICIES if name != 'email_logs']  # payments runs its own
+    results = retention.purge_all(names)
+    total_deleted = sum(r['deleted'] for r in results.values())
+
     logger.info(f"✅ Cleaned up {total_deleted} old analytics records")
     return {
         'total_deleted': total_deleted,
-        'daily_stats': daily_stats_deleted,
-        'performance': performance_deleted,
-        'ai_metrics': ai_metrics_deleted,
-        'engagement': engagement_deleted,
-        'webhooks': webhook_deleted
+        **{name: r['deleted'] for name, r in results.items()},
+        'rates': {name: r['rows_per_sec'] for name, r in results.items()},
     }
 
 
@@ -490,119 +701,24 @@ app.conf.beat_schedule = {
 def send_weekly_reports():
     """
     Send weekly reports to all users
-    Runs every Monday at 9am
+    Runs every Monday at 9am; users are sharded into send_weekly_report_chunk tasks
     """
-    from accounts.models import User
-    from automations.models import Automation, AutomationTrigger
-    from django.db.models import Sum, Count, Q
+    from analytics.services import weekly_reports
     
-    users = User.objects.filter(is_active=True)
-    reports_sent = 0
+    end_date = timezone.localdate()
+    user_ids = weekly_reports.recipients()
+    chunks = weekly_reports.chunked(user_ids, getattr(settings, 'WEEKLY_REPORT_CHUNK_SIZE', weekly_reports.DEFAULT_CHUNK_SIZE))
+    weekly_reports.start_run(end_date, len(chunks))
     
-    for user in users:
-        # Check if user wants weekly reports
-        if not user.email_preferences.get('weekly_reports', True):
-            continue
-        
-        try:
-            # Calculate this week's stats
-            end_date = timezone.now().date()
-            start_date = end_date - timedelta(days=7)
-            last_week_start = start_date - timedelta(days=7)
-            
-            triggers_this_week = AutomationTrigger.objects.filter(
-                automation__instagram_account__user=user,
-                created_at__date__gte=start_date,
-                created_at__date__lte=end_date
-            )
-            
-            triggers_last_week = AutomationTrigger.objects.filter(
-                automation__instagram_account__user=user,
-                created_at__date__gte=last_week_start,
-                created_at__date__lt=start_date
-            )
-            
-            # Calculate metrics
-            total_triggers = triggers_this_week.count()
-            total_dms_sent = triggers_this_week.filter(status='sent').count()
-            ai_enhanced_count = triggers_this_week.filter(was_ai_enhanced=True).count()
-            
-            success_rate = (total_dms_sent / total_triggers * 100) if total_triggers > 0 else 0
-            ai_enhancement_rate = (ai_enhanced_count / total_triggers * 100) if total_triggers > 0 else 0
-            
-            # Calculate changes
-            last_week_dms = triggers_last_week.filter(status='sent').count()
-            last_week_triggers = triggers_last_week.count()
-            
-            dms_change = ((total_dms_sent - last_week_dms) / last_week_dms * 100) if last_week_dms > 0 else 0
-            triggers_change = ((total_triggers - last_week_triggers) / last_week_triggers * 100) if last_week_triggers > 0 else 0
-            
-            last_week_success = (triggers_last_week.filter(status='sent').count() / last_week_triggers * 100) if last_week_triggers > 0 else 0
-            success_change = success_rate - last_week_success
-            
-            # Get top automations
-            automations = Automation.objects.filter(
-                instagram_account__user=user
-            ).annotate(
-                weekly_triggers=Count(
-                    'triggers',
-                    filter=Q(triggers__created_at__date__gte=start_date)
-                ),
-                weekly_dms=Count(
-                    'triggers',
-                    filter=Q(triggers__created_at__date__gte=start_date, triggers__status='sent')
-                )
-            ).order_by('-weekly_dms')[:5]
-            
-            # Prepare context
-            context = {
-                'user': user,
-                'start_date': start_date,
-                'end_date': end_date,
-                'total_triggers': total_triggers,
-                'total_dms_sent': total_dms_sent,
-                'success_rate': round(success_rate, 1),
-                'ai_enhanced_count': ai_enhanced_count,
-                'ai_enhancement_rate': round(ai_enhancement_rate, 1),
-                'dms_change': round(dms_change, 1),
-                'triggers_change': round(triggers_change, 1),
-                'success_change': round(success_change, 1),
-                'dms_change_class': 'positive' if dms_change >= 0 else 'negative',
-                'triggers_change_class': 'positive' if triggers_change >= 0 else 'negative',
-                'success_change_class': 'positive' if success_change >= 0 else 'negative',
-                'top_automations': automations,
-                'dashboard_url': f"{settings.FRONTEND_URL}/dashboard",
-                'unsubscribe_url': f"{settings.FRONTEND_URL}/settings/notifications",
-                'settings_url': f"{settings.FRONTEND_URL}/settings/notifications",
-            }
-            
-            # Send email
-            send_report_email(user.email, context)
-            reports_sent += 1
-            
-            logger.info(f"✓ Weekly report sent to {user.email}")
-            
-        except Exception as e:
-            logger.error(f"✗ Failed to send report to {user.email}: {str(e)}")
-    
-    return f"Sent {reports_sent} weekly reports"
-
-
-def send_report_email(to_email, context):
-    """
-    Send the actual email
-    """
-    subject = f"📊 Your Weekly Report - {context['start_date'].strftime('%b %d')}"
+    for chunk in chunks:
+        send_weekly_report_chunk.apply_async(args=[chunk, end_date.isoformat()], queue='system')
     
-    # Render HTML template
-    html_content = render_to_string('emails/weekly_report.html', context)
-    text_content = strip_tags(html_content)
+    return f"Queued {len(user_ids)} weekly reports in {len(chunks)} chunk(s)"
+
+
+@shared_task(soft_time_limit=900)
+def send_weekly_report_chunk(user_ids, end_date):
+    """Compute, render and send one chunk of weekly reports over a single SMTP connection"""
+    from analytics.services import weekly_reports
     
-    email = EmailMultiAlternatives(
-        subject=subject,
-        body=text_content,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=[to_email]
-    )
-    email.attach_alternative(html_content, "text/html")
-    email.send()
\ No newline at end of file
+    return weekly_reports.send_chunk(user_ids, _parse_day(end_date, timezone.localdate()))
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from analytics.models import AICallTelemetry, AIProviderMetrics
+from analytics.tasks import aggregate_ai_metrics
+from automations.services import ai_telemetry
+from core.testing import CoffeeShopMixin
+
+
+class AIMetricsRollupTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        self.user = self.create_user()
+        self.day = timezone.now().date() - timedelta(days=1)
+        self.noon = timezone.make_aware(datetime.combine(self.day, datetime.min.time())) + timedelta(hours=12)
+
+    def _call(self, model='anthropic/claude-3.5-sonnet', **fields):
+        defaults = dict(
+            user_id=self.user.id, provider='openrouter', model=model,
+            prompt_tokens=300, completion_tokens=200, latency_ms=1200,
+            status_code=200, success=True, created_at=self.noon,
+        )
+        defaults.update(fields)
+        return AICallTelemetry(**defaults)
+
+    def test_rollup_from_telemetry(self):
+        """Counts, tokens, latency and cost come straight from the telemetry rows"""
+        AICallTelemetry.objects.bulk_create([
+            self._call(),
+            self._call(latency_ms=800),
+            self._call(success=False, status_code=429, prompt_tokens=0, completion_tokens=0, latency_ms=100),
+            self._call(cache_hit=True, prompt_tokens=0, completion_tokens=0, latency_ms=0),
+            self._call(model='gemini-1.5-flash', provider='gemini'),
+            # Outside the day
+            self._call(created_at=self.noon + timedelta(days=1)),
+        ])
+
+        aggregate_ai_metrics(self.day.isoformat())
+        # Re-running the day updates in place
+        aggregate_ai_metrics(self.day.isoformat())
+
+        metric = AIProviderMetrics.objects.get(user=self.user, date=self.day, model_used='anthropic/claude-3.5-sonnet')
+        self.assertEqual(metric.total_requests, 3)
+        self.assertEqual(metric.successful_requests, 2)
+        self.assertEqual(metric.failed_requests, 1)
+        self.assertEqual(metric.cache_hits, 1)
+        self.assertEqual(metric.total_tokens_used, 1000)
+        self.assertAlmostEqual(metric.avg_response_time, 0.7)
+        # 1000 tokens at $0.003/1k
+        self.assertEqual(metric.estimated_cost, Decimal('0.0030'))
+
+        gemini = AIProviderMetrics.objects.get(user=self.user, model_used='gemini-1.5-flash')
+        self.assertEqual(gemini.provider, 'gemini')
+        self.assertEqual(AIProviderMetrics.objects.count(), 2)
+
+    def test_records_are_buffered_and_bulk_written(self):
+        """Calls are attributed via bind() and written in one batch on flush"""
+        # Start from an empty buffer with a fresh flush timer
+        ai_telemetry.flush()
+
+        async def emit():
+            ai_telemetry.bind(user_id=self.user.id)
+            for _ in range(3):
+                await ai_telemetry.arecord_call(
+                    'openrouter', 'anthropic/claude-3-haiku',
+                    {'success': True, 'usage': {'prompt_tokens': 10, 'completion_tokens': 5}, 'key_slot': 'abc123'},
+                    0.25,
+                )
+
+        asyncio.run(emit())
+        self.assertEqual(AICallTelemetry.objects.count(), 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(ai_telemetry.flush(), 3)
+        record = AICallTelemetry.objects.first()
+        self.assertEqual(record.user_id, self.user.id)
+        self.assertEqual(record.key_slot, 'abc123')
+        self.assertEqual(record.latency_ms, 250)
+        self.assertEqual(record.completion_tokens, 5)
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from analytics.models import DailyStats
+from analytics.tasks import aggregate_daily_stats
+from automations.models import AutomationTrigger
+from core.testing import CoffeeShopMixin
+
+
+class AggregateDailyStatsTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_coffee_shop(DmMessage='Here is our menu!')
+        # No automations, no triggers → no row
+        self.create_user('idle')
+        self.create_automation(self.account, name='Paused', trigger_keywords=['price'], DmMessage='Prices',
+                               is_active=False)
+        self.day = timezone.now().date() - timedelta(days=3)
+
+    def _trigger(self, day, status, ai=False, hour=12):
+        trigger = AutomationTrigger.objects.create(
+            automation=self.automation, instagram_user_id='42', status=status, was_ai_enhanced=ai,
+        )
+        at = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=hour)
+        AutomationTrigger.objects.filter(pk=trigger.pk).update(created_at=at)
+
+    def test_backfill_range_in_constant_queries(self):
+        next_day = self.day + timedelta(days=1)
+        self._trigger(self.day, 'sent', ai=True, hour=0)
+        self._trigger(self.day, 'sent', hour=23)
+        self._trigger(self.day, 'failed')
+        self._trigger(self.day, 'skipped')
+        self._trigger(next_day, 'sent')
+        # Outside the range
+        self._trigger(next_day + timedelta(days=1), 'sent')
+
+        # Archive boundary (then cached), reconcile hourly rollups (6, incl. savepoint
+        # and the sketch pass), hourly sums, hourly sketches, automations, upsert
+        with self.assertNumQueries(11):
+            aggregate_daily_stats(self.day.isoformat(), next_day.isoformat())
+        # Re-running updates in place
+        aggregate_daily_stats(self.day.isoformat(), next_day.isoformat())
+
+        self.assertEqual(DailyStats.objects.count(), 2)
+        stats = DailyStats.objects.get(user=self.user, date=self.day)
+        self.assertEqual(stats.total_automations, 2)
+        self.assertEqual(stats.active_automations, 1)
+        self.assertEqual(stats.total_triggers, 4)
+        self.assertEqual(stats.successful_triggers, 2)
+        self.assertEqual(stats.failed_triggers, 1)
+        self.assertEqual(stats.skipped_triggers, 1)
+        self.assertEqual(stats.total_dms_sent, 2)
+        self.assertEqual(stats.ai_enhanced_dms, 1)
+        self.assertEqual(stats.success_rate, 50.0)
+        self.assertEqual(stats.ai_enhancement_rate, 25.0)
+
+        self.assertEqual(DailyStats.objects.get(user=self.user, date=next_day).total_triggers, 1)
+
+    def test_day_without_triggers_still_records_automations(self):
+        aggregate_daily_stats(self.day.isoformat())
+
+        stats = DailyStats.objects.get(user=self.user, date=self.day)
+        self.assertEqual(stats.total_triggers, 0)
+        self.assertEqual(stats.total_automations, 2)
+        self.assertEqual(stats.success_rate, 0)
+
+    def test_backfill_keeps_automation_counts_of_past_days(self):
+        aggregate_daily_stats(self.day.isoformat())
+        DailyStats.objects.filter(date=self.day).update(total_automations=5, active_automations=4)
+        self.create_automation(self.account, name='Price list')
+
+        aggregate_daily_stats(self.day.isoformat())
+        stats = DailyStats.objects.get(user=self.user, date=self.day)
+        self.assertEqual((stats.total_automations, stats.active_automations), (5, 4))
+
+        # The nightly run (yesterday) records the current snapshot
+        aggregate_daily_stats()
+        stats = DailyStats.objects.get(user=self.user, date=timezone.now().date() - timedelta(days=1))
+        self.assertEqual((stats.total_automations, stats.active_automations), (3, 2))
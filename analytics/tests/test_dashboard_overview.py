@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from automations.models import AutomationTrigger
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DashboardOverviewTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_coffee_shop()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _trigger(self, days_ago, status, ai=False):
+        trigger = AutomationTrigger.objects.create(
+            automation=self.automation, instagram_user_id='42', status=status, was_ai_enhanced=ai,
+        )
+        day = timezone.now().date() - timedelta(days=days_ago)
+        at = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=1)
+        AutomationTrigger.objects.filter(pk=trigger.pk).update(created_at=min(at, timezone.now()))
+
+    def test_overview_queries_do_not_grow_with_period(self):
+        self._trigger(0, 'sent', ai=True)
+        self._trigger(0, 'failed')
+        self._trigger(5, 'sent')
+        self._trigger(60, 'sent')
+
+        # Automation totals + one grouped trigger query, whatever the period
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/analytics/dashboard/overview/?period=90d')
+        self.assertEqual(response.status_code, 200)
+
+        data = response.data
+        self.assertEqual(len(data['daily_breakdown']), 90)
+        self.assertEqual(data['total_triggers'], 4)
+        self.assertEqual(data['today_triggers'], 2)
+        self.assertEqual(data['success_rate'], 75.0)
+        self.assertEqual(data['ai_enhancement_rate'], 25.0)
+        self.assertEqual(data['total_automations'], 1)
+        today = data['daily_breakdown'][-1]
+        self.assertEqual((today['triggers'], today['dms_sent'], today['ai_enhanced']), (2, 1, 1))
+        self.assertEqual(data['daily_breakdown'][-2]['triggers'], 0)
+
+        # Served from cache
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/analytics/dashboard/overview/?period=90d')
+        self.assertEqual(cached.data, data)
+
+    def test_trigger_activity_invalidates_cached_overview(self):
+        self.client.get('/api/analytics/dashboard/overview/?period=7d')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AutomationTrigger.objects.create(
+                automation=self.automation, instagram_user_id='42', status='pending',
+            )
+
+        response = self.client.get('/api/analytics/dashboard/overview/?period=7d')
+        self.assertEqual(response.data['total_triggers'], 1)
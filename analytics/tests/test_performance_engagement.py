@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from analytics.models import AutomationPerformance, ContactEngagement
+from analytics.tasks import aggregate_automation_performance, aggregate_contact_engagement
+from automations.models import AutomationTrigger, Contact
+from core.testing import CoffeeShopMixin
+
+
+class PerformanceAndEngagementRollupTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        user = self.create_user()
+        self.accounts = [self.create_account(user, ig_id, f'shop_{ig_id}') for ig_id in ('1789', '1790')]
+        self.automations = [self.create_automation(account) for account in self.accounts]
+        # The same Instagram user is a contact of both accounts
+        self.contacts = [
+            Contact.objects.create(instagram_account=account, instagram_user_id='42', instagram_username='fan')
+            for account in self.accounts
+        ]
+        self.day = timezone.now().date() - timedelta(days=2)
+
+    def _trigger(self, automation, status, day=None, ai=False):
+        trigger = AutomationTrigger.objects.create(
+            automation=automation, instagram_user_id='42', status=status, was_ai_enhanced=ai,
+        )
+        at = timezone.make_aware(datetime.combine(day or self.day, datetime.min.time())) + timedelta(hours=12)
+        AutomationTrigger.objects.filter(pk=trigger.pk).update(created_at=at)
+
+    def test_performance_grouped_per_automation(self):
+        first, second = self.automations
+        self._trigger(first, 'sent', ai=True)
+        self._trigger(first, 'failed')
+        self._trigger(second, 'skipped')
+        self._trigger(first, 'sent', day=self.day + timedelta(days=1))
+        # Clicks land during the day, before the day's sends are counted
+        AutomationPerformance.objects.create(automation=first, date=self.day, click_count=1)
+
+        # Archive boundary once (then cached); per day: reconcile (6, incl. savepoint
+        # and the sketch pass), hourly sketches, one grouped query, one upsert and
+        # the click_rate update
+        with self.assertNumQueries(21):
+            aggregate_automation_performance(self.day.isoformat(), (self.day + timedelta(days=1)).isoformat())
+        aggregate_automation_performance(self.day.isoformat())
+
+        perf = AutomationPerformance.objects.get(automation=first, date=self.day)
+        self.assertEqual(perf.triggers_count, 2)
+        self.assertEqual(perf.successful_count, 1)
+        self.assertEqual(perf.failed_count, 1)
+        self.assertEqual(perf.success_rate, 50.0)
+        self.assertEqual(perf.ai_enhanced_count, 1)
+        self.assertEqual((perf.click_count, perf.click_rate), (1, 100.0))
+        self.assertEqual(AutomationPerformance.objects.get(automation=second, date=self.day).skipped_count, 1)
+        self.assertEqual(AutomationPerformance.objects.count(), 3)
+
+    def test_engagement_scoped_to_account(self):
+        first, second = self.automations
+        self._trigger(first, 'sent', ai=True)
+        self._trigger(first, 'sent')
+        self._trigger(second, 'sent')
+        # No DM sent on this day → no row
+        self._trigger(second, 'failed', day=self.day + timedelta(days=1))
+
+        aggregate_contact_engagement(self.day.isoformat(), (self.day + timedelta(days=1)).isoformat())
+
+        self.assertEqual(ContactEngagement.objects.count(), 2)
+        first_contact = ContactEngagement.objects.get(contact=self.contacts[0], date=self.day)
+        self.assertEqual(first_contact.dms_received, 2)
+        self.assertEqual(first_contact.ai_enhanced_dms, 1)
+        self.assertEqual(ContactEngagement.objects.get(contact=self.contacts[1], date=self.day).dms_received, 1)
@@ -0,0 +1,66 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from analytics.models import AICallTelemetry, SystemEvent
+from analytics.services import retention
+from analytics.tasks import cleanup_old_analytics
+from core.testing import TEST_CACHES
+
+
+@override_settings(CACHES=TEST_CACHES, RETENTION_BATCH_SLEEP=0)
+class RetentionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        AICallTelemetry.objects.bulk_create(
+            [AICallTelemetry(provider='openrouter', model='m', created_at=now - timedelta(days=120)) for _ in range(10)]
+            + [AICallTelemetry(provider='openrouter', model='m', created_at=now - timedelta(days=5)) for _ in range(3)]
+        )
+
+    def test_deletes_expired_rows_in_batches(self):
+        """Only rows past the retention window go, one DELETE per batch"""
+        with self.assertNumQueries(8):  # 4 batches x (select PKs + delete)
+            result = retention.purge('ai_telemetry', batch_size=3)
+
+        self.assertEqual(result['deleted'], 10)
+        self.assertTrue(result['complete'])
+        self.assertIn('rows_per_sec', result)
+        self.assertEqual(AICallTelemetry.objects.count(), 3)
+        self.assertIsNone(cache.get(retention._checkpoint_key('ai_telemetry')))
+
+    def test_resumes_from_checkpoint(self):
+        """A run that hits its time budget leaves a checkpoint the next run continues from"""
+        with mock.patch.object(retention.time, 'monotonic', side_effect=[0, 1000, 1000]):
+            first = retention.purge('ai_telemetry', batch_size=4, max_seconds=60)
+        self.assertEqual(first['deleted'], 4)
+        self.assertFalse(first['complete'])
+
+        checkpoint = cache.get(retention._checkpoint_key('ai_telemetry'))
+        self.assertIsNotNone(checkpoint)
+        self.assertFalse(AICallTelemetry.objects.filter(
+            pk__lte=checkpoint, created_at__lt=timezone.now() - timedelta(days=90)
+        ).exists())
+
+        second = retention.purge('ai_telemetry', batch_size=4)
+        self.assertEqual(second['deleted'], 6)
+        self.assertTrue(second['complete'])
+        self.assertEqual(AICallTelemetry.objects.count(), 3)
+
+    @override_settings(RETENTION_DAYS={'system_events': 30})
+    def test_cleanup_task_covers_all_tables(self):
+        """The weekly task purges every analytics policy and honours per-table overrides"""
+        old = SystemEvent.objects.create(event_type='rate_limit_hit')
+        SystemEvent.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=45))
+        SystemEvent.objects.create(event_type='rate_limit_hit')
+
+        result = cleanup_old_analytics()
+
+        self.assertEqual(result['ai_telemetry'], 10)
+        self.assertEqual(result['system_events'], 1)
+        self.assertEqual(result['total_deleted'], 11)
+        self.assertNotIn('email_logs', result)
+        self.assertEqual(SystemEvent.objects.count(), 1)
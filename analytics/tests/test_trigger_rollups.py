@@ -0,0 +1,96 @@
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from analytics.models import AutomationPerformance, DailyStats, HourlyTriggerRollup
+from analytics.services import trigger_rollups
+from analytics.tasks import aggregate_nightly_rollups
+from automations.models import AutomationTrigger
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TriggerRollupsTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_coffee_shop()
+
+    def _create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return AutomationTrigger.objects.create(
+                automation=self.automation, instagram_user_id='42', status='pending',
+            )
+
+    def _transition(self, trigger, status, ai=None):
+        # Reload like the DM task does, so the snapshot comes from the DB
+        trigger = AutomationTrigger.objects.get(pk=trigger.pk)
+        trigger.status = status
+        if ai is not None:
+            trigger.was_ai_enhanced = ai
+        with self.captureOnCommitCallbacks(execute=True):
+            trigger.save()
+        return trigger
+
+    def _flush(self):
+        # Two minutes ahead so the current minute counts as finished
+        return trigger_rollups.flush(now=time.time() + 120)
+
+    def test_transitions_flush_into_hourly_rows(self):
+        first, second = self._create(), self._create()
+        self._transition(first, 'processing')
+        self._transition(first, 'sent', ai=True)
+        failed = self._transition(second, 'failed')
+
+        self.assertEqual(HourlyTriggerRollup.objects.count(), 0)
+        self.assertEqual(self._flush(), 1)
+        # Already applied — a second flush is a no-op
+        self.assertEqual(self._flush(), 0)
+
+        # A minute later a retry turns the failure into a send
+        later = time.time() + 60
+        with patch('analytics.services.trigger_rollups.time') as clock:
+            clock.time.return_value = later
+            self._transition(failed, 'sent')
+        self.assertEqual(trigger_rollups.flush(now=later + 120), 1)
+
+        row = HourlyTriggerRollup.objects.get(automation=self.automation)
+        self.assertEqual(row.user_id, self.user.id)
+        self.assertEqual(row.hour, first.created_at.replace(minute=0, second=0, microsecond=0))
+        self.assertEqual(
+            (row.triggers, row.sent, row.failed, row.skipped, row.ai_enhanced),
+            (2, 2, 0, 0, 1),
+        )
+        self.assertEqual(trigger_rollups.today_totals(self.user.id)['sent'], 2)
+
+    def test_reconcile_repairs_lost_deltas(self):
+        trigger = self._create()
+        self._flush()
+        # Bulk updates bypass signals, so the delta is lost
+        AutomationTrigger.objects.filter(pk=trigger.pk).update(status='skipped')
+
+        hour = trigger.created_at.replace(minute=0, second=0, microsecond=0)
+        trigger_rollups.reconcile(hour, hour + timedelta(hours=1))
+
+        row = HourlyTriggerRollup.objects.get(automation=self.automation)
+        self.assertEqual((row.triggers, row.skipped), (1, 1))
+
+        AutomationTrigger.objects.all().delete()
+        trigger_rollups.reconcile(hour, hour + timedelta(hours=1))
+        self.assertFalse(HourlyTriggerRollup.objects.exists())
+
+    def test_nightly_step_reconciles_each_day_once(self):
+        trigger = self._create()
+        # Yesterday's trigger, written without a delta: only reconcile sees it
+        yesterday = trigger.created_at - timedelta(days=1)
+        AutomationTrigger.objects.filter(pk=trigger.pk).update(created_at=yesterday, status='sent')
+
+        with patch.object(trigger_rollups, 'reconcile', wraps=trigger_rollups.reconcile) as reconcile:
+            aggregate_nightly_rollups(timezone.localtime(yesterday).date().isoformat())
+        reconcile.assert_called_once()
+
+        self.assertEqual(DailyStats.objects.get(user=self.user).successful_triggers, 1)
+        self.assertEqual(AutomationPerformance.objects.get(automation=self.automation).successful_count, 1)
@@ -0,0 +1,118 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from analytics.models import AutomationPerformance, DailyStats, HourlyTriggerRollup
+from analytics.services import trigger_rollups
+from analytics.services.hll import HyperLogLog, merge_bytes, overlap
+from analytics.tasks import aggregate_automation_performance, aggregate_daily_stats
+from automations.models import AutomationTrigger
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+
+class HyperLogLogTest(SimpleTestCase):
+    def test_estimates_and_merges(self):
+        a = HyperLogLog().update(f'user{i}' for i in range(0, 6000))
+        b = HyperLogLog().update(f'user{i}' for i in range(4000, 10000))
+
+        self.assertAlmostEqual(a.count(), 6000, delta=6000 * 0.05)
+        self.assertAlmostEqual(HyperLogLog.union([a, b]).count(), 10000, delta=10000 * 0.05)
+        self.assertAlmostEqual(overlap(a, b), 2000, delta=10000 * 0.05)
+        # Adding the same people again changes nothing
+        self.assertEqual(HyperLogLog(a.registers).update(f'user{i}' for i in range(100)).count(), a.count())
+
+    def test_serialization(self):
+        small = HyperLogLog().update(['42', '43', '42'])
+        self.assertEqual(small.count(), 2)
+        self.assertLess(len(small.to_bytes()), 10)  # sparse
+        self.assertEqual(HyperLogLog.from_bytes(small.to_bytes()).count(), 2)
+        self.assertEqual(HyperLogLog().to_bytes(), b'')
+
+        big = HyperLogLog().update(range(20000))
+        self.assertEqual(HyperLogLog.from_bytes(big.to_bytes()).registers, big.registers)
+        self.assertEqual(HyperLogLog.from_bytes(merge_bytes(small.to_bytes(), big.to_bytes())).count(),
+                         HyperLogLog.union([small, big]).count())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UniquePeopleTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_coffee_shop()
+        self.automations = [self.automation, self.create_automation(self.account, name='Price list')]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _trigger(self, automation, person, status, days_ago):
+        trigger = AutomationTrigger.objects.create(automation=automation, instagram_user_id=person, status=status)
+        day = timezone.now().date() - timedelta(days=days_ago)
+        at = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+        AutomationTrigger.objects.filter(pk=trigger.pk).update(created_at=at)
+
+    def test_live_triggers_feed_hourly_sketches(self):
+        automation = self.automations[0]
+        for person in ('1', '2', '1'):
+            with self.captureOnCommitCallbacks(execute=True):
+                trigger = AutomationTrigger.objects.create(
+                    automation=automation, instagram_user_id=person, status='pending',
+                )
+        trigger = AutomationTrigger.objects.get(pk=trigger.pk)
+        trigger.status = 'sent'
+        with self.captureOnCommitCallbacks(execute=True):
+            trigger.save()
+
+        trigger_rollups.flush(now=time.time() + 120)
+
+        row = HourlyTriggerRollup.objects.get(automation=automation)
+        self.assertEqual(row.triggers, 3)
+        self.assertEqual(HyperLogLog.from_bytes(row.commenters_sketch).count(), 2)
+        self.assertEqual(HyperLogLog.from_bytes(row.recipients_sketch).count(), 1)
+
+        # Today's numbers come straight from the hourly sketches
+        response = self.client.get('/api/analytics/daily-stats/uniques/?days=7')
+        self.assertEqual((response.data['unique_commenters'], response.data['unique_recipients']), (2, 1))
+
+    def test_daily_sketches_merge_across_days_and_automations(self):
+        menu, prices = self.automations
+        self._trigger(menu, '1', 'sent', days_ago=2)
+        self._trigger(menu, '2', 'failed', days_ago=2)
+        self._trigger(menu, '1', 'sent', days_ago=1)
+        self._trigger(menu, '3', 'sent', days_ago=1)
+        self._trigger(prices, '1', 'sent', days_ago=1)
+        self._trigger(prices, '4', 'skipped', days_ago=1)
+
+        first_day = (timezone.now().date() - timedelta(days=2)).isoformat()
+        last_day = (timezone.now().date() - timedelta(days=1)).isoformat()
+        aggregate_automation_performance(first_day, last_day)
+        aggregate_daily_stats(first_day, last_day, reconcile=False)
+
+        older = AutomationPerformance.objects.get(automation=menu, date=first_day)
+        self.assertEqual((older.unique_commenters, older.unique_recipients), (2, 1))
+        stats = DailyStats.objects.get(user=self.user, date=last_day)
+        self.assertEqual((stats.unique_commenters, stats.unique_recipients), (3, 2))
+
+        # Person 1 on both days and in both automations is counted once
+        response = self.client.get(
+            f'/api/analytics/automation-performance/uniques/?days=7&automation={menu.id}&automation={prices.id}'
+        )
+        self.assertEqual(response.status_code, 200)
+        per_automation = {row['automation']: row for row in response.data['automations']}
+        self.assertEqual(per_automation[str(menu.id)]['unique_commenters'], 3)
+        self.assertEqual(per_automation[str(prices.id)]['unique_commenters'], 2)
+        self.assertEqual(response.data['total'], {'unique_commenters': 4, 'unique_recipients': 2})
+        self.assertEqual(response.data['overlap'][0]['unique_commenters'], 1)
+
+        response = self.client.get('/api/analytics/daily-stats/uniques/?days=7')
+        self.assertEqual((response.data['unique_commenters'], response.data['unique_recipients']), (4, 2))
+        self.assertEqual(response.data['by_account'][0]['unique_commenters'], 4)
+
+        # days=2 is yesterday and today: person 2 (two days ago) drops out
+        response = self.client.get(f'/api/analytics/automation-performance/uniques/?days=2&automation={menu.id}')
+        self.assertEqual(response.data['automations'][0]['unique_commenters'], 2)
+
+        response = self.client.get('/api/analytics/automation-performance/uniques/?automation=not-a-uuid')
+        self.assertEqual(response.status_code, 400)
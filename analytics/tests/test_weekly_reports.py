@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from analytics.models import HourlyTriggerRollup
+from analytics.services import weekly_reports
+from analytics.tasks import send_weekly_report_chunk, send_weekly_reports
+from core.testing import TEST_CACHES, CoffeeShopMixin
+from payments.models import EmailLog
+
+
+def _run_now(args, **kwargs):
+    send_weekly_report_chunk(*args)
+
+
+@override_settings(CACHES=TEST_CACHES, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   WEEKLY_REPORT_CHUNK_SIZE=2)
+class WeeklyReportTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        self.users = []
+        for i, wants_reports in enumerate((True, True, True, False)):
+            user = self.create_user(f'shop{i}')
+            user.email_preferences = {'weekly_reports': wants_reports}
+            user.save(update_fields=['email_preferences'])
+            self.users.append(user)
+
+        account = self.create_account(self.users[0], username='shop0')
+        self.menu, self.prices = (
+            self.create_automation(account, name=name, DmMessage='Hi') for name in ('Menu link', 'Price list')
+        )
+        self._rollup(self.menu, days_ago=2, triggers=10, sent=8, ai_enhanced=4)
+        self._rollup(self.prices, days_ago=1, triggers=5, sent=5)
+        self._rollup(self.menu, days_ago=10, triggers=4, sent=4)
+
+    def _rollup(self, automation, days_ago, **counts):
+        day = self.today - timedelta(days=days_ago)
+        hour = timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=12)
+        HourlyTriggerRollup.objects.create(user=self.users[0], automation=automation, hour=hour, **counts)
+
+    def test_metrics_come_from_grouped_rollup_queries(self):
+        ids = [user.pk for user in self.users]
+        with self.assertNumQueries(2):
+            metrics = weekly_reports.weekly_metrics(ids, self.today)
+
+        shop = metrics[str(self.users[0].pk)]
+        self.assertEqual(
+            (shop['week_triggers'], shop['week_sent'], shop['week_ai_enhanced'], shop['last_triggers'], shop['last_sent']),
+            (15, 13, 4, 4, 4),
+        )
+        self.assertEqual([a['name'] for a in shop['top_automations']], ['Menu link', 'Price list'])
+        self.assertNotIn(str(self.users[1].pk), metrics)
+
+        context = weekly_reports.report_context(self.users[0], shop, self.today)
+        self.assertEqual((context['dms_change'], context['triggers_change']), (225.0, 275.0))
+
+    def test_chunks_send_over_one_connection_and_bulk_log(self):
+        with mock.patch.object(send_weekly_report_chunk, 'apply_async', side_effect=_run_now) as apply_async, \
+                mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open_connection:
+            send_weekly_reports()
+
+        # 3 opted-in users in chunks of 2; one connection per chunk
+        self.assertEqual(apply_async.call_count, 2)
+        self.assertEqual(open_connection.call_count, 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['shop0@gmail.com', 'shop1@gmail.com', 'shop2@gmail.com'])
+
+        report = next(m for m in mail.outbox if m.to == ['shop0@gmail.com'])
+        html = report.alternatives[0][0]
+        self.assertIn('Menu link', html)
+        self.assertIn('13', html)
+
+        logs = EmailLog.objects.filter(email_type='weekly_report')
+        self.assertEqual(logs.count(), 3)
+        self.assertEqual(set(logs.values_list('status', flat=True)), {'sent'})
+
+    def test_failed_send_is_logged_and_the_rest_still_go_out(self):
+        calls = []
+
+        def flaky(messages):
+            calls.append(messages[0].to[0])
+            if len(calls) == 1:
+                raise ConnectionError('SMTP went away')
+            return 1
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=flaky):
+            result = weekly_reports.send_chunk([self.users[0].pk, self.users[1].pk], self.today)
+
+        self.assertEqual((result['sent'], result['failed']), (1, 1))
+        failed = EmailLog.objects.get(status='failed')
+        self.assertEqual(failed.recipient, calls[0])
+        self.assertEqual(failed.error_message, 'SMTP went away')
@@ -12,6 +12,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.db.models import Sum, Avg, Count, Q, F
 from django.utils import timezone
 from datetime import timedelta
+import uuid
 
 from .models import (
     DailyStats,
@@ -34,6 +35,13 @@ from .serializers import (
 )
 
 
+def _uniques_period(request):
+    """(days, first_day, last_day) for ?days=N: the N days ending today, both ends inclusive."""
+    days = max(1, int(request.query_params.get('days', 30)))
+    last_day = timezone.localdate()
+    return days, last_day - timedelta(days=days - 1), last_day
+
+
 class DailyStatsViewSet(viewsets.ReadOnlyModelViewSet):
     """
     View daily statistics
@@ -62,6 +70,42 @@ class DailyStatsViewSet(viewsets.ReadOnlyModelViewSet):
         
         serializer = self.get_serializer(stats, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def uniques(self, request):
+        """
+        Unique commenters and DM recipients over a period, overall and per Instagram account
+        GET /api/analytics/daily-stats/uniques/?days=30
+        """
+        from automations.models import Automation
+        from .services import uniques
+        
+        days, first_day, last_day = _uniques_period(request)
+        
+        automations = Automation.objects.filter(instagram_account__user=request.user).values_list(
+            'id', 'instagram_account_id', 'instagram_account__username'
+        )
+        accounts = {}
+        for automation_id, account_id, username in automations:
+            accounts.setdefault(account_id, {'username': username, 'automations': []})['automations'].append(automation_id)
+        
+        sketches = uniques.automation_sketches(
+            [a for account in accounts.values() for a in account['automations']], first_day, last_day
+        )
+        by_account = [
+            {
+                'instagram_account': str(account_id),
+                'username': account['username'],
+                **uniques.counts(uniques.union(sketches[a] for a in account['automations'] if a in sketches)),
+            }
+            for account_id, account in accounts.items()
+        ]
+        
+        return Response({
+            'period': f'{days}d',
+            **uniques.counts(uniques.user_sketches(request.user.id, first_day, last_day)),
+            'by_account': by_account,
+        })
 
 
 class AutomationPerformanceViewSet(viewsets.ReadOnlyModelViewSet):
@@ -72,11 +116,57 @@ class AutomationPerformanceViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AutomationPerformanceSerializer
     permission_classes = [IsAuthenticated]
     
+    MAX_OVERLAP_AUTOMATIONS = 10
+    
     def get_queryset(self):
         """Filter by user's automations"""
         return AutomationPerformance.objects.filter(
             automation__instagram_account__user=self.request.user
         ).select_related('automation')
+    
+    @action(detail=False, methods=['get'])
+    def uniques(self, request):
+        """
+        Unique commenters and DM recipients per automation over a period, their
+        union, and pairwise overlap when automations are picked explicitly
+        GET /api/analytics/automation-performance/uniques/?days=30&automation=<id>&automation=<id>
+        """
+        from automations.models import Automation
+        from .services import uniques
+        
+        days, first_day, last_day = _uniques_period(request)
+        try:
+            selected = [uuid.UUID(value) for value in request.query_params.getlist('automation')]
+        except ValueError:
+            return Response({'error': 'automation must be an automation id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        automations = Automation.objects.filter(instagram_account__user=request.user)
+        if selected:
+            automations = automations.filter(id__in=selected)
+        names = dict(automations.values_list('id', 'name'))
+        
+        sketches = uniques.automation_sketches(names, first_day, last_day)
+        per_automation = {automation_id: sketches.get(automation_id) or uniques.empty() for automation_id in names}
+        
+        overlap = []
+        ids = list(per_automation)
+        if selected and 2 <= len(ids) <= self.MAX_OVERLAP_AUTOMATIONS:
+            for i, first in enumerate(ids):
+                for second in ids[i + 1:]:
+                    overlap.append({
+                        'automations': [str(first), str(second)],
+                        **uniques.overlaps(per_automation[first], per_automation[second]),
+                    })
+        
+        return Response({
+            'period': f'{days}d',
+            'automations': [
+                {'automation': str(automation_id), 'automation_name': names[automation_id], **uniques.counts(s)}
+                for automation_id, s in per_automation.items()
+            ],
+            'total': uniques.counts(uniques.union(per_automation.values())),
+            'overlap': overlap,
+        })
 
 
 class AIProviderMetricsViewSet(viewsets.ReadOnlyModelViewSet):
@@ -109,6 +199,8 @@ class AIProviderMetricsViewSet(viewsets.ReadOnlyModelViewSet):
             failed_requests=Sum('failed_requests'),
             total_tokens=Sum('total_tokens_used'),
             total_cost=Sum('estimated_cost'),
+            cache_hits=Sum('cache_hits'),
+            cost_saved=Sum('estimated_cost_saved'),
             avg_response_time=Avg('avg_response_time')
         ).order_by('-total_requests')
         
@@ -119,6 +211,8 @@ class AIProviderMetricsViewSet(viewsets.ReadOnlyModelViewSet):
             'failed_requests': metrics.aggregate(Sum('failed_requests'))['failed_requests__sum'] or 0,
             'models_breakdown': list(models_breakdown),
             'total_cost': float(metrics.aggregate(Sum('estimated_cost'))['estimated_cost__sum'] or 0),
+            'total_cache_hits': metrics.aggregate(Sum('cache_hits'))['cache_hits__sum'] or 0,
+            'total_cost_saved': float(metrics.aggregate(Sum('estimated_cost_saved'))['estimated_cost_saved__sum'] or 0),
             'avg_response_time': float(metrics.aggregate(Avg('avg_response_time'))['avg_response_time__avg'] or 0)
         }
         
@@ -240,56 +334,76 @@ class DashboardViewSet(viewsets.ViewSet):
         Get dashboard overview
         GET /api/analytics/dashboard/overview/?period=30d
         """
-        from automations.models import Automation, AutomationTrigger
+        from .services import dashboard_cache
         
         period = request.query_params.get('period', '30d')
         days = int(period.replace('d', ''))
-        start_date = timezone.now() - timedelta(days=days)
         
-        automations = Automation.objects.filter(
-            instagram_account__user=request.user
+        stats = dashboard_cache.get_or_build(
+            request.user.id, 'overview', lambda: self._overview_stats(request.user, period, days), period
         )
         
-        triggers = AutomationTrigger.objects.filter(
-            automation__instagram_account__user=request.user,
-            created_at__gte=start_date
+        return Response(stats)
+    
+    def _overview_stats(self, user, period, days):
+        """Overview numbers in two queries: automation totals and one grouped trigger count."""
+        from django.db.models.functions import TruncDate
+        from automations.models import Automation, AutomationTrigger
+        
+        now = timezone.now()
+        today = now.date()
+        
+        automation_totals = Automation.objects.filter(
+            instagram_account__user=user
+        ).aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(is_active=True)),
+            dms_sent=Sum('total_dms_sent'),
         )
         
-        # Daily breakdown
+        per_day = {
+            row['day']: row
+            for row in AutomationTrigger.objects.filter(
+                automation__instagram_account__user=user,
+                created_at__gte=now - timedelta(days=days)
+            ).annotate(
+                day=TruncDate('created_at')
+            ).values('day').annotate(
+                triggers=Count('id'),
+                dms_sent=Count('id', filter=Q(status='sent')),
+                ai_enhanced=Count('id', filter=Q(was_ai_enhanced=True)),
+            ).order_by()
+        }
+        
+        # Daily breakdown, zero-filled
+        empty = {'triggers': 0, 'dms_sent': 0, 'ai_enhanced': 0}
         daily_breakdown = []
         for i in range(days):
-            date = timezone.now().date() - timedelta(days=days-i-1)
-            day_triggers = triggers.filter(created_at__date=date)
-            
+            date = today - timedelta(days=days-i-1)
+            row = per_day.get(date, empty)
             daily_breakdown.append({
                 'date': date.isoformat(),
-                'triggers': day_triggers.count(),
-                'dms_sent': day_triggers.filter(status='sent').count(),
-                'ai_enhanced': day_triggers.filter(was_ai_enhanced=True).count()
+                'triggers': row['triggers'],
+                'dms_sent': row['dms_sent'],
+                'ai_enhanced': row['ai_enhanced']
             })
         
+        total_triggers = sum(row['triggers'] for row in per_day.values())
+        total_sent = sum(row['dms_sent'] for row in per_day.values())
+        total_ai = sum(row['ai_enhanced'] for row in per_day.values())
+        
         stats = {
             'period': period,
-            'total_automations': automations.count(),
-            'active_automations': automations.filter(is_active=True).count(),
-            'total_dms_sent': automations.aggregate(Sum('total_dms_sent'))['total_dms_sent__sum'] or 0,
-            'total_triggers': triggers.count(),
-            'today_triggers': triggers.filter(
-                created_at__date=timezone.now().date()
-            ).count(),
-            'success_rate': (
-                triggers.filter(status='sent').count() / triggers.count() * 100
-                if triggers.count() > 0 else 0
-            ),
-            'ai_enhancement_rate': (
-                triggers.filter(was_ai_enhanced=True).count() / triggers.count() * 100
-                if triggers.count() > 0 else 0
-            ),
+            'total_automations': automation_totals['total'],
+            'active_automations': automation_totals['active'],
+            'total_dms_sent': automation_totals['dms_sent'] or 0,
+            'total_triggers': total_triggers,
+            'today_triggers': per_day.get(today, empty)['triggers'],
+            'success_rate': total_sent / total_triggers * 100 if total_triggers > 0 else 0,
+            'ai_enhancement_rate': total_ai / total_triggers * 100 if total_triggers > 0 else 0,
             'daily_breakdown': daily_breakdown
         }
-        
-        serializer = DashboardOverviewSerializer(stats)
-        return Response(serializer.data)
+        return dict(DashboardOverviewSerializer(stats).data)
     
     @action(detail=False, methods=['get'])
     def top_performers(self, request):
@@ -328,10 +442,12 @@ class DashboardViewSet(viewsets.ViewSet):
         Get real-time statistics (for WebSocket alternative)
         GET /api/analytics/dashboard/realtime_stats/
         """
-        from automations.models import Automation, AutomationTrigger
-        from django.core.cache import cache
+        from automations.models import Automation
+        from .services import trigger_rollups
         
         today = timezone.now().date()
+        # Summed from today's hourly rollups (≤ 24 rows per automation)
+        today_totals = trigger_rollups.today_totals(request.user.id)
         
         stats = {
             'timestamp': timezone.now().isoformat(),
@@ -339,15 +455,8 @@ class DashboardViewSet(viewsets.ViewSet):
                 instagram_account__user=request.user,
                 is_active=True
             ).count(),
-            'triggers_today': AutomationTrigger.objects.filter(
-                automation__instagram_account__user=request.user,
-                created_at__date=today
-            ).count(),
-            'dms_sent_today': AutomationTrigger.objects.filter(
-                automation__instagram_account__user=request.user,
-                created_at__date=today,
-                status='sent'
-            ).count(),
+            'triggers_today': today_totals['triggers'],
+            'dms_sent_today': today_totals['sent'],
             'current_queue_size': 0,  # Would need Celery inspect
             'ai_requests_today': AIProviderMetrics.objects.filter(
                 user=request.user,
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Automation, AutomationTrigger, Contact, AutomationVariant, AISettings
+from .models import Automation, AutomationTrigger, Contact, AutomationVariant, AISettings, AIMessageVariant, AutomationTriggerArchive, ExportJob, ShortLink
 from accounts.admin import SoftDeleteAdminMixin
 # Register your models here.
 
@@ -19,6 +19,33 @@ admin.site.register(AutomationTrigger)
 admin.site.register(Contact)
 admin.site.register(AutomationVariant)
 
+
+@admin.register(AIMessageVariant)
+class AIMessageVariantAdmin(admin.ModelAdmin):
+    list_display = ('automation', 'cluster', 'model_used', 'created_at')
+    list_filter = ('cluster',)
+    search_fields = ('automation__name', 'text')
+
+@admin.register(AutomationTriggerArchive)
+class AutomationTriggerArchiveAdmin(admin.ModelAdmin):
+    list_display = ('month', 'row_count', 'size_bytes', 'path', 'created_at')
+    readonly_fields = ('month', 'path', 'row_count', 'size_bytes', 'sha256', 'created_at')
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'format', 'status', 'rows_written', 'size_bytes', 'created_at', 'expires_at')
+    list_filter = ('kind', 'format', 'status')
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = ('fingerprint', 'path', 'rows_written', 'total_rows', 'size_bytes', 'error',
+                       'created_at', 'started_at', 'completed_at')
+
+@admin.register(ShortLink)
+class ShortLinkAdmin(admin.ModelAdmin):
+    list_display = ('token', 'automation', 'variant', 'url', 'created_at')
+    search_fields = ('token', 'url')
+    readonly_fields = ('token', 'url_hash', 'created_at')
+    raw_id_fields = ('automation', 'variant')
+
 @admin.register(AISettings)
 class AISettingsAdmin(admin.ModelAdmin):
     list_display = ('__str__', 'provider')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class AutomationsConfig(AppConfig):
     name = 'automations'
+
+    def ready(self):
+        import automations.signals  # noqa: F401
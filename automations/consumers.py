@@ -1,10 +1,10 @@
 import json
-import asyncio
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.core.cache import cache
 from .models import Automation, AutomationTrigger, InstagramAccount
 from .serializers import AutomationSerializer, AutomationTriggerSerializer
+from .services.dashboard_ticker import DashboardTicker, group_name as dashboard_group_name
 
 class AutomationConsumer(AsyncWebsocketConsumer):
     """
@@ -144,6 +144,13 @@ class AutomationConsumer(AsyncWebsocketConsumer):
             'status': event['status']
         }))
     
+    async def export_update(self, event):
+        """Progress / completion of a background export"""
+        await self.send(text_data=json.dumps({
+            'type': 'export_update',
+            'job': event['job']
+        }))
+    
     async def send_error(self, message):
         """Send error message"""
         await self.send(text_data=json.dumps({
@@ -153,7 +160,11 @@ class AutomationConsumer(AsyncWebsocketConsumer):
 
 
 class DashboardConsumer(AsyncWebsocketConsumer):
-    """Real-time dashboard updates"""
+    """
+    Real-time dashboard updates
+    Stats are computed by one shared ticker per user (see DashboardTicker)
+    and arrive through the dashboard group, however many tabs are open
+    """
     
     async def connect(self):
         self.user = self.scope['user']
@@ -162,7 +173,7 @@ class DashboardConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        self.dashboard_group = f'dashboard_{self.user.id}'
+        self.dashboard_group = dashboard_group_name(self.user.id)
         
         await self.channel_layer.group_add(
             self.dashboard_group,
@@ -171,50 +182,28 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Start sending real-time stats
-        asyncio.create_task(self.send_stats_periodically())
+        # Latest stats right away; the ticker keeps them coming
+        ticker = DashboardTicker.from_settings()
+        latest = await ticker.latest(self.user.id)
+        if latest is not None:
+            await self.stats_update({'data': latest})
+        ticker.subscribe(self.user.id)
+        self._subscribed = True
     
     async def disconnect(self, close_code):
+        # The socket may drop before connect() got as far as subscribing
+        if getattr(self, '_subscribed', False):
+            DashboardTicker.from_settings().unsubscribe(self.user.id)
+            self._subscribed = False
         if hasattr(self, 'dashboard_group'):
             await self.channel_layer.group_discard(
                 self.dashboard_group,
                 self.channel_name
             )
     
-    async def send_stats_periodically(self):
-        """Send dashboard stats every 5 seconds"""
-        while True:
-            try:
-                stats = await self.get_dashboard_stats()
-                await self.send(text_data=json.dumps({
-                    'type': 'stats_update',
-                    'data': stats
-                }))
-                await asyncio.sleep(5)
-            except Exception as e:
-                break
-    
-    @database_sync_to_async
-    def get_dashboard_stats(self):
-        """Get dashboard statistics"""
-        from django.db.models import Count, Q
-        from datetime import datetime, timedelta
-        
-        today = datetime.now().date()
-        
-        automations = Automation.objects.filter(
-            instagram_account__user=self.user
-        )
-        
-        stats = {
-            'total_automations': automations.count(),
-            'active_automations': automations.filter(is_active=True).count(),
-            'total_dms_sent': sum(a.total_dms_sent for a in automations),
-            'total_triggers': sum(a.total_triggers for a in automations),
-            'today_triggers': AutomationTrigger.objects.filter(
-                automation__instagram_account__user=self.user,
-                created_at__date=today
-            ).count(),
-        }
-        
-        return stats
+    async def stats_update(self, event):
+        """Send stats broadcast by the ticker to WebSocket"""
+        await self.send(text_data=json.dumps({
+            'type': 'stats_update',
+            'data': event['data']
+        }))
@@ -0,0 +1,53 @@
+"""
+Management command: ai_key_pool_status
+
+Usage:
+    python manage.py ai_key_pool_status                # Both providers
+    python manage.py ai_key_pool_status --provider gemini
+
+Shows per-key utilisation of the shared (Redis) AI key pools: requests in the
+current sliding window, 429 cool-downs and time until the next free slot.
+"""
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Show per-key utilisation of the shared OpenRouter / Gemini key pools'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider',
+            choices=['openrouter', 'gemini', 'all'],
+            default='all',
+            help='Which pool to report on (default: all).',
+        )
+
+    def handle(self, *args, **options):
+        provider = options['provider']
+
+        if provider in ('openrouter', 'all'):
+            from automations.services.openrouter_key_pool import OpenRouterKeyPool
+            try:
+                self._print_pool('OpenRouter', OpenRouterKeyPool.from_settings())
+            except RuntimeError as e:
+                self.stderr.write(self.style.WARNING(f'OpenRouter: {e}'))
+
+        if provider in ('gemini', 'all'):
+            from automations.services.gemini_key_pool import GeminiKeyPool
+            self._print_pool('Gemini', GeminiKeyPool.from_settings())
+
+    def _print_pool(self, label, pool):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({pool.max_rpm} RPM per key)'))
+        for slot in pool.utilisation():
+            marker = '*' if slot['active'] else ' '
+            line = (
+                f"  {marker} [{slot['index']}] ...{slot['key_suffix']}  "
+                f"{slot['requests_in_window']:>6}/{slot['limit']}  "
+                f"{slot['utilisation']:>5}%"
+            )
+            if slot['cooldown_seconds']:
+                line += f"  cooling down {slot['cooldown_seconds']}s"
+            elif slot['next_free_in']:
+                line += f"  next slot in {slot['next_free_in']}s"
+            self.stdout.write(line)
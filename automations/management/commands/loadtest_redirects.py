@@ -0,0 +1,165 @@
+"""
+Management command: loadtest_redirects
+
+Usage:
+    python manage.py loadtest_redirects                          # In-process ASGI app
+    python manage.py loadtest_redirects --requests 100000 --concurrency 500
+    python manage.py loadtest_redirects --url http://localhost:8000 --token <token>
+
+Drives /r/<token> redirects and reports requests/sec, p50/p99 latency and
+status codes against --target-rps (5000 by default).
+
+Without --url the redirector is called in-process with a synthetic link
+primed into the caches, which measures the handler and its click buffer;
+the buffer's flushes are counted instead of written, so the ORM stays out
+of the numbers. With --url requests go over HTTP to a running server
+(daphne or uvicorn for the ASGI fast path); pass --token for a real link,
+or leave it out to prime a synthetic one into the shared cache that server
+reads (its clicks belong to no automation and are dropped on flush).
+"""
+
+import asyncio
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Load test the /r/<token> short-link redirector'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50000, help='Total redirects (default: 50000).')
+        parser.add_argument('--concurrency', type=int, default=200, help='Requests in flight (default: 200).')
+        parser.add_argument('--url', default='', help='Base URL of a running server; in-process if omitted.')
+        parser.add_argument('--token', default='', help='Existing short-link token to hit.')
+        parser.add_argument('--target-rps', type=float, default=5000, help='Pass mark (default: 5000).')
+
+    def handle(self, *args, **options):
+        from automations.services import short_links
+
+        total, concurrency = options['requests'], options['concurrency']
+        if total < 1 or concurrency < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+
+        token = options['token']
+        if not token:
+            token = short_links.new_token()
+            # Counted like a real button link, for an automation that doesn't exist
+            short_links.prime(token, short_links.Target('https://example.com/loadtest', str(uuid.uuid4()), None))
+        elif not short_links.verify(token):
+            raise CommandError(f'{token} is not a valid short-link token')
+
+        run = self._over_http(options['url'], token) if options['url'] else self._in_process(token)
+        seconds, latencies, statuses = asyncio.run(self._drive(run, total, concurrency))
+
+        latencies.sort()
+        rps = total / seconds
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{total} redirects, concurrency {concurrency}, {'HTTP ' + options['url'] if options['url'] else 'in-process'}"
+        ))
+        self.stdout.write(f'  {rps:,.0f} req/s in {seconds:.2f}s')
+        self.stdout.write(
+            f'  latency p50 {self._percentile(latencies, 50):.3f} ms  '
+            f'p99 {self._percentile(latencies, 99):.3f} ms  max {latencies[-1]:.3f} ms'
+        )
+        self.stdout.write('  status ' + ', '.join(f'{code}: {n}' for code, n in sorted(statuses.items(), key=str)))
+        if not options['url']:
+            self.stdout.write(f'  clicks flushed {self.clicks_flushed}')
+
+        if statuses.get(302, 0) != total:
+            self.stdout.write(self.style.ERROR('  FAIL: not every request was redirected'))
+        elif not options['url'] and self.clicks_flushed != total:
+            self.stdout.write(self.style.ERROR('  FAIL: not every click reached the click buffer flush'))
+        elif rps < options['target_rps']:
+            self.stdout.write(self.style.ERROR(f"  FAIL: below {options['target_rps']:,.0f} req/s"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"  PASS: at or above {options['target_rps']:,.0f} req/s"))
+
+    @staticmethod
+    def _percentile(values, pct):
+        return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+    @staticmethod
+    async def _drive(run, total, concurrency):
+        latencies, statuses = [], Counter()
+        remaining = iter(range(total))
+
+        async def worker(request):
+            for _ in remaining:
+                started = time.perf_counter()
+                status = await request()
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] += 1
+
+        async with run() as request:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(request) for _ in range(min(concurrency, total))))
+            seconds = time.perf_counter() - started
+        return seconds, latencies, statuses
+
+    def _in_process(self, token):
+        from contextlib import asynccontextmanager
+        from unittest import mock
+
+        from automations.redirector import ShortLinkRedirector
+        from automations.services import short_links
+
+        self.clicks_flushed = 0
+
+        def apply_clicks(clicks):
+            count = sum(clicks.values())
+            self.clicks_flushed += count
+            return count
+
+        async def not_found(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 404, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        app = ShortLinkRedirector(not_found)
+        scope = {'type': 'http', 'method': 'GET', 'path': f'/r/{token}', 'headers': []}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def request():
+            status = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            await app(scope, receive, send)
+            return status[0]
+
+        @asynccontextmanager
+        async def run():
+            with mock.patch.object(short_links, 'apply_clicks', apply_clicks):
+                yield request
+                await asyncio.gather(*app._tasks)
+                short_links.flush()  # the tail a timer would have picked up
+
+        return run
+
+    @staticmethod
+    def _over_http(base_url, token):
+        from contextlib import asynccontextmanager
+
+        import httpx
+
+        url = f"{base_url.rstrip('/')}/r/{token}"
+
+        @asynccontextmanager
+        async def run():
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+            async with httpx.AsyncClient(follow_redirects=False, limits=limits, timeout=30) as client:
+                async def request():
+                    try:
+                        return (await client.get(url)).status_code
+                    except httpx.HTTPError:
+                        return 'error'
+
+                yield request
+
+        return run
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automations', '0002_automation_deleted_at_automation_is_deleted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AISettings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('openrouter', 'OpenRouter'), ('gemini', 'Gemini Flash Free')], default='openrouter', max_length=20)),
+                ('openrouter_api_keys', models.TextField(blank=True, help_text='Comma-separated OpenRouter keys (overrides settings.py)')),
+                ('gemini_api_keys', models.TextField(blank=True, help_text='Comma-separated Gemini API keys (overrides settings.py)')),
+            ],
+            options={
+                'verbose_name': 'AI Setting',
+                'verbose_name_plural': 'AI Settings',
+                'db_table': 'ai_settings',
+            },
+        ),
+        migrations.AddField(
+            model_name='automationtrigger',
+            name='ai_cache_hit',
+            field=models.BooleanField(default=False, help_text='Enhanced message was served from the AI message cache'),
+        ),
+    ]
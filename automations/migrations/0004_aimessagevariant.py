@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:36
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automations', '0003_aisettings_automationtrigger_ai_cache_hit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIMessageVariant',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('cluster', models.CharField(max_length=120)),
+                ('text', models.TextField()),
+                ('model_used', models.CharField(blank=True, max_length=100)),
+                ('source_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('automation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_variants', to='automations.automation')),
+            ],
+            options={
+                'db_table': 'ai_message_variants',
+                'indexes': [models.Index(fields=['automation', 'source_hash'], name='ai_message__automat_48b453_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automations', '0004_aimessagevariant'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='automationtrigger',
+            index=models.Index(fields=['created_at'], name='automation__created_a78c08_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:08
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automations', '0005_automationtrigger_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutomationTriggerArchive',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the archived month', unique=True)),
+                ('path', models.CharField(help_text='Name in the trigger archive storage', max_length=255)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('size_bytes', models.PositiveBigIntegerField(default=0)),
+                ('sha256', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'automation_trigger_archives',
+                'ordering': ['-month'],
+            },
+        ),
+    ]
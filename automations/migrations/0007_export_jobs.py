@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:24
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automations', '0006_automationtriggerarchive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('triggers', 'Triggers'), ('contacts', 'Contacts'), ('analytics', 'Analytics Report')], max_length=20)),
+                ('format', models.CharField(max_length=12)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('fingerprint', models.CharField(help_text='Hash of user, kind, format and params (dedupe key)', max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('rows_written', models.PositiveBigIntegerField(default=0)),
+                ('total_rows', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('path', models.CharField(blank=True, help_text='Name in the export storage', max_length=255)),
+                ('size_bytes', models.PositiveBigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'export_jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'fingerprint', '-created_at'], name='export_jobs_user_id_1f93a2_idx'), models.Index(fields=['expires_at'], name='export_jobs_expires_89b852_idx')],
+            },
+        ),
+    ]
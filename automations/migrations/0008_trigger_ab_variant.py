@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automations', '0007_export_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='automationtrigger',
+            name='variant',
+            field=models.ForeignKey(blank=True, help_text="A/B variant the recipient was assigned (empty = the automation's own message)", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='triggers', to='automations.automationvariant'),
+        ),
+    ]
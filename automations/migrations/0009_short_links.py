@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('automations', '0008_trigger_ab_variant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortLink',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('token', models.CharField(max_length=32, unique=True)),
+                ('url', models.URLField(max_length=2048)),
+                ('url_hash', models.CharField(help_text='sha256 of url (lookup key)', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('automation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='short_links', to='automations.automation')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='short_links', to='automations.automationvariant')),
+            ],
+            options={
+                'db_table': 'short_links',
+                'indexes': [models.Index(fields=['automation', 'url_hash'], name='short_links_automat_beffbc_idx')],
+            },
+        ),
+    ]
@@ -241,6 +241,20 @@ class AutomationTrigger(models.Model):
     # AI enhancement
     was_ai_enhanced = models.BooleanField(default=False)
     ai_modifications = models.TextField(blank=True)
+    ai_cache_hit = models.BooleanField(
+        default=False,
+        help_text="Enhanced message was served from the AI message cache"
+    )
+    
+    # A/B testing
+    variant = models.ForeignKey(
+        'AutomationVariant',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='triggers',
+        help_text="A/B variant the recipient was assigned (empty = the automation's own message)"
+    )
     
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -251,6 +265,7 @@ class AutomationTrigger(models.Model):
             models.Index(fields=['automation', 'instagram_user_id']),
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['comment_id']),  # NEW!
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
@@ -391,4 +406,139 @@ class AISettings(models.Model):
     @classmethod
     def load(cls):
         obj, created = cls.objects.get_or_create(pk=1)
-        return obj
\ No newline at end of file
+        return obj
+
+
+class AIMessageVariant(models.Model):
+    """
+    Pre-generated AI-enhanced DM for one automation + comment-intent cluster.
+    Text contains the {username} placeholder; the pool is rebuilt whenever the
+    automation's message/context/keywords change (source_hash) or it ages out.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    automation = models.ForeignKey(
+        Automation,
+        on_delete=models.CASCADE,
+        related_name='ai_variants'
+    )
+    cluster = models.CharField(max_length=120)  # 'kw:<keyword>' or 'generic'
+    text = models.TextField()
+    model_used = models.CharField(max_length=100, blank=True)
+    source_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'ai_message_variants'
+        indexes = [
+            models.Index(fields=['automation', 'source_hash']),
+        ]
+
+    def __str__(self):
+        return f"{self.automation_id} [{self.cluster}]"
+
+
+class AutomationTriggerArchive(models.Model):
+    """
+    Manifest entry for one month of automation_triggers moved to cold storage
+    as gzip-compressed NDJSON (see automations.services.trigger_archive).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    month = models.DateField(unique=True, help_text="First day of the archived month")
+    path = models.CharField(max_length=255, help_text="Name in the trigger archive storage")
+    row_count = models.PositiveIntegerField(default=0)
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'automation_trigger_archives'
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} ({self.row_count} triggers)"
+
+
+class ShortLink(models.Model):
+    """
+    A tracked DM button URL: /r/<token> redirects to `url` and counts a click
+    for the automation (and A/B variant) that sent it.
+    """
+    id = models.BigAutoField(primary_key=True)
+    token = models.CharField(max_length=32, unique=True)
+    automation = models.ForeignKey(Automation, on_delete=models.CASCADE, related_name='short_links')
+    variant = models.ForeignKey(
+        'AutomationVariant',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='short_links'
+    )
+    url = models.URLField(max_length=2048)
+    url_hash = models.CharField(max_length=64, help_text="sha256 of url (lookup key)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'short_links'
+        indexes = [
+            models.Index(fields=['automation', 'url_hash']),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.url}"
+
+
+class ExportJob(models.Model):
+    """
+    A background export: what was asked for, how far the worker got, and the
+    finished file in export storage (see automations.services.export_jobs).
+    """
+    KINDS = [
+        ('triggers', 'Triggers'),
+        ('contacts', 'Contacts'),
+        ('analytics', 'Analytics Report'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='export_jobs')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    format = models.CharField(max_length=12)
+    params = models.JSONField(default=dict, blank=True)
+    fingerprint = models.CharField(max_length=64, help_text="Hash of user, kind, format and params (dedupe key)")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    rows_written = models.PositiveBigIntegerField(default=0)
+    total_rows = models.PositiveBigIntegerField(null=True, blank=True)
+    path = models.CharField(max_length=255, blank=True, help_text="Name in the export storage")
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'export_jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'fingerprint', '-created_at']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}.{self.format} ({self.status})"
+
+    @property
+    def progress(self):
+        """Percent complete (None while the total isn't known)."""
+        if self.status == 'completed':
+            return 100.0
+        if not self.total_rows:
+            return None
+        return round(min(self.rows_written / self.total_rows * 100, 99.9), 1)
@@ -0,0 +1,99 @@
+"""
+Short Link Redirector
+================================================================
+- ShortLinkRedirector wraps the ASGI HTTP app and answers GET/HEAD
+  /r/<token> itself: no Django request, middleware or ORM on the hot path,
+  just the token check, an in-process (or cached) lookup and a 302
+- Clicks go into the short_links buffer; when it is due, one background
+  flush runs at a time in a worker thread, never in the request. A timer
+  flushes the tail of a burst that never fills the buffer
+- short_link_redirect serves the same route through Django for WSGI
+  deployments (gunicorn), flushing inline when the buffer is due and
+  once more when the worker exits
+"""
+
+import asyncio
+import atexit
+import logging
+
+from django.http import HttpResponse, HttpResponseRedirect
+
+from automations.services import short_links
+
+logger = logging.getLogger(__name__)
+
+_NOT_FOUND = b'Link not found'
+
+
+class ShortLinkRedirector:
+    def __init__(self, app, prefix: str = short_links.PATH_PREFIX):
+        self.app = app
+        self.prefix = prefix
+        self._flushing = False
+        self._timer = None
+        self._tasks = set()
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD')
+                or not scope['path'].startswith(self.prefix)):
+            return await self.app(scope, receive, send)
+
+        target = await short_links.aresolve(scope['path'][len(self.prefix):].rstrip('/'))
+        if target is None:
+            await self._respond(send, 404, [(b'content-type', b'text/plain; charset=utf-8')], _NOT_FOUND, scope)
+            return
+
+        await self._respond(send, 302, [
+            (b'location', target.url.encode('utf-8')),
+            (b'cache-control', b'no-store'),
+        ], b'', scope)
+        if short_links.click(target):
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(short_links.CLICK_FLUSH_INTERVAL, self._on_timer)
+
+    @staticmethod
+    async def _respond(send, status, headers, body, scope):
+        headers = headers + [(b'content-length', str(len(body)).encode('ascii'))]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+
+    def _on_timer(self):
+        self._timer = None
+        if short_links.pending():
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flushing:
+            return
+        self._flushing = True
+        task = asyncio.get_running_loop().create_task(self._flush())
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        try:
+            await short_links.aflush()
+        except Exception as e:
+            logger.error(f"[ShortLinks] Click flush failed: {e}")
+        finally:
+            self._flushing = False
+            # Clicks that arrived during the flush get the timer too
+            if self._timer is None and short_links.pending():
+                self._timer = asyncio.get_running_loop().call_later(short_links.CLICK_FLUSH_INTERVAL, self._on_timer)
+
+
+def short_link_redirect(request, token):
+    """/r/<token> through Django (WSGI deployments)."""
+    target = short_links.resolve(token)
+    if target is None:
+        return HttpResponse(_NOT_FOUND, status=404, content_type='text/plain; charset=utf-8')
+    response = HttpResponseRedirect(target.url)
+    response['Cache-Control'] = 'no-store'
+    if short_links.click(target):
+        short_links.flush()
+    return response
+
+
+atexit.register(short_links.flush)
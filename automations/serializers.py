@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Automation, AutomationTrigger, Contact, InstagramAccount
+from .models import Automation, AutomationTrigger, Contact, ExportJob, InstagramAccount
 
 class InstagramAccountSerializer(serializers.ModelSerializer):
     class Meta:
@@ -50,3 +50,20 @@ class ContactSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'first_interaction', 'last_interaction']
 
 
+class ExportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.FloatField(read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'kind', 'format', 'params', 'status', 'progress', 'rows_written', 'total_rows',
+                  'size_bytes', 'error', 'download_url', 'created_at', 'started_at', 'completed_at', 'expires_at']
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != 'completed':
+            return None
+        from django.urls import reverse
+        url = reverse('export-download', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
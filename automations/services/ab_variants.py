@@ -0,0 +1,337 @@
+"""
+A/B Variants - Sticky Assignment with Write-Behind Counters
+================================================================
+- Each process keeps a cumulative-weight table per automation (its active
+  AutomationVariants by traffic_percentage). A per-automation version stamp
+  in the shared Django cache (Redis in production) is bumped when a variant
+  is saved or deleted (see automations.signals); a process checks it at
+  most once per CHECK_INTERVAL seconds and only then reloads from the DB
+- A recipient is assigned by a stable hash of (automation, recipient id), so
+  the same person keeps getting the same variant on every worker. Weights
+  adding up to less than 100 leave the rest of the traffic on the
+  automation's own message
+- Sends, clicks and conversions go into per-minute counters in the cache;
+  the flush task adds finished minutes to the variants' totals with one
+  F() UPDATE per variant instead of a row update per DM
+- results() compares variants from those flushed totals only (two-
+  proportion z-test against the oldest variant)
+"""
+
+import bisect
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from . import cache_counters
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ab'
+CHECK_INTERVAL = 1.0       # seconds between version checks per automation and process
+MAX_TABLES = 10000         # automations whose table a process keeps
+COUNTER_TTL = 7200         # a stalled flusher can catch up for ~2 hours
+MAX_CATCHUP_MINUTES = 90
+FULL_TRAFFIC = 100
+# metric -> AutomationVariant counter field
+METRICS = {
+    'sends': 'total_sends',
+    'clicks': 'total_clicks',
+    'conversions': 'total_conversions',
+}
+SIGNIFICANCE_LEVEL = 0.05
+MIN_SENDS = 100            # per variant before a difference is called significant
+
+
+class Variant(NamedTuple):
+    id: str
+    name: str
+    message: str
+    buttons: list
+    comment_reply_message: str
+
+
+class _Table(NamedTuple):
+    version: Optional[str]
+    checked_at: float
+    boundaries: Tuple[int, ...]   # cumulative traffic_percentage
+    variants: Tuple[Variant, ...]
+    total: int                    # hash space: max(100, sum of weights)
+
+
+_lock = threading.Lock()
+_tables: "OrderedDict[str, _Table]" = OrderedDict()
+
+
+def _version_key(automation_id) -> str:
+    return f'{KEY_PREFIX}:version:{automation_id}'
+
+
+def _load(automation_id) -> Tuple[Tuple[int, ...], Tuple[Variant, ...]]:
+    from automations.models import AutomationVariant
+
+    rows = (
+        AutomationVariant.objects
+        .filter(automation_id=automation_id, is_active=True, traffic_percentage__gt=0)
+        .order_by('created_at', 'id')
+        .values_list('id', 'name', 'DmMessage', 'dm_buttons', 'comment_reply_message', 'traffic_percentage')
+    )
+    boundaries, variants, running = [], [], 0
+    for variant_id, name, message, buttons, reply, weight in rows:
+        running += weight
+        boundaries.append(running)
+        variants.append(Variant(str(variant_id), name, message, buttons or [], reply))
+    return tuple(boundaries), tuple(variants)
+
+
+def _store(automation_id: str, version, loaded) -> _Table:
+    boundaries, variants = loaded
+    table = _Table(version, time.monotonic(), boundaries, variants, max(FULL_TRAFFIC, boundaries[-1] if boundaries else 0))
+    with _lock:
+        _tables[automation_id] = table
+        _tables.move_to_end(automation_id)
+        while len(_tables) > MAX_TABLES:
+            _tables.popitem(last=False)
+    return table
+
+
+def _cached(automation_id: str, version=None, check_version: bool = False) -> Optional[_Table]:
+    """The process's table if it is still usable; re-stamps it after a version check."""
+    with _lock:
+        table = _tables.get(automation_id)
+        if table is None:
+            return None
+        if not check_version:
+            return table if time.monotonic() - table.checked_at < CHECK_INTERVAL else None
+        if table.version != version:
+            return None
+        table = _tables[automation_id] = table._replace(checked_at=time.monotonic())
+        return table
+
+
+def _hash(automation_id: str, recipient_id) -> int:
+    digest = hashlib.blake2b(f'{automation_id}:{recipient_id}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def assign(table: _Table, automation_id: str, recipient_id) -> Optional[Variant]:
+    """The variant a recipient falls into, or None for the automation's own message."""
+    if not table.variants:
+        return None
+    index = bisect.bisect_right(table.boundaries, _hash(automation_id, recipient_id) % table.total)
+    return table.variants[index] if index < len(table.variants) else None
+
+
+def table_for(automation_id) -> _Table:
+    automation_id = str(automation_id)
+    table = _cached(automation_id)
+    if table is not None:
+        return table
+    version = cache.get(_version_key(automation_id))
+    table = _cached(automation_id, version, check_version=True)
+    if table is not None:
+        return table
+    return _store(automation_id, version, _load(automation_id))
+
+
+async def atable_for(automation_id) -> _Table:
+    """Async table_for(): the DB is only touched after a variant change."""
+    automation_id = str(automation_id)
+    table = _cached(automation_id)
+    if table is not None:
+        return table
+    version = await cache.aget(_version_key(automation_id))
+    table = _cached(automation_id, version, check_version=True)
+    if table is not None:
+        return table
+    return _store(automation_id, version, await sync_to_async(_load)(automation_id))
+
+
+def pick(automation_id, recipient_id) -> Optional[Variant]:
+    return assign(table_for(automation_id), str(automation_id), recipient_id)
+
+
+async def apick(automation_id, recipient_id) -> Optional[Variant]:
+    return assign(await atable_for(automation_id), str(automation_id), recipient_id)
+
+
+def bump_version(automation_id):
+    """Make every process reload this automation's variants on its next check (≤1s)."""
+    cache.set(_version_key(automation_id), uuid.uuid4().hex, None)
+
+
+def forget(automation_id):
+    """Drop this process's table for one automation."""
+    with _lock:
+        _tables.pop(str(automation_id), None)
+
+
+def reset():
+    """Drop every table cached by this process — useful in tests."""
+    with _lock:
+        _tables.clear()
+
+
+# ----------------------------------------------------------------------------
+# Write-behind counters
+# ----------------------------------------------------------------------------
+
+def _minute(now: Optional[float] = None) -> int:
+    return int((now or time.time()) // 60)
+
+
+def record(variant_id, metric: str, count: int = 1, now: Optional[float] = None):
+    """Count a send, click or conversion for a variant in the current minute."""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown A/B metric '{metric}'")
+    minute = _minute(now)
+    try:
+        # First touch of this variant in this minute: register it for the flusher
+        if cache.add(f'{KEY_PREFIX}:seen:{minute}:{variant_id}', 1, COUNTER_TTL):
+            slot = cache_counters.incr(f'{KEY_PREFIX}:dirty:{minute}:n', COUNTER_TTL)
+            cache.set(f'{KEY_PREFIX}:dirty:{minute}:{slot}', str(variant_id), COUNTER_TTL)
+        cache_counters.incr(f'{KEY_PREFIX}:{minute}:{variant_id}:{metric}', COUNTER_TTL, delta=count)
+    except Exception as e:
+        # Counters must never fail a DM
+        logger.warning(f"[ABVariants] Could not record {metric} for variant {variant_id}: {e}")
+
+
+arecord = sync_to_async(record, thread_sensitive=True)
+
+
+def _read_minute(minute: int) -> Tuple[Dict[str, Dict[str, int]], List[str]]:
+    """{variant_id: {metric: count}} recorded during `minute` plus the cache keys used."""
+    n_key = f'{KEY_PREFIX}:dirty:{minute}:n'
+    count = int(cache.get(n_key) or 0)
+    if not count:
+        return {}, []
+
+    slot_keys = [f'{KEY_PREFIX}:dirty:{minute}:{slot}' for slot in range(1, count + 1)]
+    variant_ids = set(cache.get_many(slot_keys).values())
+    counter_keys = {
+        (variant_id, metric): f'{KEY_PREFIX}:{minute}:{variant_id}:{metric}'
+        for variant_id in variant_ids for metric in METRICS
+    }
+    values = cache.get_many(list(counter_keys.values()))
+
+    counts: Dict[str, Dict[str, int]] = {}
+    for (variant_id, metric), key in counter_keys.items():
+        value = int(values.get(key) or 0)
+        if value:
+            counts.setdefault(variant_id, {})[metric] = value
+    used = [n_key, *slot_keys, *counter_keys.values()]
+    used += [f'{KEY_PREFIX}:seen:{minute}:{variant_id}' for variant_id in variant_ids]
+    return counts, used
+
+
+def apply_counts(counts: Dict[str, Dict[str, int]]) -> int:
+    """Add counts to the variants' totals. Returns the number of variants updated."""
+    from automations.models import AutomationVariant
+
+    updated = 0
+    with transaction.atomic():
+        for variant_id, metrics in counts.items():
+            updated += AutomationVariant.objects.filter(pk=variant_id).update(**{
+                METRICS[metric]: F(METRICS[metric]) + value for metric, value in metrics.items()
+            })
+    return updated
+
+
+def flush(now: Optional[float] = None) -> int:
+    """
+    Apply the counters of every finished minute that hasn't been flushed yet.
+    The minute that just ended is left alone so in-flight writes can land.
+    Returns the number of variant rows updated.
+    """
+    current = _minute(now)
+    minutes = list(range(current - MAX_CATCHUP_MINUTES, current - 1))
+    done = cache.get_many([f'{KEY_PREFIX}:flushed:{m}' for m in minutes])
+
+    updated = 0
+    for minute in minutes:
+        marker = f'{KEY_PREFIX}:flushed:{minute}'
+        # add() doubles as a lock so concurrent flushers never apply a minute twice
+        if marker in done or not cache.add(marker, 1, COUNTER_TTL):
+            continue
+        counts, used = _read_minute(minute)
+        if not counts:
+            continue
+        try:
+            updated += apply_counts(counts)
+        except Exception as e:
+            logger.error(f"[ABVariants] Dropped counters for minute {minute}: {e}")
+            continue
+        cache.delete_many(used)
+    return updated
+
+
+# ----------------------------------------------------------------------------
+# Results
+# ----------------------------------------------------------------------------
+
+def _rate(part: int, total: int) -> float:
+    return part / total if total else 0.0
+
+
+def z_test(successes_a: int, total_a: int, successes_b: int, total_b: int) -> Tuple[float, float]:
+    """Two-proportion z-test: (z, two-sided p-value)."""
+    if not total_a or not total_b:
+        return 0.0, 1.0
+    pooled = (successes_a + successes_b) / (total_a + total_b)
+    error = math.sqrt(pooled * (1 - pooled) * (1 / total_a + 1 / total_b))
+    if error == 0:
+        return 0.0, 1.0
+    z = (_rate(successes_b, total_b) - _rate(successes_a, total_a)) / error
+    return z, math.erfc(abs(z) / math.sqrt(2))
+
+
+def results(automation_id) -> Dict:
+    """
+    Per-variant totals and rates from the flushed counters, each compared
+    with the oldest variant (the baseline) on click and conversion rate.
+    """
+    from automations.models import AutomationVariant
+
+    rows = list(
+        AutomationVariant.objects
+        .filter(automation_id=automation_id)
+        .order_by('created_at', 'id')
+        .values('id', 'name', 'is_active', 'traffic_percentage', *METRICS.values())
+    )
+    baseline = rows[0] if rows else None
+    variants = []
+    for row in rows:
+        sends = row['total_sends']
+        entry = {
+            'id': str(row['id']),
+            'name': row['name'],
+            'is_active': row['is_active'],
+            'traffic_percentage': row['traffic_percentage'],
+            'sends': sends,
+            'clicks': row['total_clicks'],
+            'conversions': row['total_conversions'],
+            'click_rate': round(_rate(row['total_clicks'], sends) * 100, 2),
+            'conversion_rate': round(_rate(row['total_conversions'], sends) * 100, 2),
+            'baseline': row is baseline,
+        }
+        if row is not baseline:
+            enough = min(sends, baseline['total_sends']) >= MIN_SENDS
+            for metric in ('clicks', 'conversions'):
+                field = METRICS[metric]
+                z, p = z_test(baseline[field], baseline['total_sends'], row[field], sends)
+                entry[f'{metric}_vs_baseline'] = {
+                    'z': round(z, 3),
+                    'p_value': round(p, 4),
+                    'significant': enough and p < SIGNIFICANCE_LEVEL,
+                }
+        variants.append(entry)
+    return {'automation': str(automation_id), 'variants': variants}
@@ -0,0 +1,293 @@
+"""
+AI Batcher - Multi-Comment Enhancement for Burst Traffic
+================================================================
+- Only engages during a burst: when one automation sees at least
+  AI_BATCH_MIN_RATE enhancement requests per second
+- Requests for the same automation join the currently open batch in the
+  shared Django cache (Redis in production), so comments handled by
+  different Celery workers share one LLM call
+- The first request opens the batch and leads it: it waits up to
+  AI_BATCH_WINDOW_MS (or until AI_BATCH_MAX_SIZE requests joined), sends one
+  prompt asking for a JSON array of personalized messages, validates each
+  entry and publishes per-request results
+- Anything that doesn't work out — parse failure, invalid entry, late
+  joiner, leader timeout — returns None and the caller enhances that
+  comment on its own, so batching never loses a DM. Members stop waiting
+  for the leader early enough (AI_BATCH_FALLBACK_RESERVE before
+  AI_ENHANCEMENT_LATENCY_BUDGET runs out) for that call to fit
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+
+from automations.services import cache_counters
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ai_batch'
+DEFAULT_MAX_SIZE = 10
+DEFAULT_WINDOW_MS = 300
+DEFAULT_MIN_RATE = 5           # requests/second per automation that count as a burst
+DEFAULT_LATENCY_BUDGET = 15
+DEFAULT_FALLBACK_RESERVE = 6   # seconds left for an individual call (≈ its p95)
+DEFAULT_RESULT_TIMEOUT = DEFAULT_LATENCY_BUDGET - DEFAULT_WINDOW_MS / 1000 - DEFAULT_FALLBACK_RESERVE
+MAX_MESSAGE_CHARS = 1000
+POLL_INTERVAL_MIN = 0.05
+POLL_INTERVAL_MAX = 0.3
+MAX_JOIN_ATTEMPTS = 3
+
+# (prompt, max_tokens) -> (model_id or None, result dict from _generate)
+GenerateFn = Callable[[str, int], Awaitable[Tuple[Optional[str], Dict]]]
+
+
+def build_batch_prompt(base_message: str, business_context: str, items: List[Dict]) -> str:
+    """One prompt that asks for len(items) personalized messages as a JSON array."""
+    comments = '\n'.join(
+        f'{idx}. "{item["user_comment"]}" by @{item["username"]}'
+        for idx, item in enumerate(items, start=1)
+    )
+    return f"""You are an Instagram DM automation assistant. Enhance this automated message for each of the {len(items)} users below, making each one personalized and engaging.
+
+BASE MESSAGE TEMPLATE:
+{base_message}
+
+BUSINESS CONTEXT:
+{business_context}
+
+USERS' COMMENTS:
+{comments}
+
+INSTRUCTIONS:
+1. Keep the core information from the base message
+2. Acknowledge each user's specific comment naturally (don't just repeat it)
+3. Use a friendly, conversational tone
+4. Keep each message concise (under 500 characters)
+5. Don't be overly salesy or formal
+6. Use the username naturally if appropriate
+
+OUTPUT:
+Return ONLY a JSON array of exactly {len(items)} strings, one message per user in the same order. No explanation, no markdown."""
+
+
+def parse_batch_response(text: str, expected: int) -> List[Optional[str]]:
+    """
+    Split the model's JSON array into per-request messages.
+    Entries that are missing or invalid come back as None.
+    """
+    start, end = (text or '').find('['), (text or '').rfind(']')
+    if start == -1 or end <= start:
+        return [None] * expected
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return [None] * expected
+    if not isinstance(data, list) or len(data) != expected:
+        # Can't trust the order if the count is off
+        return [None] * expected
+
+    messages = []
+    for entry in data:
+        if isinstance(entry, dict):
+            entry = entry.get('message')
+        if isinstance(entry, str) and entry.strip() and len(entry) <= MAX_MESSAGE_CHARS:
+            messages.append(entry.strip())
+        else:
+            messages.append(None)
+    return messages
+
+
+class AIBatcher:
+    """
+    Usage:
+        batcher = AIBatcher.from_settings()
+        batched = await batcher.enhance(automation_id, base, context, comment, username, generate)
+        if batched is None:
+            ...  # enhance this comment individually
+    """
+
+    _instance: Optional["AIBatcher"] = None
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        window_ms: int = DEFAULT_WINDOW_MS,
+        min_rate: int = DEFAULT_MIN_RATE,
+        result_timeout: float = DEFAULT_RESULT_TIMEOUT,
+    ):
+        self.max_size = max(2, int(max_size))
+        self.window = window_ms / 1000
+        self.min_rate = min_rate
+        self.result_timeout = result_timeout
+
+    @classmethod
+    def from_settings(cls) -> "AIBatcher":
+        """Singleton factory — reads AI_BATCH_* from Django settings."""
+        if cls._instance is None:
+            from django.conf import settings
+            window_ms = getattr(settings, 'AI_BATCH_WINDOW_MS', DEFAULT_WINDOW_MS)
+            result_timeout = getattr(settings, 'AI_BATCH_RESULT_TIMEOUT', None)
+            if result_timeout is None:
+                result_timeout = max(
+                    1.0,
+                    getattr(settings, 'AI_ENHANCEMENT_LATENCY_BUDGET', DEFAULT_LATENCY_BUDGET) - window_ms / 1000
+                    - getattr(settings, 'AI_BATCH_FALLBACK_RESERVE', DEFAULT_FALLBACK_RESERVE),
+                )
+            cls._instance = cls(
+                max_size=getattr(settings, 'AI_BATCH_MAX_SIZE', DEFAULT_MAX_SIZE),
+                window_ms=window_ms,
+                min_rate=getattr(settings, 'AI_BATCH_MIN_RATE', DEFAULT_MIN_RATE),
+                result_timeout=result_timeout,
+            )
+        return cls._instance
+
+    @classmethod
+    def reset(cls):
+        """Reset singleton — useful in tests."""
+        cls._instance = None
+
+    @staticmethod
+    def _group(batch_key: str, base_message: str, business_context: str) -> str:
+        raw = f'{batch_key}\x00{base_message}\x00{business_context}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+    async def _is_burst(self, group: str) -> bool:
+        """Count this request and report whether the automation is bursting."""
+        second = int(time.time())
+        current = await cache_counters.aincr(f'{KEY_PREFIX}:rate:{group}:{second}', 5)
+        previous = int(await cache.aget(f'{KEY_PREFIX}:rate:{group}:{second - 1}') or 0)
+        return max(current, previous) >= self.min_rate
+
+    async def _join(self, group: str) -> Optional[Tuple[str, int, bool]]:
+        """Join (or open) the group's batch. Returns (batch_id, slot, is_leader)."""
+        open_key = f'{KEY_PREFIX}:open:{group}'
+        ttl = int(self.window * 4) + 5
+
+        for _ in range(MAX_JOIN_ATTEMPTS):
+            candidate = uuid.uuid4().hex
+            is_leader = await cache.aadd(open_key, candidate, ttl)
+            batch_id = candidate if is_leader else await cache.aget(open_key)
+            if batch_id is None:
+                continue  # Closed between add and get — try again
+
+            slot = await cache_counters.aincr(f'{KEY_PREFIX}:{batch_id}:n', self._member_ttl())
+            if slot <= self.max_size:
+                return batch_id, slot, is_leader
+
+            # Full: close it for newcomers and try the next one
+            if await cache.aget(open_key) == batch_id:
+                await cache.adelete(open_key)
+        return None
+
+    def _member_ttl(self) -> int:
+        return int(self.window + self.result_timeout) + 10
+
+    async def enhance(
+        self,
+        batch_key: str,
+        base_message: str,
+        business_context: str,
+        user_comment: str,
+        username: str,
+        generate: GenerateFn,
+        max_tokens_per_item: int = 400,
+    ) -> Optional[Dict]:
+        """
+        Enhance one comment as part of a batch.
+
+        Returns:
+            {'success': True, 'text', 'model'} or None if the caller should
+            enhance this comment individually
+        """
+        group = self._group(batch_key, base_message, business_context)
+        try:
+            if not await self._is_burst(group):
+                return None
+            joined = await self._join(group)
+            if joined is None:
+                return None
+            batch_id, slot, is_leader = joined
+
+            item = {'user_comment': user_comment, 'username': username}
+            await cache.aset(f'{KEY_PREFIX}:{batch_id}:item:{slot}', item, self._member_ttl())
+
+            if is_leader:
+                return await self._lead(
+                    group, batch_id, slot, base_message, business_context,
+                    generate, max_tokens_per_item,
+                )
+            return await self._await_result(batch_id, slot)
+        except Exception as e:
+            logger.warning(f"[AIBatcher] Batching failed, enhancing individually: {e}")
+            return None
+
+    async def _lead(self, group, batch_id, own_slot, base_message, business_context,
+                    generate: GenerateFn, max_tokens_per_item: int) -> Optional[Dict]:
+        n_key = f'{KEY_PREFIX}:{batch_id}:n'
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while loop.time() < deadline:
+            if int(await cache.aget(n_key) or 0) >= self.max_size:
+                break
+            await asyncio.sleep(POLL_INTERVAL_MIN)
+
+        # Close the batch, then freeze the member count
+        open_key = f'{KEY_PREFIX}:open:{group}'
+        if await cache.aget(open_key) == batch_id:
+            await cache.adelete(open_key)
+        count = min(int(await cache.aget(n_key) or 0), self.max_size)
+        await cache.aset(f'{KEY_PREFIX}:{batch_id}:closed', count, self._member_ttl())
+
+        item_keys = {slot: f'{KEY_PREFIX}:{batch_id}:item:{slot}' for slot in range(1, count + 1)}
+        stored = await cache.aget_many(list(item_keys.values()))
+        slots = [slot for slot, key in item_keys.items() if key in stored]
+        items = [stored[item_keys[slot]] for slot in slots]
+
+        results = {slot: {'success': False} for slot in range(1, count + 1)}
+        if len(items) > 1:
+            logger.info(f"[AIBatcher] Sending batch of {len(items)} comments in one request")
+            prompt = build_batch_prompt(base_message, business_context, items)
+            model_id, result = await generate(prompt, max_tokens_per_item * len(items))
+            if model_id is not None:
+                messages = parse_batch_response(result.get('text', ''), len(items))
+                for slot, message in zip(slots, messages):
+                    if message:
+                        results[slot] = {'success': True, 'text': message, 'model': model_id}
+                failed = sum(1 for m in messages if not m)
+                if failed:
+                    logger.warning(f"[AIBatcher] {failed}/{len(items)} batch entries invalid — falling back individually")
+
+        await cache.aset_many(
+            {f'{KEY_PREFIX}:{batch_id}:result:{slot}': r for slot, r in results.items() if slot != own_slot},
+            self._member_ttl(),
+        )
+        own = results.get(own_slot)
+        return own if own and own['success'] else None
+
+    async def _await_result(self, batch_id: str, slot: int) -> Optional[Dict]:
+        result_key = f'{KEY_PREFIX}:{batch_id}:result:{slot}'
+        closed_key = f'{KEY_PREFIX}:{batch_id}:closed'
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window + self.result_timeout
+        interval = POLL_INTERVAL_MIN
+
+        while loop.time() < deadline:
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, POLL_INTERVAL_MAX)
+
+            values = await cache.aget_many([result_key, closed_key])
+            result = values.get(result_key)
+            if result is not None:
+                return result if result['success'] else None
+            closed = values.get(closed_key)
+            if closed is not None and slot > closed:
+                return None  # Joined after the leader froze the batch
+
+        logger.warning(f"[AIBatcher] Timed out waiting for batch {batch_id[:8]}…")
+        return None
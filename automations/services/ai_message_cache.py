@@ -0,0 +1,166 @@
+"""
+AI Message Cache - Content-Addressed Cache for Enhanced DMs
+================================================================
+- Key = sha256 of (base message, business context, normalized comment, model chain)
+- Tier 1: in-process LRU (per worker process)
+- Tier 2: Django cache (Redis in production) with TTL, shared by all workers
+- Each key holds up to AI_MESSAGE_CACHE_VARIANTS variants; until the pool is
+  full a lookup is a miss so the LLM keeps adding fresh variants, afterwards
+  one variant is picked at random so DMs don't all look identical
+- Variants are generated against a username placeholder; the real username
+  is substituted after retrieval
+- Each entry records when its shared-tier copy expires, so the LRU never
+  serves variants past AI_MESSAGE_CACHE_TTL
+"""
+
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Placeholder passed to the prompt instead of the real username
+USERNAME_PLACEHOLDER = '{username}'
+
+CACHE_KEY_PREFIX = 'ai_msg_cache'
+DEFAULT_TTL_SECONDS = 86400      # 24 hours
+DEFAULT_MAX_VARIANTS = 3
+DEFAULT_LRU_SIZE = 1024
+
+
+def normalize_comment(text: str) -> str:
+    """Lower-case and collapse whitespace so 'Link ' and 'link' share a key."""
+    return ' '.join((text or '').lower().split())
+
+
+def render_message(text: str, username: str) -> str:
+    """Substitute the real username into a cached variant."""
+    return text.replace(USERNAME_PLACEHOLDER, username or '')
+
+
+class AIMessageCache:
+    """
+    Two-tier cache of AI-enhanced DM variants.
+
+    Usage:
+        msg_cache = AIMessageCache.from_settings()
+        key = msg_cache.make_key(base, context, comment, model_chain)
+        variant = msg_cache.get(key)          # None on miss
+        msg_cache.put(key, {'text': ..., 'model': ...})
+    """
+
+    _instance: Optional["AIMessageCache"] = None
+
+    def __init__(
+        self,
+        max_variants: int = DEFAULT_MAX_VARIANTS,
+        ttl: int = DEFAULT_TTL_SECONDS,
+        lru_size: int = DEFAULT_LRU_SIZE,
+    ):
+        self.max_variants = max(1, int(max_variants))
+        self.ttl = ttl
+        self.lru_size = lru_size
+        # key -> (expires_at, variants); expires_at is wall-clock so it can be
+        # shared with the Django cache entry written by another process
+        self._lru: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "AIMessageCache":
+        """Singleton factory — reads AI_MESSAGE_CACHE_* from Django settings."""
+        if cls._instance is None:
+            from django.conf import settings
+            cls._instance = cls(
+                max_variants=getattr(settings, 'AI_MESSAGE_CACHE_VARIANTS', DEFAULT_MAX_VARIANTS),
+                ttl=getattr(settings, 'AI_MESSAGE_CACHE_TTL', DEFAULT_TTL_SECONDS),
+                lru_size=getattr(settings, 'AI_MESSAGE_CACHE_LRU_SIZE', DEFAULT_LRU_SIZE),
+            )
+        return cls._instance
+
+    @classmethod
+    def reset(cls):
+        """Reset singleton — useful in tests."""
+        cls._instance = None
+
+    @staticmethod
+    def make_key(base_message: str, business_context: str, user_comment: str, model: str) -> str:
+        """Content address for one (message, context, comment, model) combination."""
+        digest = hashlib.sha256()
+        for part in (base_message, business_context, normalize_comment(user_comment), model):
+            digest.update((part or '').encode('utf-8'))
+            digest.update(b'\x00')
+        return f'{CACHE_KEY_PREFIX}:{digest.hexdigest()}'
+
+    # ------------------------------------------------------------------
+    # In-process LRU tier
+    # ------------------------------------------------------------------
+
+    def _lru_get(self, key: str) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            expires_at, variants = entry
+            if expires_at <= time.time():
+                del self._lru[key]
+                return None
+            self._lru.move_to_end(key)
+            return variants
+
+    def _lru_set(self, key: str, variants: List[Dict], expires_at: float):
+        with self._lock:
+            self._lru[key] = (expires_at, variants)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Shared tier
+    # ------------------------------------------------------------------
+
+    def _shared_get(self, key: str) -> Tuple[List[Dict], float]:
+        """(variants, expires_at) from the Django cache; ([], 0) on a miss."""
+        entry = cache.get(key)
+        if not entry:
+            return [], 0.0
+        return list(entry['variants']), entry['expires_at']
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Return a random cached variant, or None if the variant pool for this
+        key is not full yet (the caller should generate and put() a new one).
+        """
+        variants = self._lru_get(key)
+        if variants is None or len(variants) < self.max_variants:
+            variants, expires_at = self._shared_get(key)
+            if variants:
+                self._lru_set(key, variants, expires_at)
+
+        if len(variants) < self.max_variants:
+            return None
+        return random.choice(variants)
+
+    def put(self, key: str, variant: Dict):
+        """Add a freshly generated variant to both tiers (capped at max_variants)."""
+        variants, _ = self._shared_get(key)
+        if any(v.get('text') == variant.get('text') for v in variants):
+            return
+        variants.append(variant)
+        variants = variants[-self.max_variants:]
+        # Every write restarts the shared TTL, so both tiers expire together
+        expires_at = time.time() + self.ttl
+        try:
+            cache.set(key, {'variants': variants, 'expires_at': expires_at}, self.ttl)
+        except Exception as e:
+            logger.warning(f"[AIMessageCache] Could not write shared tier: {e}")
+        self._lru_set(key, variants, expires_at)
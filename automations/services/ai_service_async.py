@@ -6,22 +6,62 @@ Supports multi-key rotation via OpenRouterKeyPool
 
 import httpx
 import asyncio
+import time
 from typing import Dict, List, Optional
 import logging
 from datetime import datetime
 
+from automations.services.ai_message_cache import (
+    AIMessageCache,
+    USERNAME_PLACEHOLDER,
+    normalize_comment,
+    render_message,
+)
+from automations.services import ai_telemetry
+from automations.services.ai_batcher import AIBatcher
+from automations.services.ai_singleflight import AISingleFlight, prompt_key
+from automations.services.model_router import ModelRouter
+from automations.services.shared_key_pool import KeyPoolExhausted
+
 logger = logging.getLogger(__name__)
 
 # Lazily imported to avoid circular imports at module load
-_key_pool = None
+async def _get_key_pool():
+    """Return the key pool singleton, refreshed if AISettings keys changed."""
+    from automations.services.openrouter_key_pool import OpenRouterKeyPool
+    return await OpenRouterKeyPool.afrom_settings()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds form only)."""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _get_singleflight():
+    """Return the AI singleflight coordinator, or None when disabled in settings."""
+    from django.conf import settings
+    if not getattr(settings, 'AI_SINGLEFLIGHT_ENABLED', True):
+        return None
+    return AISingleFlight.from_settings()
 
-def _get_key_pool():
-    """Return the global key pool singleton (lazy init)."""
-    global _key_pool
-    if _key_pool is None:
-        from automations.services.openrouter_key_pool import OpenRouterKeyPool
-        _key_pool = OpenRouterKeyPool.from_settings()
-    return _key_pool
+
+def _get_batcher():
+    """Return the burst batcher, or None when disabled in settings."""
+    from django.conf import settings
+    if not getattr(settings, 'AI_BATCH_ENABLED', True):
+        return None
+    return AIBatcher.from_settings()
+
+
+def _get_message_cache():
+    """Return the AI message cache, or None when disabled in settings."""
+    from django.conf import settings
+    if not getattr(settings, 'AI_MESSAGE_CACHE_ENABLED', True):
+        return None
+    return AIMessageCache.from_settings()
 
 
 class AIServiceOpenRouter:
@@ -109,11 +149,13 @@ class AIServiceOpenRouter:
         business_context: str,
         user_comment: str,
         username: str,
-        models: List[str] = None
+        models: List[str] = None,
+        use_cache: bool = True,
+        batch_key: Optional[str] = None
     ) -> Dict:
         """
         Enhance DM message with AI (fully async)
-        Tries multiple models with automatic fallback
+        Tries multiple models with latency-aware ordering, hedging and fallback
         
         Args:
             base_message: Template message to enhance
@@ -121,55 +163,101 @@ class AIServiceOpenRouter:
             user_comment: User's comment that triggered automation
             username: Instagram username
             models: Optional list of model IDs to try (uses default if None)
+            use_cache: Serve/store variants via AIMessageCache (username is
+                       substituted after retrieval)
+            batch_key: Automation id; during bursts, requests sharing it are
+                       enhanced together in one LLM call via AIBatcher
         
         Returns:
-            Dict with success, enhanced_message, model_used, etc.
+            Dict with success, enhanced_message, model_used, cache_hit, etc.
         """
-        prompt = self._build_enhancement_prompt(
-            base_message, 
-            business_context, 
-            user_comment, 
-            username
-        )
-        
         # Use provided models or default fallback chain
         models_to_try = models or [m['id'] for m in self.MODELS]
+
+        msg_cache = _get_message_cache() if use_cache else None
+        cache_key = None
+        if msg_cache:
+            cache_key = msg_cache.make_key(
+                base_message, business_context, user_comment, '|'.join(models_to_try)
+            )
+            cached = msg_cache.get(cache_key)
+            if cached:
+                model_info = next((m for m in self.MODELS if m['id'] == cached['model']), None)
+                logger.info(f"✓ AI message cache hit ({cached['model']})")
+                await ai_telemetry.arecord_cache_hit('openrouter', cached['model'])
+                return {
+                    'success': True,
+                    'enhanced_message': render_message(cached['text'], username),
+                    'original_message': base_message,
+                    'model_used': cached['model'],
+                    'model_name': model_info['name'] if model_info else cached['model'],
+                    'provider': 'openrouter',
+                    'cache_hit': True,
+                    'timestamp': datetime.utcnow().isoformat(),
+                }
+            # Generate against the placeholder so the variant is reusable for any user
+            prompt = self._build_enhancement_prompt(
+                base_message,
+                business_context,
+                normalize_comment(user_comment),
+                USERNAME_PLACEHOLDER
+            )
+        else:
+            prompt = self._build_enhancement_prompt(
+                base_message, 
+                business_context, 
+                user_comment, 
+                username
+            )
         
-        # Try each model in sequence
-        for model_id in models_to_try:
-            try:
-                model_info = next((m for m in self.MODELS if m['id'] == model_id), None)
-                model_name = model_info['name'] if model_info else model_id
-                
-                logger.info(f"Trying model: {model_name}")
-                
-                result = await self._generate(
-                    prompt=prompt,
-                    model=model_id,
-                    max_tokens=model_info['max_tokens'] if model_info else 400
-                )
-                
-                if result['success']:
-                    logger.info(f"✓ Success with {model_name}")
-                    return {
-                        'success': True,
-                        'enhanced_message': result['text'],
-                        'original_message': base_message,
-                        'model_used': model_id,
-                        'model_name': model_name,
-                        'provider': 'openrouter',
-                        'timestamp': datetime.utcnow().isoformat(),
-                    }
-                else:
-                    logger.warning(f"✗ {model_name} failed: {result.get('error')}")
-                    status_code = result.get('status_code')
-                    if status_code in [401, 402, 403]:
-                        logger.error(f"Critical API error {status_code}: Aborting model fallback.")
-                        break
-                    
-            except Exception as e:
-                logger.warning(f"✗ Model {model_id} exception: {str(e)}")
-                continue
+        batcher = _get_batcher() if batch_key else None
+        if batcher:
+            # With the cache on, batch against the placeholder too so each result is a reusable variant
+            batched = await batcher.enhance(
+                batch_key, base_message, business_context,
+                normalize_comment(user_comment) if msg_cache else user_comment,
+                USERNAME_PLACEHOLDER if msg_cache else username,
+                generate=lambda p, max_tokens: self._generate_hedged(p, models_to_try, max_tokens),
+            )
+            if batched:
+                model_info = next((m for m in self.MODELS if m['id'] == batched['model']), None)
+                enhanced_message = batched['text']
+                if msg_cache:
+                    msg_cache.put(cache_key, {'text': enhanced_message, 'model': batched['model']})
+                    enhanced_message = render_message(enhanced_message, username)
+                return {
+                    'success': True,
+                    'enhanced_message': enhanced_message,
+                    'original_message': base_message,
+                    'model_used': batched['model'],
+                    'model_name': model_info['name'] if model_info else batched['model'],
+                    'provider': 'openrouter',
+                    'cache_hit': False,
+                    'batched': True,
+                    'timestamp': datetime.utcnow().isoformat(),
+                }
+
+        # Fastest healthy model first; hedge to the next-best if it runs past its p95
+        model_id, result = await self._generate_hedged(prompt, models_to_try)
+
+        if model_id is not None:
+            model_info = next((m for m in self.MODELS if m['id'] == model_id), None)
+            model_name = model_info['name'] if model_info else model_id
+            logger.info(f"✓ Success with {model_name}")
+            enhanced_message = result['text']
+            if msg_cache:
+                msg_cache.put(cache_key, {'text': enhanced_message, 'model': model_id})
+                enhanced_message = render_message(enhanced_message, username)
+            return {
+                'success': True,
+                'enhanced_message': enhanced_message,
+                'original_message': base_message,
+                'model_used': model_id,
+                'model_name': model_name,
+                'provider': 'openrouter',
+                'cache_hit': False,
+                'timestamp': datetime.utcnow().isoformat(),
+            }
         
         # All models failed, return original message
         logger.error("All models failed, using original message")
@@ -182,12 +270,140 @@ class AIServiceOpenRouter:
             'timestamp': datetime.utcnow().isoformat(),
         }
     
+    async def _generate_hedged(self, prompt: str, models: List[str], max_tokens: Optional[int] = None):
+        """
+        Run the prompt against `models`, ordered by ModelRouter (p50 latency and
+        error rate). If the primary hasn't answered within its rolling p95, a
+        hedged request goes to the next-best model and the first success wins.
+        A failed attempt immediately starts the next model. At most two
+        requests are in flight at once. max_tokens overrides the per-model
+        limit (batched prompts need more room).
+
+        Returns:
+            (model_id, result) on success, (None, last_result) if all failed
+        """
+        router = ModelRouter()
+        stats = await router.astats(models)
+        queue = router.rank(models, stats)
+        in_flight = {}  # task -> model_id
+        hedged_away = set()  # tasks cancelled because another call settled the request
+        cut_off = False
+        last_result = {'success': False, 'error': 'No models to try'}
+
+        def launch():
+            model_id = queue.pop(0)
+            model_info = next((m for m in self.MODELS if m['id'] == model_id), None)
+            logger.info(f"Trying model: {model_info['name'] if model_info else model_id}")
+            task = asyncio.ensure_future(self._timed_generate(
+                router,
+                prompt=prompt,
+                model=model_id,
+                max_tokens=max_tokens or (model_info['max_tokens'] if model_info else 400),
+                hedged_away=hedged_away,
+            ))
+            in_flight[task] = model_id
+
+        launch()
+        try:
+            while in_flight:
+                primary = next(iter(in_flight.values()))
+                can_hedge = bool(queue) and len(in_flight) < 2
+                done, _ = await asyncio.wait(
+                    in_flight.keys(),
+                    timeout=router.hedge_delay(primary, stats) if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                if not done:
+                    logger.info(f"⏱ {primary} past its p95 — hedging to {queue[0]}")
+                    launch()
+                    continue
+
+                for task in done:
+                    model_id = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        result = {'success': False, 'error': str(e)}
+
+                    if result['success']:
+                        return model_id, result
+
+                    last_result = result
+                    logger.warning(f"✗ {model_id} failed: {result.get('error')}")
+                    if result.get('status_code') in [401, 402, 403]:
+                        logger.error(f"Critical API error {result['status_code']}: Aborting model fallback.")
+                        return None, last_result
+
+                if not in_flight and queue:
+                    launch()
+            return None, last_result
+        except asyncio.CancelledError:
+            # Cut off from outside (AI_ENHANCEMENT_LATENCY_BUDGET): the calls in flight failed
+            cut_off = True
+            raise
+        finally:
+            if not cut_off:
+                hedged_away.update(in_flight)
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                # Let the cancelled calls record their router samples before returning
+                await asyncio.wait(in_flight.keys())
+
+    async def _timed_generate(self, router, prompt: str, model: str, max_tokens: int = 400,
+                              hedged_away=frozenset()) -> Dict:
+        """
+        _generate_coalesced() that feeds latency/outcome into the ModelRouter.
+        A call cut off by AI_ENHANCEMENT_LATENCY_BUDGET is recorded as a
+        failure that took as long as it ran, so slow models don't look healthy
+        for lack of data. A call cancelled because another one settled the
+        request (its task is in `hedged_away`) only records its latency, a
+        lower bound, so losing a hedge doesn't count as an error.
+        """
+        started = time.monotonic()
+        try:
+            result = await self._generate_coalesced(prompt=prompt, model=model, max_tokens=max_tokens)
+        except (asyncio.CancelledError, Exception):
+            success = None if asyncio.current_task() in hedged_away else False
+            # Shielded so the sample still lands while the task is being cancelled
+            await asyncio.shield(router.arecord(model, time.monotonic() - started, success))
+            raise
+        await router.arecord(model, time.monotonic() - started, result.get('success', False))
+        return result
+
+    async def _generate_coalesced(self, prompt: str, model: str, max_tokens: int = 400) -> Dict:
+        """
+        _generate() behind AISingleFlight: concurrent identical prompts (in this
+        process or in other workers) share one provider request.
+        """
+        flight = _get_singleflight()
+        if flight is None:
+            return await self._generate(prompt=prompt, model=model, max_tokens=max_tokens)
+        return await flight.do(
+            prompt_key(prompt, model),
+            lambda: self._generate(prompt=prompt, model=model, max_tokens=max_tokens),
+        )
+
     async def _generate(
         self,
         prompt: str,
         model: str,
         max_tokens: int = 400,
         temperature: float = 0.7
+    ) -> Dict:
+        """_request() plus one AICallTelemetry record per call."""
+        started = time.monotonic()
+        result = await self._request(prompt, model, max_tokens, temperature)
+        await ai_telemetry.arecord_call('openrouter', model, result, time.monotonic() - started)
+        return result
+
+    async def _request(
+        self,
+        prompt: str,
+        model: str,
+        max_tokens: int = 400,
+        temperature: float = 0.7
     ) -> Dict:
         """
         Generate text using OpenRouter.
@@ -203,10 +419,19 @@ class AIServiceOpenRouter:
             Dict with success flag and generated text or error
         """
         # Resolve API key: pool (rotating) or static override
-        if self._use_key_pool:
-            api_key = await _get_key_pool().get_key()
+        key_pool = await _get_key_pool() if self._use_key_pool else None
+        if key_pool:
+            try:
+                api_key = await key_pool.get_key()
+            except KeyPoolExhausted as e:
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'status_code': 429,
+                }
         else:
             api_key = self._static_api_key or ''
+        key_slot = key_pool.slot_id_for(api_key) if key_pool else ''
 
         try:
             response = await self.client.post(
@@ -233,10 +458,15 @@ class AIServiceOpenRouter:
                 'text': text,
                 'model': model,
                 'usage': data.get('usage', {}),
+                'key_slot': key_slot,
             }
 
         except httpx.HTTPStatusError as e:
             error_detail = f"HTTP {e.response.status_code}"
+            if e.response.status_code == 429 and key_pool:
+                await key_pool.report_rate_limited(
+                    api_key, _parse_retry_after(e.response.headers.get('Retry-After'))
+                )
             try:
                 error_data = e.response.json()
                 error_detail = error_data.get('error', {}).get('message', error_detail)
@@ -247,6 +477,7 @@ class AIServiceOpenRouter:
                 'success': False,
                 'error': error_detail,
                 'status_code': e.response.status_code,
+                'key_slot': key_slot,
             }
 
         except Exception as e:
@@ -335,6 +566,7 @@ Return ONLY the enhanced message text, nothing else (no quotes, no explanation).
     async def close(self):
         """Close HTTP client and cleanup"""
         await self.client.aclose()
+        await ai_telemetry.aflush_if_due()
     
     async def __aenter__(self):
         """Async context manager entry"""
@@ -0,0 +1,112 @@
+"""
+AI Settings Cache - Process-Local AISettings with Version Stamp
+================================================================
+- The parsed AISettings (provider + key lists) are cached per process
+- A version stamp lives in the shared Django cache (Redis in production);
+  saving AISettings bumps it via post_save (see automations.signals)
+- Each process compares its stamp with the shared one at most once per
+  CHECK_INTERVAL seconds and only reloads from the DB when it changed, so
+  triggers never hit the DB for AI settings and edits propagate within ~1s
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'ai_settings:version'
+CHECK_INTERVAL = 1.0  # seconds between version checks per process
+
+_lock = threading.Lock()
+_state = {
+    'config': None,     # parsed settings dict
+    'version': None,    # stamp the config was loaded under
+    'checked_at': 0.0,  # monotonic time of the last version check
+}
+
+
+def parse_keys(raw: Optional[str]) -> List[str]:
+    """Split a comma-separated key string from AISettings."""
+    return [k.strip() for k in (raw or '').split(',') if k.strip()]
+
+
+def _load() -> Dict:
+    from automations.models import AISettings
+
+    ai_settings = AISettings.load()
+    return {
+        'provider': ai_settings.provider,
+        'openrouter_keys': parse_keys(ai_settings.openrouter_api_keys),
+        'gemini_keys': parse_keys(ai_settings.gemini_api_keys),
+    }
+
+
+def _fresh(version) -> Optional[Dict]:
+    """Cached config if it is still current, else None. Records the check."""
+    with _lock:
+        _state['checked_at'] = time.monotonic()
+        if _state['config'] is not None and _state['version'] == version:
+            return _state['config']
+    return None
+
+
+def _store(config: Dict, version) -> Dict:
+    with _lock:
+        _state['config'] = config
+        _state['version'] = version
+        _state['checked_at'] = time.monotonic()
+    logger.info(f"[AISettingsCache] Loaded AI settings (provider={config['provider']})")
+    return config
+
+
+def _within_interval() -> Optional[Dict]:
+    with _lock:
+        if _state['config'] is not None and time.monotonic() - _state['checked_at'] < CHECK_INTERVAL:
+            return _state['config']
+    return None
+
+
+def get_ai_config() -> Dict:
+    """
+    Current AI settings: {'provider', 'openrouter_keys', 'gemini_keys'}.
+    Sync version for Celery tasks, management commands and key pool setup.
+    """
+    config = _within_interval()
+    if config is not None:
+        return config
+
+    version = cache.get(VERSION_KEY)
+    config = _fresh(version)
+    if config is not None:
+        return config
+    return _store(_load(), version)
+
+
+async def aget_ai_config() -> Dict:
+    """Async version of get_ai_config() — the DB is only touched on a version change."""
+    config = _within_interval()
+    if config is not None:
+        return config
+
+    version = await cache.aget(VERSION_KEY)
+    config = _fresh(version)
+    if config is not None:
+        return config
+    return _store(await sync_to_async(_load)(), version)
+
+
+def bump_version():
+    """Invalidate every process's cached AI settings (called on AISettings save)."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def reset():
+    """Drop this process's cached config — useful in tests."""
+    with _lock:
+        _state.update(config=None, version=None, checked_at=0.0)
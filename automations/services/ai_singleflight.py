@@ -0,0 +1,156 @@
+"""
+AI Singleflight - Coalesce Identical Concurrent AI Requests
+================================================================
+- Requests are keyed by a hash of (model, prompt)
+- Within one event loop, concurrent callers share a single asyncio Future
+- Across Celery worker processes, the first caller takes a short lock in the
+  shared Django cache (Redis SET NX in production) and performs the request;
+  the others poll for the published result until AI_SINGLEFLIGHT_WAIT_TIMEOUT
+- If the leader dies (lock expires without a result) or the wait times out,
+  a waiter performs the request itself, so coalescing never blocks a DM; the
+  wait ends early enough in AI_ENHANCEMENT_LATENCY_BUDGET for that call
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ai_sf'
+DEFAULT_LOCK_TTL = 30          # seconds the leader lock is held at most
+DEFAULT_RESULT_TTL = 15        # seconds a published result stays readable
+DEFAULT_WAIT_TIMEOUT = 9       # seconds a waiter waits before going solo (15 s budget - 6 s for its own call)
+POLL_INTERVAL_MIN = 0.05
+POLL_INTERVAL_MAX = 0.5
+
+
+def prompt_key(prompt: str, model: str) -> str:
+    """Singleflight key for one prompt sent to one model."""
+    digest = hashlib.sha256(f'{model}\x00{prompt}'.encode('utf-8')).hexdigest()
+    return digest
+
+
+class AISingleFlight:
+    """
+    Usage:
+        flight = AISingleFlight.from_settings()
+        result = await flight.do(prompt_key(prompt, model), lambda: generate(prompt, model))
+    """
+
+    _instance: Optional["AISingleFlight"] = None
+
+    def __init__(
+        self,
+        lock_ttl: int = DEFAULT_LOCK_TTL,
+        result_ttl: int = DEFAULT_RESULT_TTL,
+        wait_timeout: float = DEFAULT_WAIT_TIMEOUT,
+    ):
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.wait_timeout = wait_timeout
+        # (id(loop), key) -> Future; every asyncio.run() in a task gets its own loop
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "AISingleFlight":
+        """Singleton factory — reads AI_SINGLEFLIGHT_* from Django settings."""
+        if cls._instance is None:
+            from django.conf import settings
+            cls._instance = cls(
+                lock_ttl=getattr(settings, 'AI_SINGLEFLIGHT_LOCK_TTL', DEFAULT_LOCK_TTL),
+                result_ttl=getattr(settings, 'AI_SINGLEFLIGHT_RESULT_TTL', DEFAULT_RESULT_TTL),
+                wait_timeout=getattr(settings, 'AI_SINGLEFLIGHT_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT),
+            )
+        return cls._instance
+
+    @classmethod
+    def reset(cls):
+        """Reset singleton — useful in tests."""
+        cls._instance = None
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Run fn() once for all concurrent callers sharing `key`."""
+        loop = asyncio.get_running_loop()
+        local_key = (id(loop), key)
+
+        with self._inflight_lock:
+            future = self._inflight.get(local_key)
+            is_owner = future is None
+            if is_owner:
+                future = loop.create_future()
+                self._inflight[local_key] = future
+
+        if not is_owner:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The owner was cancelled (e.g. lost a hedge race) — take over
+                if future.cancelled():
+                    return await self.do(key, fn)
+                raise
+
+        try:
+            result = await self._do_shared(key, fn)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited future doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(local_key, None)
+
+    async def _do_shared(self, key: str, fn: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Cross-process part: leader lock + published result in the shared cache."""
+        lock_key = f'{KEY_PREFIX}:lock:{key}'
+        result_key = f'{KEY_PREFIX}:result:{key}'
+
+        published = await cache.aget(result_key)
+        if published is not None:
+            return published
+
+        token = uuid.uuid4().hex
+        if await cache.aadd(lock_key, token, self.lock_ttl):
+            return await self._lead(lock_key, result_key, token, fn)
+
+        # Another process is the leader — wait for its result
+        deadline = asyncio.get_running_loop().time() + self.wait_timeout
+        interval = POLL_INTERVAL_MIN
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, POLL_INTERVAL_MAX)
+
+            published = await cache.aget(result_key)
+            if published is not None:
+                return published
+
+            if await cache.aget(lock_key) is None:
+                # Leader finished without publishing (failure) or died — take over
+                if await cache.aadd(lock_key, token, self.lock_ttl):
+                    return await self._lead(lock_key, result_key, token, fn)
+
+        logger.warning(f"[SingleFlight] Timed out waiting for {key[:12]}…, calling provider directly")
+        return await fn()
+
+    async def _lead(self, lock_key: str, result_key: str, token: str, fn) -> Dict:
+        try:
+            result = await fn()
+            # Only successes are shared; failures let waiters retry on their own
+            if isinstance(result, dict) and result.get('success'):
+                await cache.aset(result_key, result, self.result_ttl)
+            return result
+        finally:
+            if await cache.aget(lock_key) == token:
+                await cache.adelete(lock_key)
@@ -0,0 +1,138 @@
+"""
+AI Telemetry - Structured Per-Call Records
+================================================================
+- Every provider call made by the AI services (and every cache/variant-pool
+  hit that avoided one) becomes one AICallTelemetry row: provider, model,
+  key slot, prompt/completion tokens, latency, status code, cache hit
+- The user/automation a call belongs to is bound once per trigger with
+  bind(); it travels with the asyncio context into hedged and batched calls
+- Records are buffered per process and bulk-written once FLUSH_SIZE records
+  or FLUSH_INTERVAL seconds have accumulated, and when a service is closed
+- Telemetry is best-effort: a failed write is logged and dropped, never
+  raised into the DM pipeline
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 50
+FLUSH_INTERVAL = 10.0  # seconds
+MAX_BUFFER = 5000      # drop oldest beyond this if the DB is unreachable
+
+_context: contextvars.ContextVar = contextvars.ContextVar('ai_telemetry_context', default=None)
+
+_lock = threading.Lock()
+_buffer: List[Dict] = []
+_last_flush = time.monotonic()
+
+
+def bind(user_id=None, automation_id=None) -> contextvars.Token:
+    """Attribute subsequent AI calls in this context to a user/automation."""
+    return _context.set({'user_id': user_id, 'automation_id': automation_id})
+
+
+def unbind(token: contextvars.Token):
+    _context.reset(token)
+
+
+def _usage_tokens(result: Dict):
+    """(prompt_tokens, completion_tokens) from a normalized 'usage' dict."""
+    usage = result.get('usage') or {}
+    return int(usage.get('prompt_tokens') or 0), int(usage.get('completion_tokens') or 0)
+
+
+def _append(record: Dict) -> bool:
+    """Buffer a record; True if the buffer is due for a flush."""
+    global _buffer
+    with _lock:
+        _buffer.append(record)
+        if len(_buffer) > MAX_BUFFER:
+            _buffer = _buffer[-MAX_BUFFER:]
+        return len(_buffer) >= FLUSH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL
+
+
+def _build(provider: str, model: str, latency: float, result: Optional[Dict] = None,
+           key_slot: str = '', cache_hit: bool = False) -> Dict:
+    ctx = _context.get() or {}
+    result = result or {'success': True}
+    prompt_tokens, completion_tokens = _usage_tokens(result)
+    return {
+        'user_id': ctx.get('user_id'),
+        'automation_id': ctx.get('automation_id'),
+        'provider': provider,
+        'model': model[:100],
+        'key_slot': key_slot or result.get('key_slot') or '',
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'latency_ms': int(latency * 1000),
+        'status_code': result.get('status_code') or (200 if result.get('success') else None),
+        'success': bool(result.get('success')),
+        'cache_hit': cache_hit,
+        'created_at': timezone.now(),
+    }
+
+
+async def arecord_call(provider: str, model: str, result: Dict, latency: float):
+    """Record one provider call from a service's _generate()."""
+    if _append(_build(provider, model, latency, result)):
+        await aflush()
+
+
+async def arecord_cache_hit(provider: str, model: str):
+    """Record an enhancement served without a provider call."""
+    if _append(_build(provider, model, 0.0, cache_hit=True)):
+        await aflush()
+
+
+def _drain() -> List[Dict]:
+    global _buffer, _last_flush
+    with _lock:
+        records, _buffer = _buffer, []
+        _last_flush = time.monotonic()
+    return records
+
+
+def flush() -> int:
+    """Write buffered records (sync). Returns the number written."""
+    from analytics.models import AICallTelemetry
+
+    records = _drain()
+    if not records:
+        return 0
+    try:
+        AICallTelemetry.objects.bulk_create([AICallTelemetry(**r) for r in records])
+    except Exception as e:
+        logger.warning(f"[AITelemetry] Dropped {len(records)} record(s): {e}")
+        return 0
+    return len(records)
+
+
+async def aflush() -> int:
+    """Write buffered records (async). Returns the number written."""
+    from analytics.models import AICallTelemetry
+
+    records = _drain()
+    if not records:
+        return 0
+    try:
+        await AICallTelemetry.objects.abulk_create([AICallTelemetry(**r) for r in records])
+    except Exception as e:
+        logger.warning(f"[AITelemetry] Dropped {len(records)} record(s): {e}")
+        return 0
+    return len(records)
+
+
+async def aflush_if_due() -> int:
+    """Flush only if the size/age threshold is reached (cheap to call often)."""
+    with _lock:
+        due = _buffer and (
+            len(_buffer) >= FLUSH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL
+        )
+    return await aflush() if due else 0
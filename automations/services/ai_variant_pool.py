@@ -0,0 +1,245 @@
+"""
+AI Variant Pool - Pre-Generated Enhanced DMs per Automation
+================================================================
+- Comments are classified into intent clusters: one per trigger keyword
+  ('kw:<keyword>') plus 'generic' for short comments that match no keyword.
+  Long, specific comments don't fit a cluster and are enhanced live
+- A Celery task generates AI_VARIANT_POOL_SIZE variants per cluster offline
+  (on automation save and on a schedule) and stores them as AIMessageVariant
+- Hot path: one cache read, random pick, username substitution
+- Staleness: every variant carries a hash of the automation's message,
+  context and keywords, so an edit invalidates the pool immediately; pools
+  older than AI_VARIANT_POOL_MAX_AGE_DAYS are regenerated by the beat task
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from automations.services.ai_message_cache import USERNAME_PLACEHOLDER, normalize_comment
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = 'ai_variants'
+CACHE_TTL = 86400
+GENERIC_CLUSTER = 'generic'
+# Sample comment used to generate the generic cluster
+GENERIC_CLUSTER_SAMPLE = 'Interested!'
+# Comments longer than this carry their own content — generate those live
+MAX_CLUSTER_WORDS = 4
+MAX_CLUSTERS = 20
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_AGE_DAYS = 7
+GENERATION_CONCURRENCY = 5
+
+# Automation fields that feed the prompt; saving anything else keeps the pool
+SOURCE_FIELDS = {'DmMessage', 'ai_context', 'trigger_keywords', 'use_ai_enhancement'}
+
+
+def cluster_keywords(automation) -> List[str]:
+    """Normalized trigger keywords, longest first so the most specific match wins."""
+    keywords = {normalize_comment(k) for k in (automation.trigger_keywords or [])}
+    keywords.discard('')
+    return sorted(keywords, key=lambda k: (-len(k), k))[:MAX_CLUSTERS]
+
+
+def classify_comment(automation, comment_text: str) -> Optional[str]:
+    """Map a comment to an intent cluster, or None if it needs live generation."""
+    normalized = normalize_comment(comment_text)
+    if not normalized or len(normalized.split()) > MAX_CLUSTER_WORDS:
+        return None
+    for keyword in cluster_keywords(automation):
+        if keyword in normalized:
+            return f'kw:{keyword}'
+    return GENERIC_CLUSTER
+
+
+def source_hash(automation) -> str:
+    """Fingerprint of everything the generated variants depend on."""
+    digest = hashlib.sha256()
+    for part in (automation.DmMessage, automation.ai_context, *cluster_keywords(automation)):
+        digest.update((part or '').encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class AIVariantPool:
+    """
+    Usage:
+        pool = AIVariantPool.from_settings()
+        variant = await pool.apick(automation, comment_text)   # None → go live
+        pool.generate(automation)                               # Celery task
+    """
+
+    _instance: Optional["AIVariantPool"] = None
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, max_age_days: int = DEFAULT_MAX_AGE_DAYS):
+        self.pool_size = max(1, int(pool_size))
+        self.max_age = timedelta(days=max_age_days)
+
+    @classmethod
+    def from_settings(cls) -> "AIVariantPool":
+        """Singleton factory — reads AI_VARIANT_POOL_* from Django settings."""
+        if cls._instance is None:
+            from django.conf import settings
+            cls._instance = cls(
+                pool_size=getattr(settings, 'AI_VARIANT_POOL_SIZE', DEFAULT_POOL_SIZE),
+                max_age_days=getattr(settings, 'AI_VARIANT_POOL_MAX_AGE_DAYS', DEFAULT_MAX_AGE_DAYS),
+            )
+        return cls._instance
+
+    @classmethod
+    def reset(cls):
+        """Reset singleton — useful in tests."""
+        cls._instance = None
+
+    @staticmethod
+    def _cache_key(automation_id, fingerprint: str) -> str:
+        return f'{CACHE_KEY_PREFIX}:{automation_id}:{fingerprint[:16]}'
+
+    # ------------------------------------------------------------------
+    # Hot path
+    # ------------------------------------------------------------------
+
+    async def _aload(self, automation) -> Dict[str, List[Dict]]:
+        """cluster -> variants for the automation's current source hash."""
+        from automations.models import AIMessageVariant
+
+        fingerprint = source_hash(automation)
+        key = self._cache_key(automation.id, fingerprint)
+        pool = await cache.aget(key)
+        if pool is not None:
+            return pool
+
+        pool = {}
+        rows = AIMessageVariant.objects.filter(
+            automation_id=automation.id, source_hash=fingerprint
+        ).values('cluster', 'text', 'model_used')
+        async for row in rows:
+            pool.setdefault(row['cluster'], []).append(
+                {'text': row['text'], 'model': row['model_used']}
+            )
+        # An empty pool is cached too, so a missing pool costs one DB query per TTL
+        await cache.aset(key, pool, CACHE_TTL)
+        return pool
+
+    async def apick(self, automation, comment_text: str) -> Optional[Dict]:
+        """Random pre-generated variant for this comment, or None."""
+        cluster = classify_comment(automation, comment_text)
+        if cluster is None:
+            return None
+        try:
+            variants = (await self._aload(automation)).get(cluster)
+        except Exception as e:
+            logger.warning(f"[VariantPool] Could not load pool for {automation.id}: {e}")
+            return None
+        return random.choice(variants) if variants else None
+
+    # ------------------------------------------------------------------
+    # Offline generation
+    # ------------------------------------------------------------------
+
+    def is_stale(self, automation) -> bool:
+        """True if the pool is missing, built from an old source or too old."""
+        from automations.models import AIMessageVariant
+
+        oldest = (
+            AIMessageVariant.objects
+            .filter(automation_id=automation.id, source_hash=source_hash(automation))
+            .order_by('created_at')
+            .values_list('created_at', flat=True)
+            .first()
+        )
+        return oldest is None or oldest < timezone.now() - self.max_age
+
+    def _clusters(self, automation) -> Dict[str, str]:
+        """cluster -> sample comment passed to the prompt."""
+        clusters = {f'kw:{k}': k for k in cluster_keywords(automation)}
+        clusters[GENERIC_CLUSTER] = GENERIC_CLUSTER_SAMPLE
+        return clusters
+
+    async def _agenerate(self, ai_service, automation) -> Dict[str, List[Dict]]:
+        semaphore = asyncio.Semaphore(GENERATION_CONCURRENCY)
+
+        async def one(sample: str, index: int) -> Optional[Dict]:
+            # Numbering the variation keeps prompts distinct (no coalescing) and varied
+            context = (
+                f"{automation.ai_context}\n\n"
+                f"(Write variation {index + 1} of {self.pool_size}; vary the wording.)"
+            )
+            async with semaphore:
+                result = await ai_service.enhance_DmMessage(
+                    base_message=automation.DmMessage,
+                    business_context=context,
+                    user_comment=sample,
+                    username=USERNAME_PLACEHOLDER,
+                    use_cache=False,
+                )
+            if not result['success']:
+                return None
+            return {'text': result['enhanced_message'], 'model': result.get('model_used', '')}
+
+        pool = {}
+        clusters = self._clusters(automation)
+        results = await asyncio.gather(*[
+            one(sample, i) for sample in clusters.values() for i in range(self.pool_size)
+        ])
+        for idx, cluster in enumerate(clusters):
+            seen = set()
+            for variant in results[idx * self.pool_size:(idx + 1) * self.pool_size]:
+                if variant and variant['text'] not in seen:
+                    seen.add(variant['text'])
+                    pool.setdefault(cluster, []).append(variant)
+        return pool
+
+    def generate(self, automation) -> int:
+        """Rebuild the automation's variant pool. Returns the number of variants stored."""
+        from automations.models import AIMessageVariant
+        from automations.services.ai_service_async import AIServiceOpenRouter
+        from automations.services.ai_settings_cache import get_ai_config
+        from automations.services.gemini_service_async import AIServiceGemini
+
+        if not (automation.use_ai_enhancement and automation.ai_context):
+            AIMessageVariant.objects.filter(automation_id=automation.id).delete()
+            return 0
+
+        provider = get_ai_config()['provider']
+        ai_service = AIServiceGemini() if provider == 'gemini' else AIServiceOpenRouter()
+
+        async def run():
+            try:
+                return await self._agenerate(ai_service, automation)
+            finally:
+                await ai_service.close()
+
+        pool = asyncio.run(run())
+        if not pool:
+            logger.warning(f"[VariantPool] No variants generated for automation {automation.id}")
+            return 0
+
+        fingerprint = source_hash(automation)
+        with transaction.atomic():
+            AIMessageVariant.objects.filter(automation_id=automation.id).delete()
+            AIMessageVariant.objects.bulk_create([
+                AIMessageVariant(
+                    automation_id=automation.id,
+                    cluster=cluster,
+                    text=variant['text'],
+                    model_used=variant['model'],
+                    source_hash=fingerprint,
+                )
+                for cluster, variants in pool.items()
+                for variant in variants
+            ])
+        cache.delete(self._cache_key(automation.id, fingerprint))
+
+        total = sum(len(v) for v in pool.values())
+        logger.info(f"[VariantPool] ✓ {total} variants in {len(pool)} clusters for automation {automation.id}")
+        return total
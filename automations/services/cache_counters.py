@@ -0,0 +1,38 @@
+"""
+Atomic Cache Counters
+================================================================
+- Django's BaseCache.aincr()/adecr() are a get followed by a set, and
+  django-redis doesn't override them, so concurrent async callers silently
+  lose increments
+- These helpers run the backend's sync incr() instead (Redis INCR,
+  LocMemCache under its lock), which is atomic across coroutines, threads
+  and worker processes
+"""
+
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+
+def incr(key: str, ttl: int, delta: int = 1) -> int:
+    """Atomically add `delta` to a counter, creating it with `ttl` if missing."""
+    cache.add(key, 0, ttl)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Expired between add and incr — recreate it
+        cache.set(key, delta, ttl)
+        return delta
+
+
+def decr(key: str, delta: int = 1) -> Optional[int]:
+    """Atomically subtract `delta`; returns None if the counter is gone."""
+    try:
+        return cache.decr(key, delta)
+    except ValueError:
+        return None
+
+
+aincr = sync_to_async(incr, thread_sensitive=True)
+adecr = sync_to_async(decr, thread_sensitive=True)
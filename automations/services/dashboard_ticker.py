@@ -0,0 +1,139 @@
+"""
+Dashboard Ticker - One Stats Loop per User, Shared by All Sockets
+================================================================
+- DashboardConsumer sockets subscribe/unsubscribe here instead of each
+  running its own polling loop; a process runs at most one ticker per user
+  and cancels it when that user's last socket on the node disconnects
+- Tickers are aligned to DASHBOARD_TICKER_INTERVAL boundaries and every tick
+  is claimed with cache.add() in the shared Django cache (Redis in
+  production), so across all nodes exactly one computes the stats and
+  broadcasts them to the 'dashboard_<user>' channel group
+- Stats come from the incremental counters: the automation counter fields
+  (one aggregate query) and today's hourly trigger rollups
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'dashboard_ticker'
+DEFAULT_INTERVAL = 5  # seconds
+NODE_ID = uuid.uuid4().hex[:12]
+
+
+def group_name(user_id) -> str:
+    return f'dashboard_{user_id}'
+
+
+def compute_stats(user_id) -> Dict:
+    """Dashboard stats for one user in two small queries."""
+    from django.db.models import Count, Q, Sum
+
+    from analytics.services import trigger_rollups
+    from automations.models import Automation
+
+    totals = Automation.objects.filter(instagram_account__user_id=user_id).aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        dms_sent=Sum('total_dms_sent'),
+        triggers=Sum('total_triggers'),
+    )
+    return {
+        'total_automations': totals['total'],
+        'active_automations': totals['active'],
+        'total_dms_sent': totals['dms_sent'] or 0,
+        'total_triggers': totals['triggers'] or 0,
+        'today_triggers': trigger_rollups.today_totals(user_id)['triggers'],
+    }
+
+
+class DashboardTicker:
+    """
+    Usage (inside a consumer):
+        ticker = DashboardTicker.from_settings()
+        ticker.subscribe(user.id)      # on connect
+        ticker.unsubscribe(user.id)    # on disconnect
+    """
+
+    _instance: Optional["DashboardTicker"] = None
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self._sockets: Dict[str, int] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_settings(cls) -> "DashboardTicker":
+        """Singleton factory — reads DASHBOARD_TICKER_INTERVAL from Django settings."""
+        if cls._instance is None:
+            from django.conf import settings
+            cls._instance = cls(interval=getattr(settings, 'DASHBOARD_TICKER_INTERVAL', DEFAULT_INTERVAL))
+        return cls._instance
+
+    @classmethod
+    def reset(cls):
+        """Cancel running tickers and drop the singleton — useful in tests."""
+        if cls._instance is not None:
+            for task in cls._instance._tasks.values():
+                task.cancel()
+        cls._instance = None
+
+    def subscribe(self, user_id):
+        """Register a socket; starts the user's ticker on this node if needed."""
+        key = str(user_id)
+        self._sockets[key] = self._sockets.get(key, 0) + 1
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            self._tasks[key] = asyncio.create_task(self._run(key))
+
+    def unsubscribe(self, user_id):
+        """Unregister a socket; cancels the ticker when it was the last one."""
+        key = str(user_id)
+        remaining = self._sockets.get(key, 0) - 1
+        if remaining > 0:
+            self._sockets[key] = remaining
+            return
+        self._sockets.pop(key, None)
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def running(self, user_id) -> bool:
+        task = self._tasks.get(str(user_id))
+        return task is not None and not task.done()
+
+    async def latest(self, user_id) -> Optional[Dict]:
+        """Most recently broadcast stats, for a socket that just connected."""
+        return await cache.aget(f'{KEY_PREFIX}:last:{user_id}')
+
+    async def _run(self, user_id: str):
+        while True:
+            try:
+                await self.tick(user_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[DashboardTicker] Tick failed for user {user_id}: {e}")
+            # Sleep to the next interval boundary so all nodes contend for the same tick
+            await asyncio.sleep(self.interval - (time.time() % self.interval))
+
+    async def tick(self, user_id, now: Optional[float] = None) -> bool:
+        """Compute and broadcast stats if this node wins the tick. True if it did."""
+        from channels.layers import get_channel_layer
+
+        tick = int((now or time.time()) // self.interval)
+        ttl = int(self.interval * 2) + 1
+        if not await cache.aadd(f'{KEY_PREFIX}:lead:{user_id}:{tick}', NODE_ID, ttl):
+            return False
+
+        stats = await sync_to_async(compute_stats)(user_id)
+        await cache.aset(f'{KEY_PREFIX}:last:{user_id}', stats, int(self.interval * 3))
+        await get_channel_layer().group_send(group_name(user_id), {'type': 'stats_update', 'data': stats})
+        return True
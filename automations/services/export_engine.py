@@ -0,0 +1,497 @@
+"""
+Export Engine - Constant-Memory Streaming Exports
+================================================================
+- Rows are read as values_list() tuples in keyset-paginated pages (on the
+  export's unique sort key, e.g. (-created_at, -id)); each page is read
+  with .iterator(), a server-side cursor on PostgreSQL, so neither the
+  queryset cache nor one long-lived cursor ever holds the whole result
+- Related columns (automation name, ...) are joined in the same query and
+  only datetime/list columns get a per-cell formatter; everything else goes
+  to the writer as the database returned it
+- Writers: csv, csv.gz, ndjson, ndjson.gz, parquet (needs pyarrow) and xlsx
+  (openpyxl write-only mode, column widths fixed up front). Each one is a
+  generator of byte chunks, so the same output can feed a
+  StreamingHttpResponse or be written to a file or storage backend
+- Memory stays bounded by EXPORT_CHUNK_SIZE rows whatever the row count
+- Trigger exports also cover months moved to the cold trigger archive:
+  split_archived_triggers() limits the queryset to the hot table and reads
+  the older months back, newest first, after the last keyset page
+- analytics_report() writes the multi-sheet analytics workbook (overview,
+  automations, daily breakdown) from three aggregate queries
+"""
+
+import csv
+import io
+import json
+import tempfile
+import uuid
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.db.models import Q
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+DEFAULT_CHUNK_SIZE = 5000      # rows per keyset page
+CURSOR_FETCH_SIZE = 1000       # rows per server-side cursor round trip inside a page
+STREAM_BLOCK = 64 * 1024       # bytes buffered before a chunk is yielded
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class ExportFormatError(ValueError):
+    """Unknown export format, or one whose optional dependency isn't installed."""
+
+
+class Column(NamedTuple):
+    path: str            # values_list() path, e.g. 'automation__name'
+    header: str          # CSV/XLSX header
+    kind: str = 'text'   # text | int | bool | datetime | list
+    width: int = 20      # XLSX column width in characters
+
+    @property
+    def key(self) -> str:
+        """Field name in NDJSON/Parquet output."""
+        return self.path.replace('__', '_')
+
+
+class ExportSpec(NamedTuple):
+    name: str
+    sheet_name: str
+    columns: Tuple[Column, ...]
+    order: Tuple[str, ...]   # unique keyset sort, e.g. ('-created_at', '-id')
+
+
+TRIGGERS = ExportSpec(
+    name='triggers',
+    sheet_name='Triggers',
+    columns=(
+        Column('automation__name', 'Automation', width=30),
+        Column('instagram_username', 'Username', width=24),
+        Column('comment_text', 'Comment', width=50),
+        Column('status', 'Status', width=12),
+        Column('dm_sent_at', 'DM Sent At', 'datetime', 21),
+        Column('was_ai_enhanced', 'AI Enhanced', 'bool', 13),
+        Column('created_at', 'Triggered At', 'datetime', 21),
+    ),
+    order=('-created_at', '-id'),
+)
+
+CONTACTS = ExportSpec(
+    name='contacts',
+    sheet_name='Contacts',
+    columns=(
+        Column('instagram_username', 'Username', width=24),
+        Column('full_name', 'Full Name', width=30),
+        Column('instagram_user_id', 'Instagram ID', width=22),
+        Column('total_interactions', 'Total Interactions', 'int', 19),
+        Column('total_dms_received', 'DMs Received', 'int', 14),
+        Column('is_follower', 'Is Follower', 'bool', 12),
+        Column('first_interaction', 'First Interaction', 'datetime', 21),
+        Column('last_interaction', 'Last Interaction', 'datetime', 21),
+        Column('tags', 'Tags', 'list', 30),
+    ),
+    order=('-last_interaction', '-id'),
+)
+
+# format -> (content type, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'ndjson.gz': ('application/gzip', 'ndjson.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def check_format(fmt: str) -> str:
+    """Normalized format name, or ExportFormatError."""
+    fmt = (fmt or 'csv').lower()
+    if fmt not in FORMATS:
+        raise ExportFormatError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+    if fmt == 'parquet' and not HAS_PYARROW:
+        raise ExportFormatError('Parquet export requires pyarrow, which is not installed on this server')
+    return fmt
+
+
+def filename_for(spec: ExportSpec, fmt: str, timestamp: Optional[datetime] = None) -> str:
+    return f'{spec.name}_{(timestamp or datetime.now()):%Y%m%d_%H%M%S}.{FORMATS[fmt][1]}'
+
+
+# ----------------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------------
+
+def _after(order: Tuple[str, ...], last: tuple) -> Q:
+    """Rows strictly after `last` in the keyset order."""
+    condition = Q()
+    for i, field in enumerate(order):
+        step = Q(**{f"{field.lstrip('-')}__{'lt' if field.startswith('-') else 'gt'}": last[i]})
+        for previous, value in zip(order[:i], last[:i]):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+def iter_rows(queryset, spec: ExportSpec, chunk_size: Optional[int] = None,
+              progress: Optional[Callable[[int], None]] = None,
+              archived: Optional[Iterable[tuple]] = None) -> Iterator[tuple]:
+    """
+    Value tuples for spec.columns, in spec.order, one keyset page at a time,
+    followed by the `archived` tuples (already in spec.order and older than
+    any queryset row). progress(rows so far) is called after every page.
+    """
+    if chunk_size is None:
+        from django.conf import settings
+        chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+    keys = [field.lstrip('-') for field in spec.order]
+    width = len(keys)
+    rows = queryset.order_by(*spec.order).values_list(*keys, *(c.path for c in spec.columns))
+
+    last, total = None, 0
+    while True:
+        page = rows.filter(_after(spec.order, last)) if last is not None else rows
+        fetched = 0
+        for row in page[:chunk_size].iterator(chunk_size=min(chunk_size, CURSOR_FETCH_SIZE)):
+            fetched += 1
+            last = row[:width]
+            yield row[width:]
+        total += fetched
+        if progress is not None:
+            progress(total)
+        if fetched < chunk_size:
+            break
+
+    for row in archived or ():
+        yield row
+        total += 1
+        if progress is not None and total % chunk_size == 0:
+            progress(total)
+    if archived is not None and progress is not None:
+        progress(total)
+
+
+def split_archived_triggers(triggers, automations):
+    """
+    (hot queryset, archived rows) for a TRIGGERS export of `automations`.
+    Rows the trigger archive has taken are dropped from the queryset (a purge
+    may still be under way) and read back from the archive as TRIGGERS
+    tuples, newest first; archived is None when nothing has been archived.
+    """
+    from . import trigger_archive
+
+    boundary = trigger_archive.hot_since()
+    if boundary is None:
+        return triggers, None
+
+    def archived():
+        names = {str(pk): name for pk, name in automations.values_list('id', 'name')}
+        if not names:
+            return
+        fields = [c.path for c in TRIGGERS.columns]
+        for row in trigger_archive.iter_archived(None, boundary, automation_ids=names):
+            row['automation__name'] = names[row['automation_id']]
+            yield tuple(row[field] for field in fields)
+
+    return triggers.filter(created_at__gte=boundary), archived()
+
+
+# ----------------------------------------------------------------------------
+# Cell formatting
+# ----------------------------------------------------------------------------
+
+def _format_datetime(value):
+    return value.strftime(DATETIME_FORMAT)
+
+
+def _format_list(value):
+    return ', '.join(str(item) for item in value) if isinstance(value, list) else str(value)
+
+
+TEXT_FORMATTERS: Dict[str, Callable] = {
+    'datetime': _format_datetime,
+    'list': _format_list,
+}
+
+
+def _formatted(rows: Iterable[tuple], columns, formatters: Dict[str, Callable]) -> Iterator[list]:
+    """Rows with only the columns that need it passed through a formatter (None stays None)."""
+    plan = [(i, formatters[c.kind]) for i, c in enumerate(columns) if c.kind in formatters]
+    if not plan:
+        yield from rows
+        return
+    for row in rows:
+        row = list(row)
+        for i, formatter in plan:
+            if row[i] is not None:
+                row[i] = formatter(row[i])
+        yield row
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Cannot export value of type {type(value).__name__}')
+
+
+# ----------------------------------------------------------------------------
+# Writers (generators of bytes)
+# ----------------------------------------------------------------------------
+
+def _csv(rows, columns) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.header for c in columns])
+    for row in _formatted(rows, columns, TEXT_FORMATTERS):
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_BLOCK:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson(rows, columns) -> Iterator[bytes]:
+    keys = [c.key for c in columns]
+    encode = json.JSONEncoder(default=_json_default, ensure_ascii=False).encode
+    lines: List[str] = []
+    size = 0
+    for row in rows:
+        line = encode(dict(zip(keys, row)))
+        lines.append(line)
+        size += len(line) + 1
+        if size >= STREAM_BLOCK:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines, size = [], 0
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink:
+    """Write-only file object for pyarrow that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def _parquet(rows, columns, chunk_size: int) -> Iterator[bytes]:
+    types = {
+        'text': pa.string(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+        'datetime': pa.timestamp('us', tz='UTC'),
+        'list': pa.list_(pa.string()),
+    }
+    schema = pa.schema([(c.key, types[c.kind]) for c in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='zstd')
+
+    def batch(buffered):
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*buffered), schema)]
+        return pa.record_batch(arrays, schema=schema)
+
+    buffered = []
+    for row in rows:
+        buffered.append(row)
+        if len(buffered) >= chunk_size:
+            writer.write_batch(batch(buffered))
+            buffered = []
+            yield sink.drain()
+    if buffered:
+        writer.write_batch(batch(buffered))
+    writer.close()
+    yield sink.drain()
+
+
+def _sheet(workbook, title: str, headers: List[Tuple[str, int]]):
+    """Write-only sheet with fixed column widths and the styled header row."""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    sheet = workbook.create_sheet(title)
+    # Widths are known up front, so rows never need a second pass
+    for index, (_, width) in enumerate(headers, 1):
+        sheet.column_dimensions[get_column_letter(index)].width = width
+
+    header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
+    header_font = Font(bold=True, color='FFFFFF')
+    cells = []
+    for title_text, _ in headers:
+        cell = WriteOnlyCell(sheet, value=title_text)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center')
+        cells.append(cell)
+    sheet.append(cells)
+    return sheet
+
+
+def _xlsx(rows, columns, sheet_name: str) -> Iterator[bytes]:
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    workbook = Workbook(write_only=True)
+    sheet = _sheet(workbook, sheet_name, [(c.header, c.width) for c in columns])
+
+    # Control characters in comments would make openpyxl reject the row
+    formatters = {**TEXT_FORMATTERS, 'text': lambda value: ILLEGAL_CHARACTERS_RE.sub('', value)}
+    for row in _formatted(rows, columns, formatters):
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as fp:
+        workbook.save(fp)
+        fp.seek(0)
+        yield from iter(lambda: fp.read(STREAM_BLOCK), b'')
+
+
+def stream(spec: ExportSpec, queryset, fmt: str, chunk_size: Optional[int] = None,
+           progress: Optional[Callable[[int], None]] = None,
+           archived: Optional[Iterable[tuple]] = None) -> Iterator[bytes]:
+    """The export as byte chunks (format validated before the generator is returned)."""
+    from django.conf import settings
+
+    fmt = check_format(fmt)
+    chunk_size = chunk_size or getattr(settings, 'EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    rows = iter_rows(queryset, spec, chunk_size, progress, archived)
+
+    if fmt in ('csv', 'csv.gz'):
+        chunks = _csv(rows, spec.columns)
+    elif fmt in ('ndjson', 'ndjson.gz'):
+        chunks = _ndjson(rows, spec.columns)
+    elif fmt == 'parquet':
+        chunks = _parquet(rows, spec.columns, chunk_size)
+    else:
+        chunks = _xlsx(rows, spec.columns, spec.sheet_name)
+    return _gzip(chunks) if fmt.endswith('.gz') else chunks
+
+
+def write(spec: ExportSpec, queryset, fmt: str, fp, chunk_size: Optional[int] = None,
+          progress: Optional[Callable[[int], None]] = None,
+          archived: Optional[Iterable[tuple]] = None) -> int:
+    """Write the export to a binary file object. Returns bytes written."""
+    written = 0
+    for chunk in stream(spec, queryset, fmt, chunk_size, progress, archived):
+        fp.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def streaming_response(spec: ExportSpec, queryset, fmt: str, archived: Optional[Iterable[tuple]] = None):
+    """StreamingHttpResponse for an export; raises ExportFormatError before any output."""
+    from django.http import StreamingHttpResponse
+
+    fmt = check_format(fmt)
+    response = StreamingHttpResponse(stream(spec, queryset, fmt, archived=archived), content_type=FORMATS[fmt][0])
+    response['Content-Disposition'] = f'attachment; filename="{filename_for(spec, fmt)}"'
+    return response
+
+
+def analytics_report(user_id, days: int, fp) -> int:
+    """
+    Write the analytics workbook (Overview, Automations, Daily Breakdown) for
+    the last `days` days into a binary file object. Returns the number of
+    automation + day rows written.
+    """
+    from openpyxl import Workbook
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+
+    from automations.models import Automation, AutomationTrigger
+
+    now = timezone.localtime()
+    automations = Automation.objects.filter(instagram_account__user_id=user_id)
+    totals = automations.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_active=True)),
+        dms_sent=Sum('total_dms_sent'),
+        triggers=Sum('total_triggers'),
+    )
+
+    workbook = Workbook(write_only=True)
+    overview = _sheet(workbook, 'Overview', [('Metric', 24), ('Value', 22)])
+    for row in (
+        ['Total Automations', totals['total']],
+        ['Active Automations', totals['active']],
+        ['Total DMs Sent', totals['dms_sent'] or 0],
+        ['Total Triggers', totals['triggers'] or 0],
+        ['Period', f'{days} days'],
+        ['Report Generated', now.strftime(DATETIME_FORMAT)],
+    ):
+        overview.append(row)
+
+    written = 0
+    sheet = _sheet(workbook, 'Automations', [('Name', 30), ('Status', 10), ('Triggers', 10), ('DMs Sent', 10), ('Success Rate', 13)])
+    rows = automations.order_by('name').values_list('name', 'is_active', 'total_triggers', 'total_dms_sent')
+    for name, is_active, triggers, dms_sent in rows.iterator(chunk_size=CURSOR_FETCH_SIZE):
+        success_rate = (dms_sent / triggers * 100) if triggers > 0 else 0
+        sheet.append([name, 'Active' if is_active else 'Inactive', triggers, dms_sent, f'{success_rate:.1f}%'])
+        written += 1
+
+    daily = {
+        row['day']: row
+        for row in (
+            AutomationTrigger.objects
+            .filter(automation__instagram_account__user_id=user_id, created_at__gte=now - timedelta(days=days))
+            .annotate(day=TruncDate('created_at'))
+            .values('day')
+            .annotate(
+                triggers=Count('id'),
+                sent=Count('id', filter=Q(status='sent')),
+                ai_enhanced=Count('id', filter=Q(was_ai_enhanced=True)),
+            )
+            .order_by()
+        )
+    }
+    sheet = _sheet(workbook, 'Daily Breakdown', [('Date', 12), ('Triggers', 10), ('DMs Sent', 10), ('AI Enhanced', 12)])
+    for i in range(days):
+        day = (now - timedelta(days=days - i - 1)).date()
+        row = daily.get(day, {'triggers': 0, 'sent': 0, 'ai_enhanced': 0})
+        sheet.append([day.strftime('%Y-%m-%d'), row['triggers'], row['sent'], row['ai_enhanced']])
+        written += 1
+
+    workbook.save(fp)
+    return written
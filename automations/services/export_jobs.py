@@ -0,0 +1,310 @@
+"""
+Export Jobs - Background Exports with Resumable Downloads
+================================================================
+- POST /api/exports/ records an ExportJob and queues run_export_job on the
+  system queue; the request returns at once instead of holding a web worker
+  for the whole export
+- The worker streams the export engine's output into a temp file, updating
+  rows_written after every keyset page, then saves the file through a Django
+  storage backend (STORAGES['exports'] if configured — e.g. an object store —
+  else the local EXPORT_ROOT directory)
+- Progress reaches the browser by polling GET /api/exports/<id>/ or as
+  'export_update' events on the user's WebSocket group (throttled to one per
+  EXPORT_PROGRESS_INTERVAL seconds)
+- The same user asking for the same export within EXPORT_DEDUPE_SECONDS gets
+  the existing job (pending, running or finished) instead of a new one
+- Downloads honour single-range `Range` / `If-Range` requests so a dropped
+  connection resumes where it stopped; files expire after EXPORT_TTL_HOURS
+"""
+
+import hashlib
+import json
+import logging
+import re
+import tempfile
+import time
+from datetime import timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from . import export_engine
+
+logger = logging.getLogger(__name__)
+
+STORAGE_ALIAS = 'exports'
+DEFAULT_DEDUPE_SECONDS = 600
+DEFAULT_TTL_HOURS = 24
+DEFAULT_PROGRESS_INTERVAL = 2.0   # seconds between WebSocket progress events
+ANALYTICS_MAX_DAYS = 365
+CLEANUP_BATCH_SIZE = 500
+
+SPECS = {
+    'triggers': export_engine.TRIGGERS,
+    'contacts': export_engine.CONTACTS,
+}
+ANALYTICS_FORMATS = ('xlsx',)
+ACTIVE_STATUSES = ('pending', 'running', 'completed')
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    """A Range header that selects no bytes of the file."""
+
+
+def _setting(name: str, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def get_storage():
+    """Storage for export files: STORAGES['exports'] or a local directory."""
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage, storages
+
+    if STORAGE_ALIAS in getattr(settings, 'STORAGES', {}):
+        return storages[STORAGE_ALIAS]
+    return FileSystemStorage(location=getattr(settings, 'EXPORT_ROOT', settings.BASE_DIR / 'exports'))
+
+
+def clean_params(kind: str, fmt: str, data) -> Tuple[str, Dict]:
+    """
+    Validate an export request. Returns (format, params) with only the
+    parameters that change the output, so equal requests fingerprint equal.
+    """
+    if kind in SPECS:
+        fmt = export_engine.check_format(fmt or 'csv')
+    elif kind == 'analytics':
+        fmt = fmt or 'xlsx'
+        if fmt not in ANALYTICS_FORMATS:
+            raise export_engine.ExportFormatError(f"Analytics reports are only available as {', '.join(ANALYTICS_FORMATS)}")
+    else:
+        raise ValueError(f"Unknown export kind '{kind}'. Use one of: {', '.join([*SPECS, 'analytics'])}")
+
+    params = {}
+    if kind == 'triggers' and data.get('automation_id'):
+        params['automation_id'] = str(data['automation_id'])
+    elif kind == 'analytics':
+        period = str(data.get('period') or '30d')
+        try:
+            days = int(period[:-1] if period.endswith('d') else period)
+        except ValueError:
+            raise ValueError(f"Invalid period '{period}', e.g. 30d")
+        params['days'] = max(1, min(days, ANALYTICS_MAX_DAYS))
+    return fmt, params
+
+
+def fingerprint(user_id, kind: str, fmt: str, params: Dict) -> str:
+    payload = json.dumps([str(user_id), kind, fmt, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def request_export(user, kind: str, fmt: str, params: Dict):
+    """
+    The job for this export: a recent identical one if there is one, else a
+    new job queued once the transaction commits. Returns (job, created).
+    """
+    from automations.models import ExportJob
+    from automations.tasks import run_export_job
+
+    now = timezone.now()
+    key = fingerprint(user.id, kind, fmt, params)
+    existing = ExportJob.objects.filter(
+        user=user, fingerprint=key, status__in=ACTIVE_STATUSES,
+        created_at__gte=now - timedelta(seconds=_setting('EXPORT_DEDUPE_SECONDS', DEFAULT_DEDUPE_SECONDS)),
+        expires_at__gt=now,
+    ).first()
+    if existing is not None:
+        return existing, False
+
+    job = ExportJob.objects.create(
+        user=user, kind=kind, format=fmt, params=params, fingerprint=key,
+        expires_at=now + timedelta(hours=_setting('EXPORT_TTL_HOURS', DEFAULT_TTL_HOURS)),
+    )
+    job_id = str(job.id)
+    transaction.on_commit(lambda: run_export_job.apply_async(args=[job_id], queue='system'))
+    return job, True
+
+
+def queryset_for(job):
+    """The rows a triggers/contacts job exports, scoped to its owner."""
+    from automations.models import AutomationTrigger, Contact
+
+    if job.kind == 'triggers':
+        rows = AutomationTrigger.objects.filter(automation__instagram_account__user_id=job.user_id)
+        if job.params.get('automation_id'):
+            rows = rows.filter(automation_id=job.params['automation_id'])
+        return rows
+    return Contact.objects.filter(instagram_account__user_id=job.user_id)
+
+
+def rows_for(job):
+    """(queryset, archived rows) a triggers/contacts job exports; see export_engine.split_archived_triggers."""
+    from automations.models import Automation
+
+    rows = queryset_for(job)
+    if job.kind != 'triggers':
+        return rows, None
+    automations = Automation.all_objects.filter(instagram_account__user_id=job.user_id)
+    if job.params.get('automation_id'):
+        automations = automations.filter(id=job.params['automation_id'])
+    return export_engine.split_archived_triggers(rows, automations)
+
+
+def download_name(job) -> str:
+    if job.kind == 'analytics':
+        return f'analytics_report_{timezone.localtime(job.created_at):%Y%m%d_%H%M%S}.xlsx'
+    return export_engine.filename_for(SPECS[job.kind], job.format, timezone.localtime(job.created_at))
+
+
+def job_payload(job) -> Dict:
+    """What WebSocket clients get in an 'export_update' event."""
+    return {
+        'id': str(job.id),
+        'kind': job.kind,
+        'format': job.format,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_written': job.rows_written,
+        'total_rows': job.total_rows,
+        'size_bytes': job.size_bytes,
+        'error': job.error,
+    }
+
+
+def notify(job):
+    """Best-effort progress event to the owner's WebSocket connections."""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    try:
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            f'user_{job.user_id}',
+            {'type': 'export_update', 'job': job_payload(job)},
+        )
+    except Exception as e:
+        logger.warning(f'⚠️ [Export] Progress event for job {job.id} not delivered: {e}')
+
+
+def run(job_id) -> Optional[str]:
+    """
+    Produce the file for a pending job (called by the run_export_job task).
+    Returns the final status, or None if another worker already claimed it.
+    """
+    from automations.models import ExportJob
+
+    # Claim: only one worker moves a job out of 'pending'
+    claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+    job = ExportJob.objects.get(pk=job_id)
+    notify(job)
+
+    interval = _setting('EXPORT_PROGRESS_INTERVAL', DEFAULT_PROGRESS_INTERVAL)
+    last_event = time.monotonic()
+
+    def progress(rows: int):
+        nonlocal last_event
+        job.rows_written = rows
+        ExportJob.objects.filter(pk=job.pk).update(rows_written=rows)
+        if time.monotonic() - last_event >= interval:
+            last_event = time.monotonic()
+            notify(job)
+
+    try:
+        with tempfile.TemporaryFile() as fp:
+            if job.kind == 'analytics':
+                job.rows_written = export_engine.analytics_report(job.user_id, job.params['days'], fp)
+            else:
+                rows, archived = rows_for(job)
+                # Archived months aren't counted up front; the total settles once they are read
+                job.total_rows = rows.count()
+                ExportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+                export_engine.write(SPECS[job.kind], rows, job.format, fp, progress=progress, archived=archived)
+                job.total_rows = job.rows_written
+            job.size_bytes = fp.tell()
+            fp.seek(0)
+            extension = export_engine.FORMATS[job.format][1]
+            job.path = get_storage().save(f'{job.user_id}/{job.id}.{extension}', File(fp))
+    except Exception as e:
+        logger.exception(f'❌ [Export] Job {job.id} ({job.kind}.{job.format}) failed: {e}')
+        job.status = 'failed'
+        job.error = str(e)[:1000]
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'completed_at', 'rows_written', 'total_rows'])
+        notify(job)
+        return job.status
+
+    job.status = 'completed'
+    job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'completed_at', 'rows_written', 'total_rows', 'path', 'size_bytes'])
+    notify(job)
+    logger.info(
+        f'✅ [Export] Job {job.id}: {job.rows_written} row(s), {job.size_bytes} bytes '
+        f'in {(job.completed_at - job.started_at).total_seconds():.1f}s'
+    )
+    return job.status
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (first, last) byte offsets, inclusive, for a single-range `Range` header;
+    None to send the whole file (no header, or one we don't serve partially,
+    e.g. multiple ranges). Raises RangeNotSatisfiable.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or last < first:
+        raise RangeNotSatisfiable(header)
+    return first, last
+
+
+def read_range(job, first: int, last: int) -> Iterator[bytes]:
+    """Bytes first..last (inclusive) of a job's file, in STREAM_BLOCK chunks."""
+    with get_storage().open(job.path, 'rb') as fp:
+        fp.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = fp.read(min(export_engine.STREAM_BLOCK, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def cleanup_expired(now=None) -> int:
+    """Delete expired jobs and their files. Returns the number of jobs removed."""
+    from automations.models import ExportJob
+
+    now = now or timezone.now()
+    storage = get_storage()
+    removed = 0
+    while True:
+        batch = list(ExportJob.objects.filter(expires_at__lte=now).values_list('pk', 'path')[:CLEANUP_BATCH_SIZE])
+        if not batch:
+            return removed
+        for _, path in batch:
+            if path:
+                try:
+                    storage.delete(path)
+                except Exception as e:
+                    logger.warning(f'⚠️ [Export] Could not delete {path}: {e}')
+        removed += ExportJob.objects.filter(pk__in=[pk for pk, _ in batch]).delete()[0]
@@ -3,14 +3,15 @@ Gemini API Key Pool - Rotating Rate Limiter
 ================================================
 - Holds multiple Gemini API keys from database AISettings or settings.GEMINI_API_KEYS
 - Each key is allowed max 15 requests/minute
+- Counters are shared by all worker processes via Redis (see SharedKeyPool)
 - Keys are rotated every 60 seconds (1 minute) in round-robin order
-- Falls back to the next key if the current key is rate-limited (429)
+- Falls back to the next key if the current key is busy or cooling down after a 429
 """
 
-import time
-import asyncio
 import logging
-from typing import Optional, List
+from typing import Optional
+
+from automations.services.shared_key_pool import SharedKeyPool
 
 logger = logging.getLogger(__name__)
 
@@ -20,65 +21,47 @@ KEY_MAX_RPM = 15
 KEY_ROTATION_SECONDS = 60
 
 
-class _KeySlot:
-    """Tracks usage stats for a single API key."""
-
-    def __init__(self, key: str):
-        self.key = key
-        self.request_count = 0       # Requests sent this minute window
-        self.window_start = time.monotonic()  # Start of current 1-min window
-        self._lock = asyncio.Lock()
-
-    async def can_use(self) -> bool:
-        async with self._lock:
-            now = time.monotonic()
-            # Reset window every 60 seconds
-            if now - self.window_start >= 60:
-                self.request_count = 0
-                self.window_start = now
-            return bool(self.request_count < KEY_MAX_RPM)
-        return False
-
-    async def record_use(self):
-        async with self._lock:
-            now = time.monotonic()
-            if now - self.window_start >= 60:
-                self.request_count = 0
-                self.window_start = now
-            self.request_count += 1
-
-
-class GeminiKeyPool:
+class GeminiKeyPool(SharedKeyPool):
     """
-    Thread-safe async pool that rotates between multiple Gemini API keys.
+    Cross-process pool that rotates between multiple Gemini API keys.
     """
 
-    _instance: Optional["GeminiKeyPool"] = None
+    namespace = 'gemini_keys'
+    max_rpm = KEY_MAX_RPM
+    rotation_seconds = KEY_ROTATION_SECONDS
+    log_prefix = '[GeminiKeyPool]'
 
-    def __init__(self, keys: List[str]):
-        if not keys:
-            raise ValueError("At least one Gemini API key must be provided.")
-        self._slots = [_KeySlot(k) for k in keys]
-        self._rotation_index = 0
-        self._rotation_lock = asyncio.Lock()
-        self._rotation_start = time.monotonic()
+    _instance: Optional["GeminiKeyPool"] = None
 
     @classmethod
     def from_settings(cls) -> "GeminiKeyPool":
-        """Singleton factory — reads from Django settings or AISettings."""
-        from django.conf import settings
-        from automations.models import AISettings
-        
-        # Load keys from AISettings if available
-        keys = []
+        """Singleton factory — reads from AISettings (cached) or Django settings."""
+        from automations.services.ai_settings_cache import get_ai_config
+
         try:
-            ai_settings = AISettings.load()
-            raw = ai_settings.gemini_api_keys
-            if raw:
-                keys = [k.strip() for k in raw.split(",") if k.strip()]
+            db_keys = get_ai_config()['gemini_keys']
         except Exception as e:
             logger.warning(f"Could not load AISettings: {e}")
-            
+            db_keys = []
+        return cls._from_keys(db_keys)
+
+    @classmethod
+    async def afrom_settings(cls) -> "GeminiKeyPool":
+        """Async from_settings() for the request path — no DB query unless AISettings changed."""
+        from automations.services.ai_settings_cache import aget_ai_config
+
+        try:
+            db_keys = (await aget_ai_config())['gemini_keys']
+        except Exception as e:
+            logger.warning(f"Could not load AISettings: {e}")
+            db_keys = []
+        return cls._from_keys(db_keys)
+
+    @classmethod
+    def _from_keys(cls, db_keys) -> "GeminiKeyPool":
+        from django.conf import settings
+
+        keys = list(db_keys)
         if not keys:
             raw = getattr(settings, "GEMINI_API_KEYS", None)
             if not raw:
@@ -94,18 +77,14 @@ class GeminiKeyPool:
             # Set a dummy key to prevent crash if not used
             keys = ["dummy_key"]
             
-        # Instead of global singleton that cannot refresh when AISettings changes,
-        # we update the slots if the keys changed, or just instantiate a new one.
-        # But for rate limiting context, we should preserve request counts.
-        # For simplicity, we just use the singleton pattern here.
+        # Re-instantiating on key changes is cheap: request counts live in
+        # Redis, keyed by a hash of each key, so they survive the swap.
         if cls._instance is None:
             cls._instance = cls(keys)
             logger.info(f"[GeminiKeyPool] Initialized with {len(keys)} API key(s).")
-        else:
-            current_keys = [s.key for s in cls._instance._slots]
-            if current_keys != keys:
-                cls._instance = cls(keys)
-                logger.info(f"[GeminiKeyPool] Re-initialized with {len(keys)} API key(s).")
+        elif cls._instance.keys != keys:
+            cls._instance = cls(keys)
+            logger.info(f"[GeminiKeyPool] Re-initialized with {len(keys)} API key(s).")
             
         return cls._instance
 
@@ -113,37 +92,3 @@ class GeminiKeyPool:
     def reset(cls):
         """Reset singleton — useful in tests."""
         cls._instance = None
-
-    async def get_key(self) -> str:
-        """
-        Return the best available API key.
-        Rotates active index every minute.
-        """
-        async with self._rotation_lock:
-            now = time.monotonic()
-            if now - self._rotation_start >= KEY_ROTATION_SECONDS:
-                self._rotation_index = (self._rotation_index + 1) % len(self._slots)
-                self._rotation_start = now
-                key_snippet = self._slots[self._rotation_index].key[-6:] if len(self._slots[self._rotation_index].key) > 6 else self._slots[self._rotation_index].key
-                logger.info(
-                    f"[GeminiKeyPool] Rotated to key index {self._rotation_index} "
-                    f"(key: ...{key_snippet})"
-                )
-
-        n = len(self._slots)
-        for offset in range(n):
-            idx = (self._rotation_index + offset) % n
-            slot = self._slots[idx]
-            if await slot.can_use():
-                await slot.record_use()
-                logger.debug(
-                    f"[GeminiKeyPool] Using key index {idx} "
-                    f"(requests this window: {slot.request_count}/{KEY_MAX_RPM})"
-                )
-                return slot.key
-
-        logger.warning("[GeminiKeyPool] All keys at capacity. Waiting 2s before retry...")
-        await asyncio.sleep(2)
-        slot = self._slots[self._rotation_index]
-        await slot.record_use()
-        return slot.key
@@ -6,21 +6,60 @@ Supports multi-key rotation via GeminiKeyPool
 
 import httpx
 import asyncio
+import time
 from typing import Dict, List, Optional
 import logging
 from datetime import datetime
 
+from automations.services.ai_message_cache import (
+    AIMessageCache,
+    USERNAME_PLACEHOLDER,
+    normalize_comment,
+    render_message,
+)
+from automations.services import ai_telemetry
+from automations.services.ai_batcher import AIBatcher
+from automations.services.ai_singleflight import AISingleFlight, prompt_key
+from automations.services.shared_key_pool import KeyPoolExhausted
+
 logger = logging.getLogger(__name__)
 
-_key_pool = None
+async def _get_key_pool():
+    """Return the key pool singleton, refreshed if AISettings keys changed."""
+    from automations.services.gemini_key_pool import GeminiKeyPool
+    return await GeminiKeyPool.afrom_settings()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds form only)."""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _get_singleflight():
+    """Return the AI singleflight coordinator, or None when disabled in settings."""
+    from django.conf import settings
+    if not getattr(settings, 'AI_SINGLEFLIGHT_ENABLED', True):
+        return None
+    return AISingleFlight.from_settings()
 
-def _get_key_pool():
-    """Return the global key pool singleton (lazy init)."""
-    global _key_pool
-    if _key_pool is None:
-        from automations.services.gemini_key_pool import GeminiKeyPool
-        _key_pool = GeminiKeyPool.from_settings()
-    return _key_pool
+
+def _get_batcher():
+    """Return the burst batcher, or None when disabled in settings."""
+    from django.conf import settings
+    if not getattr(settings, 'AI_BATCH_ENABLED', True):
+        return None
+    return AIBatcher.from_settings()
+
+
+def _get_message_cache():
+    """Return the AI message cache, or None when disabled in settings."""
+    from django.conf import settings
+    if not getattr(settings, 'AI_MESSAGE_CACHE_ENABLED', True):
+        return None
+    return AIMessageCache.from_settings()
 
 
 class AIServiceGemini:
@@ -57,18 +96,78 @@ class AIServiceGemini:
         business_context: str,
         user_comment: str,
         username: str,
-        models: Optional[List[str]] = None
+        models: Optional[List[str]] = None,
+        use_cache: bool = True,
+        batch_key: Optional[str] = None
     ) -> Dict:
-        """Enhance DM message with Gemini"""
-        prompt = self._build_enhancement_prompt(
-            base_message, 
-            business_context, 
-            user_comment, 
-            username
-        )
-        
+        """
+        Enhance DM message with Gemini (variants served/stored via AIMessageCache;
+        bursts for the same batch_key are enhanced together via AIBatcher)
+        """
         models_to_try = models or [m['id'] for m in self.MODELS]
+
+        msg_cache = _get_message_cache() if use_cache else None
+        cache_key = None
+        if msg_cache:
+            cache_key = msg_cache.make_key(
+                base_message, business_context, user_comment, '|'.join(models_to_try)
+            )
+            cached = msg_cache.get(cache_key)
+            if cached:
+                model_info = next((m for m in self.MODELS if m['id'] == cached['model']), None)
+                logger.info(f"✓ AI message cache hit ({cached['model']})")
+                await ai_telemetry.arecord_cache_hit('gemini', cached['model'])
+                return {
+                    'success': True,
+                    'enhanced_message': render_message(cached['text'], username),
+                    'original_message': base_message,
+                    'model_used': cached['model'],
+                    'model_name': model_info['name'] if model_info else cached['model'],
+                    'provider': 'gemini',
+                    'cache_hit': True,
+                    'timestamp': datetime.utcnow().isoformat(),
+                }
+            prompt = self._build_enhancement_prompt(
+                base_message,
+                business_context,
+                normalize_comment(user_comment),
+                USERNAME_PLACEHOLDER
+            )
+        else:
+            prompt = self._build_enhancement_prompt(
+                base_message, 
+                business_context, 
+                user_comment, 
+                username
+            )
         
+        batcher = _get_batcher() if batch_key else None
+        if batcher:
+            # With the cache on, batch against the placeholder too so each result is a reusable variant
+            batched = await batcher.enhance(
+                batch_key, base_message, business_context,
+                normalize_comment(user_comment) if msg_cache else user_comment,
+                USERNAME_PLACEHOLDER if msg_cache else username,
+                generate=lambda p, max_tokens: self._generate_first(p, models_to_try, max_tokens),
+            )
+            if batched:
+                model_info = next((m for m in self.MODELS if m['id'] == batched['model']), None)
+                enhanced_message = batched['text']
+                if msg_cache:
+                    msg_cache.put(cache_key, {'text': enhanced_message, 'model': batched['model']})
+                    enhanced_message = render_message(enhanced_message, username)
+                return {
+                    'success': True,
+                    'enhanced_message': enhanced_message,
+                    'original_message': base_message,
+                    'model_used': batched['model'],
+                    'model_name': model_info['name'] if model_info else batched['model'],
+                    'provider': 'gemini',
+                    'cache_hit': False,
+                    'batched': True,
+                    'timestamp': datetime.utcnow().isoformat(),
+                }
+
         for model_id in models_to_try:
             try:
                 model_info = next((m for m in self.MODELS if m['id'] == model_id), None)
@@ -76,7 +175,7 @@ class AIServiceGemini:
                 
                 logger.info(f"Trying Gemini model: {model_name}")
                 
-                result = await self._generate(
+                result = await self._generate_coalesced(
                     prompt=prompt,
                     model=str(model_id),
                     max_tokens=int(model_info['max_tokens']) if model_info else 400
@@ -84,13 +183,18 @@ class AIServiceGemini:
                 
                 if result['success']:
                     logger.info(f"✓ Success with {model_name}")
+                    enhanced_message = result['text']
+                    if msg_cache:
+                        msg_cache.put(cache_key, {'text': enhanced_message, 'model': model_id})
+                        enhanced_message = render_message(enhanced_message, username)
                     return {
                         'success': True,
-                        'enhanced_message': result['text'],
+                        'enhanced_message': enhanced_message,
                         'original_message': base_message,
                         'model_used': model_id,
                         'model_name': model_name,
                         'provider': 'gemini',
+                        'cache_hit': False,
                         'timestamp': datetime.utcnow().isoformat(),
                     }
                 else:
@@ -114,6 +218,30 @@ class AIServiceGemini:
             'timestamp': datetime.utcnow().isoformat(),
         }
     
+    async def _generate_first(self, prompt: str, models: List[str], max_tokens: int):
+        """First successful model in order: (model_id, result) or (None, last_result)."""
+        result = {'success': False, 'error': 'No models to try'}
+        for model_id in models:
+            result = await self._generate_coalesced(prompt=prompt, model=str(model_id), max_tokens=max_tokens)
+            if result['success']:
+                return model_id, result
+            if result.get('status_code') in [401, 403]:
+                break
+        return None, result
+
+    async def _generate_coalesced(self, prompt: str, model: str, max_tokens: int = 400) -> Dict:
+        """
+        _generate() behind AISingleFlight: concurrent identical prompts (in this
+        process or in other workers) share one provider request.
+        """
+        flight = _get_singleflight()
+        if flight is None:
+            return await self._generate(prompt=prompt, model=model, max_tokens=max_tokens)
+        return await flight.do(
+            prompt_key(prompt, model),
+            lambda: self._generate(prompt=prompt, model=model, max_tokens=max_tokens),
+        )
+
     async def _generate(
         self,
         prompt: str,
@@ -121,10 +249,32 @@ class AIServiceGemini:
         max_tokens: int = 400,
         temperature: float = 0.7
     ) -> Dict:
-        if self._use_key_pool:
-            api_key = await _get_key_pool().get_key()
+        """_request() plus one AICallTelemetry record per call."""
+        started = time.monotonic()
+        result = await self._request(prompt, model, max_tokens, temperature)
+        await ai_telemetry.arecord_call('gemini', model, result, time.monotonic() - started)
+        return result
+
+    async def _request(
+        self,
+        prompt: str,
+        model: str,
+        max_tokens: int = 400,
+        temperature: float = 0.7
+    ) -> Dict:
+        key_pool = await _get_key_pool() if self._use_key_pool else None
+        if key_pool:
+            try:
+                api_key = await key_pool.get_key()
+            except KeyPoolExhausted as e:
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'status_code': 429,
+                }
         else:
             api_key = self._static_api_key or ''
+        key_slot = key_pool.slot_id_for(api_key) if key_pool else ''
 
         try:
             url = f"{self.base_url}/{model}:generateContent?key={api_key}"
@@ -149,14 +299,24 @@ class AIServiceGemini:
                     'response': data
                 }
 
+            usage = data.get('usageMetadata', {})
             return {
                 'success': True,
                 'text': text,
                 'model': model,
+                'usage': {
+                    'prompt_tokens': usage.get('promptTokenCount', 0),
+                    'completion_tokens': usage.get('candidatesTokenCount', 0),
+                },
+                'key_slot': key_slot,
             }
 
         except httpx.HTTPStatusError as e:
             error_detail = f"HTTP {e.response.status_code}"
+            if e.response.status_code == 429 and key_pool:
+                await key_pool.report_rate_limited(
+                    api_key, _parse_retry_after(e.response.headers.get('Retry-After'))
+                )
             try:
                 error_data = e.response.json()
                 error_detail = error_data.get('error', {}).get('message', error_detail)
@@ -167,6 +327,7 @@ class AIServiceGemini:
                 'success': False,
                 'error': error_detail,
                 'status_code': e.response.status_code,
+                'key_slot': key_slot,
             }
         except Exception as e:
             return {
@@ -217,6 +378,7 @@ Return ONLY the enhanced message text, nothing else (no quotes, no explanation).
         
     async def close(self):
         await self.client.aclose()
+        await ai_telemetry.aflush_if_due()
     
     async def __aenter__(self):
         return self
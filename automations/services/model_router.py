@@ -0,0 +1,145 @@
+"""
+AI Model Router - Latency-Aware Model Selection
+================================================================
+- Every model call records its latency and outcome into a per-model latency
+  histogram in the shared Django cache (Redis in production), bucketed into
+  5-minute slices; the last 3 slices form a rolling 15-minute window. A
+  call abandoned because a hedge won records its latency only
+- rank() orders the fallback chain by observed p50 latency, penalised by
+  error rate; models without enough samples keep their configured position
+- hedge_delay() is the primary model's rolling p95: if the primary hasn't
+  answered by then, the service fires a hedged request at the next-best model
+"""
+
+import hashlib
+import logging
+import time
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+
+from automations.services import cache_counters
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ai_router'
+SLICE_SECONDS = 300          # 5-minute slices
+WINDOW_SLICES = 3            # rolling 15-minute window
+# Histogram upper bounds in seconds (last bucket catches everything slower)
+LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 4, 8, 15, 30, 60]
+MIN_SAMPLES = 5              # below this a model keeps its configured position
+DEFAULT_LATENCY = 2.0        # assumed p50/p95 for models without data
+MIN_HEDGE_DELAY = 1.0
+ERROR_PENALTY = 4            # p50 is multiplied by (1 + ERROR_PENALTY * error_rate)
+
+
+def _model_id_hash(model: str) -> str:
+    return hashlib.sha1(model.encode('utf-8')).hexdigest()[:10]
+
+
+class ModelRouter:
+    """
+    Usage:
+        router = ModelRouter()
+        stats = await router.astats(models)
+        ordered = router.rank(models, stats)
+        delay = router.hedge_delay(ordered[0], stats)
+        await router.arecord(model, latency_seconds, success)
+    """
+
+    def _slice_id(self, now: Optional[float] = None) -> int:
+        return int((now or time.time()) // SLICE_SECONDS)
+
+    def _key(self, model: str, slice_id: int, field: str) -> str:
+        return f'{KEY_PREFIX}:{_model_id_hash(model)}:{slice_id}:{field}'
+
+    @staticmethod
+    def _bucket_index(latency: float) -> int:
+        for idx, upper in enumerate(LATENCY_BUCKETS):
+            if latency <= upper:
+                return idx
+        return len(LATENCY_BUCKETS)
+
+    async def arecord(self, model: str, latency: float, success: Optional[bool]):
+        """Record one call's latency (seconds) and outcome; success=None records the latency only."""
+        slice_id = self._slice_id()
+        ttl = SLICE_SECONDS * (WINDOW_SLICES + 1)
+        try:
+            await cache_counters.aincr(self._key(model, slice_id, f'lat{self._bucket_index(latency)}'), ttl)
+            if success is not None:
+                await cache_counters.aincr(self._key(model, slice_id, 'ok' if success else 'err'), ttl)
+        except Exception as e:
+            # Stats are best-effort and must never fail a DM
+            logger.debug(f"[ModelRouter] Could not record stats for {model}: {e}")
+
+    def _stat_keys(self, models: List[str]):
+        current = self._slice_id()
+        slices = [current - i for i in range(WINDOW_SLICES)]
+        fields = [f'lat{i}' for i in range(len(LATENCY_BUCKETS) + 1)] + ['ok', 'err']
+        wanted = [self._key(m, s, f) for m in models for s in slices for f in fields]
+        return slices, fields, wanted
+
+    def _parse_stats(self, models: List[str], slices, fields, values: Dict) -> Dict[str, Dict]:
+        result = {}
+        for model in models:
+            counts = {f: sum(int(values.get(self._key(model, s, f)) or 0) for s in slices) for f in fields}
+            histogram = [counts[f'lat{i}'] for i in range(len(LATENCY_BUCKETS) + 1)]
+            outcomes = counts['ok'] + counts['err']
+            result[model] = {
+                'samples': sum(histogram),
+                'p50': self._percentile(histogram, 0.50),
+                'p95': self._percentile(histogram, 0.95),
+                'error_rate': (counts['err'] / outcomes) if outcomes else 0.0,
+            }
+        return result
+
+    def stats(self, models: List[str]) -> Dict[str, Dict]:
+        """Rolling p50/p95 latency and error rate per model (one cache round trip)."""
+        slices, fields, wanted = self._stat_keys(models)
+        try:
+            values = cache.get_many(wanted)
+        except Exception as e:
+            logger.debug(f"[ModelRouter] Could not read stats: {e}")
+            values = {}
+        return self._parse_stats(models, slices, fields, values)
+
+    async def astats(self, models: List[str]) -> Dict[str, Dict]:
+        """Async variant of stats() for use inside the enhancement hot path."""
+        slices, fields, wanted = self._stat_keys(models)
+        try:
+            values = await cache.aget_many(wanted)
+        except Exception as e:
+            logger.debug(f"[ModelRouter] Could not read stats: {e}")
+            values = {}
+        return self._parse_stats(models, slices, fields, values)
+
+    @staticmethod
+    def _percentile(histogram: List[int], q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile."""
+        total = sum(histogram)
+        if total == 0:
+            return DEFAULT_LATENCY
+        threshold = q * total
+        running = 0
+        for idx, count in enumerate(histogram):
+            running += count
+            if running >= threshold:
+                return LATENCY_BUCKETS[idx] if idx < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+        return LATENCY_BUCKETS[-1]
+
+    def rank(self, models: List[str], stats: Optional[Dict[str, Dict]] = None) -> List[str]:
+        """Order models best-first; ties keep the configured order."""
+        stats = stats or self.stats(models)
+
+        def score(model):
+            s = stats[model]
+            if s['samples'] < MIN_SAMPLES:
+                return DEFAULT_LATENCY
+            return s['p50'] * (1 + ERROR_PENALTY * s['error_rate'])
+
+        return sorted(models, key=score)
+
+    def hedge_delay(self, model: str, stats: Optional[Dict[str, Dict]] = None) -> float:
+        """Seconds to wait on `model` before firing a hedged request."""
+        stats = stats or self.stats([model])
+        return max(MIN_HEDGE_DELAY, stats[model]['p95'])
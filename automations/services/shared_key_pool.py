@@ -0,0 +1,234 @@
+"""
+Shared API Key Pool - Cross-Process Rate Limiter
+================================================
+- Per-key request counters live in the shared Django cache (Redis in
+  production), so every Celery worker process draws from the same budget
+- Sliding-window counter per key: the previous minute's count is weighted by
+  the part of it still inside the window, plus the current minute's count.
+  Slots are claimed with an atomic INCR and released with DECR if the claim
+  overshot the limit, so concurrent workers can never overcommit a key
+- A key that returned HTTP 429 is put on cool-down until its Retry-After
+- When every key is busy, the pool computes the exact time until the next
+  slot frees up and sleeps only that long
+- No asyncio primitives are held across calls, so a pool instance is safe to
+  reuse from the fresh event loop that every asyncio.run() task creates
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+
+from automations.services import cache_counters
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+# Wait this long at most for a free slot before giving up on the request
+MAX_WAIT_SECONDS = 60
+DEFAULT_COOLDOWN_SECONDS = 60
+
+
+class KeyPoolExhausted(RuntimeError):
+    """No API key became available within MAX_WAIT_SECONDS."""
+
+
+class SharedKeyPool:
+    """
+    Base class for GeminiKeyPool / OpenRouterKeyPool.
+
+    Subclasses set `namespace`, `max_rpm` and `rotation_seconds`.
+    """
+
+    namespace = 'key_pool'
+    max_rpm = 15
+    rotation_seconds = 60
+    log_prefix = '[KeyPool]'
+
+    def __init__(self, keys: List[str]):
+        if not keys:
+            raise ValueError("At least one API key must be provided.")
+        self._keys = list(keys)
+        # Never put raw API keys into Redis — address slots by a short hash
+        self._slot_ids = [hashlib.sha256(k.encode('utf-8')).hexdigest()[:12] for k in self._keys]
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self._keys)
+
+    # ------------------------------------------------------------------
+    # Cache keys
+    # ------------------------------------------------------------------
+
+    def _counter_key(self, slot_id: str, window_id: int) -> str:
+        return f'{self.namespace}:rpm:{slot_id}:{window_id}'
+
+    def _cooldown_key(self, slot_id: str) -> str:
+        return f'{self.namespace}:cooldown:{slot_id}'
+
+    def slot_id_for(self, key: str) -> Optional[str]:
+        """Short hash identifying `key` in Redis and telemetry (never the key itself)."""
+        try:
+            return self._slot_ids[self._keys.index(key)]
+        except ValueError:
+            return None
+
+    # ------------------------------------------------------------------
+    # Sliding-window maths
+    # ------------------------------------------------------------------
+
+    def _estimate(self, prev: int, curr: int, elapsed: float) -> float:
+        """Requests inside the last WINDOW_SECONDS (sliding-window counter)."""
+        return prev * (1 - elapsed / WINDOW_SECONDS) + curr
+
+    def _seconds_until_free(self, prev: int, curr: int, elapsed: float) -> float:
+        """Exact time until one more request fits under max_rpm."""
+        limit = self.max_rpm
+        if self._estimate(prev, curr, elapsed) + 1 <= limit:
+            return 0.0
+
+        remaining_in_window = WINDOW_SECONDS - elapsed
+        # Still inside the current window: the previous window's weight decays
+        if prev > 0 and curr + 1 <= limit:
+            wait = WINDOW_SECONDS * (1 - (limit - curr - 1) / prev) - elapsed
+            if wait < remaining_in_window:
+                return max(0.0, wait)
+
+        # Next window: the current count becomes the decaying previous count
+        wait_into_next = WINDOW_SECONDS * (1 - (limit - 1) / curr) if curr > 0 else 0.0
+        return remaining_in_window + max(0.0, wait_into_next)
+
+    def _slot_cache_keys(self, window_id: int) -> List[str]:
+        wanted = []
+        for slot_id in self._slot_ids:
+            wanted += [
+                self._counter_key(slot_id, window_id - 1),
+                self._counter_key(slot_id, window_id),
+                self._cooldown_key(slot_id),
+            ]
+        return wanted
+
+    def _parse_slots(self, values: Dict, window_id: int) -> Dict[str, Dict]:
+        slots = {}
+        for slot_id in self._slot_ids:
+            slots[slot_id] = {
+                'prev': int(values.get(self._counter_key(slot_id, window_id - 1)) or 0),
+                'curr': int(values.get(self._counter_key(slot_id, window_id)) or 0),
+                'cooldown_until': float(values.get(self._cooldown_key(slot_id)) or 0),
+            }
+        return slots
+
+    async def _read_slots(self, now: float) -> Dict[str, Dict]:
+        """Fetch counters and cool-downs for every slot in one round trip."""
+        window_id = int(now // WINDOW_SECONDS)
+        values = await cache.aget_many(self._slot_cache_keys(window_id))
+        return self._parse_slots(values, window_id)
+
+    async def _try_claim(self, slot_id: str, prev: int, now: float) -> bool:
+        """Atomically claim one request on a slot for the current window."""
+        window_id = int(now // WINDOW_SECONDS)
+        elapsed = now - window_id * WINDOW_SECONDS
+        counter_key = self._counter_key(slot_id, window_id)
+
+        curr = await cache_counters.aincr(counter_key, WINDOW_SECONDS * 2)
+        if self._estimate(prev, curr, elapsed) <= self.max_rpm:
+            return True
+
+        # Lost a race with another worker — give the slot back
+        await cache_counters.adecr(counter_key)
+        return False
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def _rotation_index(self, now: float) -> int:
+        """Time-based rotation: every process agrees on the active key."""
+        return int(now // self.rotation_seconds) % len(self._keys)
+
+    async def get_key(self) -> str:
+        """
+        Return an API key with spare capacity, starting from the active
+        rotation index. Sleeps exactly until the next free slot if all keys
+        are busy; raises KeyPoolExhausted after MAX_WAIT_SECONDS.
+        """
+        deadline = time.time() + MAX_WAIT_SECONDS
+        n = len(self._keys)
+
+        while True:
+            now = time.time()
+            elapsed = now % WINDOW_SECONDS
+            slots = await self._read_slots(now)
+            start = self._rotation_index(now)
+
+            next_free = math.inf
+            for offset in range(n):
+                idx = (start + offset) % n
+                slot_id = self._slot_ids[idx]
+                state = slots[slot_id]
+
+                wait = max(
+                    state['cooldown_until'] - now,
+                    self._seconds_until_free(state['prev'], state['curr'], elapsed),
+                )
+                if wait > 0:
+                    next_free = min(next_free, wait)
+                    continue
+
+                if await self._try_claim(slot_id, state['prev'], now):
+                    logger.debug(f"{self.log_prefix} Using key index {idx}")
+                    return self._keys[idx]
+                next_free = 0.0  # Raced — re-read counters immediately
+
+            if now + next_free > deadline:
+                raise KeyPoolExhausted(
+                    f"{self.log_prefix} No API key free within {MAX_WAIT_SECONDS}s"
+                )
+
+            if next_free > 0:
+                logger.warning(
+                    f"{self.log_prefix} All keys at capacity. Next slot frees in {next_free:.2f}s"
+                )
+            # Small epsilon so we land just after the slot frees, not just before
+            await asyncio.sleep(next_free + 0.01)
+
+    async def report_rate_limited(self, key: str, retry_after: Optional[float] = None):
+        """Put a key on cool-down after the provider answered HTTP 429."""
+        slot_id = self.slot_id_for(key)
+        if slot_id is None:
+            return
+        cooldown = float(retry_after) if retry_after else DEFAULT_COOLDOWN_SECONDS
+        await cache.aset(
+            self._cooldown_key(slot_id),
+            time.time() + cooldown,
+            int(math.ceil(cooldown)),
+        )
+        logger.warning(f"{self.log_prefix} Key ...{key[-6:]} rate limited — cooling down {cooldown:.0f}s")
+
+    def utilisation(self) -> List[Dict]:
+        """Per-key usage snapshot (sync, for admin/management commands)."""
+        now = time.time()
+        elapsed = now % WINDOW_SECONDS
+        window_id = int(now // WINDOW_SECONDS)
+        slots = self._parse_slots(cache.get_many(self._slot_cache_keys(window_id)), window_id)
+        active = self._rotation_index(now)
+
+        report = []
+        for idx, (key, slot_id) in enumerate(zip(self._keys, self._slot_ids)):
+            state = slots[slot_id]
+            in_window = self._estimate(state['prev'], state['curr'], elapsed)
+            report.append({
+                'index': idx,
+                'key_suffix': key[-6:],
+                'active': idx == active,
+                'requests_in_window': round(in_window, 2),
+                'limit': self.max_rpm,
+                'utilisation': round(min(in_window / self.max_rpm, 1.0) * 100, 1),
+                'cooldown_seconds': round(max(0.0, state['cooldown_until'] - now), 1),
+                'next_free_in': round(self._seconds_until_free(state['prev'], state['curr'], elapsed), 2),
+            })
+        return report
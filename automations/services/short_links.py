@@ -0,0 +1,300 @@
+"""
+Short Links - Signed DM Button Redirects with Buffered Click Counts
+================================================================
+- Button URLs in outgoing DMs are rewritten to {SHORT_LINK_BASE_URL}/r/<token>;
+  one ShortLink row per (automation, variant, url), so every DM of an
+  automation reuses the same few tokens
+- A token is 12 random url-safe characters plus an 8-character HMAC of
+  them, so forged or mistyped tokens are rejected before any lookup
+- Resolving a token reads a per-process LRU, then the shared cache (Redis
+  in production); the ORM is only touched when both miss, and that answer
+  warms both again
+- Clicks are counted in a per-process buffer and handed over in bulk once
+  CLICK_FLUSH_SIZE clicks or CLICK_FLUSH_INTERVAL seconds have accumulated:
+  one UPDATE per (automation, day) on AutomationPerformance.click_count and
+  the A/B write-behind counters for variant clicks (see ab_variants);
+  click_rate is derived from it by the nightly aggregation
+"""
+
+import base64
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import ab_variants
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'link'
+PATH_PREFIX = '/r/'
+KEY_CHARS = 12          # 9 random bytes, url-safe base64
+SIGNATURE_CHARS = 8     # 6 HMAC bytes, url-safe base64
+TOKEN_LENGTH = KEY_CHARS + SIGNATURE_CHARS
+CACHE_TTL = 30 * 86400
+MAX_LOCAL = 50000       # tokens (and button URLs) a process keeps
+CLICK_FLUSH_SIZE = 1000
+CLICK_FLUSH_INTERVAL = 1.0  # seconds
+MAX_PENDING_KEYS = 100000   # distinct (automation, variant, day) keys before new ones are dropped
+
+
+class Target(NamedTuple):
+    url: str
+    automation_id: Optional[str]   # None: not counted (e.g. load-test links)
+    variant_id: Optional[str]
+
+
+_lock = threading.Lock()
+_targets: "OrderedDict[str, Target]" = OrderedDict()
+_tokens: "OrderedDict[Tuple[str, Optional[str], str], str]" = OrderedDict()
+_clicks: Counter = Counter()
+_pending = 0                # running sum(_clicks.values())
+_last_flush = time.monotonic()
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _signature(key: str) -> str:
+    from django.conf import settings
+
+    digest = hmac.new(settings.SECRET_KEY.encode('utf-8'), f'short-link:{key}'.encode('utf-8'), hashlib.sha256)
+    return _b64(digest.digest()[:6])
+
+
+def new_token() -> str:
+    key = _b64(secrets.token_bytes(9))
+    return key + _signature(key)
+
+
+def verify(token: str) -> bool:
+    return len(token) == TOKEN_LENGTH and hmac.compare_digest(token[KEY_CHARS:], _signature(token[:KEY_CHARS]))
+
+
+def short_url(token: str) -> str:
+    from django.conf import settings
+
+    base = getattr(settings, 'SHORT_LINK_BASE_URL', None) or settings.BACKEND_URL
+    return f"{base.rstrip('/')}{PATH_PREFIX}{token}"
+
+
+def _remember(store: OrderedDict, key, value):
+    with _lock:
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > MAX_LOCAL:
+            store.popitem(last=False)
+
+
+def _local(store: OrderedDict, key):
+    with _lock:
+        return store.get(key)
+
+
+def prime(token: str, target: Target):
+    """Put a token's target in this process's LRU and the shared cache."""
+    _remember(_targets, token, target)
+    cache.set(f'{KEY_PREFIX}:{token}', tuple(target), CACHE_TTL)
+
+
+# ----------------------------------------------------------------------------
+# Resolving (redirect hot path)
+# ----------------------------------------------------------------------------
+
+def _load(token: str) -> Optional[Target]:
+    from automations.models import ShortLink
+
+    row = ShortLink.objects.filter(token=token).values_list('url', 'automation_id', 'variant_id').first()
+    if row is None:
+        return None
+    url, automation_id, variant_id = row
+    target = Target(url, str(automation_id), str(variant_id) if variant_id else None)
+    prime(token, target)
+    return target
+
+
+def resolve(token: str) -> Optional[Target]:
+    """Where a token points, or None for an invalid/unknown token."""
+    if not verify(token):
+        return None
+    target = _local(_targets, token)
+    if target is not None:
+        return target
+    cached = cache.get(f'{KEY_PREFIX}:{token}')
+    if cached is not None:
+        target = Target(*cached)
+        _remember(_targets, token, target)
+        return target
+    return _load(token)
+
+
+async def aresolve(token: str) -> Optional[Target]:
+    """Async resolve(): no await at all on a process LRU hit."""
+    if not verify(token):
+        return None
+    target = _local(_targets, token)
+    if target is not None:
+        return target
+    cached = await cache.aget(f'{KEY_PREFIX}:{token}')
+    if cached is not None:
+        target = Target(*cached)
+        _remember(_targets, token, target)
+        return target
+    return await sync_to_async(_load)(token)
+
+
+# ----------------------------------------------------------------------------
+# Rewriting outgoing buttons
+# ----------------------------------------------------------------------------
+
+def _url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def token_for(automation_id, variant_id, url: str) -> str:
+    """The token for a button URL, created on first use."""
+    from automations.models import ShortLink
+
+    automation_id, variant_id = str(automation_id), (str(variant_id) if variant_id else None)
+    key = (automation_id, variant_id, url)
+    token = _local(_tokens, key)
+    if token is not None:
+        return token
+
+    url_hash = _url_hash(url)
+    cache_key = f'{KEY_PREFIX}:url:{automation_id}:{variant_id or "-"}:{url_hash}'
+    token = cache.get(cache_key)
+    if token is None:
+        link = ShortLink.objects.filter(
+            automation_id=automation_id, variant_id=variant_id, url_hash=url_hash,
+        ).only('token').first()
+        if link is None:
+            link = ShortLink.objects.create(
+                token=new_token(), automation_id=automation_id, variant_id=variant_id, url=url, url_hash=url_hash,
+            )
+        token = link.token
+        cache.set(cache_key, token, CACHE_TTL)
+        prime(token, Target(url, automation_id, variant_id))
+    _remember(_tokens, key, token)
+    return token
+
+
+def rewrite_buttons(automation_id, variant_id, buttons: List[Dict]) -> List[Dict]:
+    """Copy of `buttons` with http(s) URLs replaced by tracked short links."""
+    rewritten = []
+    for button in buttons or []:
+        url = button.get('url') or ''
+        if url.startswith(('http://', 'https://')):
+            try:
+                button = {**button, 'url': short_url(token_for(automation_id, variant_id, url))}
+            except Exception as e:
+                # Tracking must never break a DM — send the original URL
+                logger.warning(f"[ShortLinks] Could not shorten {url} for automation {automation_id}: {e}")
+        rewritten.append(button)
+    return rewritten
+
+
+arewrite_buttons = sync_to_async(rewrite_buttons, thread_sensitive=True)
+
+
+# ----------------------------------------------------------------------------
+# Click buffer
+# ----------------------------------------------------------------------------
+
+def click(target: Target, day: Optional[date] = None) -> bool:
+    """Count a click in this process's buffer; True if the buffer is due for a flush."""
+    if target.automation_id is None:
+        return False
+    global _pending
+    key = (target.automation_id, target.variant_id, day or timezone.localdate())
+    with _lock:
+        if key in _clicks or len(_clicks) < MAX_PENDING_KEYS:
+            _clicks[key] += 1
+            _pending += 1
+        return _pending >= CLICK_FLUSH_SIZE or time.monotonic() - _last_flush >= CLICK_FLUSH_INTERVAL
+
+
+def pending() -> int:
+    with _lock:
+        return _pending
+
+
+def _drain() -> Counter:
+    global _clicks, _pending, _last_flush
+    with _lock:
+        clicks, _clicks = _clicks, Counter()
+        _pending = 0
+        _last_flush = time.monotonic()
+    return clicks
+
+
+def apply_clicks(clicks: Counter) -> int:
+    """
+    Add drained clicks to the click rollups. Returns the number of clicks applied.
+    Only click_count moves here: click_rate needs the day's successful_count,
+    which the nightly aggregation writes, so it is recomputed there.
+    """
+    from django.db import transaction
+    from django.db.models import F
+
+    from analytics.models import AutomationPerformance
+    from automations.models import Automation
+
+    per_day: Counter = Counter()
+    for (automation_id, variant_id, day), count in clicks.items():
+        per_day[(automation_id, day)] += count
+        if variant_id:
+            ab_variants.record(variant_id, 'clicks', count)
+
+    # Also drops clicks for automations deleted since
+    live = {str(pk) for pk in Automation.objects.filter(id__in={a for a, _ in per_day}).values_list('id', flat=True)}
+    applied = 0
+    with transaction.atomic():
+        AutomationPerformance.objects.bulk_create(
+            [AutomationPerformance(automation_id=a, date=day) for a, day in per_day if a in live],
+            ignore_conflicts=True,
+        )
+        for (automation_id, day), count in per_day.items():
+            if automation_id not in live:
+                continue
+            AutomationPerformance.objects.filter(automation_id=automation_id, date=day).update(
+                click_count=F('click_count') + count
+            )
+            applied += count
+    return applied
+
+
+def flush() -> int:
+    """Hand buffered clicks to the rollups (sync). Returns the number applied."""
+    clicks = _drain()
+    if not clicks:
+        return 0
+    try:
+        return apply_clicks(clicks)
+    except Exception as e:
+        logger.warning(f"[ShortLinks] Dropped {sum(clicks.values())} click(s): {e}")
+        return 0
+
+
+aflush = sync_to_async(flush, thread_sensitive=False)
+
+
+def reset():
+    """Forget cached tokens and buffered clicks — useful in tests."""
+    global _pending, _last_flush
+    with _lock:
+        _targets.clear()
+        _tokens.clear()
+        _clicks.clear()
+        _pending = 0
+        _last_flush = time.monotonic()
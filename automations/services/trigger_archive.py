@@ -0,0 +1,242 @@
+"""
+Trigger Archive - Monthly Cold Storage for automation_triggers
+================================================================
+- Months older than TRIGGER_HOT_MONTHS are streamed out of the hot table
+  into one gzip-compressed NDJSON file per month, newest row first (the
+  export order, (-created_at, -id)), written through a Django
+  storage backend (STORAGES['trigger_archive'] if configured — e.g. an
+  object store — else the local TRIGGER_ARCHIVE_ROOT directory)
+- Each archived month gets an AutomationTriggerArchive manifest row (path,
+  row count, size, sha256); the rows are deleted from the hot table only
+  after the file has been written and read back with the expected count
+- Aggregates for archived months stay in the rollup/daily tables, and
+  hot_since() tells reconciliation not to touch them
+- iter_archived() is the read-back path for exports over old ranges; trigger
+  exports append archived months after the hot rows (export_engine)
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.core.files import File
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+STORAGE_ALIAS = 'trigger_archive'
+PATH_PREFIX = 'automation_triggers'
+DEFAULT_HOT_MONTHS = 3
+CHUNK_SIZE = 2000          # rows fetched per DB round trip while archiving
+DELETE_BATCH_SIZE = 5000   # rows per DELETE once a month is safely archived
+HOT_SINCE_CACHE_KEY = 'trigger_archive:hot_since'
+HOT_SINCE_CACHE_TTL = 3600
+
+
+def get_storage():
+    """Storage for archive files: STORAGES['trigger_archive'] or a local directory."""
+    from django.conf import settings
+    from django.core.files.storage import FileSystemStorage, storages
+
+    if STORAGE_ALIAS in getattr(settings, 'STORAGES', {}):
+        return storages[STORAGE_ALIAS]
+    return FileSystemStorage(location=getattr(settings, 'TRIGGER_ARCHIVE_ROOT', settings.BASE_DIR / 'archive'))
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _bounds(month: date):
+    start = timezone.make_aware(datetime.combine(month, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(next_month(month), datetime.min.time()))
+    return start, end
+
+
+def _fields() -> List[str]:
+    from automations.models import AutomationTrigger
+    return [f.attname for f in AutomationTrigger._meta.concrete_fields]
+
+
+def _datetime_fields() -> List[str]:
+    from django.db import models
+    from automations.models import AutomationTrigger
+    return [f.attname for f in AutomationTrigger._meta.concrete_fields if isinstance(f, models.DateTimeField)]
+
+
+def _encode(value):
+    # Full-precision isoformat (DjangoJSONEncoder truncates to milliseconds)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f'Cannot archive value of type {type(value).__name__}')
+
+
+def archive_path(month: date) -> str:
+    return f'{PATH_PREFIX}/{month:%Y}/{month:%Y-%m}.ndjson.gz'
+
+
+def hot_since() -> Optional[datetime]:
+    """Start of the oldest month still in the hot table, or None if nothing is archived."""
+    from django.db.models import Max
+    from automations.models import AutomationTriggerArchive
+
+    cached = cache.get(HOT_SINCE_CACHE_KEY)
+    if cached is not None:
+        return cached or None
+
+    latest = AutomationTriggerArchive.objects.aggregate(latest=Max('month'))['latest']
+    boundary = _bounds(latest)[1] if latest else None
+    # '' caches "nothing archived" without colliding with a cache miss
+    cache.set(HOT_SINCE_CACHE_KEY, boundary or '', HOT_SINCE_CACHE_TTL)
+    return boundary
+
+
+def _write(month: date, fp) -> int:
+    """Stream the month's triggers into `fp` as gzip NDJSON. Returns the row count."""
+    from automations.models import AutomationTrigger
+
+    start, end = _bounds(month)
+    rows = (
+        AutomationTrigger.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .order_by('-created_at', '-id')
+        .values(*_fields())
+    )
+    count = 0
+    with gzip.GzipFile(fileobj=fp, mode='wb', compresslevel=6) as gz:
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            gz.write(json.dumps(row, default=_encode, ensure_ascii=False).encode('utf-8'))
+            gz.write(b'\n')
+            count += 1
+    return count
+
+
+def _digest_and_count(fp) -> Tuple[str, int]:
+    """sha256 of the compressed file and the number of NDJSON lines in it."""
+    fp.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fp.read(1 << 20), b''):
+        digest.update(chunk)
+    fp.seek(0)
+    with gzip.GzipFile(fileobj=fp, mode='rb') as gz:
+        lines = sum(1 for _ in gz)
+    fp.seek(0)
+    return digest.hexdigest(), lines
+
+
+def _purge(month: date):
+    """Delete an archived month from the hot table in PK batches (short locks)."""
+    from analytics.services.retention import delete_batch
+    from automations.models import AutomationTrigger
+
+    start, end = _bounds(month)
+    in_month = AutomationTrigger.objects.filter(created_at__gte=start, created_at__lt=end)
+    while True:
+        batch = list(in_month.values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+        if not batch:
+            break
+        delete_batch(AutomationTrigger, batch)
+
+
+def archive_month(month: date) -> Optional[int]:
+    """
+    Move one month of triggers to cold storage.
+    Returns the number of rows archived, or None if the month was already archived.
+    """
+    from automations.models import AutomationTriggerArchive
+
+    month = month_start(month)
+    if AutomationTriggerArchive.objects.filter(month=month).exists():
+        # Finish a purge an earlier run may not have completed
+        _purge(month)
+        return None
+
+    storage = get_storage()
+    path = archive_path(month)
+    with tempfile.TemporaryFile() as fp:
+        count = _write(month, fp)
+        sha256, lines = _digest_and_count(fp)
+        if lines != count:
+            raise RuntimeError(f'Archive for {month:%Y-%m} has {lines} lines, expected {count}')
+
+        if storage.exists(path):
+            # Leftover from an interrupted run — no manifest points to it
+            storage.delete(path)
+        saved_path = storage.save(path, File(fp))
+        size = storage.size(saved_path)
+
+    AutomationTriggerArchive.objects.create(
+        month=month, path=saved_path, row_count=count, size_bytes=size, sha256=sha256,
+    )
+    cache.delete(HOT_SINCE_CACHE_KEY)
+
+    _purge(month)
+
+    logger.info(f"[TriggerArchive] ✓ Archived {count} triggers for {month:%Y-%m} → {saved_path} ({size} bytes)")
+    return count
+
+
+def archive_old_months(hot_months: Optional[int] = None, today: Optional[date] = None) -> Dict[str, int]:
+    """Archive every whole month older than the hot window. Returns {'YYYY-MM': rows}."""
+    from django.conf import settings
+    from django.db.models import Min
+    from automations.models import AutomationTrigger
+
+    hot_months = hot_months or getattr(settings, 'TRIGGER_HOT_MONTHS', DEFAULT_HOT_MONTHS)
+    cutoff = month_start(today or timezone.now().date())
+    for _ in range(hot_months):
+        cutoff = month_start(cutoff - timedelta(days=1))
+
+    oldest = AutomationTrigger.objects.aggregate(oldest=Min('created_at'))['oldest']
+    archived = {}
+    if oldest is None:
+        return archived
+
+    month = month_start(timezone.localtime(oldest).date())
+    while month < cutoff:
+        count = archive_month(month)
+        if count is not None:
+            archived[f'{month:%Y-%m}'] = count
+        month = next_month(month)
+    return archived
+
+
+def iter_archived(start: Optional[datetime], end: datetime, automation_ids: Optional[Iterable] = None) -> Iterator[Dict]:
+    """
+    Archived triggers with start <= created_at < end (start=None: from the
+    first archived month), newest first as the files are written, as dicts
+    with the model's field names (datetimes parsed back, UUIDs as strings).
+    """
+    from automations.models import AutomationTriggerArchive
+
+    wanted = {str(a) for a in automation_ids} if automation_ids is not None else None
+    datetime_fields = _datetime_fields()
+    storage = get_storage()
+
+    manifests = AutomationTriggerArchive.objects.filter(month__lte=timezone.localtime(end).date())
+    if start is not None:
+        manifests = manifests.filter(month__gte=month_start(timezone.localtime(start).date()))
+    for manifest in manifests.order_by('-month'):
+        with storage.open(manifest.path, 'rb') as raw, gzip.GzipFile(fileobj=raw, mode='rb') as gz:
+            for line in gz:
+                row = json.loads(line)
+                if wanted is not None and row['automation_id'] not in wanted:
+                    continue
+                for field in datetime_fields:
+                    if row.get(field):
+                        row[field] = parse_datetime(row[field])
+                if (start is None or start <= row['created_at']) and row['created_at'] < end:
+                    yield row
@@ -0,0 +1,53 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AISettings, Automation, AutomationVariant
+from .services import ab_variants, ai_settings_cache
+from .services.ai_variant_pool import SOURCE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Automation)
+def regenerate_ai_variants(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Rebuild the pre-generated AI variant pool when an automation's message,
+    context or keywords change. The task itself skips pools that are still
+    fresh, so saves that don't touch those fields cost one cheap task at most.
+    """
+    if not getattr(settings, 'AI_VARIANT_POOL_ENABLED', True):
+        return
+    if update_fields and not SOURCE_FIELDS.intersection(update_fields):
+        return
+    if not (instance.use_ai_enhancement and instance.ai_context):
+        return
+
+    def enqueue():
+        from .tasks import generate_automation_variants
+        try:
+            generate_automation_variants.apply_async(args=[str(instance.id)], queue='system')
+        except Exception as e:
+            # Broker down — the scheduled refresh will pick the pool up later
+            logger.warning(f"Could not queue variant pool for automation {instance.id}: {e}")
+
+    transaction.on_commit(enqueue)
+
+
+@receiver(post_save, sender=AISettings)
+def invalidate_ai_settings_cache(sender, instance, **kwargs):
+    """Make every worker reload AI settings on its next check (≤1s)."""
+    ai_settings_cache.reset()
+    transaction.on_commit(ai_settings_cache.bump_version)
+
+
+@receiver(post_save, sender=AutomationVariant)
+@receiver(post_delete, sender=AutomationVariant)
+def invalidate_variant_table(sender, instance, **kwargs):
+    """Make every worker rebuild this automation's A/B weight table on its next check (≤1s)."""
+    automation_id = instance.automation_id
+    ab_variants.forget(automation_id)
+    transaction.on_commit(lambda: ab_variants.bump_version(automation_id))
@@ -19,6 +19,8 @@ from django.utils import timezone
 from django.db.models import F
 import logging
 
+from automations.services import ab_variants, short_links
+
 
 
 logger = logging.getLogger(__name__)
@@ -252,6 +254,86 @@ def refresh_instagram_tokens():
             )
 
 
+@shared_task(soft_time_limit=240)
+def generate_automation_variants(automation_id, force=False):
+    """
+    Build the pre-generated AI variant pool for one automation.
+    Queued on automation save (see automations.signals) and by
+    refresh_ai_variant_pools; a fresh pool is left alone unless force=True.
+    """
+    from automations.models import Automation
+    from automations.services.ai_variant_pool import AIVariantPool
+
+    automation = Automation.objects.filter(id=automation_id).first()
+    if automation is None:
+        return 0
+
+    pool = AIVariantPool.from_settings()
+    if not force and automation.use_ai_enhancement and not pool.is_stale(automation):
+        logger.info(f'[variant_pool] Pool for automation {automation_id} is fresh — skipping')
+        return 0
+    return pool.generate(automation)
+
+
+@shared_task
+def refresh_ai_variant_pools():
+    """Regenerate variant pools that are missing, outdated or past their max age."""
+    from automations.models import Automation
+    from automations.services.ai_variant_pool import AIVariantPool
+
+    pool = AIVariantPool.from_settings()
+    automations = Automation.objects.filter(
+        is_active=True, use_ai_enhancement=True
+    ).exclude(ai_context='')
+
+    queued = 0
+    for automation in automations.iterator():
+        if pool.is_stale(automation):
+            generate_automation_variants.apply_async(args=[str(automation.id)], queue='system')
+            queued += 1
+    logger.info(f'[variant_pool] Queued {queued} stale pool(s) for regeneration')
+    return queued
+
+
+@shared_task
+def archive_old_triggers():
+    """Move whole months older than TRIGGER_HOT_MONTHS out of automation_triggers."""
+    from automations.services.trigger_archive import archive_old_months
+
+    archived = archive_old_months()
+    if archived:
+        logger.info(f'[trigger_archive] Archived {sum(archived.values())} trigger(s) from {", ".join(archived)}')
+    return archived
+
+
+@shared_task
+def flush_variant_counters():
+    """Add buffered A/B send/click/conversion counts to the variants (every minute)."""
+    updated = ab_variants.flush()
+    if updated:
+        logger.info(f'[ab_variants] Flushed counters into {updated} variant(s)')
+    return updated
+
+
+@shared_task(soft_time_limit=3600)
+def run_export_job(job_id):
+    """Write the file for a background export (see automations.services.export_jobs)."""
+    from automations.services import export_jobs
+
+    return export_jobs.run(job_id)
+
+
+@shared_task
+def cleanup_expired_exports():
+    """Delete export jobs and files older than EXPORT_TTL_HOURS."""
+    from automations.services import export_jobs
+
+    removed = export_jobs.cleanup_expired()
+    if removed:
+        logger.info(f'[export] Removed {removed} expired export(s)')
+    return removed
+
+
 @shared_task
 def retry_pending_triggers():
     """
@@ -326,7 +408,7 @@ async def _process_trigger_with_rate_limit(celery_task, trigger_id):
     from automations.services.instagram_service_async import InstagramServiceAsync
     from automations.services.ai_service_async import AIServiceOpenRouter
     from automations.services.gemini_service_async import AIServiceGemini
-    from automations.models import AISettings
+    from automations.services.ai_settings_cache import aget_ai_config
     
     # ═══════════════════════════════════════════════════════════
     # STEP 1: Load trigger
@@ -384,6 +466,10 @@ async def _process_trigger_with_rate_limit(celery_task, trigger_id):
     # Notify processing started
     await notify_trigger_processing(automation, trigger)
     
+    # Sticky A/B variant for this recipient (None = the automation's own message)
+    ab_variant = await ab_variants.apick(automation.id, trigger.instagram_user_id)
+    trigger.variant_id = ab_variant.id if ab_variant else None
+    
     # ═══════════════════════════════════════════════════════════
     # STEP 4: Reply to comment publicly (if enabled)
     # ═══════════════════════════════════════════════════════════
@@ -399,7 +485,8 @@ async def _process_trigger_with_rate_limit(celery_task, trigger_id):
                 )
             else:
                 # Replace variables in reply message
-                reply_message = automation.comment_reply_message.replace(
+                reply_template = (ab_variant and ab_variant.comment_reply_message) or automation.comment_reply_message
+                reply_message = reply_template.replace(
                     '{username}', trigger.instagram_username
                 )
                 
@@ -420,18 +507,38 @@ async def _process_trigger_with_rate_limit(celery_task, trigger_id):
     # ═══════════════════════════════════════════════════════════
     # STEP 5: Prepare DM message (with AI enhancement)
     # ═══════════════════════════════════════════════════════════
-    message = automation.DmMessage
-    
-    if automation.use_ai_enhancement and automation.ai_context:
-        if trigger.ai_modifications == 'FAILED':
+    message = ab_variant.message if ab_variant else automation.DmMessage
+    
+    # A/B variants go out as written so the test compares the variants themselves
+    if automation.use_ai_enhancement and automation.ai_context and not ab_variant:
+        from django.conf import settings as django_settings
+        from automations.services.ai_message_cache import render_message
+        from automations.services.ai_variant_pool import AIVariantPool
+        from automations.services import ai_telemetry
+
+        # Attribute AI calls made below to this user/automation (scoped to this asyncio.run)
+        ai_telemetry.bind(user_id=instagram_account.user_id, automation_id=automation.id)
+
+        # Pre-generated variant for this comment's intent cluster — no LLM call
+        variant = None
+        if getattr(django_settings, 'AI_VARIANT_POOL_ENABLED', True):
+            variant = await AIVariantPool.from_settings().apick(automation, trigger.comment_text)
+
+        if variant:
+            message = render_message(variant['text'], trigger.instagram_username)
+            trigger.was_ai_enhanced = True
+            trigger.ai_modifications = variant['model'] or 'variant_pool'
+            trigger.ai_cache_hit = True
+            await ai_telemetry.arecord_cache_hit('variant_pool', variant['model'] or 'variant_pool')
+        elif trigger.ai_modifications == 'FAILED':
             logger.info(f"Skipping AI enhancement for trigger #{trigger.id} due to previous failure.")
         else:
             try:
-                from django.conf import settings as django_settings
-                ai_settings = AISettings.load()
+                # Process-local cached settings — no DB query unless AISettings changed
+                ai_config = await aget_ai_config()
                 
                 # Check active provider
-                if ai_settings.provider == 'gemini':
+                if ai_config['provider'] == 'gemini':
                     ai_service = AIServiceGemini()
                 else:
                     api_key = getattr(django_settings, 'OPENROUTER_API_KEY', '')
@@ -439,16 +546,27 @@ async def _process_trigger_with_rate_limit(celery_task, trigger_id):
                     ai_service = AIServiceOpenRouter()
 
                 if ai_service:
-                    result = await ai_service.enhance_DmMessage(
-                        base_message=message,
-                        business_context=automation.ai_context,
-                        user_comment=trigger.comment_text,
-                        username=trigger.instagram_username,
-                    )
+                    # Hard latency budget: past it the DM goes out with the original template
+                    budget = getattr(django_settings, 'AI_ENHANCEMENT_LATENCY_BUDGET', 15)
+                    try:
+                        result = await asyncio.wait_for(
+                            ai_service.enhance_DmMessage(
+                                base_message=message,
+                                business_context=automation.ai_context,
+                                user_comment=trigger.comment_text,
+                                username=trigger.instagram_username,
+                                batch_key=str(automation.id),
+                            ),
+                            timeout=budget,
+                        )
+                    except asyncio.TimeoutError:
+                        logger.warning(f"AI enhancement for trigger #{trigger.id} exceeded {budget}s budget, using original message")
+                        result = {'success': False, 'error': 'Latency budget exceeded'}
                     if result['success']:
                         message = result['enhanced_message']
                         trigger.was_ai_enhanced = True
-                        trigger.ai_modifications = result.get('model_used', ai_settings.provider)
+                        trigger.ai_modifications = result.get('model_used', ai_config['provider'])
+                        trigger.ai_cache_hit = result.get('cache_hit', False)
                     else:
                         logger.warning(f"AI Enhancement failed for trigger #{trigger.id}. Flagging to avoid retries.")
                         trigger.was_ai_enhanced = False
@@ -465,10 +583,15 @@ async def _process_trigger_with_rate_limit(celery_task, trigger_id):
     # ═══════════════════════════════════════════════════════════
     # STEP 6: Send DM
     # ═══════════════════════════════════════════════════════════
+    # Button URLs go out as tracked short links (/r/<token>)
+    buttons = await short_links.arewrite_buttons(
+        automation.id, ab_variant.id if ab_variant else None,
+        ab_variant.buttons if ab_variant else automation.dm_buttons,
+    )
     dm_result = await instagram_service.send_dm(
         recipient_id=trigger.instagram_user_id,
         message=message,
-        buttons=automation.dm_buttons,
+        buttons=buttons,
         comment_id=trigger.comment_id or None,
         ig_user_id=instagram_account.platform_id or instagram_account.instagram_user_id,
     )
@@ -485,6 +608,8 @@ async def _process_trigger_with_rate_limit(celery_task, trigger_id):
         trigger.dm_sent_at = timezone.now()
         trigger.DmMessage_sent = message
         await trigger.asave()
+        if ab_variant:
+            await ab_variants.arecord(ab_variant.id, 'sends')
         
         # Update automation stats
         automation.total_dms_sent += 1
@@ -0,0 +1,84 @@
+import time
+from collections import Counter
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from automations.models import AutomationVariant
+from automations.services import ab_variants
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ABVariantsTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        ab_variants.reset()
+        self.create_coffee_shop()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a = AutomationVariant.objects.create(automation=self.automation, name='A', DmMessage='Hi A',
+                                                      traffic_percentage=30)
+            self.b = AutomationVariant.objects.create(automation=self.automation, name='B', DmMessage='Hi B',
+                                                      traffic_percentage=30)
+
+    def tearDown(self):
+        ab_variants.reset()
+
+    def test_assignment_is_sticky_weighted_and_cached(self):
+        picks = [ab_variants.pick(self.automation.id, f'fan{i}') for i in range(3000)]
+        shares = Counter(p.name if p else None for p in picks)
+        # 30% / 30% / remaining 40% on the automation's own message
+        self.assertAlmostEqual(shares['A'] / 3000, 0.3, delta=0.04)
+        self.assertAlmostEqual(shares['B'] / 3000, 0.3, delta=0.04)
+        self.assertAlmostEqual(shares[None] / 3000, 0.4, delta=0.04)
+
+        # Past the check interval only the shared version stamp is read, never the DB
+        with patch.object(ab_variants, 'CHECK_INTERVAL', 0), self.assertNumQueries(0):
+            again = [ab_variants.pick(self.automation.id, f'fan{i}') for i in range(3000)]
+        self.assertEqual(again, picks)
+
+    def test_variant_change_invalidates_other_processes(self):
+        ab_variants.pick(self.automation.id, 'fan')
+        stale_version = cache.get(ab_variants._version_key(self.automation.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b.delete()
+        self.assertNotEqual(cache.get(ab_variants._version_key(self.automation.id)), stale_version)
+
+        # Another process still holding the old table rebuilds it on its next check
+        ab_variants._store(str(self.automation.id), stale_version, ((30, 60), (
+            ab_variants.Variant(str(self.a.id), 'A', 'Hi A', [], ''),
+            ab_variants.Variant(str(self.b.id), 'B', 'Hi B', [], ''),
+        )))
+        with patch.object(ab_variants, 'CHECK_INTERVAL', 0):
+            names = {getattr(ab_variants.pick(self.automation.id, f'fan{i}'), 'name', None) for i in range(200)}
+        self.assertEqual(names, {'A', None})
+
+    def test_counters_are_written_behind_and_feed_results(self):
+        minute_ago = time.time() - 120
+        for _ in range(200):
+            ab_variants.record(self.a.id, 'sends', now=minute_ago)
+            ab_variants.record(self.b.id, 'sends', now=minute_ago)
+        ab_variants.record(self.a.id, 'conversions', count=10, now=minute_ago)
+        ab_variants.record(self.b.id, 'conversions', count=40, now=minute_ago)
+        ab_variants.record(self.b.id, 'clicks', count=5)  # current minute: not flushed yet
+
+        self.assertEqual(AutomationVariant.objects.get(pk=self.a.pk).total_sends, 0)
+        with self.assertNumQueries(4):  # savepoint pair + one UPDATE per variant
+            self.assertEqual(ab_variants.flush(), 2)
+        self.assertEqual(ab_variants.flush(), 0)
+
+        b = AutomationVariant.objects.get(pk=self.b.pk)
+        self.assertEqual((b.total_sends, b.total_clicks, b.total_conversions), (200, 0, 40))
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(f'/api/automations/{self.automation.id}/ab_results/')
+        self.assertEqual(response.status_code, 200)
+        baseline, challenger = response.data['variants']
+        self.assertTrue(baseline['baseline'])
+        self.assertEqual(challenger['conversion_rate'], 20.0)
+        self.assertTrue(challenger['conversions_vs_baseline']['significant'])
+        self.assertFalse(challenger['clicks_vs_baseline']['significant'])
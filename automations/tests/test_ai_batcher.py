@@ -0,0 +1,95 @@
+import asyncio
+import json
+import re
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from automations.services.ai_batcher import AIBatcher, parse_batch_response
+from automations.services.ai_message_cache import AIMessageCache
+from automations.services.ai_service_async import AIServiceOpenRouter
+from core.testing import TEST_CACHES
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    AI_MESSAGE_CACHE_ENABLED=False,
+    AI_BATCH_MIN_RATE=1,
+    AI_BATCH_MAX_SIZE=10,
+    AI_BATCH_WINDOW_MS=200,
+)
+class AIBatcherTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        AIBatcher.reset()
+        AIMessageCache.reset()
+        self.addCleanup(AIMessageCache.reset)
+        self.provider_calls = 0
+
+    async def _mock_generate(self, prompt, model, max_tokens=400, temperature=0.7):
+        """Answers batch prompts with a JSON array, single prompts with plain text."""
+        self.provider_calls += 1
+        await asyncio.sleep(0.05)
+        users = re.findall(r'^\d+\. ".*" by @(\w+|\{username\})$', prompt, flags=re.MULTILINE)
+        if users:
+            text = json.dumps([f'Hi @{u}, here is the link!' for u in users])
+        else:
+            text = 'Here is the link!'
+        return {'success': True, 'text': text, 'model': model}
+
+    def _burst(self, count):
+        async def run():
+            service = AIServiceOpenRouter(api_key='test-key')
+            try:
+                return await asyncio.gather(*[
+                    service.enhance_DmMessage(
+                        base_message='Here is the link!',
+                        business_context='We sell coffee',
+                        user_comment=f'link please {i}',
+                        username=f'fan{i}',
+                        batch_key='automation-1',
+                    )
+                    for i in range(count)
+                ])
+            finally:
+                await service.close()
+
+        with patch.object(AIServiceOpenRouter, '_generate', new=self._mock_generate):
+            return asyncio.run(run())
+
+    def test_burst_is_batched(self):
+        """30 distinct comments in a burst go out as a handful of batched calls"""
+        results = self._burst(30)
+
+        self.assertTrue(all(r['success'] for r in results))
+        for i, result in enumerate(results):
+            self.assertEqual(result['enhanced_message'], f'Hi @fan{i}, here is the link!')
+        self.assertLessEqual(self.provider_calls, 6)
+
+    @override_settings(AI_MESSAGE_CACHE_ENABLED=True, AI_MESSAGE_CACHE_VARIANTS=1)
+    def test_batched_results_fill_the_message_cache(self):
+        """Batches are generated against the placeholder and stored like individual results"""
+        results = self._burst(10)
+        for i, result in enumerate(results):
+            self.assertEqual(result['enhanced_message'], f'Hi @fan{i}, here is the link!')
+        calls = self.provider_calls
+
+        again = self._burst(10)
+        self.assertEqual(self.provider_calls, calls)
+        self.assertTrue(all(r['cache_hit'] for r in again))
+        self.assertEqual(again[3]['enhanced_message'], 'Hi @fan3, here is the link!')
+
+    @override_settings(AI_BATCH_RESULT_TIMEOUT=None, AI_ENHANCEMENT_LATENCY_BUDGET=10, AI_BATCH_FALLBACK_RESERVE=4)
+    def test_member_wait_leaves_room_for_an_individual_call(self):
+        batcher = AIBatcher.from_settings()
+        self.assertAlmostEqual(batcher.window + batcher.result_timeout, 10 - 4)
+
+    def test_parse_batch_response(self):
+        """Invalid entries fall back individually; a wrong count rejects the batch"""
+        self.assertEqual(
+            parse_batch_response('```json\n["a", "", {"message": "c"}]\n```', 3),
+            ['a', None, 'c'],
+        )
+        self.assertEqual(parse_batch_response('["a", "b"]', 3), [None, None, None])
+        self.assertEqual(parse_batch_response('Sorry, I cannot help', 2), [None, None])
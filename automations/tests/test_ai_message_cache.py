@@ -0,0 +1,100 @@
+import asyncio
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from automations.services.ai_message_cache import AIMessageCache, render_message
+from automations.services.ai_service_async import AIServiceOpenRouter
+from core.testing import TEST_CACHES
+
+
+@override_settings(CACHES=TEST_CACHES, AI_SINGLEFLIGHT_ENABLED=False)
+class AIMessageCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        AIMessageCache.reset()
+        self.addCleanup(AIMessageCache.reset)
+        self.prompts = []
+
+    async def _mock_generate(self, prompt, model, max_tokens=400, temperature=0.7):
+        self.prompts.append(prompt)
+        return {'success': True, 'text': 'Hi @{username}, here is the menu!', 'model': model}
+
+    def test_hit_and_miss(self):
+        msg_cache = AIMessageCache(max_variants=1)
+        key = msg_cache.make_key('Menu', 'We sell coffee', 'Link  please', 'model-a|model-b')
+        self.assertIsNone(msg_cache.get(key))
+
+        msg_cache.put(key, {'text': 'Hi @{username}!', 'model': 'model-a'})
+        self.assertEqual(msg_cache.get(key), {'text': 'Hi @{username}!', 'model': 'model-a'})
+        # Comments differing only in case/whitespace share the key; another model chain does not
+        self.assertEqual(msg_cache.make_key('Menu', 'We sell coffee', 'link please', 'model-a|model-b'), key)
+        self.assertNotEqual(msg_cache.make_key('Menu', 'We sell coffee', 'link please', 'model-b'), key)
+
+        # Another process starts with an empty LRU and reads the shared tier
+        self.assertEqual(AIMessageCache(max_variants=1).get(key)['model'], 'model-a')
+
+    def test_each_key_holds_at_most_max_variants(self):
+        msg_cache = AIMessageCache(max_variants=3)
+        key = msg_cache.make_key('Menu', '', 'link', 'model-a')
+        for i in range(2):
+            msg_cache.put(key, {'text': f'variant {i}', 'model': 'model-a'})
+        msg_cache.put(key, {'text': 'variant 1', 'model': 'model-a'})  # duplicate, ignored
+        # Until the pool is full a lookup is a miss, so new variants keep coming
+        self.assertIsNone(msg_cache.get(key))
+
+        for i in range(2, 5):
+            msg_cache.put(key, {'text': f'variant {i}', 'model': 'model-a'})
+        self.assertEqual([v['text'] for v in cache.get(key)['variants']], ['variant 2', 'variant 3', 'variant 4'])
+        self.assertIn(msg_cache.get(key)['text'], {'variant 2', 'variant 3', 'variant 4'})
+
+    def test_lru_entries_expire_with_the_shared_tier(self):
+        msg_cache = AIMessageCache(max_variants=1, ttl=60)
+        key = msg_cache.make_key('Menu', '', 'link', 'model-a')
+        with patch('automations.services.ai_message_cache.time.time', return_value=1000.0):
+            msg_cache.put(key, {'text': 'Hi @{username}!', 'model': 'model-a'})
+        # Redis dropped the key at its TTL; the LRU must not keep serving it
+        cache.delete(key)
+
+        with patch('automations.services.ai_message_cache.time.time', return_value=1059.0):
+            self.assertEqual(msg_cache.get(key)['text'], 'Hi @{username}!')
+        with patch('automations.services.ai_message_cache.time.time', return_value=1060.0):
+            self.assertIsNone(msg_cache.get(key))
+
+        # A worker filling its LRU from the shared tier inherits the remaining lifetime
+        with patch('automations.services.ai_message_cache.time.time', return_value=2000.0):
+            msg_cache.put(key, {'text': 'Hello @{username}!', 'model': 'model-a'})
+        other = AIMessageCache(max_variants=1, ttl=60)
+        with patch('automations.services.ai_message_cache.time.time', return_value=2030.0):
+            self.assertIsNotNone(other.get(key))
+        cache.delete(key)
+        with patch('automations.services.ai_message_cache.time.time', return_value=2060.0):
+            self.assertIsNone(other.get(key))
+
+    @override_settings(AI_MESSAGE_CACHE_ENABLED=True, AI_MESSAGE_CACHE_VARIANTS=1)
+    def test_variants_are_generated_once_and_personalised_per_user(self):
+        self.assertEqual(render_message('Hi @{username}!', 'fan'), 'Hi @fan!')
+
+        async def enhance(username):
+            service = AIServiceOpenRouter(api_key='test-key')
+            try:
+                return await service.enhance_DmMessage(
+                    base_message='Here is our menu!',
+                    business_context='We sell coffee',
+                    user_comment='Menu please',
+                    username=username,
+                )
+            finally:
+                await service.close()
+
+        with patch.object(AIServiceOpenRouter, '_generate', new=self._mock_generate):
+            first = asyncio.run(enhance('alice'))
+            second = asyncio.run(enhance('bob'))
+
+        # The prompt never contains a real username, so the variant is reusable
+        self.assertEqual(len(self.prompts), 1)
+        self.assertIn('{username}', self.prompts[0])
+        self.assertNotIn('alice', self.prompts[0])
+        self.assertEqual((first['enhanced_message'], first['cache_hit']), ('Hi @alice, here is the menu!', False))
+        self.assertEqual((second['enhanced_message'], second['cache_hit']), ('Hi @bob, here is the menu!', True))
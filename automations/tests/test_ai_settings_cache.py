@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from automations.models import AISettings
+from automations.services import ai_settings_cache
+from automations.services.ai_settings_cache import get_ai_config
+from core.testing import TEST_CACHES
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AISettingsCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        ai_settings_cache.reset()
+
+    def tearDown(self):
+        ai_settings_cache.reset()
+
+    def test_config_is_parsed_and_cached(self):
+        """Keys are split once; later lookups don't touch the DB"""
+        AISettings.objects.create(provider='gemini', gemini_api_keys=' key-a, key-b ,')
+        ai_settings_cache.reset()
+
+        config = get_ai_config()
+        self.assertEqual(config['provider'], 'gemini')
+        self.assertEqual(config['gemini_keys'], ['key-a', 'key-b'])
+
+        # Past the check interval the shared version stamp is read, not the DB
+        with patch.object(ai_settings_cache, 'CHECK_INTERVAL', 0), self.assertNumQueries(0):
+            for _ in range(100):
+                get_ai_config()
+
+    def test_save_invalidates_other_processes(self):
+        """Saving AISettings bumps the shared version so every process reloads"""
+        AISettings.load()
+        self.assertEqual(get_ai_config()['provider'], 'openrouter')
+        version = cache.get(ai_settings_cache.VERSION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ai_settings = AISettings.load()
+            ai_settings.provider = 'gemini'
+            ai_settings.save()
+        self.assertNotEqual(cache.get(ai_settings_cache.VERSION_KEY), version)
+
+        # Another process: still holds the old config, sees the new stamp on its next check
+        ai_settings_cache._store(
+            {'provider': 'openrouter', 'openrouter_keys': [], 'gemini_keys': []}, version
+        )
+        with patch.object(ai_settings_cache, 'CHECK_INTERVAL', 0):
+            self.assertEqual(get_ai_config()['provider'], 'gemini')
@@ -0,0 +1,100 @@
+import asyncio
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from automations.services.ai_service_async import AIServiceOpenRouter
+from automations.services.ai_singleflight import KEY_PREFIX, AISingleFlight, prompt_key
+from core.testing import TEST_CACHES
+
+
+@override_settings(CACHES=TEST_CACHES, AI_MESSAGE_CACHE_ENABLED=False)
+class AISingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        AISingleFlight.reset()
+        self.provider_calls = 0
+
+    async def _mock_generate(self, prompt, model, max_tokens=400, temperature=0.7):
+        """Stand-in for the provider: slow enough that every caller overlaps."""
+        self.provider_calls += 1
+        await asyncio.sleep(0.2)
+        return {'success': True, 'text': 'Thanks for commenting!', 'model': model}
+
+    def test_500_identical_concurrent_requests_reach_provider_once(self):
+        """Identical prompts fired at the same instant share one provider call"""
+        async def burst():
+            service = AIServiceOpenRouter(api_key='test-key')
+            try:
+                return await asyncio.gather(*[
+                    service.enhance_DmMessage(
+                        base_message='Here is the link!',
+                        business_context='We sell coffee',
+                        user_comment='link',
+                        username='coffee_fan',
+                    )
+                    for _ in range(500)
+                ])
+            finally:
+                await service.close()
+
+        with patch.object(AIServiceOpenRouter, '_generate', new=self._mock_generate):
+            results = asyncio.run(burst())
+
+        self.assertEqual(self.provider_calls, 1)
+        self.assertEqual(len(results), 500)
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertTrue(all(r['enhanced_message'] == 'Thanks for commenting!' for r in results))
+
+    def test_waiter_in_other_process_reuses_leader_result(self):
+        """A second coordinator (another worker process) waits on the shared lock"""
+        leader = AISingleFlight(wait_timeout=5)
+        follower = AISingleFlight(wait_timeout=5)
+        key = prompt_key('same prompt', 'anthropic/claude-3-haiku')
+
+        async def generate():
+            return await self._mock_generate('same prompt', 'anthropic/claude-3-haiku')
+
+        async def run_both():
+            return await asyncio.gather(leader.do(key, generate), follower.do(key, generate))
+
+        results = asyncio.run(run_both())
+
+        self.assertEqual(self.provider_calls, 1)
+        self.assertEqual(results[0], results[1])
+
+    def test_failed_result_is_not_shared(self):
+        """Waiters retry on their own instead of reusing a failure"""
+        flight = AISingleFlight(wait_timeout=5)
+        key = prompt_key('prompt', 'model')
+
+        async def failing():
+            self.provider_calls += 1
+            return {'success': False, 'error': 'HTTP 500', 'status_code': 500}
+
+        asyncio.run(flight.do(key, failing))
+        asyncio.run(flight.do(key, failing))
+
+        self.assertEqual(self.provider_calls, 2)
+
+    def test_waiter_behind_stuck_leader_calls_provider_within_budget(self):
+        """The wait ends early enough for the waiter's own call to fit in the latency budget"""
+        self.assertLessEqual(
+            settings.AI_SINGLEFLIGHT_WAIT_TIMEOUT + settings.AI_SINGLEFLIGHT_SOLO_RESERVE,
+            settings.AI_ENHANCEMENT_LATENCY_BUDGET,
+        )
+
+        flight = AISingleFlight(wait_timeout=0.3)
+        key = prompt_key('prompt', 'model')
+        # A leader in another process holds the lock and never publishes
+        cache.add(f'{KEY_PREFIX}:lock:{key}', 'other-worker', 30)
+
+        async def generate():
+            return await self._mock_generate('prompt', 'model')
+
+        result = asyncio.run(asyncio.wait_for(flight.do(key, generate), timeout=1))
+
+        self.assertTrue(result['success'])
+        self.assertEqual(self.provider_calls, 1)
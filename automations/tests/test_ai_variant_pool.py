@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from automations.models import AIMessageVariant
+from automations.services import ai_settings_cache
+from automations.services.ai_service_async import AIServiceOpenRouter
+from automations.services.ai_variant_pool import (
+    GENERIC_CLUSTER,
+    AIVariantPool,
+    classify_comment,
+)
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+
+@override_settings(CACHES=TEST_CACHES, AI_VARIANT_POOL_SIZE=3)
+class AIVariantPoolTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        AIVariantPool.reset()
+        ai_settings_cache.reset()
+        self.create_coffee_shop(
+            trigger_keywords=['link', 'price list'],
+            trigger_match_type='contains',
+            DmMessage='Here is our menu!',
+            use_ai_enhancement=True,
+            ai_context='We sell coffee',
+        )
+        self.calls = 0
+
+    async def _mock_enhance(self, base_message, business_context, user_comment,
+                            username, models=None, use_cache=True):
+        self.calls += 1
+        return {
+            'success': True,
+            'enhanced_message': f'Hey @{username}, {user_comment} #{self.calls}',
+            'model_used': 'anthropic/claude-3-haiku',
+        }
+
+    def test_classify_comment(self):
+        """Short comments map to the longest matching keyword, long ones go live"""
+        self.assertEqual(classify_comment(self.automation, 'Price list please'), 'kw:price list')
+        self.assertEqual(classify_comment(self.automation, 'LINK'), 'kw:link')
+        self.assertEqual(classify_comment(self.automation, '🔥🔥'), GENERIC_CLUSTER)
+        self.assertIsNone(classify_comment(
+            self.automation, 'can you send the link for the oat milk latte'
+        ))
+
+    def test_generate_and_pick(self):
+        """Generated pool serves matching comments; an edit invalidates it"""
+        with patch.object(AIServiceOpenRouter, 'enhance_DmMessage', new=self._mock_enhance):
+            stored = AIVariantPool.from_settings().generate(self.automation)
+
+        # 2 keyword clusters + generic, 3 variants each
+        self.assertEqual(stored, 9)
+        self.assertEqual(AIMessageVariant.objects.filter(cluster='kw:link').count(), 3)
+        self.assertFalse(AIVariantPool.from_settings().is_stale(self.automation))
+
+        pool = AIVariantPool.from_settings()
+        variant = self._pick(pool, 'link pls')
+        self.assertTrue(variant['text'].startswith('Hey @{username}, link #'))
+        self.assertIsNone(self._pick(pool, 'what time do you open on sunday mornings'))
+
+        self.automation.DmMessage = 'Here is our new menu!'
+        self.automation.save()
+        self.assertIsNone(self._pick(pool, 'link pls'))
+        self.assertTrue(pool.is_stale(self.automation))
+
+    def _pick(self, pool, comment):
+        return async_to_sync(pool.apick)(self.automation, comment)
+
+    def test_save_queues_regeneration(self):
+        """Editing prompt fields queues the pool rebuild after commit"""
+        with patch('automations.tasks.generate_automation_variants.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.automation.ai_context = 'We sell coffee and pastries'
+                self.automation.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.automation.save(update_fields=['total_triggers'])
+
+        apply_async.assert_called_once_with(args=[str(self.automation.id)], queue='system')
@@ -0,0 +1,86 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from automations.consumers import DashboardConsumer
+from automations.services.dashboard_ticker import DashboardTicker, group_name
+from core.testing import TEST_CACHES, TEST_CHANNEL_LAYERS, CoffeeShopMixin
+
+
+@override_settings(CACHES=TEST_CACHES, CHANNEL_LAYERS=TEST_CHANNEL_LAYERS)
+class DashboardTickerTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        DashboardTicker.reset()
+        self.create_coffee_shop(total_dms_sent=7, total_triggers=9)
+
+    def tearDown(self):
+        DashboardTicker.reset()
+
+    def test_one_ticker_per_user_cancelled_with_last_socket(self):
+        async def scenario():
+            # Long interval: we only care about task lifecycle here
+            ticker = DashboardTicker(interval=3600)
+            for _ in range(3):
+                ticker.subscribe(self.user.id)
+            task = ticker._tasks[str(self.user.id)]
+            self.assertEqual(len(ticker._tasks), 1)
+
+            ticker.unsubscribe(self.user.id)
+            ticker.unsubscribe(self.user.id)
+            self.assertTrue(ticker.running(self.user.id))
+
+            ticker.unsubscribe(self.user.id)
+            await asyncio.sleep(0)
+            self.assertFalse(ticker.running(self.user.id))
+            return task
+
+        task = async_to_sync(scenario)()
+        self.assertTrue(task.cancelled())
+
+    def test_each_tick_is_computed_once_across_nodes(self):
+        async def scenario():
+            layer = get_channel_layer()
+            channel = await layer.new_channel()
+            await layer.group_add(group_name(self.user.id), channel)
+
+            # Two nodes contending for the same tick
+            node_a, node_b = DashboardTicker(interval=5), DashboardTicker(interval=5)
+            won = [await node.tick(self.user.id, now=1000.0) for node in (node_a, node_b)]
+            message = await layer.receive(channel)
+            # Next tick is up for grabs again
+            next_won = await node_b.tick(self.user.id, now=1005.0)
+            return won, next_won, message, await node_a.latest(self.user.id)
+
+        won, next_won, message, latest = async_to_sync(scenario)()
+        self.assertEqual(won, [True, False])
+        self.assertTrue(next_won)
+        self.assertEqual(message['type'], 'stats_update')
+        self.assertEqual(message['data'], {
+            'total_automations': 1,
+            'active_automations': 1,
+            'total_dms_sent': 7,
+            'total_triggers': 9,
+            'today_triggers': 0,
+        })
+        self.assertEqual(latest, message['data'])
+
+    def test_socket_closed_before_subscribing_leaves_ticker_running(self):
+        async def scenario():
+            ticker = DashboardTicker.from_settings()
+            ticker.subscribe(self.user.id)  # another open tab
+
+            # A socket that got its group but dropped before connect() subscribed
+            consumer = DashboardConsumer()
+            consumer.channel_layer, consumer.channel_name = get_channel_layer(), 'dropped'
+            consumer.user, consumer.dashboard_group = self.user, group_name(self.user.id)
+            await consumer.disconnect(1006)
+
+            running = ticker.running(self.user.id)
+            ticker.unsubscribe(self.user.id)
+            return running
+
+        self.assertTrue(async_to_sync(scenario)())
@@ -0,0 +1,87 @@
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from automations.models import AutomationTrigger, Contact
+from automations.services import export_engine
+from core.testing import CoffeeShopMixin
+
+
+class ExportEngineTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        self.create_coffee_shop()
+        # Several triggers share a timestamp so paging has to break ties on id
+        now = timezone.now().replace(microsecond=0)
+        AutomationTrigger.objects.bulk_create([
+            AutomationTrigger(
+                automation=self.automation, instagram_user_id=str(i), instagram_username=f'fan{i}',
+                comment_text=f'link please {i}', status='sent' if i % 2 else 'failed',
+                created_at=now - timedelta(minutes=i // 3),
+            )
+            for i in range(23)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_keyset_pages_cover_every_row_once_in_order(self):
+        triggers = AutomationTrigger.objects.filter(automation=self.automation)
+        rows = list(export_engine.iter_rows(triggers, export_engine.TRIGGERS, chunk_size=4))
+
+        expected = list(
+            triggers.order_by('-created_at', '-id').values_list('instagram_username', flat=True)
+        )
+        self.assertEqual([row[1] for row in rows], expected)
+        self.assertEqual(len(set(expected)), 23)
+
+    def test_one_query_per_page(self):
+        triggers = AutomationTrigger.objects.filter(automation=self.automation)
+        with self.assertNumQueries(3):  # 10 + 10 + 3 rows
+            self.assertEqual(len(list(export_engine.iter_rows(triggers, export_engine.TRIGGERS, chunk_size=10))), 23)
+
+    def test_csv_and_gzip_csv(self):
+        response = self.client.get('/api/triggers/export/?format=csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:3], ['Automation', 'Username', 'Comment'])
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(rows[1][0], 'Menu link')
+
+        response = self.client.get('/api/triggers/export/?format=csv.gz')
+        unzipped = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(list(csv.reader(io.StringIO(unzipped))), rows)
+
+    def test_ndjson(self):
+        response = self.client.get(f'/api/triggers/export/?format=ndjson&automation_id={self.automation.id}')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 23)
+        first = json.loads(lines[0])
+        self.assertEqual(first['automation_name'], 'Menu link')
+        self.assertIn('T', first['created_at'])
+
+    def test_xlsx_contacts(self):
+        Contact.objects.create(
+            instagram_account=self.account, instagram_user_id='42', instagram_username='fan',
+            tags=['vip', 'coffee'], total_interactions=3,
+        )
+        response = self.client.get('/api/contacts/export/?format=xlsx')
+        self.assertEqual(response.status_code, 200)
+
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(sheet.title, 'Contacts')
+        self.assertEqual(sheet['A1'].value, 'Username')
+        self.assertEqual(sheet['A2'].value, 'fan')
+        self.assertEqual(sheet['D2'].value, 3)
+        self.assertEqual(sheet['I2'].value, 'vip, coffee')
+        self.assertEqual(sheet.column_dimensions['B'].width, 30)
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/triggers/export/?format=pdf')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,126 @@
+import csv
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from automations.models import AutomationTrigger, ExportJob
+from automations.services import export_jobs
+from automations.tasks import run_export_job
+from core.testing import TEST_CACHES, TEST_CHANNEL_LAYERS, CoffeeShopMixin
+
+
+def _run_now(args, **kwargs):
+    run_export_job(*args)
+
+
+@mock.patch.object(run_export_job, 'apply_async', side_effect=_run_now)
+class ExportJobTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        overrides = override_settings(
+            CACHES=TEST_CACHES, CHANNEL_LAYERS=TEST_CHANNEL_LAYERS, EXPORT_ROOT=self.root,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.create_coffee_shop()
+        AutomationTrigger.objects.bulk_create([
+            AutomationTrigger(
+                automation=self.automation, instagram_user_id=str(i), instagram_username=f'fan{i}',
+                comment_text=f'link please {i}', status='sent',
+            )
+            for i in range(12)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/exports/', data, format='json')
+
+    def test_job_runs_and_identical_request_reuses_it(self, apply_async):
+        response = self._create(kind='triggers', format='csv')
+        self.assertEqual(response.status_code, 202)
+
+        job = self.client.get(f'/api/exports/{response.data["id"]}/').data
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual((job['rows_written'], job['total_rows'], job['progress']), (12, 12, 100.0))
+        self.assertTrue(job['download_url'].endswith(f'/api/exports/{job["id"]}/download/'))
+
+        again = self._create(kind='triggers', format='csv')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data['id'], job['id'])
+        self.assertEqual(apply_async.call_count, 1)
+
+        # Different parameters are a different export
+        other = self._create(kind='triggers', format='csv', automation_id=str(self.automation.id))
+        self.assertEqual(other.status_code, 202)
+        self.assertNotEqual(other.data['id'], job['id'])
+
+    def test_download_and_resume_with_range(self, apply_async):
+        job_id = self._create(kind='triggers', format='csv').data['id']
+        url = f'/api/exports/{job_id}/download/'
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment; filename="triggers_', response['Content-Disposition'])
+        body = b''.join(response.streaming_content)
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(len(rows), 13)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=100-', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-{len(body) - 1}/{len(body)}')
+        self.assertEqual(b''.join(response.streaming_content), body[100:])
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), body[-10:])
+
+        # A stale validator gets the whole (new) file rather than a spliced one
+        response = self.client.get(url, HTTP_RANGE='bytes=100-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(body)}')
+
+    def test_analytics_report_and_validation(self, apply_async):
+        job_id = self._create(kind='analytics', period='7d').data['id']
+        response = self.client.get(f'/api/exports/{job_id}/download/')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['Overview', 'Automations', 'Daily Breakdown'])
+        daily = workbook['Daily Breakdown']
+        self.assertEqual(daily.max_row, 8)
+        self.assertEqual(daily.cell(row=8, column=2).value, 12)
+
+        # The synchronous endpoint writes the same workbook
+        response = self.client.get('/api/analytics/export_analytics/?period=7d')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(load_workbook(io.BytesIO(b''.join(response.streaming_content))).sheetnames, workbook.sheetnames)
+
+        self.assertEqual(self._create(kind='analytics', format='csv').status_code, 400)
+        self.assertEqual(self._create(kind='triggers', format='pdf').status_code, 400)
+        self.assertEqual(self._create(kind='everything').status_code, 400)
+
+    def test_pending_download_conflicts_and_expired_jobs_are_removed(self, apply_async):
+        job = ExportJob.objects.create(
+            user=self.user, kind='contacts', format='csv', fingerprint='x',
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(self.client.get(f'/api/exports/{job.id}/download/').status_code, 409)
+
+        done = ExportJob.objects.get(pk=self._create(kind='contacts', format='ndjson').data['id'])
+        self.assertTrue(export_jobs.get_storage().exists(done.path))
+        self.assertEqual(export_jobs.cleanup_expired(now=timezone.now() + timedelta(days=2)), 2)
+        self.assertFalse(export_jobs.get_storage().exists(done.path))
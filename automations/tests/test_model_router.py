@@ -0,0 +1,98 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from automations.services.ai_service_async import AIServiceOpenRouter
+from automations.services.model_router import MIN_SAMPLES, ModelRouter
+from core.testing import TEST_CACHES
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    AI_MESSAGE_CACHE_ENABLED=False,
+    AI_SINGLEFLIGHT_ENABLED=False,
+)
+class ModelRouterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _record(self, model, latency, success=True, times=MIN_SAMPLES):
+        router = ModelRouter()
+
+        async def go():
+            for _ in range(times):
+                await router.arecord(model, latency, success)
+        asyncio.run(go())
+
+    def test_rank_prefers_fast_healthy_model(self):
+        """Observed p50 and error rate reorder the configured chain"""
+        self._record('slow/model', 8)
+        self._record('fast/model', 0.4)
+        self._record('flaky/model', 0.4, success=False)
+
+        router = ModelRouter()
+        models = ['slow/model', 'flaky/model', 'fast/model', 'new/model']
+        self.assertEqual(
+            router.rank(models),
+            ['fast/model', 'new/model', 'flaky/model', 'slow/model'],
+        )
+
+    def test_slow_primary_is_hedged(self):
+        """When the primary runs past its p95 the next model answers the DM"""
+        service = AIServiceOpenRouter(api_key='test-key')
+        primary, secondary = service.MODELS[0]['id'], service.MODELS[1]['id']
+        self._record(primary, 0.2)
+        self._record(secondary, 1.5)
+
+        async def fake_generate(_service, prompt, model, max_tokens=400, temperature=0.7):
+            await asyncio.sleep(30 if model == primary else 0.1)
+            return {'success': True, 'text': f'from {model}', 'model': model}
+
+        async def run():
+            try:
+                return await service.enhance_DmMessage(
+                    base_message='Here is the link!',
+                    business_context='We sell coffee',
+                    user_comment='link',
+                    username='coffee_fan',
+                )
+            finally:
+                await service.close()
+
+        started = time.monotonic()
+        with patch.object(AIServiceOpenRouter, '_generate', new=fake_generate):
+            result = asyncio.run(run())
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['model_used'], secondary)
+        # Hedge fires after MIN_HEDGE_DELAY, not after the 30s primary
+        self.assertLess(time.monotonic() - started, 5)
+        # The hedged-away primary still counts, as a latency sample but not an error
+        stats = ModelRouter().stats([primary, secondary])
+        self.assertEqual((stats[primary]['samples'], stats[primary]['error_rate']), (MIN_SAMPLES + 1, 0))
+        self.assertGreaterEqual(stats[primary]['p95'], 1)
+        self.assertEqual((stats[secondary]['samples'], stats[secondary]['error_rate']), (MIN_SAMPLES + 1, 0))
+
+    def test_call_cut_off_by_latency_budget_is_recorded(self):
+        """A call cancelled by AI_ENHANCEMENT_LATENCY_BUDGET counts as a failure"""
+        service = AIServiceOpenRouter(api_key='test-key')
+        model = service.MODELS[0]['id']
+
+        async def hanging_generate(_service, prompt, model, max_tokens=400, temperature=0.7):
+            await asyncio.sleep(30)
+
+        async def run():
+            try:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(service._generate_hedged('prompt', [model]), timeout=0.2)
+            finally:
+                await service.close()
+
+        with patch.object(AIServiceOpenRouter, '_generate', new=hanging_generate):
+            asyncio.run(run())
+
+        stats = ModelRouter().stats([model])[model]
+        self.assertEqual((stats['samples'], stats['error_rate']), (1, 1.0))
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from automations.services.gemini_key_pool import GeminiKeyPool
+from automations.services.openrouter_key_pool import OpenRouterKeyPool
+from automations.services.shared_key_pool import (
+    MAX_WAIT_SECONDS,
+    WINDOW_SECONDS,
+    KeyPoolExhausted,
+    SharedKeyPool,
+)
+from core.testing import TEST_CACHES
+
+# Start of a sliding window, so `elapsed` in each test is just the offset added to it
+T0 = 1_800_000_000.0
+
+
+class FrozenClock:
+    """time.time() for the pool that only moves when the pool sleeps."""
+
+    def __init__(self, now: float):
+        self.now = now
+        self.sleeps = []
+        self.on_sleep = None
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(round(seconds, 2))
+        self.now += seconds
+        if self.on_sleep:
+            await self.on_sleep()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SharedKeyPoolTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _freeze(self, now: float) -> FrozenClock:
+        clock = FrozenClock(now)
+        for target, fake in (('time.time', clock.time), ('asyncio.sleep', clock.sleep)):
+            patcher = patch(f'automations.services.shared_key_pool.{target}', new=fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return clock
+
+    def _fill(self, pool: SharedKeyPool, key: str, now: float, prev: int = 0, curr: int = 0):
+        """Set a key's request counters for the window containing `now`."""
+        slot_id = pool.slot_id_for(key)
+        window_id = int(now // WINDOW_SECONDS)
+        cache.set(pool._counter_key(slot_id, window_id - 1), prev, WINDOW_SECONDS * 2)
+        cache.set(pool._counter_key(slot_id, window_id), curr, WINDOW_SECONDS * 2)
+
+    def test_concurrent_claims_never_overcommit(self):
+        """50 coroutines racing for one key get exactly max_rpm slots"""
+        pool = SharedKeyPool(['key-a'])
+        slot_id = pool._slot_ids[0]
+
+        async def race():
+            now = time.time()
+            return await asyncio.gather(*[pool._try_claim(slot_id, 0, now) for _ in range(50)])
+
+        claims = asyncio.run(race())
+        self.assertEqual(sum(claims), pool.max_rpm)
+
+    def test_seconds_until_free_is_exact(self):
+        """The computed wait lands exactly where the sliding window admits one more request"""
+        pool = SharedKeyPool(['key-a'])  # 15 RPM
+
+        self.assertEqual(pool._seconds_until_free(prev=0, curr=14, elapsed=10), 0.0)
+        # Inside the window: 30 * (1 - 32/60) + 0 + 1 = 15 at elapsed 32
+        self.assertAlmostEqual(pool._seconds_until_free(prev=30, curr=0, elapsed=30), 2.0)
+        self.assertAlmostEqual(pool._estimate(30, 0, 32) + 1, pool.max_rpm)
+        # Current window full: 40 s to its end, then 15 * (1 - 4/60) + 1 = 15 at 4 s into the next
+        self.assertAlmostEqual(pool._seconds_until_free(prev=0, curr=15, elapsed=20), 44.0)
+        self.assertAlmostEqual(pool._estimate(15, 0, 4) + 1, pool.max_rpm)
+
+    def test_get_key_sleeps_exactly_until_the_next_slot(self):
+        pool = SharedKeyPool(['key-a'])
+        clock = self._freeze(T0 + 20)
+        self._fill(pool, 'key-a', clock.now, curr=15)
+
+        self.assertEqual(asyncio.run(pool.get_key()), 'key-a')
+        self.assertEqual(clock.sleeps, [44.01])
+
+    def test_rate_limited_key_cools_down_until_retry_after(self):
+        pool = SharedKeyPool(['key-a', 'key-b'])
+        clock = self._freeze(T0)
+        active = pool.keys[pool._rotation_index(clock.now)]
+        other = next(k for k in pool.keys if k != active)
+
+        asyncio.run(pool.report_rate_limited(active, retry_after=30))
+        # The pool skips the cooling key without waiting
+        self.assertEqual(asyncio.run(pool.get_key()), other)
+        self.assertEqual(clock.sleeps, [])
+        self.assertEqual(pool.utilisation()[pool.keys.index(active)]['cooldown_seconds'], 30.0)
+
+        clock.now += 30
+        self.assertEqual(asyncio.run(pool.get_key()), active)
+
+    def test_exhausted_when_no_key_frees_within_the_wait_cap(self):
+        pool = SharedKeyPool(['key-a'])
+        clock = self._freeze(T0)
+
+        asyncio.run(pool.report_rate_limited('key-a', retry_after=MAX_WAIT_SECONDS + 30))
+        with self.assertRaises(KeyPoolExhausted):
+            asyncio.run(pool.get_key())
+        # A wait past the cap is refused up front instead of slept through
+        self.assertEqual(clock.sleeps, [])
+
+    def test_exhausted_counts_the_wait_cap_from_the_first_attempt(self):
+        pool = SharedKeyPool(['key-a'])
+        clock = self._freeze(T0)
+        asyncio.run(pool.report_rate_limited('key-a', retry_after=50))
+
+        async def rate_limited_again():
+            # Another worker got a fresh 429 while we slept
+            await pool.report_rate_limited('key-a', retry_after=30)
+
+        clock.on_sleep = rate_limited_again
+        with self.assertRaises(KeyPoolExhausted):
+            asyncio.run(pool.get_key())
+        self.assertEqual(clock.sleeps, [50.01])
+
+    def test_utilisation_reports_window_usage_per_key(self):
+        pool = SharedKeyPool(['key-aaaaaa', 'key-bbbbbb'])
+        clock = self._freeze(T0 + 30)
+        self._fill(pool, 'key-aaaaaa', clock.now, prev=30, curr=3)
+
+        busy, idle = pool.utilisation()
+
+        self.assertEqual(busy['key_suffix'], 'aaaaaa')
+        self.assertEqual(busy['requests_in_window'], 18.0)  # 30 * 1/2 + 3
+        self.assertEqual(busy['utilisation'], 100.0)
+        self.assertEqual(busy['next_free_in'], 8.0)
+        self.assertEqual(idle['requests_in_window'], 0)
+        self.assertEqual(idle['utilisation'], 0.0)
+        self.assertEqual(idle['next_free_in'], 0.0)
+        self.assertEqual([busy['active'], idle['active']], [
+            i == pool._rotation_index(clock.now) for i in range(2)
+        ])
+
+    def test_status_command_prints_every_key(self):
+        OpenRouterKeyPool.reset()
+        GeminiKeyPool.reset()
+        self.addCleanup(OpenRouterKeyPool.reset)
+        self.addCleanup(GeminiKeyPool.reset)
+        config = {'provider': 'openrouter', 'openrouter_keys': ['or-key-111111', 'or-key-222222'], 'gemini_keys': []}
+        clock = self._freeze(T0)
+
+        with patch('automations.services.ai_settings_cache.get_ai_config', return_value=config):
+            pool = OpenRouterKeyPool.from_settings()
+            self._fill(pool, 'or-key-111111', clock.now, curr=pool.max_rpm)
+            asyncio.run(pool.report_rate_limited('or-key-222222', retry_after=20))
+            out = StringIO()
+            call_command('ai_key_pool_status', '--provider', 'openrouter', stdout=out)
+
+        output = out.getvalue()
+        self.assertIn(f'OpenRouter ({pool.max_rpm} RPM per key)', output)
+        self.assertRegex(output, r'\[0\] \.\.\.111111 +15\.0/15 +100\.0%  next slot in 64\.0s')
+        self.assertRegex(output, r'\[1\] \.\.\.222222 +0\.0/15 +0\.0%  cooling down 20\.0s')
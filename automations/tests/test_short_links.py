@@ -0,0 +1,109 @@
+import asyncio
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from analytics.models import AutomationPerformance
+from automations.models import AutomationVariant, ShortLink
+from automations.redirector import ShortLinkRedirector
+from automations.services import ab_variants, short_links
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+
+async def _not_found(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 404, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def _get(app, path):
+    """(status, headers) of a GET through an ASGI app."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app({'type': 'http', 'method': 'GET', 'path': path, 'headers': []}, receive, send))
+    return messages[0]['status'], dict(messages[0]['headers'])
+
+
+@override_settings(CACHES=TEST_CACHES, SHORT_LINK_BASE_URL='https://go.example.com')
+class ShortLinksTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        short_links.reset()
+        self.create_coffee_shop()
+        self.variant = AutomationVariant.objects.create(automation=self.automation, name='B', DmMessage='Hi B')
+        self.buttons = [
+            {'type': 'web_url', 'title': 'Menu', 'url': 'https://coffee.example.com/menu'},
+            {'type': 'postback', 'title': 'Hours', 'payload': 'HOURS'},
+        ]
+
+    def tearDown(self):
+        short_links.reset()
+
+    def test_buttons_are_rewritten_to_one_signed_token_per_url(self):
+        rewritten = short_links.rewrite_buttons(self.automation.id, None, self.buttons)
+        self.assertEqual(rewritten[1], self.buttons[1])
+        self.assertTrue(rewritten[0]['url'].startswith('https://go.example.com/r/'))
+        self.assertEqual(self.buttons[0]['url'], 'https://coffee.example.com/menu')
+
+        # Every later DM reuses the token without touching the DB
+        with self.assertNumQueries(0):
+            again = short_links.rewrite_buttons(self.automation.id, None, self.buttons)
+        self.assertEqual(again, rewritten)
+        short_links.rewrite_buttons(self.automation.id, self.variant.id, self.buttons)
+        self.assertEqual(ShortLink.objects.count(), 2)
+
+        token = rewritten[0]['url'].rsplit('/', 1)[1]
+        self.assertTrue(short_links.verify(token))
+        self.assertFalse(short_links.verify(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+
+    def test_asgi_redirect_skips_the_orm_and_rejects_forged_tokens(self):
+        url = short_links.rewrite_buttons(self.automation.id, self.variant.id, self.buttons)[0]['url']
+        token = url.rsplit('/', 1)[1]
+        app = ShortLinkRedirector(_not_found)
+
+        short_links.reset()  # another process: only the shared cache is warm
+        with self.assertNumQueries(0):
+            status, headers = _get(app, f'/r/{token}')
+            self.assertEqual(_get(app, f'/r/{token}')[0], 302)
+        self.assertEqual(status, 302)
+        self.assertEqual(headers[b'location'], b'https://coffee.example.com/menu')
+        self.assertEqual(headers[b'cache-control'], b'no-store')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(_get(app, f'/r/{short_links.new_token()[:-2]}xx')[0], 404)
+        self.assertEqual(_get(app, '/api/automations/')[0], 404)  # passed through to the wrapped app
+        self.assertEqual(short_links.pending(), 2)
+
+    def test_clicks_are_flushed_into_rollups_and_variant_counters(self):
+        url = short_links.rewrite_buttons(self.automation.id, self.variant.id, self.buttons)[0]['url']
+        token = url.rsplit('/', 1)[1]
+        today = timezone.localdate()
+        AutomationPerformance.objects.create(automation=self.automation, date=today, successful_count=10)
+
+        for _ in range(3):
+            response = self.client.get(f'/r/{token}')
+            self.assertEqual((response.status_code, response['Location']), (302, 'https://coffee.example.com/menu'))
+        self.assertEqual(self.client.get('/r/not-a-token').status_code, 404)
+
+        self.assertEqual(short_links.flush(), 3)
+        self.assertEqual(short_links.flush(), 0)
+        performance = AutomationPerformance.objects.get(automation=self.automation, date=today)
+        # click_rate waits for the nightly aggregation, which knows the day's sends
+        self.assertEqual((performance.click_count, performance.click_rate), (3, 0.0))
+
+        # A day without a rollup row yet gets one
+        short_links.click(short_links.resolve(token), day=today - timedelta(days=1))
+        short_links.flush()
+        self.assertEqual(
+            AutomationPerformance.objects.get(automation=self.automation, date=today - timedelta(days=1)).click_count, 1
+        )
+
+        ab_variants.flush(now=timezone.now().timestamp() + 180)
+        self.assertEqual(AutomationVariant.objects.get(pk=self.variant.pk).total_clicks, 4)
@@ -0,0 +1,122 @@
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from analytics.models import ContactEngagement, HourlyTriggerRollup
+from analytics.services import trigger_rollups
+from analytics.tasks import aggregate_contact_engagement
+from automations.models import AutomationTrigger, AutomationTriggerArchive, Contact, ExportJob
+from automations.services import export_jobs, trigger_archive
+from core.testing import TEST_CACHES, CoffeeShopMixin
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TriggerArchiveTest(CoffeeShopMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.archive_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(TRIGGER_ARCHIVE_ROOT=self.archive_root)
+        self.settings_override.enable()
+
+        self.create_coffee_shop()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.archive_root, ignore_errors=True)
+
+    def _trigger(self, at, status='sent', **fields):
+        trigger = AutomationTrigger.objects.create(
+            automation=self.automation, instagram_user_id='42', status=status,
+            comment_text='Send me the link 🙏', **fields,
+        )
+        AutomationTrigger.objects.filter(pk=trigger.pk).update(created_at=at)
+        return trigger
+
+    def _at(self, day, hour=12):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time())) + timedelta(hours=hour, microseconds=123456)
+
+    def test_archive_moves_old_months_and_reads_back(self):
+        january = self._trigger(self._at(date(2026, 1, 31), hour=23), was_ai_enhanced=True)
+        self._trigger(self._at(date(2026, 2, 1), hour=0))
+        recent = self._trigger(self._at(date(2026, 6, 10)))
+
+        archived = trigger_archive.archive_old_months(hot_months=3, today=date(2026, 6, 15))
+
+        self.assertEqual(archived, {'2026-01': 1, '2026-02': 1})
+        self.assertEqual(list(AutomationTrigger.objects.values_list('pk', flat=True)), [recent.pk])
+
+        manifest = AutomationTriggerArchive.objects.get(month=date(2026, 1, 1))
+        self.assertEqual(manifest.row_count, 1)
+        with trigger_archive.get_storage().open(manifest.path, 'rb') as raw:
+            self.assertEqual(len(gzip.decompress(raw.read()).splitlines()), 1)
+
+        # Re-running is a no-op
+        self.assertEqual(trigger_archive.archive_old_months(hot_months=3, today=date(2026, 6, 15)), {})
+
+        rows = list(trigger_archive.iter_archived(
+            self._at(date(2026, 1, 1), hour=0), self._at(date(2026, 2, 1), hour=1),
+            automation_ids=[self.automation.id],
+        ))
+        # Newest first, like the files
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]['id'], str(january.pk))
+        self.assertEqual(rows[1]['created_at'], self._at(date(2026, 1, 31), hour=23))
+        self.assertTrue(rows[1]['was_ai_enhanced'])
+        self.assertEqual(rows[1]['comment_text'], 'Send me the link 🙏')
+
+    def test_reconcile_keeps_rollups_of_archived_months(self):
+        at = self._at(date(2026, 1, 15))
+        self._trigger(at)
+        hour = at.replace(minute=0, second=0, microsecond=0)
+        trigger_rollups.reconcile(hour, hour + timedelta(hours=1))
+
+        trigger_archive.archive_month(date(2026, 1, 1))
+        trigger_rollups.reconcile(hour, hour + timedelta(hours=1))
+
+        self.assertEqual(HourlyTriggerRollup.objects.get(automation=self.automation).sent, 1)
+
+    def test_contact_engagement_backfill_reads_archived_days(self):
+        contact = Contact.objects.create(instagram_account=self.account, instagram_user_id='42')
+        day = date(2026, 1, 15)
+        self._trigger(self._at(day), was_ai_enhanced=True)
+        self._trigger(self._at(day, hour=18))
+        self._trigger(self._at(day), status='failed')
+        self._trigger(self._at(day + timedelta(days=1)))  # another day
+        trigger_archive.archive_month(date(2026, 1, 1))
+
+        aggregate_contact_engagement(day.isoformat())
+
+        engagement = ContactEngagement.objects.get(contact=contact, date=day)
+        self.assertEqual((engagement.dms_received, engagement.ai_enhanced_dms), (2, 1))
+
+    def test_trigger_exports_read_archived_months(self):
+        self._trigger(self._at(date(2026, 1, 10)), instagram_username='jan')
+        self._trigger(self._at(date(2026, 2, 5)), instagram_username='feb_early')
+        self._trigger(self._at(date(2026, 2, 20)), instagram_username='feb_late')
+        self._trigger(self._at(date(2026, 6, 10)), instagram_username='june')
+        other = self.create_automation(self.create_account(self.create_user('bakery'), '1790', 'bakery'))
+        AutomationTrigger.objects.create(automation=other, instagram_user_id='7', instagram_username='not_mine')
+        trigger_archive.archive_old_months(hot_months=3, today=date(2026, 6, 15))
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get('/api/triggers/export/?format=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        # Hot rows first, then archived months, all newest first
+        self.assertEqual([row['instagram_username'] for row in rows], ['june', 'feb_late', 'feb_early', 'jan'])
+        self.assertEqual(rows[-1]['automation_name'], 'Menu link')
+
+        job = ExportJob.objects.create(
+            user=self.user, kind='triggers', format='csv', params={'automation_id': str(self.automation.id)},
+            fingerprint='test', expires_at=timezone.now() + timedelta(hours=1),
+        )
+        hot, archived = export_jobs.rows_for(job)
+        self.assertEqual(hot.count(), 1)
+        self.assertEqual([row[1] for row in archived], ['feb_late', 'feb_early', 'jan'])
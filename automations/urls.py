@@ -10,7 +10,8 @@ from .views import (
     AutomationTriggerViewSet,
     ContactViewSet,
     AIProviderViewSet,
-    AnalyticsViewSet
+    AnalyticsViewSet,
+    ExportJobViewSet
 )
 from .webhooks import instagram_webhook
 from accounts.views import InstagramAccountViewSet
@@ -22,6 +23,7 @@ router.register(r'triggers', AutomationTriggerViewSet, basename='trigger')
 router.register(r'contacts', ContactViewSet, basename='contact')
 router.register(r'ai-providers', AIProviderViewSet, basename='ai-provider')
 router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+router.register(r'exports', ExportJobViewSet, basename='export')
 router.register(r'instagram-accounts', InstagramAccountViewSet, basename='instagram-account')
 
 urlpatterns = [
@@ -6,7 +6,7 @@ REST API Views for Automations with OpenRouter AI
 Provides endpoints for testing and managing AI-enhanced automations
 """
 
-from rest_framework import viewsets, status, serializers
+from rest_framework import mixins, viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -15,25 +15,30 @@ from django.conf import settings
 import asyncio
 from asgiref.sync import async_to_sync
 
-from .models import Automation, AutomationTrigger, Contact
+from .models import Automation, AutomationTrigger, Contact, ExportJob
 from .serializers import (
     AutomationSerializer, 
     AutomationTriggerSerializer, 
-    ContactSerializer
+    ContactSerializer,
+    ExportJobSerializer
 )
 from .services.ai_service_async import (
     AIServiceOpenRouter,
     AIServiceOpenRouterSync
 )
+from .services import ab_variants, export_engine, export_jobs
 from .tasks import process_automation_trigger_async
 
-import csv
-import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from django.http import HttpResponse, StreamingHttpResponse
-from datetime import datetime, timedelta, timezone
-from django.db.models import Sum
+import tempfile
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from rest_framework.negotiation import DefaultContentNegotiation
+from datetime import datetime
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """On export endpoints `?format=` picks the file type, not a DRF renderer."""
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
 
 
 class AutomationViewSet(viewsets.ModelViewSet):
@@ -254,6 +259,16 @@ class AutomationViewSet(viewsets.ModelViewSet):
         
         return Response(analytics)
     
+    @action(detail=True, methods=['get'])
+    def ab_results(self, request, pk=None):
+        """
+        A/B variant totals, rates and significance against the baseline variant
+        GET /api/automations/{id}/ab_results/
+        (reads the flushed counters, which trail live sends by a minute or two)
+        """
+        automation = self.get_object()
+        return Response(ab_variants.results(automation.id))
+    
     @action(detail=True, methods=['post'])
     def duplicate(self, request, pk=None):
         """
@@ -302,37 +317,27 @@ class AutomationTriggerViewSet(viewsets.ReadOnlyModelViewSet):
     
 
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], content_negotiation_class=ExportContentNegotiation)
     def export(self, request):
         """
-        Export triggers to CSV or Excel
+        Stream triggers as CSV, gzipped CSV, NDJSON, Parquet or Excel
         GET /api/triggers/export/?format=csv&automation_id=xxx
+        (format: csv, csv.gz, ndjson, ndjson.gz, parquet, xlsx)
         """
-        format_type = request.query_params.get('format', 'csv').lower()
-        automation_id = request.query_params.get('automation_id')
-        
         triggers = self.get_queryset()
+        automations = Automation.all_objects.filter(instagram_account__user=request.user)
+        automation_id = request.query_params.get('automation_id')
         if automation_id:
             triggers = triggers.filter(automation_id=automation_id)
+            automations = automations.filter(id=automation_id)
+        triggers, archived = export_engine.split_archived_triggers(triggers, automations)
         
-        fields = [
-            ('automation.name', 'Automation'),
-            ('instagram_username', 'Username'),
-            ('comment_text', 'Comment'),
-            ('status', 'Status'),
-            ('dm_sent_at', 'DM Sent At'),
-            ('was_ai_enhanced', 'AI Enhanced'),
-            ('created_at', 'Triggered At'),
-        ]
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        if format_type == 'xlsx':
-            filename = f'triggers_{timestamp}.xlsx'
-            return export_to_excel(triggers, fields, filename, 'Triggers')
-        else:
-            filename = f'triggers_{timestamp}.csv'
-            return export_to_csv(triggers, fields, filename)
+        try:
+            return export_engine.streaming_response(
+                export_engine.TRIGGERS, triggers, request.query_params.get('format', 'csv'), archived=archived
+            )
+        except export_engine.ExportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 
@@ -364,57 +369,19 @@ class ContactViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = self.get_serializer(contacts, many=True)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
-    def export(self, request):
-        """
-        Export contacts to CSV/XLSX
-        GET /api/contacts/export/?format=csv
-        """
-        format_type = request.query_params.get('format', 'csv')
-        
-        # This would generate CSV/XLSX file
-        # For now, return JSON
-        contacts = self.get_queryset()
-        serializer = self.get_serializer(contacts, many=True)
-        
-        return Response({
-            'format': format_type,
-            'count': contacts.count(),
-            'data': serializer.data,
-            'message': 'Export functionality - implement with pandas or openpyxl'
-        })
-    
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], content_negotiation_class=ExportContentNegotiation)
     def export(self, request):
         """
-        Export contacts to CSV or Excel
+        Stream contacts as CSV, gzipped CSV, NDJSON, Parquet or Excel
         GET /api/contacts/export/?format=csv
         GET /api/contacts/export/?format=xlsx
         """
-        format_type = request.query_params.get('format', 'csv').lower()
-        contacts = self.get_queryset()
-        
-        # Define fields to export
-        fields = [
-            ('instagram_username', 'Username'),
-            ('full_name', 'Full Name'),
-            ('instagram_user_id', 'Instagram ID'),
-            ('total_interactions', 'Total Interactions'),
-            ('total_dms_received', 'DMs Received'),
-            ('is_follower', 'Is Follower'),
-            ('first_interaction', 'First Interaction'),
-            ('last_interaction', 'Last Interaction'),
-            ('tags', 'Tags'),
-        ]
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        if format_type == 'xlsx':
-            filename = f'contacts_{timestamp}.xlsx'
-            return export_to_excel(contacts, fields, filename, 'Contacts')
-        else:
-            filename = f'contacts_{timestamp}.csv'
-            return export_to_csv(contacts, fields, filename)
+        try:
+            return export_engine.streaming_response(
+                export_engine.CONTACTS, self.get_queryset(), request.query_params.get('format', 'csv')
+            )
+        except export_engine.ExportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 
@@ -606,235 +573,87 @@ class AnalyticsViewSet(viewsets.ViewSet):
         """
         Export analytics to Excel with multiple sheets
         GET /api/analytics/dashboard/export_analytics/?period=30d
+        (long periods: POST /api/exports/ with kind=analytics runs it in the background)
         """
-        from automations.models import Automation, AutomationTrigger
-        
-        period = request.query_params.get('period', '30d')
-        days = int(period.replace('d', ''))
-        start_date = timezone.now() - timedelta(days=days)
-        
-        workbook = Workbook()
-        
-        # Sheet 1: Overview
-        ws_overview = workbook.active
-        ws_overview.title = 'Overview'
-        
-        automations = Automation.objects.filter(
-            instagram_account__user=request.user
-        )
+        try:
+            _, params = export_jobs.clean_params('analytics', 'xlsx', request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        overview_data = [
-            ['Metric', 'Value'],
-            ['Total Automations', automations.count()],
-            ['Active Automations', automations.filter(is_active=True).count()],
-            ['Total DMs Sent', automations.aggregate(Sum('total_dms_sent'))['total_dms_sent__sum'] or 0],
-            ['Total Triggers', automations.aggregate(Sum('total_triggers'))['total_triggers__sum'] or 0],
-            ['Period', f'{days} days'],
-            ['Report Generated', timezone.now().strftime('%Y-%m-%d %H:%M:%S')],
-        ]
-        
-        for row_num, row_data in enumerate(overview_data, 1):
-            for col_num, value in enumerate(row_data, 1):
-                ws_overview.cell(row=row_num, column=col_num, value=value)
-        
-        # Sheet 2: Automation Performance
-        ws_automations = workbook.create_sheet('Automations')
-        ws_automations.append(['Name', 'Status', 'Triggers', 'DMs Sent', 'Success Rate'])
-        
-        for automation in automations:
-            success_rate = (automation.total_dms_sent / automation.total_triggers * 100) if automation.total_triggers > 0 else 0
-            ws_automations.append([
-                automation.name,
-                'Active' if automation.is_active else 'Inactive',
-                automation.total_triggers,
-                automation.total_dms_sent,
-                f'{success_rate:.1f}%'
-            ])
-        
-        # Sheet 3: Daily Breakdown
-        ws_daily = workbook.create_sheet('Daily Breakdown')
-        ws_daily.append(['Date', 'Triggers', 'DMs Sent', 'AI Enhanced'])
-        
-        triggers = AutomationTrigger.objects.filter(
-            automation__instagram_account__user=request.user,
-            created_at__gte=start_date
-        )
-        
-        for i in range(days):
-            date = (timezone.now() - timedelta(days=days-i-1)).date()
-            day_triggers = triggers.filter(created_at__date=date)
-            
-            ws_daily.append([
-                date.strftime('%Y-%m-%d'),
-                day_triggers.count(),
-                day_triggers.filter(status='sent').count(),
-                day_triggers.filter(was_ai_enhanced=True).count()
-            ])
-        
-        # Style headers
-        for sheet in workbook.worksheets:
-            for cell in sheet[1]:
-                cell.font = Font(bold=True)
-                cell.fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
-                cell.font = Font(bold=True, color='FFFFFF')
-        
-        # Save
-        output = io.BytesIO()
-        workbook.save(output)
+        output = tempfile.TemporaryFile()
+        export_engine.analytics_report(request.user.id, params['days'], output)
         output.seek(0)
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'analytics_report_{timestamp}.xlsx'
-        
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        filename = f'analytics_report_{datetime.now():%Y%m%d_%H%M%S}.xlsx'
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=filename,
+            content_type=export_engine.FORMATS['xlsx'][0]
         )
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
-
-    
-
-
-
-
-
-
-
-
 
 
-
-
-
-
-
-
-
-
-# ============================================================================
-# CSV EXPORT HELPERS
-# ============================================================================
-
-class Echo:
-    """Helper for streaming CSV responses"""
-    def write(self, value):
-        return value
-
-
-def export_to_csv(queryset, fields, filename):
+class ExportJobViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
     """
-    Generic CSV export function
-    
-    Args:
-        queryset: Django queryset to export
-        fields: List of (field_name, display_name) tuples
-        filename: Output filename
+    Background exports
+    POST /api/exports/ {"kind": "triggers", "format": "csv.gz", "automation_id": "..."}
+    GET  /api/exports/<id>/            (status and progress; also pushed as 'export_update' over WebSocket)
+    GET  /api/exports/<id>/download/   (supports Range / If-Range for resumed downloads)
     """
-    pseudo_buffer = Echo()
-    writer = csv.writer(pseudo_buffer)
-    
-    def generate_rows():
-        # Header row
-        yield writer.writerow([field[1] for field in fields])
-        
-        # Data rows
-        for obj in queryset:
-            row = []
-            for field_name, _ in fields:
-                # Handle nested fields (e.g., 'automation.name')
-                if '.' in field_name:
-                    parts = field_name.split('.')
-                    value = obj
-                    for part in parts:
-                        value = getattr(value, part, '')
-                else:
-                    value = getattr(obj, field_name, '')
-                
-                # Format dates
-                if hasattr(value, 'strftime'):
-                    value = value.strftime('%Y-%m-%d %H:%M:%S')
-                
-                row.append(str(value))
-            yield writer.writerow(row)
-    
-    response = StreamingHttpResponse(
-        generate_rows(),
-        content_type='text/csv'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
-
-
-# ============================================================================
-# EXCEL EXPORT HELPERS
-# ============================================================================
-
-def export_to_excel(queryset, fields, filename, sheet_name='Data'):
-    """
-    Generic Excel export function with styling
-    
-    Args:
-        queryset: Django queryset to export
-        fields: List of (field_name, display_name) tuples
-        filename: Output filename
-        sheet_name: Excel sheet name
-    """
-    workbook = Workbook()
-    worksheet = workbook.active
-    worksheet.title = sheet_name
-    
-    # Header styling
-    header_fill = PatternFill(start_color='4F81BD', end_color='4F81BD', fill_type='solid')
-    header_font = Font(bold=True, color='FFFFFF')
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
     
-    # Write headers
-    for col_num, (_, display_name) in enumerate(fields, 1):
-        cell = worksheet.cell(row=1, column=col_num)
-        cell.value = display_name
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center')
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user)
     
-    # Write data
-    for row_num, obj in enumerate(queryset, 2):
-        for col_num, (field_name, _) in enumerate(fields, 1):
-            # Handle nested fields
-            if '.' in field_name:
-                parts = field_name.split('.')
-                value = obj
-                for part in parts:
-                    value = getattr(value, part, '')
-            else:
-                value = getattr(obj, field_name, '')
-            
-            # Format dates
-            if hasattr(value, 'strftime'):
-                value = value.strftime('%Y-%m-%d %H:%M:%S')
-            
-            worksheet.cell(row=row_num, column=col_num, value=str(value))
+    def create(self, request, *args, **kwargs):
+        kind = request.data.get('kind', '')
+        try:
+            fmt, params = export_jobs.clean_params(kind, request.data.get('format'), request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        job, created = export_jobs.request_export(request.user, kind, fmt, params)
+        return Response(
+            self.get_serializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+        )
     
-    # Auto-adjust column widths
-    for column in worksheet.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
+    @action(detail=True, methods=['get'], content_negotiation_class=ExportContentNegotiation)
+    def download(self, request, pk=None):
+        """
+        Download a finished export; `Range: bytes=N-` resumes an interrupted download
+        GET /api/exports/<id>/download/
+        """
+        job = self.get_object()
+        if job.status != 'completed':
+            return Response(
+                {'error': f'Export is {job.status}', 'status': job.status, 'progress': job.progress},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        size = job.size_bytes
+        etag = f'"{job.id.hex}-{size}"'
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range == etag:
             try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        worksheet.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to response
-    output = io.BytesIO()
-    workbook.save(output)
-    output.seek(0)
-    
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+                byte_range = export_jobs.parse_range(request.headers.get('Range'), size)
+            except export_jobs.RangeNotSatisfiable:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+        
+        first, last = byte_range or (0, size - 1)
+        response = StreamingHttpResponse(
+            export_jobs.read_range(job, first, last),
+            status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+            content_type=export_engine.FORMATS[job.format][0]
+        )
+        if byte_range:
+            response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = str(last - first + 1)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Content-Disposition'] = f'attachment; filename="{export_jobs.download_name(job)}"'
+        return response
@@ -19,10 +19,12 @@ from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 django.setup()
 
+from automations.redirector import ShortLinkRedirector
 from automations.routing import websocket_urlpatterns
 
 application = ProtocolTypeRouter({
-    'http': ASGIStaticFilesHandler(get_asgi_application()),
+    # /r/<token> click redirects are answered before Django sees the request
+    'http': ShortLinkRedirector(ASGIStaticFilesHandler(get_asgi_application())),
     'websocket': AllowedHostsOriginValidator(
         AuthMiddlewareStack(
             URLRouter(websocket_urlpatterns)
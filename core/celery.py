@@ -1,6 +1,7 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown, worker_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
@@ -8,6 +9,15 @@ app = Celery('core')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def flush_ai_telemetry(**kwargs):
+    """Write AI telemetry still buffered in this process before it exits."""
+    from automations.services import ai_telemetry
+    ai_telemetry.flush()
+
+
 # Dynamic Load Management for 1000+ Users targeting Gevent pool
 app.conf.update(
     worker_pool='gevent',             # Re-enable the gevent pool
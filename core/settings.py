@@ -241,6 +241,7 @@ CELERY_TASK_TIME_LIMIT = 300  # 5 minutes max per task
 #   celery -A core worker -Q paid_high -c 8    (paid/high priority)
 #   celery -A core worker -Q free_default -c 4  (free tier)
 #   celery -A core worker -Q system -c 2         (tokens, beat tasks)
+from celery.schedules import crontab
 from kombu import Queue, Exchange
 
 _default_exchange = Exchange('default', type='direct')
@@ -285,6 +286,48 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': 86400.0,  # every 24 hours
         'options': {'queue': 'system'},
     },
+
+    # Rebuild AI variant pools that are missing or older than AI_VARIANT_POOL_MAX_AGE_DAYS
+    'refresh-ai-variant-pools': {
+        'task': 'automations.tasks.refresh_ai_variant_pools',
+        'schedule': 21600.0,  # every 6 hours
+        'options': {'queue': 'system'},
+    },
+
+    # Move months older than TRIGGER_HOT_MONTHS to the cold trigger archive
+    'archive-old-triggers': {
+        'task': 'automations.tasks.archive_old_triggers',
+        'schedule': 86400.0,  # daily; a month is archived once it leaves the hot window
+        'options': {'queue': 'system'},
+    },
+
+    # Add buffered A/B variant counters to automation_variants
+    'flush-variant-counters': {
+        'task': 'automations.tasks.flush_variant_counters',
+        'schedule': 60.0,  # every minute
+        'options': {'queue': 'system'},
+    },
+
+    # Delete background export files past EXPORT_TTL_HOURS
+    'cleanup-expired-exports': {
+        'task': 'automations.tasks.cleanup_expired_exports',
+        'schedule': 3600.0,  # hourly
+        'options': {'queue': 'system'},
+    },
+
+    # Apply trigger rollup deltas to the hourly rollup table
+    'flush-trigger-rollups': {
+        'task': 'analytics.tasks.flush_trigger_rollups',
+        'schedule': 60.0,  # every minute
+        'options': {'queue': 'system'},
+    },
+
+    # Reconcile yesterday's hourly trigger rollups, then derive daily stats and automation performance
+    'aggregate-nightly-rollups': {
+        'task': 'analytics.tasks.aggregate_nightly_rollups',
+        'schedule': crontab(hour=0, minute=15),
+        'options': {'queue': 'system'},
+    },
 }
 
 
@@ -424,6 +467,87 @@ AI_ENHANCEMENT_TIMEOUT = 60  # seconds
 AI_ENHANCEMENT_MAX_RETRIES = 3
 AI_ENHANCEMENT_FALLBACK_TO_ORIGINAL = True  # Use original message if all models fail
 
+# AI message cache (content-addressed, LRU + Redis tiers)
+AI_MESSAGE_CACHE_ENABLED = config('AI_MESSAGE_CACHE_ENABLED', default=True, cast=bool)
+AI_MESSAGE_CACHE_TTL = config('AI_MESSAGE_CACHE_TTL', default=86400, cast=int)  # seconds
+AI_MESSAGE_CACHE_VARIANTS = config('AI_MESSAGE_CACHE_VARIANTS', default=3, cast=int)  # variants per key
+AI_MESSAGE_CACHE_LRU_SIZE = 1024  # in-process entries per worker
+
+# Hard per-trigger budget for AI enhancement; past it the original template is sent
+AI_ENHANCEMENT_LATENCY_BUDGET = config('AI_ENHANCEMENT_LATENCY_BUDGET', default=15, cast=int)
+
+# Singleflight: identical concurrent AI prompts share one provider request
+AI_SINGLEFLIGHT_ENABLED = config('AI_SINGLEFLIGHT_ENABLED', default=True, cast=bool)
+AI_SINGLEFLIGHT_LOCK_TTL = 30  # seconds
+AI_SINGLEFLIGHT_RESULT_TTL = 15  # seconds
+# A waiter that gives up calls the provider itself, which has to fit in the latency budget
+AI_SINGLEFLIGHT_SOLO_RESERVE = 6  # seconds ≈ single-call p95
+AI_SINGLEFLIGHT_WAIT_TIMEOUT = max(1, AI_ENHANCEMENT_LATENCY_BUDGET - AI_SINGLEFLIGHT_SOLO_RESERVE)
+
+# Pre-generated AI variant pool (per automation + comment-intent cluster)
+AI_VARIANT_POOL_ENABLED = config('AI_VARIANT_POOL_ENABLED', default=True, cast=bool)
+AI_VARIANT_POOL_SIZE = config('AI_VARIANT_POOL_SIZE', default=5, cast=int)  # variants per cluster
+AI_VARIANT_POOL_MAX_AGE_DAYS = config('AI_VARIANT_POOL_MAX_AGE_DAYS', default=7, cast=int)
+
+# Burst batching: during bursts, up to AI_BATCH_MAX_SIZE comments on one automation share one LLM call
+AI_BATCH_ENABLED = config('AI_BATCH_ENABLED', default=True, cast=bool)
+AI_BATCH_MAX_SIZE = config('AI_BATCH_MAX_SIZE', default=10, cast=int)
+AI_BATCH_WINDOW_MS = config('AI_BATCH_WINDOW_MS', default=300, cast=int)  # how long a batch stays open
+AI_BATCH_MIN_RATE = config('AI_BATCH_MIN_RATE', default=5, cast=int)  # requests/second per automation
+# A member that gives up on its batch still has to make its own call inside the latency
+# budget, so it waits at most budget - window - AI_BATCH_FALLBACK_RESERVE for the leader
+AI_BATCH_FALLBACK_RESERVE = config('AI_BATCH_FALLBACK_RESERVE', default=6, cast=float)  # seconds ≈ single-call p95
+AI_BATCH_RESULT_TIMEOUT = max(1.0, AI_ENHANCEMENT_LATENCY_BUDGET - AI_BATCH_WINDOW_MS / 1000 - AI_BATCH_FALLBACK_RESERVE)
+
+# Analytics: incremental hourly trigger rollups (deltas in cache, flushed every minute)
+TRIGGER_ROLLUPS_ENABLED = config('TRIGGER_ROLLUPS_ENABLED', default=True, cast=bool)
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=60, cast=int)  # seconds; trigger activity invalidates sooner
+DASHBOARD_TICKER_INTERVAL = 5  # seconds between dashboard WebSocket stats pushes
+
+# automation_triggers retention: whole months older than this move to gzip NDJSON cold storage
+# (STORAGES['trigger_archive'] if defined, else TRIGGER_ARCHIVE_ROOT on local disk)
+TRIGGER_HOT_MONTHS = config('TRIGGER_HOT_MONTHS', default=3, cast=int)
+TRIGGER_ARCHIVE_ROOT = config('TRIGGER_ARCHIVE_ROOT', default=str(BASE_DIR / 'archive'))
+
+# Retention for analytics/log tables: expired rows are deleted in PK batches with a pause between
+# batches; a run stops after RETENTION_MAX_SECONDS per table and the next one resumes from a checkpoint
+RETENTION_BATCH_SIZE = config('RETENTION_BATCH_SIZE', default=5000, cast=int)
+RETENTION_BATCH_SLEEP = config('RETENTION_BATCH_SLEEP', default=0.1, cast=float)  # seconds
+RETENTION_MAX_SECONDS = config('RETENTION_MAX_SECONDS', default=600, cast=int)
+RETENTION_DAYS = {}  # per-table overrides of the defaults in analytics/services/retention.py, e.g. {'webhooks': 30}
+
+# Trigger/contact exports stream keyset pages of this many rows (memory is bounded by one page)
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=5000, cast=int)
+
+# Background export jobs (POST /api/exports/): files go to STORAGES['exports'] if defined, else EXPORT_ROOT;
+# an identical request within EXPORT_DEDUPE_SECONDS reuses the existing job
+EXPORT_ROOT = config('EXPORT_ROOT', default=str(BASE_DIR / 'exports'))
+EXPORT_DEDUPE_SECONDS = config('EXPORT_DEDUPE_SECONDS', default=600, cast=int)
+EXPORT_TTL_HOURS = config('EXPORT_TTL_HOURS', default=24, cast=int)
+EXPORT_PROGRESS_INTERVAL = config('EXPORT_PROGRESS_INTERVAL', default=2.0, cast=float)  # seconds between WebSocket progress events
+
+# Weekly reports are sent in chunks of this many users, one task and one SMTP connection per chunk
+WEEKLY_REPORT_CHUNK_SIZE = config('WEEKLY_REPORT_CHUNK_SIZE', default=200, cast=int)
+
+# DM button links are rewritten to {SHORT_LINK_BASE_URL}/r/<token> (defaults to BACKEND_URL)
+SHORT_LINK_BASE_URL = config('SHORT_LINK_BASE_URL', default='')
+
+# IP geolocation / VPN detection for sessions (see accounts/geoip.py). Local MaxMind-format .mmdb files are
+# opened memory-mapped (needs `pip install maxminddb`); ip-api.com is only asked when they don't know an address
+GEOIP_CITY_DATABASE = config('GEOIP_CITY_DATABASE', default='')            # e.g. GeoLite2-City.mmdb
+GEOIP_ASN_DATABASE = config('GEOIP_ASN_DATABASE', default='')              # e.g. GeoLite2-ASN.mmdb
+GEOIP_ANONYMOUS_DATABASE = config('GEOIP_ANONYMOUS_DATABASE', default='')  # e.g. GeoIP2-Anonymous-IP.mmdb
+GEOIP_HTTP_FALLBACK = config('GEOIP_HTTP_FALLBACK', default=True, cast=bool)
+GEOIP_HTTP_TIMEOUT = config('GEOIP_HTTP_TIMEOUT', default=3.0, cast=float)
+# Answers are cached per /24 (IPv4) or /48 (IPv6) network when a backend has per-address security flags
+# (MaxMind Anonymous IP), otherwise per address; lookups that failed are retried after the negative TTL
+GEOIP_CACHE_TTL = config('GEOIP_CACHE_TTL', default=86400, cast=int)
+GEOIP_CACHE_NEGATIVE_TTL = config('GEOIP_CACHE_NEGATIVE_TTL', default=300, cast=int)
+GEOIP_CACHE_BY_PREFIX = config('GEOIP_CACHE_BY_PREFIX', default=True, cast=bool)
+
+# Parsed user agents are memoized per process; with this on they are shared through the cache too
+USER_AGENT_SHARED_CACHE = config('USER_AGENT_SHARED_CACHE', default=True, cast=bool)
+
 
 
 
@@ -0,0 +1,56 @@
+"""
+Shared Test Helpers
+================================================================
+- TEST_CACHES / TEST_CHANNEL_LAYERS: in-process backends, so tests never
+  need Redis
+- CoffeeShopMixin: the coffee_shop user, its Instagram account and a
+  'Menu link' automation that most automation and analytics tests start from
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+TEST_CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+}
+
+
+class CoffeeShopMixin:
+    """Fixture builders for TestCase subclasses."""
+
+    def create_user(self, username='coffee_shop', **fields):
+        return get_user_model().objects.create_user(
+            username=username, email=f'{username}@gmail.com', password='testpassword123', **fields
+        )
+
+    def create_account(self, user, instagram_user_id='1789', username='coffee_shop'):
+        from accounts.models import InstagramAccount
+
+        return InstagramAccount.objects.create(
+            user=user, instagram_user_id=instagram_user_id, username=username, access_token='token',
+            token_expires_at=timezone.now() + timedelta(days=30),
+        )
+
+    def create_automation(self, account, name='Menu link', **fields):
+        from automations.models import Automation
+
+        fields.setdefault('trigger_keywords', ['link'])
+        fields.setdefault('DmMessage', 'Menu')
+        return Automation.objects.create(instagram_account=account, name=name, **fields)
+
+    def create_coffee_shop(self, **automation_fields):
+        """Sets self.user, self.account and self.automation."""
+        self.user = self.create_user()
+        self.account = self.create_account(self.user)
+        self.automation = self.create_automation(self.account, **automation_fields)
+        return self.automation
@@ -20,6 +20,7 @@ from django.urls import path
 
 from django.contrib import admin
 from django.urls import path, include
+from automations.redirector import short_link_redirect
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -39,6 +40,9 @@ urlpatterns = [
     path('api/analytics/', include('analytics.urls')),
     path('api/payments/', include('payments.urls')),
 
+    # Tracked DM button links (served before Django under ASGI, see core/asgi.py)
+    path('r/<str:token>', short_link_redirect, name='short-link'),
+
     # Health check endpoint
     path('health/', lambda request: __import__('django.http').JsonResponse({'status': 'healthy'})),
 ]
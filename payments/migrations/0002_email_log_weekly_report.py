@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emaillog',
+            name='email_type',
+            field=models.CharField(choices=[('payment_receipt', 'Payment Receipt'), ('payment_failure', 'Payment Failure'), ('subscription_reminder', 'Subscription Reminder'), ('refund_notification', 'Refund Notification'), ('trial_expiring', 'Trial Expiring Soon'), ('trial_expired', 'Trial Expired'), ('subscription_expired', 'Subscription Expired'), ('subscription_suspended', 'Subscription Suspended'), ('subscription_renewed', 'Subscription Renewed'), ('plan_change_applied', 'Plan Change Applied'), ('low_token_balance', 'Low Token Balance'), ('weekly_report', 'Weekly Report')], max_length=50),
+        ),
+    ]
@@ -940,6 +940,7 @@ class EmailLog(models.Model):
         ('subscription_renewed', 'Subscription Renewed'),
         ('plan_change_applied', 'Plan Change Applied'),
         ('low_token_balance', 'Low Token Balance'),
+        ('weekly_report', 'Weekly Report'),
     ]
     
     STATUS_CHOICES = [
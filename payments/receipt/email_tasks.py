@@ -155,12 +155,10 @@ def cleanup_old_email_logs():
     Runs daily via Celery Beat
     """
     try:
-        from payments.models import EmailLog
+        from analytics.services import retention
         
-        cutoff_date = timezone.now() - timedelta(days=90)
-        deleted_count, _ = EmailLog.objects.filter(
-            created_at__lt=cutoff_date
-        ).delete()
+        # Throttled PK batches instead of one long DELETE (RETENTION_* settings)
+        deleted_count = retention.purge('email_logs')['deleted']
         
         logger.info(f"Cleaned up {deleted_count} old email logs")
         return f"Deleted {deleted_count} email logs"